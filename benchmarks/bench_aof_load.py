@@ -0,0 +1,98 @@
+"""
+AOF load benchmark: AOFLoader versus reading the whole file and replaying
+each parse_commands() record through the command table (the old loader).
+
+Usage:
+    python benchmarks/bench_aof_load.py [commands] [--no-baseline]
+
+    python benchmarks/bench_aof_load.py 10000000   # the 10M command run
+"""
+
+import os
+import resource
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from redis_server.command_handler import CommandHandler
+from redis_server.persistence import AOFLoader
+from redis_server.persistence.aof import encode_command, parse_commands
+from redis_server.storage import DataStore
+
+
+def write_aof(filename: str, count: int) -> None:
+    """count commands: 60% SET, then RPUSH, HSET and SADD on a tenth as many keys"""
+    collections = max(1, count // 10)
+    with open(filename, 'wb') as f:
+        chunk = []
+        for i in range(count):
+            kind = i % 20
+            if kind < 12:
+                chunk.append(encode_command("SET", f"key:{i}", f"value:{i}"))
+            elif kind < 15:
+                chunk.append(encode_command("RPUSH", f"list:{i % collections}", f"item:{i}"))
+            elif kind < 18:
+                chunk.append(encode_command("HSET", f"hash:{i % collections}", f"field:{i}", f"{i}"))
+            else:
+                chunk.append(encode_command("SADD", f"set:{i % collections}", f"member:{i}"))
+            if len(chunk) == 100_000:
+                f.write(b"".join(chunk))
+                chunk = []
+        f.write(b"".join(chunk))
+
+
+def peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def load_with_loader(filename: str) -> int:
+    store = DataStore()
+    loader = AOFLoader(store, CommandHandler(store), progress_interval=5.0)
+    return loader.load(filename)
+
+
+def load_baseline(filename: str) -> int:
+    store = DataStore()
+    commands = CommandHandler(store).commands
+    with open(filename, 'rb') as f:
+        data = f.read()
+    count = 0
+    for command, args, _ in parse_commands(data):
+        handler = commands.get(command)
+        if handler:
+            handler(*args)
+        count += 1
+    return count
+
+
+def report(name: str, load, filename: str, size: int) -> None:
+    start = time.perf_counter()
+    count = load(filename)
+    elapsed = time.perf_counter() - start
+    print(f"{name:>9} {count:>11} {elapsed:>9.2f} {count / elapsed:>12.0f} "
+          f"{size / (1024 * 1024) / elapsed:>8.1f} {peak_rss_mb():>10.0f}")
+
+
+def main():
+    arguments = [argument for argument in sys.argv[1:] if not argument.startswith('--')]
+    count = int(arguments[0]) if arguments else 1_000_000
+    baseline = '--no-baseline' not in sys.argv
+
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, 'appendonly.aof')
+        start = time.perf_counter()
+        write_aof(filename, count)
+        size = os.path.getsize(filename)
+        print(f"{count} commands, {size / (1024 * 1024):.1f} MB written in {time.perf_counter() - start:.1f}s\n")
+
+        print(f"{'loader':>9} {'commands':>11} {'seconds':>9} {'commands/s':>12} {'MB/s':>8} {'peak MB':>10}")
+        # The streaming loader goes first: peak RSS only ever grows
+        report("AOFLoader", load_with_loader, filename, size)
+        if baseline:
+            report("baseline", load_baseline, filename, size)
+
+
+if __name__ == "__main__":
+    main()
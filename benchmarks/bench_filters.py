@@ -0,0 +1,68 @@
+"""
+Bloom and Cuckoo filter benchmark: throughput, false positive rate and memory
+versus a plain set.
+
+Usage:
+    python benchmarks/bench_filters.py [items]
+"""
+
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from redis_server.datatypes import BloomFilter, CuckooFilter
+
+
+def timed(operation, items) -> float:
+    """Run operation over items and return operations per second"""
+    start = time.perf_counter()
+    for item in items:
+        operation(item)
+    return len(items) / (time.perf_counter() - start)
+
+
+def set_memory(items) -> int:
+    """Python heap needed to hold the same items in a set (what SADD costs today)"""
+    tracemalloc.start()
+    members = set(items)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del members
+    return size
+
+
+def report(name, filter_obj, add, items, absent):
+    add_rate = timed(add, items)
+    exists_rate = timed(filter_obj.exists, items)
+    false_positives = sum(1 for item in absent if filter_obj.exists(item))
+    print(f"{name:>8} {add_rate:>12.0f} {exists_rate:>12.0f} "
+          f"{false_positives / len(absent) * 100:>8.3f} {filter_obj.memory_usage():>12}")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    items = [f"id:{i}" for i in range(count)]
+    absent = [f"missing:{i}" for i in range(count)]
+
+    print(f"{count} items, set of the same ids: {set_memory(items)} bytes\n")
+    print(f"{'filter':>8} {'adds/s':>12} {'exists/s':>12} {'fp %':>8} {'bytes':>12}")
+
+    bloom = BloomFilter(error_rate=0.01, capacity=count)
+    report("bloom", bloom, bloom.add, items, absent)
+
+    scaling = BloomFilter(error_rate=0.01, capacity=max(1, count // 16))
+    report("bloom*", scaling, scaling.add, items, absent)
+
+    cuckoo = CuckooFilter(capacity=count)
+    report("cuckoo", cuckoo, cuckoo.add, items, absent)
+
+    delete_rate = timed(cuckoo.delete, items)
+    print(f"\ncuckoo deletes/s: {delete_rate:.0f} (items left: {cuckoo.num_items})")
+    print("bloom* starts at 1/16 of the capacity and scales with sub-filters")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+HyperLogLog benchmark: estimation error, memory and throughput versus a plain set.
+
+Usage:
+    python benchmarks/bench_hyperloglog.py [max_cardinality]
+"""
+
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from redis_server.datatypes import HyperLogLog
+
+
+def set_memory(cardinality: int) -> int:
+    """Python heap needed to hold the same members in a set (what SADD costs today)"""
+    tracemalloc.start()
+    members = {f"user:{i}" for i in range(cardinality)}
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del members
+    return size
+
+
+def main():
+    max_cardinality = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+
+    print(f"{'cardinality':>12} {'estimate':>10} {'error %':>8} {'encoding':>8} "
+          f"{'hll bytes':>10} {'set bytes':>12} {'adds/s':>10}")
+
+    cardinality = 100
+    while cardinality <= max_cardinality:
+        hll = HyperLogLog()
+        elements = [f"user:{i}" for i in range(cardinality)]
+
+        start = time.perf_counter()
+        hll.add(*elements)
+        elapsed = time.perf_counter() - start
+
+        estimate = hll.count()
+        error_pct = abs(estimate - cardinality) / cardinality * 100
+        print(f"{cardinality:>12} {estimate:>10} {error_pct:>8.2f} {hll.encoding:>8} "
+              f"{hll.memory_usage():>10} {set_memory(cardinality):>12} {cardinality / elapsed:>10.0f}")
+        cardinality *= 10
+
+    # PFMERGE cost: register-wise max of two dense HyperLogLogs
+    first, second = HyperLogLog(), HyperLogLog()
+    first.add(*(f"a:{i}" for i in range(50_000)))
+    second.add(*(f"b:{i}" for i in range(50_000)))
+    rounds = 200
+    start = time.perf_counter()
+    for _ in range(rounds):
+        merged = HyperLogLog()
+        merged.merge(first, second)
+    merge_ms = (time.perf_counter() - start) / rounds * 1000
+    print(f"\nPFMERGE of two dense HLLs: {merge_ms:.3f} ms, estimate {merged.count()} (true 100000)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+RDB load benchmark: RDBLoader with a given number of worker processes
+versus decoding the file in process and setting one key at a time (the
+old RecoveryManager._load_from_rdb).
+
+Usage:
+    python benchmarks/bench_rdb_load.py [keys] [workers ...] [--no-baseline]
+
+    python benchmarks/bench_rdb_load.py 5000000 1 4 8   # the 5M key run
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from redis_server.persistence import RDBHandler, RDBLoader
+from redis_server.storage import DataStore
+
+from bench_rdb_save import populate
+
+
+def load_baseline(filename: str) -> int:
+    store = DataStore()
+    count = 0
+    for key, value, expiry_time in RDBHandler(filename).iter_snapshot():
+        store.set(key, value, expiry_time)
+        count += 1
+    return count
+
+
+def load_with_loader(filename: str, workers: int) -> int:
+    return RDBLoader(DataStore(), workers, progress_interval=5.0).load(filename)
+
+
+def report(name: str, load, count: int) -> None:
+    start = time.perf_counter()
+    loaded = load()
+    elapsed = time.perf_counter() - start
+    assert loaded == count, (loaded, count)
+    print(f"{name:>12} {elapsed:>9.2f} {count / elapsed:>10.0f}")
+
+
+def main():
+    arguments = [int(argument) for argument in sys.argv[1:] if not argument.startswith('--')]
+    count = arguments[0] if arguments else 1_000_000
+    workers = arguments[1:] or [1, os.cpu_count() or 1]
+    baseline = '--no-baseline' not in sys.argv
+
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, 'dump.rdb')
+        start = time.perf_counter()
+        RDBHandler(filename).create_snapshot(populate(count))
+        print(f"{count} keys, {os.path.getsize(filename) / (1024 * 1024):.1f} MB written in "
+              f"{time.perf_counter() - start:.1f}s on {os.cpu_count()} CPUs\n")
+
+        print(f"{'loader':>12} {'seconds':>9} {'keys/s':>10}")
+        if baseline:
+            report("baseline", lambda: load_baseline(filename), count)
+        for n in workers:
+            report(f"{n} workers", lambda: load_with_loader(filename, n), count)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+RDB save benchmark: peak RSS and time of SAVE with the streaming writer,
+versus the old pickle + gzip + md5 of a copy of the whole state.
+
+Each save runs in a forked child that builds the dataset itself, so the
+peak RSS figures don't leak into each other; "save MB" is how far the
+peak rose above the populated store during the save.
+
+Usage:
+    python benchmarks/bench_rdb_save.py [keys] [--no-baseline]
+
+    python benchmarks/bench_rdb_save.py 5000000   # the 5M key run
+"""
+
+import gzip
+import hashlib
+import os
+import pickle
+import resource
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from redis_server.persistence import RDBHandler
+from redis_server.storage import DataStore
+
+
+def populate(count: int) -> DataStore:
+    """count keys: 90% strings, the rest 10-field hashes"""
+    store = DataStore()
+    for i in range(count):
+        if i % 10:
+            store.set(f"key:{i}", f"value:{i}")
+        else:
+            store.get_or_create_hash(f"hash:{i}").update({f"field:{n}": f"{i * n}" for n in range(10)})
+    return store
+
+
+def peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def save_streaming(store: DataStore, filename: str) -> None:
+    if not RDBHandler(filename).create_snapshot(store):
+        raise RuntimeError("save failed")
+
+
+def save_pickle(store: DataStore, filename: str) -> None:
+    """The pre-0002 save: state dict, pickle, gzip and md5 of it all in memory"""
+    state = {'keys': {}, 'metadata': {'created_time': time.time(), 'key_count': 0}}
+    for key in store.keys():
+        state['keys'][key] = {'value': store.get(key), 'type': store.get_type(key),
+                              'ttl': None, 'expiry_time': None}
+    data = gzip.compress(pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL))
+    with open(filename, 'wb') as f:
+        f.write(b'REDIS0001' + hashlib.md5(data).digest() + data)
+
+
+def run(name: str, save, count: int, directory: str) -> None:
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        store = populate(count)
+        before = peak_rss_mb()
+        filename = os.path.join(directory, f"{name}.rdb")
+        start = time.perf_counter()
+        save(store, filename)
+        elapsed = time.perf_counter() - start
+        line = (f"{name:>9} {elapsed:>9.2f} {os.path.getsize(filename) / (1024 * 1024):>9.1f} "
+                f"{before:>10.0f} {peak_rss_mb() - before:>9.0f}\n")
+        os.write(write_fd, line.encode())
+        os._exit(0)
+    os.close(write_fd)
+    with os.fdopen(read_fd) as pipe:
+        print(pipe.read(), end='')
+    os.waitpid(pid, 0)
+
+
+def main():
+    arguments = [argument for argument in sys.argv[1:] if not argument.startswith('--')]
+    count = int(arguments[0]) if arguments else 1_000_000
+    baseline = '--no-baseline' not in sys.argv
+
+    print(f"{count} keys\n")
+    print(f"{'writer':>9} {'seconds':>9} {'file MB':>9} {'store MB':>10} {'save MB':>9}")
+    with tempfile.TemporaryDirectory() as directory:
+        run("streaming", save_streaming, count, directory)
+        if baseline:
+            run("pickle", save_pickle, count, directory)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Vector set benchmark: HNSW build time, query latency and recall@10 against
+the exact scan, plus snapshot (to_bytes/from_bytes) size and time.
+
+Usage:
+    python benchmarks/bench_vectorset.py [vectors] [dim] [M] [EF]
+
+The HNSW graph is pure Python, so building is the slow part: expect
+minutes at 100k vectors (`bench_vectorset.py 100000`) and far longer at 1M.
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from redis_server.datatypes import VectorSet
+
+
+QUERIES = 50
+COUNT = 10
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5_000
+    dim = int(sys.argv[2]) if len(sys.argv) > 2 else 32
+    m = int(sys.argv[3]) if len(sys.argv) > 3 else 16
+    ef_construction = int(sys.argv[4]) if len(sys.argv) > 4 else 100
+
+    rng = random.Random(42)
+    vectors = [[rng.gauss(0, 1) for _ in range(dim)] for _ in range(count)]
+    queries = [[rng.gauss(0, 1) for _ in range(dim)] for _ in range(QUERIES)]
+
+    vector_set = VectorSet(dim, m=m, ef_construction=ef_construction, hnsw_threshold=0)
+    start = time.perf_counter()
+    for i, vector in enumerate(vectors):
+        vector_set.add(f"v{i}", vector)
+    build = time.perf_counter() - start
+    print(f"{count} vectors of dim {dim}, M={m} EF={ef_construction}: "
+          f"built in {build:.1f}s ({count / build:.0f} adds/s)\n")
+
+    start = time.perf_counter()
+    truth = [{name for name, _ in vector_set.search(query, COUNT, exact=True)} for query in queries]
+    exact_ms = (time.perf_counter() - start) / QUERIES * 1000
+    print(f"{'search':>12} {'ms/query':>10} {'recall@10':>10}")
+    print(f"{'exact':>12} {exact_ms:>10.2f} {1.0:>10.3f}")
+
+    for ef in (10, 50, 100, 200):
+        start = time.perf_counter()
+        found = [{name for name, _ in vector_set.search(query, COUNT, ef=ef)} for query in queries]
+        hnsw_ms = (time.perf_counter() - start) / QUERIES * 1000
+        recall = sum(len(hits & expected) for hits, expected in zip(found, truth)) / (COUNT * QUERIES)
+        print(f"{f'hnsw ef={ef}':>12} {hnsw_ms:>10.2f} {recall:>10.3f}")
+
+    start = time.perf_counter()
+    data = vector_set.to_bytes()
+    dumped = time.perf_counter() - start
+    start = time.perf_counter()
+    VectorSet.from_bytes(data)
+    loaded = time.perf_counter() - start
+    print(f"\nsnapshot: {len(data)} bytes, dump {dumped * 1000:.0f} ms, "
+          f"load {loaded * 1000:.0f} ms (graph restored, no rebuild)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+import time
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional, Set
+
+class BlockedClient:
+    """A client waiting on keys, with the command to retry and the reply to send on timeout."""
+
+    def __init__(self, client, keys, deadline: Optional[float],
+                 retry: Callable[[], Optional[bytes]], timeout_response: bytes):
+        self.client = client
+        self.keys = keys
+        self.deadline = deadline
+        self.retry = retry
+        self.timeout_response = timeout_response
+
+
+class BlockingManager:
+    """
+    Tracks clients blocked on keys (XREAD BLOCK and friends).
+    Writers signal keys as ready; the event loop then retries the blocked
+    commands once per iteration and answers timed out clients.
+    """
+    def __init__(self, send: Optional[Callable[[Any, bytes], None]] = None):
+        # How replies reach clients (the server may hold them for the AOF)
+        self.send = send
+        
+        # Client socket -> blocked state
+        self.blocked: Dict[Any, BlockedClient] = {}
+
+        # Key -> clients blocked on it, in blocking order
+        self.key_clients: Dict[str, List[Any]] = defaultdict(list)
+
+        # Keys written to since the last processing pass
+        self.ready_keys: Set[str] = set()
+
+    def block(self, client, keys, timeout_ms: int, retry: Callable[[], Optional[bytes]],
+              timeout_response: bytes) -> None:
+        """Block a client until retry() produces a reply or the timeout (0 = forever) expires."""
+        deadline = time.time() + timeout_ms / 1000 if timeout_ms > 0 else None
+        self.blocked[client] = BlockedClient(client, keys, deadline, retry, timeout_response)
+        for key in keys:
+            self.key_clients[key].append(client)
+
+    def is_blocked(self, client) -> bool:
+        return client in self.blocked
+
+    def signal_key_ready(self, key: str) -> None:
+        """Called by writers so clients blocked on key get a chance to proceed."""
+        if key in self.key_clients:
+            self.ready_keys.add(key)
+
+    def process_ready_keys(self) -> List[Any]:
+        """
+        Retry commands of clients blocked on ready keys.
+        Returns the clients that were served and unblocked.
+        """
+        served = []
+        while self.ready_keys:
+            key = self.ready_keys.pop()
+            for client in list(self.key_clients.get(key, [])):
+                state = self.blocked.get(client)
+                if state is None:
+                    continue
+                response = state.retry()
+                if response is not None:
+                    self._send(client, response)
+                    self.unblock(client)
+                    served.append(client)
+        return served
+
+    def process_timeouts(self) -> List[Any]:
+        """Answer clients whose block timeout expired. Returns the unblocked clients."""
+        now = time.time()
+        expired = [client for client, state in self.blocked.items()
+                   if state.deadline is not None and state.deadline <= now]
+        for client in expired:
+            self._send(client, self.blocked[client].timeout_response)
+            self.unblock(client)
+        return expired
+
+    def unblock(self, client) -> None:
+        """Forget a blocked client (served, timed out or disconnected)."""
+        state = self.blocked.pop(client, None)
+        if state is None:
+            return
+        for key in state.keys:
+            clients = self.key_clients.get(key)
+            if clients is None:
+                continue
+            if client in clients:
+                clients.remove(client)
+            if not clients:
+                del self.key_clients[key]
+
+    def _send(self, client, response: bytes) -> None:
+        try:
+            if self.send is not None:
+                self.send(client, response)
+            else:
+                client.send(response)
+        except Exception:
+            # Client likely disconnected; the server will clean it up
+            pass
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            'blocked_clients': len(self.blocked),
+            'blocking_keys': len(self.key_clients),
+        }
@@ -1,14 +1,21 @@
 from .commands import (
     BasicCommands, ExpirationCommands, ListCommands, 
-    HashCommands, SetCommands, PersistenceCommands, InfoCommands, PubSubCommands
+    HashCommands, SetCommands, PersistenceCommands, InfoCommands, PubSubCommands,
+    BitmapCommands, HyperLogLogCommands, BloomCommands, CuckooCommands,
+    CountMinCommands, TopKCommands, StreamCommands, TimeSeriesCommands,
+    VectorSetCommands, SearchCommands, JSONCommands, GeoCommands
 )
-from .response import error
+from .response import error, loading_error, misconf_error
+
+# Commands served while the dataset is still loading; the rest get -LOADING
+LOADING_COMMANDS = {"PING", "ECHO", "INFO", "CONFIG", "LASTSAVE", "SUBSCRIBE", "UNSUBSCRIBE", "PUBLISH", "PUBSUB"}
 
 class CommandHandler:
-    def __init__(self, storage, persistence_manager=None, pubsub_manager=None):
+    def __init__(self, storage, persistence_manager=None, pubsub_manager=None, blocking_manager=None):
         self.storage = storage
         self.persistence_manager = persistence_manager
         self.pubsub_manager = pubsub_manager
+        self.blocking_manager = blocking_manager
         self.command_count = 0
         self.current_client = None  # Track current client for pub/sub commands
         
@@ -21,6 +28,18 @@ class CommandHandler:
         self.persistence_commands = PersistenceCommands(storage, persistence_manager)
         self.info_commands = InfoCommands(storage, persistence_manager, self.command_count)
         self.pubsub_commands = PubSubCommands(storage, persistence_manager, pubsub_manager)
+        self.bitmap_commands = BitmapCommands(storage, persistence_manager)
+        self.hyperloglog_commands = HyperLogLogCommands(storage, persistence_manager)
+        self.bloom_commands = BloomCommands(storage, persistence_manager)
+        self.cuckoo_commands = CuckooCommands(storage, persistence_manager)
+        self.countmin_commands = CountMinCommands(storage, persistence_manager)
+        self.topk_commands = TopKCommands(storage, persistence_manager)
+        self.stream_commands = StreamCommands(storage, persistence_manager, blocking_manager)
+        self.timeseries_commands = TimeSeriesCommands(storage, persistence_manager)
+        self.vectorset_commands = VectorSetCommands(storage, persistence_manager)
+        self.search_commands = SearchCommands(storage, persistence_manager)
+        self.json_commands = JSONCommands(storage, persistence_manager)
+        self.geo_commands = GeoCommands(storage, persistence_manager)
         
         # Command registry mapping commands to their handlers
         self.commands = {
@@ -32,11 +51,13 @@ class CommandHandler:
             "DEL": self.basic_commands.delete,
             "EXISTS": self.basic_commands.exists,
             "KEYS": self.basic_commands.keys,
+            "OBJECT": self.basic_commands.object_command,
             "FLUSHALL": self.basic_commands.flushall,
             
             # Expiration commands
             "EXPIRE": self.expiration_commands.expire,
             "EXPIREAT": self.expiration_commands.expireat,
+            "PEXPIREAT": self.expiration_commands.pexpireat,
             "TTL": self.expiration_commands.ttl,
             "PTTL": self.expiration_commands.pttl,
             "PERSIST": self.expiration_commands.persist,
@@ -73,6 +94,119 @@ class CommandHandler:
             "SDIFF": self.set_commands.sdiff,
             "SINTERSTORE": self.set_commands.sinterstore,
             
+            # Bitmap commands
+            "SETBIT": self.bitmap_commands.setbit,
+            "GETBIT": self.bitmap_commands.getbit,
+            "BITCOUNT": self.bitmap_commands.bitcount,
+            "BITPOS": self.bitmap_commands.bitpos,
+            "BITOP": self.bitmap_commands.bitop,
+            "BITFIELD": self.bitmap_commands.bitfield,
+            "BITFIELD_RO": self.bitmap_commands.bitfield_ro,
+            
+            # HyperLogLog commands
+            "PFADD": self.hyperloglog_commands.pfadd,
+            "PFCOUNT": self.hyperloglog_commands.pfcount,
+            "PFMERGE": self.hyperloglog_commands.pfmerge,
+            
+            # Bloom filter commands
+            "BF.RESERVE": self.bloom_commands.bf_reserve,
+            "BF.ADD": self.bloom_commands.bf_add,
+            "BF.MADD": self.bloom_commands.bf_madd,
+            "BF.EXISTS": self.bloom_commands.bf_exists,
+            "BF.MEXISTS": self.bloom_commands.bf_mexists,
+            "BF.CARD": self.bloom_commands.bf_card,
+            "BF.INFO": self.bloom_commands.bf_info,
+            
+            # Cuckoo filter commands
+            "CF.RESERVE": self.cuckoo_commands.cf_reserve,
+            "CF.ADD": self.cuckoo_commands.cf_add,
+            "CF.ADDNX": self.cuckoo_commands.cf_addnx,
+            "CF.EXISTS": self.cuckoo_commands.cf_exists,
+            "CF.MEXISTS": self.cuckoo_commands.cf_mexists,
+            "CF.DEL": self.cuckoo_commands.cf_del,
+            "CF.COUNT": self.cuckoo_commands.cf_count,
+            "CF.INFO": self.cuckoo_commands.cf_info,
+            
+            # Count-Min Sketch commands
+            "CMS.INITBYDIM": self.countmin_commands.cms_initbydim,
+            "CMS.INITBYPROB": self.countmin_commands.cms_initbyprob,
+            "CMS.INCRBY": self.countmin_commands.cms_incrby,
+            "CMS.QUERY": self.countmin_commands.cms_query,
+            "CMS.MERGE": self.countmin_commands.cms_merge,
+            "CMS.INFO": self.countmin_commands.cms_info,
+            
+            # Top-K commands
+            "TOPK.RESERVE": self.topk_commands.topk_reserve,
+            "TOPK.ADD": self.topk_commands.topk_add,
+            "TOPK.INCRBY": self.topk_commands.topk_incrby,
+            "TOPK.QUERY": self.topk_commands.topk_query,
+            "TOPK.COUNT": self.topk_commands.topk_count,
+            "TOPK.LIST": self.topk_commands.topk_list,
+            "TOPK.INFO": self.topk_commands.topk_info,
+            
+            # Stream commands
+            "XADD": self.stream_commands.xadd,
+            "XLEN": self.stream_commands.xlen,
+            "XRANGE": self.stream_commands.xrange,
+            "XREVRANGE": self.stream_commands.xrevrange,
+            "XDEL": self.stream_commands.xdel,
+            "XTRIM": self.stream_commands.xtrim,
+            "XREAD": self.stream_commands.xread,
+            "XGROUP": self.stream_commands.xgroup,
+            "XREADGROUP": self.stream_commands.xreadgroup,
+            "XACK": self.stream_commands.xack,
+            "XPENDING": self.stream_commands.xpending,
+            "XCLAIM": self.stream_commands.xclaim,
+            
+            # Time series commands
+            "TS.CREATE": self.timeseries_commands.ts_create,
+            "TS.ADD": self.timeseries_commands.ts_add,
+            "TS.MADD": self.timeseries_commands.ts_madd,
+            "TS.GET": self.timeseries_commands.ts_get,
+            "TS.DEL": self.timeseries_commands.ts_del,
+            "TS.RANGE": self.timeseries_commands.ts_range,
+            "TS.REVRANGE": self.timeseries_commands.ts_revrange,
+            "TS.MRANGE": self.timeseries_commands.ts_mrange,
+            "TS.MREVRANGE": self.timeseries_commands.ts_mrevrange,
+            "TS.QUERYINDEX": self.timeseries_commands.ts_queryindex,
+            "TS.INFO": self.timeseries_commands.ts_info,
+            
+            # Vector set commands
+            "VADD": self.vectorset_commands.vadd,
+            "VSIM": self.vectorset_commands.vsim,
+            "VREM": self.vectorset_commands.vrem,
+            "VCARD": self.vectorset_commands.vcard,
+            "VDIM": self.vectorset_commands.vdim,
+            "VEMB": self.vectorset_commands.vemb,
+            "VINFO": self.vectorset_commands.vinfo,
+            
+            # Search commands
+            "FT.CREATE": self.search_commands.ft_create,
+            "FT.SEARCH": self.search_commands.ft_search,
+            "FT.DROPINDEX": self.search_commands.ft_dropindex,
+            "FT.INFO": self.search_commands.ft_info,
+            "FT._LIST": self.search_commands.ft_list,
+            
+            # JSON commands
+            "JSON.SET": self.json_commands.json_set,
+            "JSON.GET": self.json_commands.json_get,
+            "JSON.DEL": self.json_commands.json_del,
+            "JSON.NUMINCRBY": self.json_commands.json_numincrby,
+            "JSON.ARRAPPEND": self.json_commands.json_arrappend,
+            "JSON.OBJLEN": self.json_commands.json_objlen,
+            "JSON.ARRLEN": self.json_commands.json_arrlen,
+            "JSON.TYPE": self.json_commands.json_type,
+            
+            # Geo commands (geo sets are sorted sets scored by geohash)
+            "GEOADD": self.geo_commands.geoadd,
+            "GEOPOS": self.geo_commands.geopos,
+            "GEODIST": self.geo_commands.geodist,
+            "GEOHASH": self.geo_commands.geohash,
+            "GEOSEARCH": self.geo_commands.geosearch,
+            "ZREM": self.geo_commands.zrem,
+            "ZSCORE": self.geo_commands.zscore,
+            "ZCARD": self.geo_commands.zcard,
+            
             # Persistence commands
             "SAVE": self.persistence_commands.save,
             "BGSAVE": self.persistence_commands.bgsave,
@@ -98,17 +232,41 @@ class CommandHandler:
         if client is not None:
             self.current_client = client
             self.pubsub_commands.set_current_client(client)
+        # Only a live client may block; recovery and internal calls never do
+        self.stream_commands.set_current_client(client)
         
         # Update command count in info handler
         self.info_commands.update_command_count(self.command_count)
         
         cmd = self.commands.get(command.upper())
+        if cmd and self.persistence_manager and self.persistence_manager.loading \
+                and command.upper() not in LOADING_COMMANDS:
+            return loading_error()
+        if cmd and self.persistence_manager and self.basic_commands._is_write_command(command):
+            # Like Redis, refuse writes while they can't be persisted
+            write_error = self.persistence_manager.write_error()
+            if write_error is not None:
+                return misconf_error(write_error)
         if cmd:
-            result = cmd(*args)
+            handler = cmd.__self__
+            handler.propagated = None
+            # Values a read-only command is handed aren't marked dirty or
+            # pinned into a mapped snapshot's overlay (see DataStore._unshare)
+            reading = self.storage.reading
+            self.storage.reading = not self.basic_commands._is_write_command(command)
+            try:
+                result = cmd(*args)
+            finally:
+                self.storage.reading = reading
             
-            # Log write commands to AOF using the base class method
+            # Log write commands to AOF using the base class method, or the
+            # commands the handler chose to propagate in their place
             if self.persistence_manager and self.basic_commands._is_write_command(command):
-                self.persistence_manager.log_write_command(command, *args)
+                if handler.propagated is None:
+                    self.persistence_manager.log_write_command(command, *args)
+                else:
+                    for propagated_command, propagated_args in handler.propagated:
+                        self.persistence_manager.log_write_command(propagated_command, *propagated_args)
             
             return result
         return error(f"Unknown command '{command}'")
\ No newline at end of file
@@ -6,6 +6,18 @@ from .set import SetCommands
 from .persistence import PersistenceCommands
 from .info import InfoCommands
 from .pubsub import PubSubCommands
+from .bitmap import BitmapCommands
+from .hyperloglog import HyperLogLogCommands
+from .bloom import BloomCommands
+from .cuckoo import CuckooCommands
+from .countmin import CountMinCommands
+from .topk import TopKCommands
+from .stream import StreamCommands
+from .timeseries import TimeSeriesCommands
+from .vectorset import VectorSetCommands
+from .search import SearchCommands
+from .json import JSONCommands
+from .geo import GeoCommands
 
 __all__ = [
     'BasicCommands',
@@ -15,5 +27,17 @@ __all__ = [
     'SetCommands',
     'PersistenceCommands',
     'InfoCommands',
-    'PubSubCommands'
+    'PubSubCommands',
+    'BitmapCommands',
+    'HyperLogLogCommands',
+    'BloomCommands',
+    'CuckooCommands',
+    'CountMinCommands',
+    'TopKCommands',
+    'StreamCommands',
+    'TimeSeriesCommands',
+    'VectorSetCommands',
+    'SearchCommands',
+    'JSONCommands',
+    'GeoCommands'
 ]
\ No newline at end of file
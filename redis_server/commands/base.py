@@ -1,22 +1,46 @@
 from abc import ABC
 from ..response import *
 
+# Commands that change the dataset: logged to the AOF (or the commands they
+# propagate in their place, see _propagate) and refused while the AOF can't
+# be written. The one list every layer checks, so none drops a write.
+WRITE_COMMANDS = frozenset({
+    'SET', 'DEL', 'EXPIRE', 'EXPIREAT', 'PEXPIREAT', 'PERSIST', 'FLUSHALL',
+    'LPUSH', 'RPUSH', 'LPOP', 'RPOP', 'LSET',
+    'HSET', 'HMSET', 'HDEL',
+    'SADD', 'SREM', 'SINTERSTORE',
+    'SETBIT', 'BITOP', 'BITFIELD',
+    'PFADD', 'PFMERGE',
+    'BF.RESERVE', 'BF.ADD', 'BF.MADD',
+    'CF.RESERVE', 'CF.ADD', 'CF.ADDNX', 'CF.DEL',
+    'CMS.INITBYDIM', 'CMS.INITBYPROB', 'CMS.INCRBY', 'CMS.MERGE',
+    'TOPK.RESERVE', 'TOPK.ADD', 'TOPK.INCRBY',
+    'XADD', 'XDEL', 'XTRIM', 'XGROUP', 'XREADGROUP', 'XACK', 'XCLAIM',
+    'TS.CREATE', 'TS.ADD', 'TS.MADD', 'TS.DEL',
+    'VADD', 'VREM',
+    'FT.CREATE', 'FT.DROPINDEX',
+    'JSON.SET', 'JSON.DEL', 'JSON.NUMINCRBY', 'JSON.ARRAPPEND',
+    'GEOADD', 'ZREM',
+})
+
 class BaseCommandHandler(ABC):
     """Base class for all command handlers"""
     
     def __init__(self, storage, persistence_manager=None):
         self.storage = storage
         self.persistence_manager = persistence_manager
+        # Commands to log instead of the one received (None = log it as is)
+        self.propagated = None
+    
+    def _propagate(self, command, *args):
+        """Log command to the AOF in place of the one being executed; may be called repeatedly"""
+        if self.propagated is None:
+            self.propagated = []
+        self.propagated.append((command, args))
     
     def _is_write_command(self, command):
         """Check if command is a write command that should be logged"""
-        write_commands = {
-            'SET', 'DEL', 'EXPIRE', 'EXPIREAT', 'PERSIST', 'FLUSHALL',
-            'LPUSH', 'RPUSH', 'LPOP', 'RPOP', 'LSET',
-            'HSET', 'HMSET', 'HDEL',
-            'SADD', 'SREM', 'SINTERSTORE'
-        }
-        return command.upper() in write_commands
+        return command.upper() in WRITE_COMMANDS
     
     def _format_bytes(self, bytes_count):
         """Format bytes in human readable format"""
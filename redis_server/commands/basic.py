@@ -2,8 +2,16 @@ import time
 from .base import BaseCommandHandler
 from ..response import *
 
+# SET expiry option -> absolute expiry time of its argument
+EXPIRY_OPTIONS = {
+    "EX": lambda seconds: time.time() + seconds,
+    "PX": lambda milliseconds: time.time() + milliseconds / 1000,
+    "EXAT": lambda timestamp: timestamp,
+    "PXAT": lambda timestamp: timestamp / 1000,
+}
+
 class BasicCommands(BaseCommandHandler):
-    """Basic Redis commands: PING, ECHO, SET, GET, DEL, EXISTS, KEYS, FLUSHALL"""
+    """Basic Redis commands: PING, ECHO, SET, GET, DEL, EXISTS, KEYS, OBJECT, FLUSHALL"""
     
     def ping(self, *args):
         return pong()
@@ -18,17 +26,25 @@ class BasicCommands(BaseCommandHandler):
         key = args[0]
         value = " ".join(args[1:])
         
-        # Parse optional EX parameter for expiration
+        # Parse optional EX/PX/EXAT/PXAT parameter for expiration
         expiry_time = None
-        if len(args) >= 4 and args[-2].upper() == "EX":
+        if len(args) >= 4 and args[-2].upper() in EXPIRY_OPTIONS:
             try:
-                seconds = int(args[-1])
-                expiry_time = time.time() + seconds
+                expiry_time = EXPIRY_OPTIONS[args[-2].upper()](int(args[-1]))
                 value = " ".join(args[1:-2])
             except ValueError:
                 return error("Invalid expire time in set")
         
-        self.storage.set(key, value, expiry_time)
+        if expiry_time is None:
+            self.storage.set(key, value)
+        elif expiry_time <= time.time():
+            # Already expired (e.g. a PXAT in the past): nothing is stored
+            self.storage.delete(key)
+            self._propagate("DEL", key)
+        else:
+            self.storage.set(key, value, expiry_time)
+            # Logged with an absolute deadline so a replay doesn't restart the TTL
+            self._propagate("SET", key, value, "PXAT", str(int(expiry_time * 1000)))
         return ok()
 
     def get(self, *args):
@@ -53,6 +69,16 @@ class BasicCommands(BaseCommandHandler):
             return array([])
         return array([bulk_string(key) for key in keys])
 
+    def object_command(self, *args):
+        if len(args) != 2:
+            return error("wrong number of arguments for 'object' command")
+        
+        subcommand = args[0].upper()
+        if subcommand == "ENCODING":
+            # "compressed" for the large strings the store keeps deflated
+            return bulk_string(self.storage.get_encoding(args[1]))
+        return error(f"unknown OBJECT subcommand '{args[0]}'")
+
     def flushall(self, *args):
         self.storage.flush()
         return ok()
\ No newline at end of file
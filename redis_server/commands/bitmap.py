@@ -0,0 +1,388 @@
+from .base import BaseCommandHandler
+from ..response import *
+
+# Redis caps bitmaps at 512MB, i.e. 2^32 addressable bits
+MAX_BIT_OFFSET = 2 ** 32 - 1
+
+class BitmapCommands(BaseCommandHandler):
+    """Redis Bitmap commands: SETBIT, GETBIT, BITCOUNT, BITPOS, BITOP, BITFIELD, BITFIELD_RO"""
+
+    def setbit(self, *args):
+        """Set or clear the bit at offset"""
+        if len(args) != 3:
+            return error("wrong number of arguments for 'setbit' command")
+
+        key, offset_str, bit_str = args
+
+        offset = self._parse_bit_offset(offset_str)
+        if offset is None:
+            return error("bit offset is not an integer or out of range")
+        if bit_str not in ("0", "1"):
+            return error("bit is not an integer or out of range")
+
+        try:
+            bitmap = self.storage.get_or_create_bitmap(key)
+            byte_index = offset // 8
+            mask = 0x80 >> (offset % 8)
+
+            # Grow the bitmap with zero bytes when writing past the end
+            if byte_index >= len(bitmap):
+                bitmap.extend(bytes(byte_index + 1 - len(bitmap)))
+
+            old_bit = 1 if bitmap[byte_index] & mask else 0
+            if bit_str == "1":
+                bitmap[byte_index] |= mask
+            else:
+                bitmap[byte_index] &= ~mask & 0xFF
+
+            return integer(old_bit)
+        except TypeError as e:
+            return error(str(e))
+
+    def getbit(self, *args):
+        """Get the bit at offset"""
+        if len(args) != 2:
+            return error("wrong number of arguments for 'getbit' command")
+
+        key, offset_str = args
+
+        offset = self._parse_bit_offset(offset_str)
+        if offset is None:
+            return error("bit offset is not an integer or out of range")
+
+        try:
+            data = self.storage.get_string_bytes(key)
+            if data is None or offset // 8 >= len(data):
+                return integer(0)
+            return integer(1 if data[offset // 8] & (0x80 >> (offset % 8)) else 0)
+        except TypeError as e:
+            return error(str(e))
+
+    def bitcount(self, *args):
+        """Count set bits, optionally within a BYTE or BIT range"""
+        if len(args) not in (1, 3, 4):
+            return error("wrong number of arguments for 'bitcount' command")
+
+        key = args[0]
+
+        try:
+            data = self.storage.get_string_bytes(key)
+        except TypeError as e:
+            return error(str(e))
+
+        if len(args) == 1:
+            if not data:
+                return integer(0)
+            return integer(int.from_bytes(data, 'big').bit_count())
+
+        try:
+            start = int(args[1])
+            end = int(args[2])
+        except ValueError:
+            return error("value is not an integer or out of range")
+
+        unit = args[3].upper() if len(args) == 4 else "BYTE"
+        if unit not in ("BYTE", "BIT"):
+            return error("syntax error")
+
+        if not data:
+            return integer(0)
+
+        if unit == "BYTE":
+            start, end = self._resolve_range(start, end, len(data))
+            if start > end:
+                return integer(0)
+            return integer(int.from_bytes(data[start:end + 1], 'big').bit_count())
+
+        start, end = self._resolve_range(start, end, len(data) * 8)
+        if start > end:
+            return integer(0)
+        return integer(self._read_bits(data, start, end - start + 1).bit_count())
+
+    def bitpos(self, *args):
+        """Find the first bit set to 0 or 1, optionally within a BYTE or BIT range"""
+        if len(args) < 2 or len(args) > 5:
+            return error("wrong number of arguments for 'bitpos' command")
+
+        key, bit_str = args[0], args[1]
+        if bit_str not in ("0", "1"):
+            return error("The bit argument must be 1 or 0.")
+        bit = int(bit_str)
+
+        try:
+            start = int(args[2]) if len(args) >= 3 else 0
+            end = int(args[3]) if len(args) >= 4 else -1
+        except ValueError:
+            return error("value is not an integer or out of range")
+        end_given = len(args) >= 4
+
+        unit = args[4].upper() if len(args) == 5 else "BYTE"
+        if unit not in ("BYTE", "BIT"):
+            return error("syntax error")
+
+        try:
+            data = self.storage.get_string_bytes(key)
+        except TypeError as e:
+            return error(str(e))
+
+        # A missing key is an empty string: all of its (infinite) bits are zero
+        if not data:
+            return integer(0 if bit == 0 else -1)
+
+        if unit == "BYTE":
+            start, end = self._resolve_range(start, end, len(data))
+            start_bit, end_bit = start * 8, end * 8 + 7
+        else:
+            start_bit, end_bit = self._resolve_range(start, end, len(data) * 8)
+
+        if start_bit > end_bit:
+            return integer(-1)
+
+        position = self._find_bit(data, bit, start_bit, end_bit)
+
+        # Looking for a clear bit without an explicit end: the string is
+        # considered padded with zeros on the right
+        if position == -1 and bit == 0 and not end_given:
+            return integer(end_bit + 1)
+        return integer(position)
+
+    def bitop(self, *args):
+        """Perform AND, OR, XOR or NOT between strings and store the result"""
+        if len(args) < 3:
+            return error("wrong number of arguments for 'bitop' command")
+
+        operation = args[0].upper()
+        destination = args[1]
+        keys = args[2:]
+
+        if operation not in ("AND", "OR", "XOR", "NOT"):
+            return error("syntax error")
+        if operation == "NOT" and len(keys) != 1:
+            return error("BITOP NOT must be called with a single source key.")
+
+        try:
+            sources = [self.storage.get_string_bytes(key) or b"" for key in keys]
+        except TypeError as e:
+            return error(str(e))
+
+        length = max(len(source) for source in sources)
+        if length == 0:
+            self.storage.delete(destination)
+            return integer(0)
+
+        # Operate on whole bitmaps as big integers instead of looping per byte.
+        # Shorter strings are zero-padded on the right to the longest length.
+        values = [int.from_bytes(bytes(source).ljust(length, b"\x00"), 'big') for source in sources]
+
+        if operation == "NOT":
+            result = values[0] ^ ((1 << (length * 8)) - 1)
+        else:
+            result = values[0]
+            for value in values[1:]:
+                if operation == "AND":
+                    result &= value
+                elif operation == "OR":
+                    result |= value
+                else:
+                    result ^= value
+
+        self.storage.set(destination, bytearray(result.to_bytes(length, 'big')))
+        return integer(length)
+
+    def bitfield(self, *args):
+        """Read, write and increment arbitrary width integer fields"""
+        return self._bitfield("bitfield", args, read_only=False)
+
+    def bitfield_ro(self, *args):
+        """Read-only variant of BITFIELD that only accepts GET"""
+        return self._bitfield("bitfield_ro", args, read_only=True)
+
+    def _bitfield(self, name, args, read_only):
+        if len(args) < 1:
+            return error(f"wrong number of arguments for '{name}' command")
+
+        key = args[0]
+        operations = []
+        overflow = "WRAP"
+        writes = False
+
+        # Parse every subcommand up front so a syntax error doesn't leave a partial write
+        i = 1
+        try:
+            while i < len(args):
+                subcommand = args[i].upper()
+                if subcommand == "GET" and i + 2 < len(args):
+                    signed, bits = self._parse_field_type(args[i + 1])
+                    offset = self._parse_field_offset(args[i + 2], bits)
+                    operations.append(("GET", signed, bits, offset, None, overflow))
+                    i += 3
+                elif subcommand in ("SET", "INCRBY") and i + 3 < len(args):
+                    if read_only:
+                        return error("BITFIELD_RO only supports the GET subcommand")
+                    signed, bits = self._parse_field_type(args[i + 1])
+                    offset = self._parse_field_offset(args[i + 2], bits)
+                    try:
+                        value = int(args[i + 3])
+                    except ValueError:
+                        return error("value is not an integer or out of range")
+                    operations.append((subcommand, signed, bits, offset, value, overflow))
+                    writes = True
+                    i += 4
+                elif subcommand == "OVERFLOW" and i + 1 < len(args):
+                    if read_only:
+                        return error("BITFIELD_RO only supports the GET subcommand")
+                    overflow = args[i + 1].upper()
+                    if overflow not in ("WRAP", "SAT", "FAIL"):
+                        return error("Invalid OVERFLOW type specified")
+                    i += 2
+                else:
+                    return error("syntax error")
+        except ValueError as e:
+            return error(str(e))
+
+        try:
+            if writes:
+                data = self.storage.get_or_create_bitmap(key)
+            else:
+                data = self.storage.get_string_bytes(key) or b""
+        except TypeError as e:
+            return error(str(e))
+
+        results = []
+        for subcommand, signed, bits, offset, value, overflow in operations:
+            current = self._read_bits(data, offset, bits)
+            if signed and current >= 1 << (bits - 1):
+                current -= 1 << bits
+
+            if subcommand == "GET":
+                results.append(integer(current))
+                continue
+
+            new_value = value if subcommand == "SET" else current + value
+            new_value = self._apply_overflow(new_value, signed, bits, overflow)
+            if new_value is None:
+                results.append(null_bulk_string())
+                continue
+
+            self._write_bits(data, offset, bits, new_value)
+            # SET replies with the old value, INCRBY with the new one
+            results.append(integer(current if subcommand == "SET" else new_value))
+
+        return array(results)
+
+    def _parse_bit_offset(self, offset_str):
+        """Parse a SETBIT/GETBIT offset, returning None when invalid"""
+        try:
+            offset = int(offset_str)
+        except ValueError:
+            return None
+        if offset < 0 or offset > MAX_BIT_OFFSET:
+            return None
+        return offset
+
+    def _parse_field_type(self, type_str):
+        """Parse a BITFIELD type like i16 or u8 into (signed, bits)"""
+        invalid = "Invalid bitfield type. Use something like i16 u8. Note that u64 is not supported but i64 is."
+        if len(type_str) < 2 or type_str[0] not in "iIuU":
+            raise ValueError(invalid)
+        try:
+            bits = int(type_str[1:])
+        except ValueError:
+            raise ValueError(invalid)
+
+        signed = type_str[0] in "iI"
+        if bits < 1 or (signed and bits > 64) or (not signed and bits > 63):
+            raise ValueError(invalid)
+        return signed, bits
+
+    def _parse_field_offset(self, offset_str, bits):
+        """Parse a BITFIELD offset; '#N' means the N-th field of the given width"""
+        try:
+            if offset_str.startswith("#"):
+                offset = int(offset_str[1:]) * bits
+            else:
+                offset = int(offset_str)
+        except ValueError:
+            raise ValueError("bit offset is not an integer or out of range")
+        if offset < 0 or offset + bits - 1 > MAX_BIT_OFFSET:
+            raise ValueError("bit offset is not an integer or out of range")
+        return offset
+
+    def _apply_overflow(self, value, signed, bits, overflow):
+        """Fit value into the field according to the overflow policy (None means FAIL)"""
+        if signed:
+            low, high = -(1 << (bits - 1)), (1 << (bits - 1)) - 1
+        else:
+            low, high = 0, (1 << bits) - 1
+
+        if low <= value <= high:
+            return value
+        if overflow == "FAIL":
+            return None
+        if overflow == "SAT":
+            return high if value > high else low
+
+        # WRAP: keep the low bits, then reinterpret as signed if needed
+        value &= (1 << bits) - 1
+        if signed and value > high:
+            value -= 1 << bits
+        return value
+
+    def _resolve_range(self, start, end, length):
+        """Convert possibly negative inclusive range bounds into clamped indexes"""
+        if start < 0:
+            start = max(0, length + start)
+        if end < 0:
+            end = length + end
+        end = min(end, length - 1)
+        return start, end
+
+    def _read_bits(self, data, offset, bits):
+        """Read `bits` bits starting at bit offset as an unsigned integer (missing bytes read as 0)"""
+        first = offset // 8
+        last = (offset + bits - 1) // 8
+        chunk = bytes(data[first:last + 1]).ljust(last - first + 1, b"\x00")
+        shift = (last + 1) * 8 - (offset + bits)
+        return (int.from_bytes(chunk, 'big') >> shift) & ((1 << bits) - 1)
+
+    def _write_bits(self, data, offset, bits, value):
+        """Write the low `bits` bits of value at bit offset, growing the bitmap if needed"""
+        first = offset // 8
+        last = (offset + bits - 1) // 8
+        if last >= len(data):
+            data.extend(bytes(last + 1 - len(data)))
+
+        width = last - first + 1
+        shift = width * 8 - (offset - first * 8) - bits
+        mask = ((1 << bits) - 1) << shift
+        current = int.from_bytes(data[first:last + 1], 'big')
+        current = (current & ~mask) | ((value & ((1 << bits) - 1)) << shift)
+        data[first:last + 1] = current.to_bytes(width, 'big')
+
+    def _find_bit(self, data, bit, start_bit, end_bit):
+        """Return the first position of `bit` in the inclusive bit range, or -1"""
+        # Bytes that can't contain the target bit are skipped with a C-level strip
+        skip = b"\x00" if bit else b"\xff"
+        position = start_bit
+
+        while position <= end_bit:
+            if position % 8 == 0 and position + 7 <= end_bit:
+                byte_index = position // 8
+                chunk = bytes(data[byte_index:(end_bit + 1) // 8])
+                skipped = len(chunk) - len(chunk.lstrip(skip))
+                position += skipped * 8
+                if skipped == len(chunk):
+                    continue
+
+                byte = data[position // 8]
+                for i in range(8):
+                    if (byte >> (7 - i)) & 1 == bit:
+                        return position + i
+
+            byte_index = position // 8
+            current = (data[byte_index] >> (7 - position % 8)) & 1 if byte_index < len(data) else 0
+            if current == bit:
+                return position
+            position += 1
+
+        return -1
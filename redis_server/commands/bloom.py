@@ -0,0 +1,142 @@
+from .base import BaseCommandHandler
+from ..datatypes import BloomFilter
+from ..response import *
+
+class BloomCommands(BaseCommandHandler):
+    """Bloom filter commands: BF.RESERVE, BF.ADD, BF.MADD, BF.EXISTS, BF.MEXISTS, BF.CARD, BF.INFO"""
+
+    def bf_reserve(self, *args):
+        """Create an empty Bloom filter with the given error rate and capacity"""
+        if len(args) < 3:
+            return error("wrong number of arguments for 'bf.reserve' command")
+
+        key = args[0]
+        try:
+            error_rate = float(args[1])
+            capacity = int(args[2])
+        except ValueError:
+            return error("bad error rate or capacity")
+
+        expansion = 2
+        scaling = True
+        i = 3
+        while i < len(args):
+            option = args[i].upper()
+            if option == "NONSCALING":
+                scaling = False
+                i += 1
+            elif option == "EXPANSION" and i + 1 < len(args):
+                try:
+                    expansion = int(args[i + 1])
+                except ValueError:
+                    return error("bad expansion")
+                if expansion < 1:
+                    return error("expansion should be greater or equal to 1")
+                i += 2
+            else:
+                return error("syntax error")
+
+        if self.storage._is_key_valid(key):
+            return error("item exists")
+
+        try:
+            self.storage.set(key, BloomFilter(error_rate, capacity, expansion, scaling))
+            return ok()
+        except ValueError as e:
+            return error(str(e))
+
+    def bf_add(self, *args):
+        """Add an item, creating a default filter if needed"""
+        if len(args) != 2:
+            return error("wrong number of arguments for 'bf.add' command")
+
+        key, item = args
+        try:
+            bloom = self.storage.get_or_create_bloom(key)
+            return integer(1 if bloom.add(item) else 0)
+        except (TypeError, ValueError) as e:
+            return error(str(e))
+
+    def bf_madd(self, *args):
+        """Add multiple items, creating a default filter if needed"""
+        if len(args) < 2:
+            return error("wrong number of arguments for 'bf.madd' command")
+
+        key = args[0]
+        try:
+            bloom = self.storage.get_or_create_bloom(key)
+        except TypeError as e:
+            return error(str(e))
+
+        results = []
+        for item in args[1:]:
+            try:
+                results.append(integer(1 if bloom.add(item) else 0))
+            except ValueError as e:
+                results.append(error(str(e)))
+        return array(results)
+
+    def bf_exists(self, *args):
+        """Check if an item may exist in the filter"""
+        if len(args) != 2:
+            return error("wrong number of arguments for 'bf.exists' command")
+
+        key, item = args
+        if not self.storage._is_key_valid(key):
+            return integer(0)
+
+        try:
+            bloom = self.storage.get_or_create_bloom(key)
+            return integer(1 if bloom.exists(item) else 0)
+        except TypeError as e:
+            return error(str(e))
+
+    def bf_mexists(self, *args):
+        """Check if multiple items may exist in the filter"""
+        if len(args) < 2:
+            return error("wrong number of arguments for 'bf.mexists' command")
+
+        key = args[0]
+        items = args[1:]
+        if not self.storage._is_key_valid(key):
+            return array([integer(0) for _ in items])
+
+        try:
+            bloom = self.storage.get_or_create_bloom(key)
+            return array([integer(1 if bloom.exists(item) else 0) for item in items])
+        except TypeError as e:
+            return error(str(e))
+
+    def bf_card(self, *args):
+        """Number of items added to the filter"""
+        if len(args) != 1:
+            return error("wrong number of arguments for 'bf.card' command")
+
+        key = args[0]
+        if not self.storage._is_key_valid(key):
+            return integer(0)
+
+        try:
+            return integer(len(self.storage.get_or_create_bloom(key)))
+        except TypeError as e:
+            return error(str(e))
+
+    def bf_info(self, *args):
+        """Return filter parameters and statistics"""
+        if len(args) != 1:
+            return error("wrong number of arguments for 'bf.info' command")
+
+        key = args[0]
+        if not self.storage._is_key_valid(key):
+            return error("not found")
+
+        try:
+            info = self.storage.get_or_create_bloom(key).get_info()
+        except TypeError as e:
+            return error(str(e))
+
+        results = []
+        for name, value in info.items():
+            results.append(bulk_string(name))
+            results.append(integer(value) if value is not None else null_bulk_string())
+        return array(results)
@@ -0,0 +1,145 @@
+from .base import BaseCommandHandler
+from ..datatypes import CountMinSketch
+from ..response import *
+
+class CountMinCommands(BaseCommandHandler):
+    """Count-Min Sketch commands: CMS.INITBYDIM, CMS.INITBYPROB, CMS.INCRBY, CMS.QUERY, CMS.MERGE, CMS.INFO"""
+
+    def cms_initbydim(self, *args):
+        """Create a sketch with the given width and depth"""
+        if len(args) != 3:
+            return error("wrong number of arguments for 'cms.initbydim' command")
+
+        key = args[0]
+        try:
+            width = int(args[1])
+            depth = int(args[2])
+        except ValueError:
+            return error("CMS: invalid width/depth")
+
+        if self.storage._is_key_valid(key):
+            return error("CMS: key already exists")
+
+        try:
+            self.storage.set(key, CountMinSketch(width, depth))
+            return ok()
+        except ValueError as e:
+            return error(f"CMS: {e}")
+
+    def cms_initbyprob(self, *args):
+        """Create a sketch sized for an error rate and failure probability"""
+        if len(args) != 3:
+            return error("wrong number of arguments for 'cms.initbyprob' command")
+
+        key = args[0]
+        try:
+            error_rate = float(args[1])
+            probability = float(args[2])
+        except ValueError:
+            return error("CMS: invalid prob value")
+
+        if self.storage._is_key_valid(key):
+            return error("CMS: key already exists")
+
+        try:
+            self.storage.set(key, CountMinSketch.from_error(error_rate, probability))
+            return ok()
+        except ValueError as e:
+            return error(f"CMS: {e}")
+
+    def cms_incrby(self, *args):
+        """Increase the count of one or more items"""
+        if len(args) < 3 or len(args) % 2 == 0:
+            return error("wrong number of arguments for 'cms.incrby' command")
+
+        key = args[0]
+        pairs = []
+        for i in range(1, len(args), 2):
+            try:
+                increment = int(args[i + 1])
+            except ValueError:
+                return error("CMS: Cannot parse number")
+            if increment < 0:
+                return error("CMS: Cannot parse number")
+            pairs.append((args[i], increment))
+
+        try:
+            sketch = self.storage.get_typed(key, "cms")
+        except TypeError as e:
+            return error(str(e))
+        if sketch is None:
+            return error("CMS: key does not exist")
+
+        return array([integer(sketch.incrby(item, increment)) for item, increment in pairs])
+
+    def cms_query(self, *args):
+        """Return the estimated count of one or more items"""
+        if len(args) < 2:
+            return error("wrong number of arguments for 'cms.query' command")
+
+        try:
+            sketch = self.storage.get_typed(args[0], "cms")
+        except TypeError as e:
+            return error(str(e))
+        if sketch is None:
+            return error("CMS: key does not exist")
+
+        return array([integer(sketch.query(item)) for item in args[1:]])
+
+    def cms_merge(self, *args):
+        """Merge sketches into an existing destination sketch: dest numkeys src... [WEIGHTS w...]"""
+        if len(args) < 3:
+            return error("wrong number of arguments for 'cms.merge' command")
+
+        destination = args[0]
+        try:
+            num_keys = int(args[1])
+        except ValueError:
+            return error("CMS: invalid numkeys")
+        if num_keys < 1 or len(args) < 2 + num_keys:
+            return error("CMS: invalid numkeys")
+
+        source_keys = args[2:2 + num_keys]
+        rest = args[2 + num_keys:]
+        weights = [1] * num_keys
+        if rest:
+            if rest[0].upper() != "WEIGHTS" or len(rest) != num_keys + 1:
+                return error("syntax error")
+            try:
+                weights = [int(weight) for weight in rest[1:]]
+            except ValueError:
+                return error("CMS: invalid weight value")
+            if any(weight < 0 for weight in weights):
+                return error("CMS: invalid weight value")
+
+        try:
+            sketch = self.storage.get_typed(destination, "cms")
+            sources = [self.storage.get_typed(key, "cms") for key in source_keys]
+        except TypeError as e:
+            return error(str(e))
+        if sketch is None or any(source is None for source in sources):
+            return error("CMS: key does not exist")
+
+        try:
+            sketch.merge(sources, weights)
+            return ok()
+        except ValueError as e:
+            return error(f"CMS: {e}")
+
+    def cms_info(self, *args):
+        """Return width, depth and total count"""
+        if len(args) != 1:
+            return error("wrong number of arguments for 'cms.info' command")
+
+        try:
+            sketch = self.storage.get_typed(args[0], "cms")
+        except TypeError as e:
+            return error(str(e))
+        if sketch is None:
+            return error("CMS: key does not exist")
+
+        results = []
+        for name, value in sketch.get_info().items():
+            results.append(bulk_string(name))
+            results.append(integer(value))
+        return array(results)
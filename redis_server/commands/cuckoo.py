@@ -0,0 +1,144 @@
+from .base import BaseCommandHandler
+from ..datatypes import CuckooFilter
+from ..response import *
+
+class CuckooCommands(BaseCommandHandler):
+    """Cuckoo filter commands: CF.RESERVE, CF.ADD, CF.ADDNX, CF.EXISTS, CF.MEXISTS, CF.DEL, CF.COUNT, CF.INFO"""
+
+    def cf_reserve(self, *args):
+        """Create an empty Cuckoo filter with the given capacity"""
+        if len(args) < 2:
+            return error("wrong number of arguments for 'cf.reserve' command")
+
+        key = args[0]
+        try:
+            capacity = int(args[1])
+        except ValueError:
+            return error("Bad capacity")
+
+        options = {"BUCKETSIZE": 2, "MAXITERATIONS": 20, "EXPANSION": 1}
+        i = 2
+        while i < len(args):
+            option = args[i].upper()
+            if option not in options or i + 1 >= len(args):
+                return error("syntax error")
+            try:
+                options[option] = int(args[i + 1])
+            except ValueError:
+                return error(f"Bad {option.lower()}")
+            i += 2
+
+        if self.storage._is_key_valid(key):
+            return error("item exists")
+
+        try:
+            self.storage.set(key, CuckooFilter(capacity, options["BUCKETSIZE"],
+                                               options["MAXITERATIONS"], options["EXPANSION"]))
+            return ok()
+        except ValueError as e:
+            return error(str(e))
+
+    def cf_add(self, *args):
+        """Add an item (duplicates allowed), creating a default filter if needed"""
+        if len(args) != 2:
+            return error("wrong number of arguments for 'cf.add' command")
+
+        key, item = args
+        try:
+            cuckoo = self.storage.get_or_create_cuckoo(key)
+            cuckoo.add(item)
+            return integer(1)
+        except (TypeError, ValueError) as e:
+            return error(str(e))
+
+    def cf_addnx(self, *args):
+        """Add an item only if it doesn't seem to exist yet"""
+        if len(args) != 2:
+            return error("wrong number of arguments for 'cf.addnx' command")
+
+        key, item = args
+        try:
+            cuckoo = self.storage.get_or_create_cuckoo(key)
+            return integer(1 if cuckoo.add_nx(item) else 0)
+        except (TypeError, ValueError) as e:
+            return error(str(e))
+
+    def cf_exists(self, *args):
+        """Check if an item may exist in the filter"""
+        if len(args) != 2:
+            return error("wrong number of arguments for 'cf.exists' command")
+
+        key, item = args
+        if not self.storage._is_key_valid(key):
+            return integer(0)
+
+        try:
+            cuckoo = self.storage.get_or_create_cuckoo(key)
+            return integer(1 if cuckoo.exists(item) else 0)
+        except TypeError as e:
+            return error(str(e))
+
+    def cf_mexists(self, *args):
+        """Check if multiple items may exist in the filter"""
+        if len(args) < 2:
+            return error("wrong number of arguments for 'cf.mexists' command")
+
+        key = args[0]
+        items = args[1:]
+        if not self.storage._is_key_valid(key):
+            return array([integer(0) for _ in items])
+
+        try:
+            cuckoo = self.storage.get_or_create_cuckoo(key)
+            return array([integer(1 if cuckoo.exists(item) else 0) for item in items])
+        except TypeError as e:
+            return error(str(e))
+
+    def cf_del(self, *args):
+        """Delete one occurrence of an item"""
+        if len(args) != 2:
+            return error("wrong number of arguments for 'cf.del' command")
+
+        key, item = args
+        if not self.storage._is_key_valid(key):
+            return error("Not found")
+
+        try:
+            cuckoo = self.storage.get_or_create_cuckoo(key)
+            return integer(1 if cuckoo.delete(item) else 0)
+        except TypeError as e:
+            return error(str(e))
+
+    def cf_count(self, *args):
+        """Approximate number of times an item was added"""
+        if len(args) != 2:
+            return error("wrong number of arguments for 'cf.count' command")
+
+        key, item = args
+        if not self.storage._is_key_valid(key):
+            return integer(0)
+
+        try:
+            return integer(self.storage.get_or_create_cuckoo(key).count(item))
+        except TypeError as e:
+            return error(str(e))
+
+    def cf_info(self, *args):
+        """Return filter parameters and statistics"""
+        if len(args) != 1:
+            return error("wrong number of arguments for 'cf.info' command")
+
+        key = args[0]
+        if not self.storage._is_key_valid(key):
+            return error("not found")
+
+        try:
+            info = self.storage.get_or_create_cuckoo(key).get_info()
+        except TypeError as e:
+            return error(str(e))
+
+        results = []
+        for name, value in info.items():
+            results.append(bulk_string(name))
+            results.append(integer(value))
+        return array(results)
@@ -3,19 +3,19 @@ from .base import BaseCommandHandler
 from ..response import *
 
 class ExpirationCommands(BaseCommandHandler):
-    """Expiration-related commands: EXPIRE, EXPIREAT, TTL, PTTL, PERSIST, TYPE"""
+    """Expiration-related commands: EXPIRE, EXPIREAT, PEXPIREAT, TTL, PTTL, PERSIST, TYPE"""
     
     def expire(self, *args):
         if len(args) != 2:
             return error("Wrong number of arguments for 'expire' command")
         
+        self.propagated = []  # logged as the PEXPIREAT or DEL below, if anything changed
         key = args[0]
         try:
             seconds = int(args[1])
             if seconds <= 0:
                 return integer(0)
-            success = self.storage.expire(key, seconds)
-            return integer(1 if success else 0)
+            return self._expire_at(key, time.time() + seconds)
         except ValueError:
             return error("invalid expire time")
 
@@ -23,16 +23,41 @@ class ExpirationCommands(BaseCommandHandler):
         if len(args) != 2:
             return error("wrong number of arguments for 'expireat' command")
         
+        self.propagated = []
         key = args[0]
         try:
             timestamp = int(args[1])
             if timestamp <= time.time():
                 return integer(0)
-            success = self.storage.expire_at(key, timestamp)
-            return integer(1 if success else 0)
+            return self._expire_at(key, timestamp)
         except ValueError:
             return error("invalid timestamp")
 
+    def pexpireat(self, *args):
+        if len(args) != 2:
+            return error("wrong number of arguments for 'pexpireat' command")
+        
+        self.propagated = []
+        key = args[0]
+        try:
+            timestamp = int(args[1]) / 1000
+        except ValueError:
+            return error("invalid timestamp")
+        if timestamp <= time.time():
+            # A deadline already passed deletes the key, as it would have expired
+            deleted = self.storage.delete(key)
+            if deleted:
+                self._propagate("DEL", key)
+            return integer(deleted)
+        return self._expire_at(key, timestamp)
+
+    def _expire_at(self, key, timestamp):
+        """Set an absolute expiry; it is logged as PEXPIREAT whichever command set it"""
+        success = self.storage.expire_at(key, timestamp)
+        if success:
+            self._propagate("PEXPIREAT", key, str(int(timestamp * 1000)))
+        return integer(1 if success else 0)
+
     def ttl(self, *args):
         if len(args) != 1:
             return error("wrong number of arguments for 'ttl' command")
@@ -0,0 +1,275 @@
+import heapq
+from itertools import islice
+from .base import BaseCommandHandler
+from ..datatypes import SortedSet
+from ..geo import UNITS, valid_position, encode, decode, geohash_string, distance, search
+from ..response import *
+
+class GeoCommands(BaseCommandHandler):
+    """Geospatial commands: GEOADD, GEOPOS, GEODIST, GEOHASH, GEOSEARCH, plus ZREM, ZSCORE, ZCARD on the geo set"""
+
+    def geoadd(self, *args):
+        """Add positions: key [NX|XX] [CH] longitude latitude member ..."""
+        if len(args) < 4:
+            return error("wrong number of arguments for 'geoadd' command")
+
+        key = args[0]
+        nx = xx = changed_only = False
+        i = 1
+        while i < len(args) and args[i].upper() in ("NX", "XX", "CH"):
+            option = args[i].upper()
+            nx = nx or option == "NX"
+            xx = xx or option == "XX"
+            changed_only = changed_only or option == "CH"
+            i += 1
+        if nx and xx:
+            return error("XX and NX options at the same time are not compatible")
+        triples = args[i:]
+        if not triples or len(triples) % 3:
+            return error("syntax error")
+
+        positions = []
+        for j in range(0, len(triples), 3):
+            try:
+                longitude, latitude = float(triples[j]), float(triples[j + 1])
+            except ValueError:
+                return error("value is not a valid float")
+            if not valid_position(longitude, latitude):
+                return error(f"invalid longitude,latitude pair {longitude:.6f},{latitude:.6f}")
+            positions.append((triples[j + 2], encode(longitude, latitude)))
+
+        try:
+            geo_set = self.storage.get_typed(key, "zset")
+            if geo_set is None:
+                if xx:
+                    return integer(0)
+                geo_set = SortedSet()
+                self.storage.set(key, geo_set)
+
+            added = changed = 0
+            for member, score in positions:
+                old_score = geo_set.score(member)
+                if (nx and old_score is not None) or (xx and old_score is None):
+                    continue
+                if geo_set.add(member, score):
+                    added += 1
+                elif old_score != score:
+                    changed += 1
+
+            if not geo_set:
+                self.storage.delete(key)  # NX/XX skipped every member of a new set
+            return integer(added + changed if changed_only else added)
+        except TypeError as e:
+            return error(str(e))
+
+    def geopos(self, *args):
+        """Longitude and latitude of members"""
+        if len(args) < 1:
+            return error("wrong number of arguments for 'geopos' command")
+
+        try:
+            geo_set = self.storage.get_typed(args[0], "zset")
+        except TypeError as e:
+            return error(str(e))
+
+        results = []
+        for member in args[1:]:
+            score = geo_set.score(member) if geo_set is not None else None
+            if score is None:
+                results.append(null_array())
+            else:
+                results.append(array([bulk_string(f"{coordinate:.17g}") for coordinate in decode(score)]))
+        return array(results)
+
+    def geodist(self, *args):
+        """Distance between two members: key member1 member2 [m|km|mi|ft]"""
+        if len(args) not in (3, 4):
+            return error("wrong number of arguments for 'geodist' command")
+
+        unit = self._unit(args[3] if len(args) == 4 else "m")
+        if isinstance(unit, bytes):
+            return unit
+        try:
+            geo_set = self.storage.get_typed(args[0], "zset")
+        except TypeError as e:
+            return error(str(e))
+        if geo_set is None:
+            return null_bulk_string()
+
+        first, second = geo_set.score(args[1]), geo_set.score(args[2])
+        if first is None or second is None:
+            return null_bulk_string()
+        meters = distance(*decode(first), *decode(second))
+        return bulk_string(f"{meters / unit:.4f}")
+
+    def geohash(self, *args):
+        """Standard geohash strings of members"""
+        if len(args) < 1:
+            return error("wrong number of arguments for 'geohash' command")
+
+        try:
+            geo_set = self.storage.get_typed(args[0], "zset")
+        except TypeError as e:
+            return error(str(e))
+
+        results = []
+        for member in args[1:]:
+            score = geo_set.score(member) if geo_set is not None else None
+            results.append(null_bulk_string() if score is None else bulk_string(geohash_string(score)))
+        return array(results)
+
+    def geosearch(self, *args):
+        """
+        Members in an area: key FROMMEMBER member | FROMLONLAT lon lat
+        BYRADIUS radius unit | BYBOX width height unit [ASC|DESC] [COUNT n [ANY]]
+        [WITHCOORD] [WITHDIST] [WITHHASH]
+        """
+        if len(args) < 5:
+            return error("wrong number of arguments for 'geosearch' command")
+
+        key = args[0]
+        member = center = None
+        radius = width = height = None
+        unit = 1.0
+        order = None
+        count = None
+        any_match = with_coord = with_dist = with_hash = False
+        i = 1
+        try:
+            while i < len(args):
+                option = args[i].upper()
+                if option == "FROMMEMBER" and i + 1 < len(args):
+                    member = args[i + 1]
+                    i += 2
+                elif option == "FROMLONLAT" and i + 2 < len(args):
+                    center = (float(args[i + 1]), float(args[i + 2]))
+                    if not valid_position(*center):
+                        return error(f"invalid longitude,latitude pair {center[0]:.6f},{center[1]:.6f}")
+                    i += 3
+                elif option == "BYRADIUS" and i + 2 < len(args):
+                    radius = float(args[i + 1])
+                    unit = self._unit(args[i + 2])
+                    i += 3
+                elif option == "BYBOX" and i + 3 < len(args):
+                    width, height = float(args[i + 1]), float(args[i + 2])
+                    unit = self._unit(args[i + 3])
+                    i += 4
+                elif option in ("ASC", "DESC"):
+                    order = option
+                    i += 1
+                elif option == "COUNT" and i + 1 < len(args):
+                    count = int(args[i + 1])
+                    if count <= 0:
+                        return error("COUNT must be > 0")
+                    i += 2
+                    if i < len(args) and args[i].upper() == "ANY":
+                        any_match = True
+                        i += 1
+                elif option in ("WITHCOORD", "WITHDIST", "WITHHASH"):
+                    with_coord = with_coord or option == "WITHCOORD"
+                    with_dist = with_dist or option == "WITHDIST"
+                    with_hash = with_hash or option == "WITHHASH"
+                    i += 1
+                else:
+                    return error("syntax error")
+        except ValueError:
+            return error("value is not a valid float")
+        if isinstance(unit, bytes):
+            return unit
+        if (member is None) == (center is None):
+            return error("exactly one of FROMMEMBER or FROMLONLAT can be specified for 'geosearch' command")
+        if (radius is None) == (width is None):
+            return error("exactly one of BYRADIUS and BYBOX can be specified for 'geosearch' command")
+        if any_match and count is None:
+            return error("the ANY argument requires COUNT argument")
+
+        try:
+            geo_set = self.storage.get_typed(key, "zset")
+        except TypeError as e:
+            return error(str(e))
+        if geo_set is None:
+            return array([])
+        if member is not None:
+            score = geo_set.score(member)
+            if score is None:
+                return error("could not decode requested zset member")
+            center = decode(score)
+
+        matches = search(geo_set, center[0], center[1],
+                         radius=radius * unit if radius is not None else None,
+                         width=width * unit if width is not None else None,
+                         height=height * unit if height is not None else None)
+        # Like Redis, COUNT without ANY returns the nearest members
+        if count is not None and order is None and not any_match:
+            order = "ASC"
+        if any_match or order is None:
+            matches = islice(matches, count)  # stop scanning once count members are found
+        if order is not None and count is not None:
+            select = heapq.nsmallest if order == "ASC" else heapq.nlargest
+            matches = select(count, matches, key=lambda match: match[1])
+        elif order is not None:
+            matches = sorted(matches, key=lambda match: match[1], reverse=order == "DESC")
+
+        results = []
+        for name, meters, score in matches:
+            if not (with_dist or with_hash or with_coord):
+                results.append(bulk_string(name))
+                continue
+            item = [bulk_string(name)]
+            if with_dist:
+                item.append(bulk_string(f"{meters / unit:.4f}"))
+            if with_hash:
+                item.append(integer(int(score)))
+            if with_coord:
+                item.append(array([bulk_string(f"{coordinate:.17g}") for coordinate in decode(score)]))
+            results.append(array(item))
+        return array(results)
+
+    def zrem(self, *args):
+        """Remove members from a sorted set"""
+        if len(args) < 2:
+            return error("wrong number of arguments for 'zrem' command")
+
+        key = args[0]
+        try:
+            sorted_set = self.storage.get_typed(key, "zset")
+            if sorted_set is None:
+                return integer(0)
+            removed = sum(1 for member in args[1:] if sorted_set.remove(member))
+            if not sorted_set:
+                self.storage.delete(key)
+            return integer(removed)
+        except TypeError as e:
+            return error(str(e))
+
+    def zscore(self, *args):
+        """Score of a member (its geohash for geo sets)"""
+        if len(args) != 2:
+            return error("wrong number of arguments for 'zscore' command")
+
+        try:
+            sorted_set = self.storage.get_typed(args[0], "zset")
+        except TypeError as e:
+            return error(str(e))
+        score = sorted_set.score(args[1]) if sorted_set is not None else None
+        if score is None:
+            return null_bulk_string()
+        return bulk_string(str(int(score)) if score.is_integer() else repr(score))
+
+    def zcard(self, *args):
+        """Number of members in a sorted set"""
+        if len(args) != 1:
+            return error("wrong number of arguments for 'zcard' command")
+
+        try:
+            sorted_set = self.storage.get_typed(args[0], "zset")
+        except TypeError as e:
+            return error(str(e))
+        return integer(len(sorted_set) if sorted_set is not None else 0)
+
+    def _unit(self, name):
+        """Meters per unit, or an error reply for unknown units"""
+        unit = UNITS.get(name.lower())
+        if unit is None:
+            return error("unsupported unit provided. please use M, KM, FT, MI")
+        return unit
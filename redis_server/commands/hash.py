@@ -25,6 +25,8 @@ class HashCommands(BaseCommandHandler):
                     new_fields += 1
                 hash_obj[field] = value
             
+            # Keep secondary indexes in step with the in-place update
+            self.storage.notify_key_changed(key)
             return integer(new_fields)
         except TypeError as e:
             return error(str(e))
@@ -63,6 +65,7 @@ class HashCommands(BaseCommandHandler):
                 value = field_value_pairs[i + 1]
                 hash_obj[field] = value
             
+            self.storage.notify_key_changed(key)
             return ok()
         except TypeError as e:
             return error(str(e))
@@ -135,6 +138,8 @@ class HashCommands(BaseCommandHandler):
             # Remove key if hash becomes empty
             if not hash_obj:
                 self.storage.delete(key)
+            elif deleted_count:
+                self.storage.notify_key_changed(key)
             
             return integer(deleted_count)
         except TypeError as e:
@@ -0,0 +1,67 @@
+from .base import BaseCommandHandler
+from ..datatypes import HyperLogLog
+from ..response import *
+
+class HyperLogLogCommands(BaseCommandHandler):
+    """Redis HyperLogLog commands: PFADD, PFCOUNT, PFMERGE"""
+
+    def pfadd(self, *args):
+        """Add elements to a HyperLogLog"""
+        if len(args) < 1:
+            return error("wrong number of arguments for 'pfadd' command")
+
+        key = args[0]
+        elements = args[1:]
+
+        try:
+            created = not self.storage._is_key_valid(key)
+            hll = self.storage.get_or_create_hyperloglog(key)
+            changed = hll.add(*elements)
+            return integer(1 if created or changed else 0)
+        except TypeError as e:
+            return error(str(e))
+
+    def pfcount(self, *args):
+        """Estimate the cardinality of the union of one or more HyperLogLogs"""
+        if len(args) < 1:
+            return error("wrong number of arguments for 'pfcount' command")
+
+        try:
+            if len(args) == 1:
+                if not self.storage._is_key_valid(args[0]):
+                    return integer(0)
+                return integer(self.storage.get_or_create_hyperloglog(args[0]).count())
+
+            # Multiple keys: estimate over the register-wise max without storing it
+            lanes = None
+            for key in args:
+                if not self.storage._is_key_valid(key):
+                    continue
+                key_lanes = self.storage.get_or_create_hyperloglog(key).to_lanes()
+                lanes = key_lanes if lanes is None else HyperLogLog.max_lanes(lanes, key_lanes)
+
+            if lanes is None:
+                return integer(0)
+            return integer(HyperLogLog.estimate_lanes(lanes))
+        except TypeError as e:
+            return error(str(e))
+
+    def pfmerge(self, *args):
+        """Merge HyperLogLogs into the destination key"""
+        if len(args) < 1:
+            return error("wrong number of arguments for 'pfmerge' command")
+
+        destination = args[0]
+        source_keys = args[1:]
+
+        try:
+            sources = []
+            for key in source_keys:
+                if self.storage._is_key_valid(key):
+                    sources.append(self.storage.get_or_create_hyperloglog(key))
+
+            hll = self.storage.get_or_create_hyperloglog(destination)
+            hll.merge(*sources)
+            return ok()
+        except TypeError as e:
+            return error(str(e))
@@ -16,6 +16,8 @@ class InfoCommands(BaseCommandHandler):
     def info(self, *args):
         memory_usage = self.storage.get_memory_usage()
         key_count = len(self.storage.keys())
+        compression_stats = self.storage.get_compression_stats()
+        tiering_stats = self.storage.get_tiering_stats()
         
         info = {
             "server": {
@@ -30,25 +32,75 @@ class InfoCommands(BaseCommandHandler):
             },
             "memory": {
                 "used_memory": memory_usage,
-                "used_memory_human": self._format_bytes(memory_usage)
+                "used_memory_human": self._format_bytes(memory_usage),
+                "compressed_strings": compression_stats['compressed_values'],
+                "compressed_strings_raw_bytes": compression_stats['raw_bytes'],
+                "compressed_strings_bytes": compression_stats['compressed_bytes'],
+                "compression_ratio": f"{compression_stats['compression_ratio']:.2f}",
+                "compression_cache_bytes": compression_stats['cache_bytes'],
+                "compression_cache_hits": compression_stats['cache_hits'],
+                "compression_cache_misses": compression_stats['cache_misses'],
+                # used_memory is what stays in RAM; spilled values are on disk in the value log
+                "tiered_spilled_values": tiering_stats['spilled_values'],
+                "tiered_disk_bytes": tiering_stats['disk_live_bytes'],
+                "tiered_log_bytes": tiering_stats['disk_bytes'],
+                "tiered_log_segments": tiering_stats['segments'],
+                "tiered_spills": tiering_stats['spills'],
+                "tiered_fetches": tiering_stats['fetches'],
+                "tiered_promotions": tiering_stats['promotions'],
+                "tiered_compactions": tiering_stats['compactions'],
+                "tiered_spills_per_sec": f"{tiering_stats['spills_per_sec']:.2f}",
+                "tiered_fetches_per_sec": f"{tiering_stats['fetches_per_sec']:.2f}"
             },
             "keyspace": {
                 "db0": f"keys={key_count},expires=0,avg_ttl=0"
             }
         }
+        mapped_stats = self.storage.get_mapped_stats()
+        if mapped_stats:
+            # Keys served from a mapped snapshot, and what changed since it was attached
+            info["memory"].update(mapped_stats)
         
         # Add persistence information if available
         if self.persistence_manager:
             persistence_stats = self.persistence_manager.get_stats()
             info["persistence"] = {
+                "loading": int(persistence_stats.get('loading', False)),
                 "aof_enabled": int(persistence_stats.get('aof_enabled', False)),
                 "rdb_enabled": int(persistence_stats.get('rdb_enabled', False)),
                 "rdb_changes_since_last_save": persistence_stats.get('changes_since_save', 0),
                 "rdb_last_save_time": persistence_stats.get('last_rdb_save_time', 0),
+                "rdb_bgsave_in_progress": int(persistence_stats.get('rdb_bgsave_in_progress', False)),
+                "rdb_last_bgsave_status": persistence_stats.get('rdb_last_bgsave_status', 'ok'),
+                "rdb_last_bgsave_time_sec": persistence_stats.get('rdb_last_bgsave_time_sec', -1),
+                "rdb_incremental": int(persistence_stats.get('rdb_incremental', False)),
+                "rdb_last_save_type": persistence_stats.get('rdb_last_save_type', 'full'),
+                "rdb_last_save_keys": persistence_stats.get('rdb_last_save_keys', 0),
+                "rdb_delta_count": persistence_stats.get('rdb_delta_count', 0),
+                "rdb_delta_bytes": persistence_stats.get('rdb_delta_bytes', 0),
                 "aof_last_sync_time": persistence_stats.get('last_aof_sync_time', 0),
-                "aof_filename": persistence_stats.get('aof_filename', ''),
+                "aof_delayed_fsync": persistence_stats.get('aof_delayed_fsync', 0),
+                "aof_last_fsync_duration_ms": persistence_stats.get('aof_last_fsync_duration_ms', 0),
+                "aof_fsync_lag_sec": persistence_stats.get('aof_fsync_lag_sec', 0),
+                "aof_rewrite_in_progress": int(persistence_stats.get('aof_rewrite_in_progress', False)),
+                "aof_rewrite_scheduled": int(persistence_stats.get('aof_rewrite_scheduled', False)),
+                "aof_last_bgrewrite_status": persistence_stats.get('aof_last_bgrewrite_status', 'ok'),
+                "aof_last_write_status": persistence_stats.get('aof_last_write_status', 'ok'),
+                "aof_current_size": persistence_stats.get('aof_current_size', 0),
+                "aof_base_size": persistence_stats.get('aof_base_size', 0),
+                "aof_manifest": persistence_stats.get('aof_manifest', ''),
+                "aof_incr_filename": persistence_stats.get('aof_incr_filename', ''),
                 "rdb_filename": persistence_stats.get('rdb_filename', '')
             }
+            if persistence_stats.get('loading'):
+                # Lets orchestrators tell a server still loading from one that is down
+                info["persistence"].update({
+                    "loading_start_time": persistence_stats.get('loading_start_time', 0),
+                    "loading_total_bytes": persistence_stats.get('loading_total_bytes', 0),
+                    "loading_loaded_bytes": persistence_stats.get('loading_loaded_bytes', 0),
+                    "loading_loaded_perc": persistence_stats.get('loading_loaded_perc', 0),
+                    "loading_eta_seconds": persistence_stats.get('loading_eta_seconds', 0),
+                })
         
         # Add type statistics
         type_stats = self.storage.get_type_stats()
@@ -56,7 +108,17 @@ class InfoCommands(BaseCommandHandler):
             "strings": type_stats['string'],
             "lists": type_stats['list'],
             "sets": type_stats['set'],
-            "hashes": type_stats['hash']
+            "hashes": type_stats['hash'],
+            "hyperloglogs": type_stats['hyperloglog'],
+            "blooms": type_stats['bloom'],
+            "cuckoos": type_stats['cuckoo'],
+            "cms": type_stats['cms'],
+            "topks": type_stats['topk'],
+            "streams": type_stats['stream'],
+            "timeseries": type_stats['timeseries'],
+            "vectorsets": type_stats['vectorset'],
+            "jsons": type_stats['json'],
+            "zsets": type_stats['zset']
         }
         
         sections = []
@@ -0,0 +1,227 @@
+import json
+from .base import BaseCommandHandler
+from ..datatypes import JSONDocument
+from ..datatypes.json_document import PathError, dumps
+from ..response import *
+
+class JSONCommands(BaseCommandHandler):
+    """JSON document commands: JSON.SET, JSON.GET, JSON.DEL, JSON.NUMINCRBY, JSON.ARRAPPEND, JSON.OBJLEN, JSON.ARRLEN, JSON.TYPE"""
+
+    def json_set(self, *args):
+        """Set the value at path: key path value [NX|XX]"""
+        if len(args) < 3:
+            return error("wrong number of arguments for 'json.set' command")
+
+        key, path = args[0], args[1]
+        value_args = list(args[2:])
+        nx = xx = False
+        if len(value_args) > 1 and value_args[-1].upper() in ("NX", "XX"):
+            nx = value_args[-1].upper() == "NX"
+            xx = not nx
+            value_args.pop()
+        # The inline protocol splits the document on spaces, so put it back together
+        value = self._parse_value(" ".join(value_args))
+        if isinstance(value, bytes):
+            return value
+
+        try:
+            document = self.storage.get_typed(key, "json")
+            if document is None:
+                if xx:
+                    return null_bulk_string()
+                if path not in ("$", "."):
+                    return error("new objects must be created at the root")
+                self.storage.set(key, JSONDocument(value))
+                return ok()
+
+            if not document.set(path, value, nx=nx, xx=xx):
+                return null_bulk_string()
+            self._changed(key)
+            return ok()
+        except TypeError as e:
+            return error(str(e))
+        except PathError as e:
+            return error(str(e))
+
+    def json_get(self, *args):
+        """Serialized values at one or more paths: key [path ...]"""
+        if len(args) < 1:
+            return error("wrong number of arguments for 'json.get' command")
+
+        key = args[0]
+        paths = list(args[1:]) or ["."]
+        try:
+            document = self.storage.get_typed(key, "json")
+            if document is None:
+                return null_bulk_string()
+
+            matches = {path: document.get(path) for path in paths}
+            any_jsonpath = any(is_jsonpath for _, is_jsonpath in matches.values())
+            results = {}
+            for path, (values, is_jsonpath) in matches.items():
+                if any_jsonpath:
+                    # With any '$' path every path answers in the list form
+                    results[path] = values
+                elif not values:
+                    return error(f"Path '{path}' does not exist")
+                else:
+                    results[path] = values[0]
+
+            if len(paths) == 1:
+                return bulk_string(dumps(results[paths[0]]))
+            return bulk_string(dumps(results))
+        except TypeError as e:
+            return error(str(e))
+        except PathError as e:
+            return error(str(e))
+
+    def json_del(self, *args):
+        """Delete the values at path, or the whole key at the root: key [path]"""
+        if len(args) not in (1, 2):
+            return error("wrong number of arguments for 'json.del' command")
+
+        key = args[0]
+        path = args[1] if len(args) == 2 else "$"
+        try:
+            document = self.storage.get_typed(key, "json")
+            if document is None:
+                return integer(0)
+            if path in ("$", "."):
+                self.storage.delete(key)
+                return integer(1)
+
+            deleted = document.delete(path)
+            if deleted:
+                self._changed(key)
+            return integer(deleted)
+        except TypeError as e:
+            return error(str(e))
+        except PathError as e:
+            return error(str(e))
+
+    def json_numincrby(self, *args):
+        """Add a number to the numbers at path: key path value"""
+        if len(args) != 3:
+            return error("wrong number of arguments for 'json.numincrby' command")
+
+        key, path = args[0], args[1]
+        increment = self._parse_value(args[2])
+        if isinstance(increment, bytes):
+            return increment
+        if isinstance(increment, bool) or not isinstance(increment, (int, float)):
+            return error("expected a number")
+
+        try:
+            document = self._existing(key)
+            if isinstance(document, bytes):
+                return document
+
+            results = document.numincrby(path, increment)
+            if any(result is not None for result in results):
+                self._changed(key)
+            if path.startswith("$"):
+                return bulk_string(dumps(results))
+            if not results or results[0] is None:
+                return error(f"Path '{path}' does not exist or does not hold a number")
+            return bulk_string(dumps(results[0]))
+        except TypeError as e:
+            return error(str(e))
+        except PathError as e:
+            return error(str(e))
+
+    def json_arrappend(self, *args):
+        """Append values to the arrays at path: key path value [value ...]"""
+        if len(args) < 3:
+            return error("wrong number of arguments for 'json.arrappend' command")
+
+        key, path = args[0], args[1]
+        values = []
+        for text in args[2:]:
+            value = self._parse_value(text)
+            if isinstance(value, bytes):
+                return value
+            values.append(value)
+
+        try:
+            document = self._existing(key)
+            if isinstance(document, bytes):
+                return document
+
+            results = document.arrappend(path, values)
+            if any(result is not None for result in results):
+                self._changed(key)
+            return self._counts(path, results, "an array")
+        except TypeError as e:
+            return error(str(e))
+        except PathError as e:
+            return error(str(e))
+
+    def json_objlen(self, *args):
+        """Number of members of the objects at path: key [path]"""
+        return self._read_counts("objlen", "an object", args)
+
+    def json_arrlen(self, *args):
+        """Length of the arrays at path: key [path]"""
+        return self._read_counts("arrlen", "an array", args)
+
+    def json_type(self, *args):
+        """JSON type of the values at path: key [path]"""
+        if len(args) not in (1, 2):
+            return error("wrong number of arguments for 'json.type' command")
+
+        key = args[0]
+        path = args[1] if len(args) == 2 else "."
+        try:
+            document = self.storage.get_typed(key, "json")
+            if document is None:
+                return null_bulk_string()
+            types = document.types(path)
+            if path.startswith("$"):
+                return array([bulk_string(name) for name in types])
+            return simple_string(types[0]) if types else null_bulk_string()
+        except TypeError as e:
+            return error(str(e))
+        except PathError as e:
+            return error(str(e))
+
+    def _read_counts(self, method, kind, args):
+        name = f"json.{method}"
+        if len(args) not in (1, 2):
+            return error(f"wrong number of arguments for '{name}' command")
+
+        key = args[0]
+        path = args[1] if len(args) == 2 else "."
+        try:
+            document = self.storage.get_typed(key, "json")
+            if document is None:
+                return null_bulk_string()
+            return self._counts(path, getattr(document, method)(path), kind)
+        except TypeError as e:
+            return error(str(e))
+        except PathError as e:
+            return error(str(e))
+
+    def _counts(self, path, results, kind):
+        """One integer per match for '$' paths; the first match (which must fit) otherwise"""
+        if path.startswith("$"):
+            return array([null_bulk_string() if result is None else integer(result) for result in results])
+        if not results or results[0] is None:
+            return error(f"Path '{path}' does not exist or is not {kind}")
+        return integer(results[0])
+
+    def _existing(self, key):
+        """Document at key, or an error reply when the key is missing"""
+        document = self.storage.get_typed(key, "json")
+        if document is None:
+            return error("could not perform this operation on a key that doesn't exist")
+        return document
+
+    def _changed(self, key):
+        """Tell the store's listeners about an in-place update (its size is measured again by the store)"""
+        self.storage.notify_key_changed(key)
+
+    def _parse_value(self, text):
+        try:
+            return json.loads(text)
+        except ValueError:
+            return error(f"expected value at line 1 column 1: {text}")
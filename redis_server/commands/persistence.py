@@ -1,6 +1,16 @@
 from .base import BaseCommandHandler
 from ..response import *
 
+# CONFIG parameters of the data store's StringCompressor -> (attribute, lowest value)
+# Settings of the store's components: parameter -> (component, attribute, lowest value)
+STORE_PARAMETERS = {
+    'string_compression_threshold': ('compressor', 'threshold', 0),
+    'string_compression_level': ('compressor', 'level', 1),
+    'string_compression_cache_bytes': ('compressor', 'cache_bytes', 0),
+    'tiering_max_memory': ('tier', 'max_memory', 0),
+    'tiering_promote_hits': ('tier', 'promote_hits', 1),
+}
+
 class PersistenceCommands(BaseCommandHandler):
     """Persistence commands: SAVE, BGSAVE, BGREWRITEAOF, LASTSAVE, CONFIG, DEBUG"""
     
@@ -9,6 +19,9 @@ class PersistenceCommands(BaseCommandHandler):
         if not self.persistence_manager:
             return error("persistence not enabled")
         
+        if self.persistence_manager.rdb_bgsave_in_progress():
+            return error("Background save already in progress")
+        
         try:
             success = self.persistence_manager.create_rdb_snapshot(self.storage)
             if success:
@@ -23,6 +36,11 @@ class PersistenceCommands(BaseCommandHandler):
         if not self.persistence_manager:
             return error("persistence not enabled")
         
+        if self.persistence_manager.rdb_bgsave_in_progress():
+            return error("Background save already in progress")
+        if self.persistence_manager.aof_rewrite_in_progress():
+            return error("Background append only file rewriting in progress")
+        
         try:
             success = self.persistence_manager.create_rdb_snapshot_background(self.storage)
             if success:
@@ -37,6 +55,12 @@ class PersistenceCommands(BaseCommandHandler):
         if not self.persistence_manager:
             return error("persistence not enabled")
         
+        if self.persistence_manager.aof_rewrite_in_progress():
+            return error("Background append only file rewriting already in progress")
+        if self.persistence_manager.rdb_bgsave_in_progress():
+            self.persistence_manager.schedule_aof_rewrite()
+            return simple_string("Background append only file rewriting scheduled")
+        
         try:
             success = self.persistence_manager.rewrite_aof_background(self.storage)
             if success:
@@ -69,6 +93,10 @@ class PersistenceCommands(BaseCommandHandler):
                 return error("wrong number of arguments for 'config get' command")
             
             parameter = args[1].lower()
+            if parameter in STORE_PARAMETERS:
+                component, attribute, _ = STORE_PARAMETERS[parameter]
+                config_value = getattr(getattr(self.storage, component), attribute)
+                return array([bulk_string(parameter), bulk_string(str(config_value))])
             if self.persistence_manager:
                 config_value = self.persistence_manager.config.get(parameter)
                 if config_value is not None:
@@ -83,6 +111,14 @@ class PersistenceCommands(BaseCommandHandler):
             parameter = args[1].lower()
             value = args[2]
             
+            if parameter in STORE_PARAMETERS:
+                # Compression settings apply to values written from now on; stored ones stay as they are
+                component, attribute, lowest = STORE_PARAMETERS[parameter]
+                if not value.isdigit() or int(value) < lowest or (attribute == 'level' and int(value) > 9):
+                    return error(f"config set error: invalid value for '{parameter}'")
+                setattr(getattr(self.storage, component), attribute, int(value))
+                return ok()
+            
             if self.persistence_manager:
                 try:
                     # Convert string values to appropriate types
@@ -0,0 +1,214 @@
+import heapq
+from .base import BaseCommandHandler
+from ..search import SchemaField, IndexManager, parse_query, evaluate
+from ..response import *
+
+# FT.SEARCH options; the query is every argument before the first of these,
+# since the inline protocol splits it on spaces
+SEARCH_OPTIONS = {"NOCONTENT", "RETURN", "SORTBY", "LIMIT", "VERBATIM", "NOSTOPWORDS", "DIALECT"}
+
+class SearchCommands(BaseCommandHandler):
+    """Secondary index commands: FT.CREATE, FT.SEARCH, FT.DROPINDEX, FT.INFO, FT._LIST"""
+
+    def __init__(self, storage, persistence_manager=None):
+        super().__init__(storage, persistence_manager)
+        self.index_manager = IndexManager(storage)
+
+    def ft_create(self, *args):
+        """Create an index: index [ON HASH] [PREFIX count prefix ...] SCHEMA field type [options] ..."""
+        if len(args) < 4:
+            return error("wrong number of arguments for 'ft.create' command")
+
+        name = args[0]
+        prefixes = []
+        i = 1
+        while i < len(args) and args[i].upper() != "SCHEMA":
+            option = args[i].upper()
+            if option == "ON" and i + 1 < len(args):
+                if args[i + 1].upper() != "HASH":
+                    return error("Only HASH indexes are supported")
+                i += 2
+            elif option == "PREFIX" and i + 1 < len(args):
+                try:
+                    count = int(args[i + 1])
+                except ValueError:
+                    return error("Bad arguments for PREFIX: expected a number")
+                prefixes = list(args[i + 2:i + 2 + count])
+                if len(prefixes) != count:
+                    return error("Bad arguments for PREFIX")
+                i += 2 + count
+            else:
+                return error(f"Unknown argument `{args[i]}`")
+
+        fields = self._parse_schema(args[i + 1:])
+        if isinstance(fields, bytes):
+            return fields
+
+        try:
+            self.index_manager.create(name, prefixes, fields)
+        except ValueError as e:
+            return error(str(e))
+        return ok()
+
+    def ft_search(self, *args):
+        """Query an index: index query [NOCONTENT] [RETURN n field ...] [SORTBY field [ASC|DESC]] [LIMIT offset num]"""
+        if len(args) < 2:
+            return error("wrong number of arguments for 'ft.search' command")
+
+        index = self.index_manager.indexes.get(args[0])
+        if index is None:
+            return error(f"{args[0]}: no such index")
+
+        i = 1
+        while i < len(args) and (i == 1 or args[i].upper() not in SEARCH_OPTIONS):
+            i += 1
+        query_text = " ".join(args[1:i])
+
+        no_content = False
+        return_fields = None
+        sort_field = None
+        descending = False
+        offset, limit = 0, 10
+        while i < len(args):
+            option = args[i].upper()
+            try:
+                if option in ("NOCONTENT", "VERBATIM", "NOSTOPWORDS"):
+                    no_content = no_content or option == "NOCONTENT"
+                    i += 1
+                elif option == "RETURN" and i + 1 < len(args):
+                    count = int(args[i + 1])
+                    return_fields = list(args[i + 2:i + 2 + count])
+                    i += 2 + count
+                elif option == "SORTBY" and i + 1 < len(args):
+                    sort_field = args[i + 1]
+                    i += 2
+                    if i < len(args) and args[i].upper() in ("ASC", "DESC"):
+                        descending = args[i].upper() == "DESC"
+                        i += 1
+                elif option == "LIMIT" and i + 2 < len(args):
+                    offset, limit = int(args[i + 1]), int(args[i + 2])
+                    i += 3
+                elif option == "DIALECT" and i + 1 < len(args):
+                    i += 2
+                else:
+                    return error(f"Unknown argument `{args[i]}`")
+            except ValueError:
+                return error(f"Bad arguments for {option}")
+        if offset < 0 or limit < 0:
+            return error("LIMIT exceeds maximum of 1000000")
+        if sort_field is not None and sort_field not in index.fields:
+            return error(f"Property `{sort_field}` not loaded nor in schema")
+
+        try:
+            keys = evaluate(parse_query(query_text), index)
+        except ValueError as e:  # QueryError included
+            return error(str(e))
+
+        # Only the requested page is ordered in full, and only its hashes are read
+        wanted = offset + limit
+        if sort_field is not None and descending:
+            def descending_key(key):
+                missing, value = index.sort_key(key, sort_field)
+                return -missing, value  # documents without the field still go last
+            ordered = heapq.nlargest(wanted, keys, key=descending_key)
+        elif sort_field is not None:
+            ordered = heapq.nsmallest(wanted, keys, key=lambda key: index.sort_key(key, sort_field))
+        else:
+            ordered = heapq.nsmallest(wanted, keys, key=index.doc_order.get)
+        page = ordered[offset:wanted]
+
+        results = [integer(len(keys))]
+        for key in page:
+            # A key past its TTL that hasn't been evicted yet: reading it evicts
+            # it, which also drops it from the index
+            hash_obj = self.storage.get(key)
+            if hash_obj is None:
+                continue
+            results.append(bulk_string(key))
+            if no_content:
+                continue
+            fields = return_fields if return_fields is not None else list(hash_obj)
+            content = []
+            for field in fields:
+                if field in hash_obj:
+                    content.append(bulk_string(field))
+                    content.append(bulk_string(hash_obj[field]))
+            results.append(array(content))
+        return array(results)
+
+    def ft_dropindex(self, *args):
+        """Drop an index, and with DD the hashes it covers"""
+        if len(args) not in (1, 2):
+            return error("wrong number of arguments for 'ft.dropindex' command")
+        delete_docs = len(args) == 2
+        if delete_docs and args[1].upper() != "DD":
+            return error(f"Unknown argument `{args[1]}`")
+
+        index = self.index_manager.drop(args[0])
+        if index is None:
+            return error("Unknown Index name")
+        if delete_docs and index.docs:
+            self.storage.delete(*list(index.docs))
+        return ok()
+
+    def ft_info(self, *args):
+        """Return the index definition and statistics"""
+        if len(args) != 1:
+            return error("wrong number of arguments for 'ft.info' command")
+
+        index = self.index_manager.indexes.get(args[0])
+        if index is None:
+            return error("Unknown Index name")
+
+        info = index.get_info()
+        return array([
+            bulk_string("index_name"), bulk_string(info['index_name']),
+            bulk_string("prefixes"), array([bulk_string(prefix) for prefix in info['prefixes']]),
+            bulk_string("attributes"), array([
+                array([bulk_string("identifier"), bulk_string(name), bulk_string("type"), bulk_string(field_type)])
+                for name, field_type in info['attributes']
+            ]),
+            bulk_string("num_docs"), integer(info['num_docs']),
+            bulk_string("num_terms"), integer(info['num_terms']),
+            bulk_string("num_records"), integer(info['num_records']),
+        ])
+
+    def ft_list(self, *args):
+        """Names of all indexes"""
+        return array([bulk_string(name) for name in self.index_manager.indexes])
+
+    def _parse_schema(self, args):
+        """Parse 'field type [SORTABLE] [SEPARATOR c] [CASESENSITIVE] ...' into SchemaFields"""
+        if not args:
+            return error("Fields arguments are missing")
+
+        fields = []
+        i = 0
+        while i < len(args):
+            if i + 1 >= len(args):
+                return error(f"Field `{args[i]}` does not have a type")
+            name, field_type = args[i], args[i + 1].upper()
+            i += 2
+            options = {}
+            while i < len(args):
+                option = args[i].upper()
+                if option == "SORTABLE":
+                    options['sortable'] = True
+                    i += 1
+                elif option == "CASESENSITIVE" and field_type == "TAG":
+                    options['case_sensitive'] = True
+                    i += 1
+                elif option == "SEPARATOR" and field_type == "TAG" and i + 1 < len(args):
+                    options['separator'] = args[i + 1]
+                    i += 2
+                elif option in ("NOSTEM", "NOINDEX", "UNF"):
+                    i += 1
+                elif option == "WEIGHT" and i + 1 < len(args):
+                    i += 2
+                else:
+                    break
+            try:
+                fields.append(SchemaField(name, field_type, **options))
+            except ValueError as e:
+                return error(str(e))
+        return fields
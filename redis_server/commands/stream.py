@@ -0,0 +1,631 @@
+from .base import BaseCommandHandler
+from ..datatypes.stream import (
+    Stream, CHUNK_SIZE, MIN_ID, MAX_ID, format_id, parse_id, increment_id, decrement_id, now_ms
+)
+from ..response import *
+
+class StreamCommands(BaseCommandHandler):
+    """Redis Stream commands: XADD, XLEN, XRANGE, XREVRANGE, XDEL, XTRIM, XREAD,
+    XGROUP, XREADGROUP, XACK, XPENDING, XCLAIM"""
+
+    def __init__(self, storage, persistence_manager=None, blocking_manager=None):
+        super().__init__(storage, persistence_manager)
+        self.blocking_manager = blocking_manager
+        self.current_client = None  # Will be set by command handler
+
+    def set_current_client(self, client):
+        """Set the current client for blocking reads."""
+        self.current_client = client
+
+    def xadd(self, *args):
+        """Append an entry: key [NOMKSTREAM] [MAXLEN|MINID [=|~] threshold [LIMIT count]] id field value ..."""
+        if len(args) < 4:
+            return error("wrong number of arguments for 'xadd' command")
+
+        key = args[0]
+        i = 1
+        nomkstream = False
+        trim = None
+        if args[i].upper() == "NOMKSTREAM":
+            nomkstream = True
+            i += 1
+        if i < len(args) and args[i].upper() in ("MAXLEN", "MINID"):
+            trim, i = self._parse_trim(args, i)
+            if isinstance(trim, bytes):
+                return trim
+
+        id_index = i
+        fields = list(args[id_index + 1:])
+        if not fields or len(fields) % 2 != 0:
+            return error("wrong number of arguments for 'xadd' command")
+
+        stream, failure = self._get_stream(key)
+        if failure:
+            return failure
+        if stream is None and nomkstream:
+            return null_bulk_string()
+
+        try:
+            stream_id = (stream or Stream()).next_id(args[id_index])
+        except ValueError as e:
+            return error(str(e))
+        if stream is None:
+            stream = self.storage.get_or_create_stream(key)
+
+        stream.append(stream_id, fields)
+        if trim:
+            self._apply_trim(stream, *trim)
+
+        # Log the generated ID so replaying the AOF rebuilds the same stream
+        self._propagate("XADD", *args[:id_index], format_id(stream_id), *fields)
+
+        if self.blocking_manager:
+            self.blocking_manager.signal_key_ready(key)
+        return bulk_string(format_id(stream_id))
+
+    def xlen(self, *args):
+        """Number of entries in a stream"""
+        if len(args) != 1:
+            return error("wrong number of arguments for 'xlen' command")
+
+        stream, failure = self._get_stream(args[0])
+        if failure:
+            return failure
+        return integer(len(stream) if stream else 0)
+
+    def xrange(self, *args):
+        """Entries between start and end: key start end [COUNT count]"""
+        return self._range("xrange", args, reverse=False)
+
+    def xrevrange(self, *args):
+        """Entries between end and start, newest first: key end start [COUNT count]"""
+        return self._range("xrevrange", args, reverse=True)
+
+    def xdel(self, *args):
+        """Delete entries by ID"""
+        if len(args) < 2:
+            return error("wrong number of arguments for 'xdel' command")
+
+        try:
+            ids = [parse_id(text) for text in args[1:]]
+        except ValueError as e:
+            return error(str(e))
+
+        stream, failure = self._get_stream(args[0])
+        if failure:
+            return failure
+        if stream is None:
+            return integer(0)
+        return integer(sum(1 for stream_id in ids if stream.delete(stream_id)))
+
+    def xtrim(self, *args):
+        """Trim a stream: key MAXLEN|MINID [=|~] threshold [LIMIT count]"""
+        if len(args) < 3:
+            return error("wrong number of arguments for 'xtrim' command")
+
+        trim, i = self._parse_trim(args, 1)
+        if isinstance(trim, bytes):
+            return trim
+        if i != len(args):
+            return error("syntax error")
+
+        stream, failure = self._get_stream(args[0])
+        if failure:
+            return failure
+        if stream is None:
+            return integer(0)
+        return integer(self._apply_trim(stream, *trim))
+
+    def xread(self, *args):
+        """Read entries after the given IDs: [COUNT count] [BLOCK ms] STREAMS key ... id ..."""
+        count = None
+        block = None
+        i = 0
+        while i < len(args) and args[i].upper() != "STREAMS":
+            option = args[i].upper()
+            if option in ("COUNT", "BLOCK") and i + 1 < len(args):
+                try:
+                    value = int(args[i + 1])
+                except ValueError:
+                    return error("value is not an integer or out of range")
+                if value < 0:
+                    return error("timeout is negative" if option == "BLOCK" else "value is out of range")
+                if option == "COUNT":
+                    count = value or None
+                else:
+                    block = value
+                i += 2
+            else:
+                return error("syntax error")
+
+        keys, id_args, failure = self._parse_streams(args, i)
+        if failure:
+            return failure
+
+        # Resolve '$' to the current last ID now, so blocking waits for newer entries
+        ids = []
+        for key, text in zip(keys, id_args):
+            if text == "$":
+                stream, failure = self._get_stream(key)
+                if failure:
+                    return failure
+                ids.append(stream.last_id if stream else MIN_ID)
+            else:
+                try:
+                    ids.append(parse_id(text))
+                except ValueError as e:
+                    return error(str(e))
+
+        def read():
+            results = []
+            for key, last_seen in zip(keys, ids):
+                stream, failure = self._get_stream(key)
+                if failure:
+                    return failure
+                if stream is None or last_seen >= stream.last_id:
+                    continue
+                entries = stream.range(increment_id(last_seen), MAX_ID, count)
+                if entries:
+                    results.append(array([bulk_string(key), self._entries_response(entries)]))
+            return array(results) if results else None
+
+        response = read()
+        if response is not None:
+            return response
+        if block is not None and self.blocking_manager and self.current_client is not None:
+            self.blocking_manager.block(self.current_client, keys, block, read, null_array())
+            return None
+        return null_array()
+
+    def xgroup(self, *args):
+        """Manage consumer groups: CREATE, SETID, DESTROY, CREATECONSUMER, DELCONSUMER"""
+        if len(args) < 1:
+            return error("wrong number of arguments for 'xgroup' command")
+
+        subcommand = args[0].upper()
+        if subcommand in ("CREATE", "SETID"):
+            if len(args) < 4:
+                return error(f"wrong number of arguments for 'xgroup|{subcommand.lower()}' command")
+            key, group_name, id_text = args[1:4]
+            mkstream = False
+            entries_read = None
+            i = 4
+            while i < len(args):
+                option = args[i].upper()
+                if option == "MKSTREAM" and subcommand == "CREATE":
+                    mkstream = True
+                    i += 1
+                elif option == "ENTRIESREAD" and i + 1 < len(args):
+                    try:
+                        entries_read = int(args[i + 1])
+                    except ValueError:
+                        return error("value is not an integer or out of range")
+                    i += 2
+                else:
+                    return error("syntax error")
+
+            try:
+                if not self.storage._is_key_valid(key) and not (subcommand == "CREATE" and mkstream):
+                    return error("The XGROUP subcommand requires the key to exist. "
+                                 "Note that for CREATE you may want to use the MKSTREAM option to create an empty stream automatically.")
+                stream = self.storage.get_or_create_stream(key)
+                last_id = stream.last_id if id_text == "$" else parse_id(id_text)
+            except (TypeError, ValueError) as e:
+                return error(str(e))
+
+            if subcommand == "CREATE":
+                if not stream.create_group(group_name, last_id, entries_read):
+                    return error("BUSYGROUP Consumer Group name already exists")
+                return ok()
+
+            group = stream.groups.get(group_name)
+            if group is None:
+                return error(f"NOGROUP No such consumer group '{group_name}' for key name '{key}'")
+            group.last_id = last_id
+            if entries_read is not None:
+                group.entries_read = entries_read
+            return ok()
+
+        if subcommand == "DESTROY":
+            if len(args) != 3:
+                return error("wrong number of arguments for 'xgroup|destroy' command")
+            stream, failure = self._get_stream(args[1])
+            if failure:
+                return failure
+            if stream is None:
+                return error("The XGROUP subcommand requires the key to exist.")
+            return integer(1 if stream.groups.pop(args[2], None) else 0)
+
+        if subcommand in ("CREATECONSUMER", "DELCONSUMER"):
+            if len(args) != 4:
+                return error(f"wrong number of arguments for 'xgroup|{subcommand.lower()}' command")
+            group, failure = self._get_group(args[1], args[2])
+            if failure:
+                return failure
+            if subcommand == "CREATECONSUMER":
+                if args[3] in group.consumers:
+                    return integer(0)
+                group.get_consumer(args[3])
+                return integer(1)
+            return integer(group.delete_consumer(args[3]))
+
+        return error(f"unknown XGROUP subcommand '{subcommand}'")
+
+    def xreadgroup(self, *args):
+        """Read as a group consumer: GROUP group consumer [COUNT count] [BLOCK ms] [NOACK] STREAMS key ... id ..."""
+        if len(args) < 6 or args[0].upper() != "GROUP":
+            return error("wrong number of arguments for 'xreadgroup' command")
+
+        group_name, consumer_name = args[1], args[2]
+        count = None
+        block = None
+        noack = False
+        i = 3
+        while i < len(args) and args[i].upper() != "STREAMS":
+            option = args[i].upper()
+            if option == "NOACK":
+                noack = True
+                i += 1
+            elif option in ("COUNT", "BLOCK") and i + 1 < len(args):
+                try:
+                    value = int(args[i + 1])
+                except ValueError:
+                    return error("value is not an integer or out of range")
+                if value < 0:
+                    return error("timeout is negative" if option == "BLOCK" else "value is out of range")
+                if option == "COUNT":
+                    count = value or None
+                else:
+                    block = value
+                i += 2
+            else:
+                return error("syntax error")
+
+        keys, id_args, failure = self._parse_streams(args, i)
+        if failure:
+            return failure
+
+        for key, text in zip(keys, id_args):
+            _, failure = self._get_group(key, group_name)
+            if failure:
+                return failure
+            if text != ">":
+                try:
+                    parse_id(text)
+                except ValueError as e:
+                    return error(str(e))
+
+        def read():
+            results = []
+            for key, text in zip(keys, id_args):
+                stream, failure = self._get_stream(key)
+                if failure:
+                    return failure
+                group = stream.groups.get(group_name) if stream else None
+                if group is None:
+                    return error(f"NOGROUP No such key '{key}' or consumer group '{group_name}' in XREADGROUP with GROUP option")
+                consumer = group.get_consumer(consumer_name)
+
+                if text == ">":
+                    entries = stream.read_group_new(group, consumer, count, noack)
+                    if not entries:
+                        continue
+                    self._propagate_delivery(key, group, consumer_name, entries, noack)
+                    results.append(array([bulk_string(key), self._entries_response(entries)]))
+                else:
+                    # History: this consumer's pending entries after the given ID
+                    pending = group.pending_range(increment_id(parse_id(text)), MAX_ID,
+                                                  count or len(consumer.pending), consumer_name)
+                    entries = [(stream_id, stream.get(stream_id)) for stream_id in pending]
+                    results.append(array([bulk_string(key), self._entries_response(entries)]))
+            return array(results) if results else None
+
+        self.propagated = []
+        response = read()
+        if response is not None:
+            return response
+        if block is not None and self.blocking_manager and self.current_client is not None:
+            def retry():
+                self.propagated = []
+                result = read()
+                # Served outside CommandHandler.execute, so log the delivery here
+                if result is not None and self.persistence_manager:
+                    for command, propagated_args in self.propagated or []:
+                        self.persistence_manager.log_write_command(command, *propagated_args)
+                    self.propagated = None
+                return result
+            self.blocking_manager.block(self.current_client, keys, block, retry, null_array())
+            return None
+        return null_array()
+
+    def xack(self, *args):
+        """Acknowledge entries, removing them from the group's PEL"""
+        if len(args) < 3:
+            return error("wrong number of arguments for 'xack' command")
+
+        try:
+            ids = [parse_id(text) for text in args[2:]]
+        except ValueError as e:
+            return error(str(e))
+
+        stream, failure = self._get_stream(args[0])
+        if failure:
+            return failure
+        group = stream.groups.get(args[1]) if stream else None
+        if group is None:
+            return integer(0)
+        return integer(sum(1 for stream_id in ids if group.ack(stream_id)))
+
+    def xpending(self, *args):
+        """Inspect pending entries: key group [[IDLE min-idle] start end count [consumer]]"""
+        if len(args) < 2:
+            return error("wrong number of arguments for 'xpending' command")
+
+        group, failure = self._get_group(args[0], args[1])
+        if failure:
+            return failure
+
+        if len(args) == 2:
+            if not group.pel_ids:
+                return array([integer(0), null_bulk_string(), null_bulk_string(), null_array()])
+            per_consumer = [array([bulk_string(name), bulk_string(str(len(consumer.pending)))])
+                            for name, consumer in group.consumers.items() if consumer.pending]
+            return array([
+                integer(len(group.pel_ids)),
+                bulk_string(format_id(group.pel_ids[0])),
+                bulk_string(format_id(group.pel_ids[-1])),
+                array(per_consumer),
+            ])
+
+        i = 2
+        min_idle = 0
+        if args[i].upper() == "IDLE":
+            if len(args) < 4:
+                return error("syntax error")
+            try:
+                min_idle = int(args[i + 1])
+            except ValueError:
+                return error("value is not an integer or out of range")
+            i += 2
+        if len(args) - i not in (3, 4):
+            return error("syntax error")
+
+        try:
+            start = self._parse_range_bound(args[i], MIN_ID, 0)
+            end = self._parse_range_bound(args[i + 1], MAX_ID, MAX_ID[1])
+            count = int(args[i + 2])
+        except ValueError as e:
+            return error(str(e))
+        consumer = args[i + 3] if len(args) - i == 4 else None
+
+        now = now_ms()
+        results = []
+        for stream_id in group.pending_range(start, end, len(group.pel_ids), consumer):
+            if len(results) >= count:
+                break
+            entry = group.pel[stream_id]
+            idle = now - entry.delivery_time
+            if idle >= min_idle:
+                results.append(array([
+                    bulk_string(format_id(stream_id)),
+                    bulk_string(entry.consumer),
+                    integer(idle),
+                    integer(entry.delivery_count),
+                ]))
+        return array(results)
+
+    def xclaim(self, *args):
+        """Change ownership of pending entries:
+        key group consumer min-idle-time id ... [IDLE ms] [TIME ms] [RETRYCOUNT n] [FORCE] [JUSTID]"""
+        if len(args) < 5:
+            return error("wrong number of arguments for 'xclaim' command")
+
+        key, group_name, consumer_name = args[0], args[1], args[2]
+        try:
+            min_idle = int(args[3])
+        except ValueError:
+            return error("Invalid min-idle-time argument for XCLAIM")
+
+        ids = []
+        i = 4
+        while i < len(args):
+            try:
+                ids.append(parse_id(args[i]))
+                i += 1
+            except ValueError:
+                break
+        if not ids:
+            return error("wrong number of arguments for 'xclaim' command")
+
+        now = now_ms()
+        delivery_time = now
+        retry_count = None
+        force = False
+        justid = False
+        while i < len(args):
+            option = args[i].upper()
+            try:
+                if option == "IDLE" and i + 1 < len(args):
+                    delivery_time = now - int(args[i + 1])
+                    i += 2
+                elif option == "TIME" and i + 1 < len(args):
+                    delivery_time = int(args[i + 1])
+                    i += 2
+                elif option == "RETRYCOUNT" and i + 1 < len(args):
+                    retry_count = int(args[i + 1])
+                    i += 2
+                elif option == "FORCE":
+                    force = True
+                    i += 1
+                elif option == "JUSTID":
+                    justid = True
+                    i += 1
+                else:
+                    return error(f"Unrecognized XCLAIM option '{args[i]}'")
+            except ValueError:
+                return error("value is not an integer or out of range")
+
+        group, failure = self._get_group(key, group_name)
+        if failure:
+            return failure
+        stream = self.storage.get_typed(key, "stream")
+        consumer = group.get_consumer(consumer_name)
+
+        self.propagated = []
+        claimed = []
+        for stream_id in ids:
+            fields = stream.get(stream_id)
+            entry = group.pel.get(stream_id)
+            if entry is None:
+                if not force or fields is None:
+                    continue
+                group.add_pending(stream_id, consumer, delivery_time)
+                entry = group.pel[stream_id]
+                entry.delivery_count = 0
+            elif fields is None:
+                # Entry was deleted from the stream: drop it from the PEL
+                group.ack(stream_id)
+                continue
+            elif now - entry.delivery_time < min_idle:
+                continue
+
+            delivery_count = entry.delivery_count
+            group.add_pending(stream_id, consumer, delivery_time)
+            if retry_count is not None:
+                entry.delivery_count = retry_count
+            elif justid:
+                entry.delivery_count = delivery_count
+            claimed.append((stream_id, fields))
+            self._propagate("XCLAIM", key, group_name, consumer_name, "0", format_id(stream_id),
+                            "TIME", str(entry.delivery_time), "RETRYCOUNT", str(entry.delivery_count),
+                            "FORCE", "JUSTID")
+
+        consumer.seen_time = now
+        if justid:
+            return array([bulk_string(format_id(stream_id)) for stream_id, _ in claimed])
+        return self._entries_response(claimed)
+
+    def _range(self, name, args, reverse):
+        if len(args) not in (3, 5):
+            return error(f"wrong number of arguments for '{name}' command")
+
+        key = args[0]
+        low_text, high_text = (args[2], args[1]) if reverse else (args[1], args[2])
+        try:
+            start = self._parse_range_bound(low_text, MIN_ID, 0)
+            end = self._parse_range_bound(high_text, MAX_ID, MAX_ID[1])
+        except ValueError as e:
+            return error(str(e))
+
+        count = None
+        if len(args) == 5:
+            if args[3].upper() != "COUNT":
+                return error("syntax error")
+            try:
+                count = int(args[4])
+            except ValueError:
+                return error("value is not an integer or out of range")
+            if count <= 0:
+                return array([])
+
+        stream, failure = self._get_stream(key)
+        if failure:
+            return failure
+        if stream is None:
+            return array([])
+        return self._entries_response(stream.range(start, end, count, reverse))
+
+    def _parse_range_bound(self, text, special, default_seq):
+        """Parse an XRANGE bound: '-', '+', 'ms[-seq]' or exclusive '(ms[-seq]'"""
+        if text in ("-", "+"):
+            return MIN_ID if text == "-" else MAX_ID
+        if text.startswith("("):
+            stream_id = parse_id(text[1:], default_seq)
+            return increment_id(stream_id) if special == MIN_ID else decrement_id(stream_id)
+        return parse_id(text, default_seq)
+
+    def _parse_trim(self, args, i):
+        """Parse MAXLEN|MINID [=|~] threshold [LIMIT count]; returns ((strategy, approx, threshold, limit), next)"""
+        strategy = args[i].upper()
+        i += 1
+        approximate = False
+        if i < len(args) and args[i] in ("=", "~"):
+            approximate = args[i] == "~"
+            i += 1
+        if i >= len(args):
+            return error("syntax error"), i
+
+        try:
+            if strategy == "MAXLEN":
+                threshold = int(args[i])
+                if threshold < 0:
+                    return error("The MAXLEN argument must be >= 0."), i
+            else:
+                threshold = parse_id(args[i])
+        except ValueError:
+            return error("value is not an integer or out of range"), i
+        i += 1
+
+        limit = None
+        if i + 1 < len(args) and args[i].upper() == "LIMIT":
+            if not approximate:
+                return error("syntax error, LIMIT cannot be used without the special ~ option"), i
+            try:
+                limit = int(args[i + 1])
+            except ValueError:
+                return error("value is not an integer or out of range"), i
+            i += 2
+        elif approximate:
+            limit = 100 * CHUNK_SIZE
+        return (strategy, approximate, threshold, limit or None), i
+
+    def _apply_trim(self, stream, strategy, approximate, threshold, limit):
+        if strategy == "MAXLEN":
+            return stream.trim_maxlen(threshold, approximate, limit)
+        return stream.trim_minid(threshold, approximate, limit)
+
+    def _parse_streams(self, args, i):
+        """Split 'STREAMS key ... id ...' into (keys, ids, error)"""
+        if i >= len(args) or args[i].upper() != "STREAMS":
+            return None, None, error("syntax error")
+        rest = args[i + 1:]
+        if not rest or len(rest) % 2 != 0:
+            return None, None, error("Unbalanced 'xread' list of streams: for each stream key an ID or '$' must be specified.")
+        half = len(rest) // 2
+        return rest[:half], rest[half:], None
+
+    def _get_stream(self, key):
+        """Return (stream or None, None) or (None, error response)"""
+        try:
+            return self.storage.get_typed(key, "stream"), None
+        except TypeError as e:
+            return None, error(str(e))
+
+    def _get_group(self, key, group_name):
+        """Return (group, None) or (None, error response)"""
+        stream, failure = self._get_stream(key)
+        if failure:
+            return None, failure
+        group = stream.groups.get(group_name) if stream else None
+        if group is None:
+            return None, error(f"NOGROUP No such key '{key}' or consumer group '{group_name}'")
+        return group, None
+
+    def _entries_response(self, entries):
+        results = []
+        for stream_id, fields in entries:
+            results.append(array([
+                bulk_string(format_id(stream_id)),
+                array([bulk_string(field) for field in fields]) if fields is not None else null_array(),
+            ]))
+        return array(results)
+
+    def _propagate_delivery(self, key, group, consumer_name, entries, noack):
+        """Log a group read as deterministic claims plus the new last delivered ID"""
+        if not noack:
+            for stream_id, _ in entries:
+                entry = group.pel[stream_id]
+                self._propagate("XCLAIM", key, group.name, consumer_name, "0", format_id(stream_id),
+                                "TIME", str(entry.delivery_time), "RETRYCOUNT", str(entry.delivery_count),
+                                "FORCE", "JUSTID")
+        self._propagate("XGROUP", "SETID", key, group.name, format_id(group.last_id))
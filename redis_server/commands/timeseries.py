@@ -0,0 +1,343 @@
+import time
+from .base import BaseCommandHandler
+from ..datatypes import TimeSeries
+from ..datatypes.timeseries import AGGREGATORS, DUPLICATE_POLICIES
+from ..response import *
+
+class TimeSeriesCommands(BaseCommandHandler):
+    """Time series commands: TS.CREATE, TS.ADD, TS.MADD, TS.GET, TS.DEL, TS.RANGE, TS.REVRANGE,
+    TS.MRANGE, TS.MREVRANGE, TS.QUERYINDEX, TS.INFO"""
+
+    def ts_create(self, *args):
+        """Create a series: key [RETENTION ms] [CHUNK_SIZE n] [DUPLICATE_POLICY policy] [LABELS label value ...]"""
+        if len(args) < 1:
+            return error("wrong number of arguments for 'ts.create' command")
+
+        key = args[0]
+        options = self._parse_options(args, 1)
+        if isinstance(options, bytes):
+            return options
+        options.pop('on_duplicate', None)
+
+        if self.storage._is_key_valid(key):
+            return error("TSDB: key already exists")
+
+        try:
+            self.storage.set(key, TimeSeries(**options))
+        except ValueError as e:
+            return error(f"TSDB: {e}")
+        return ok()
+
+    def ts_add(self, *args):
+        """Append a sample, creating the series if needed: key timestamp|* value [options]"""
+        if len(args) < 3:
+            return error("wrong number of arguments for 'ts.add' command")
+
+        key = args[0]
+        options = self._parse_options(args, 3)
+        if isinstance(options, bytes):
+            return options
+        on_duplicate = options.pop('on_duplicate', None)
+
+        sample = self._parse_sample(args[1], args[2])
+        if isinstance(sample, bytes):
+            return sample
+
+        try:
+            series = self.storage.get_typed(key, "timeseries")
+            if series is None:
+                series = TimeSeries(**options)
+                self.storage.set(key, series)
+            timestamp = series.add(*sample, on_duplicate)
+        except TypeError as e:
+            return error(str(e))
+        except ValueError as e:
+            return error(str(e) if str(e).startswith("TSDB") else f"TSDB: {e}")
+
+        # Log the resolved timestamp so '*' replays to the same sample
+        self._propagate("TS.ADD", key, str(timestamp), *args[2:])
+        return integer(timestamp)
+
+    def ts_madd(self, *args):
+        """Append samples to existing series: key timestamp value [key timestamp value ...]"""
+        if len(args) < 3 or len(args) % 3 != 0:
+            return error("wrong number of arguments for 'ts.madd' command")
+
+        results = []
+        self.propagated = []
+        for i in range(0, len(args), 3):
+            key = args[i]
+            sample = self._parse_sample(args[i + 1], args[i + 2])
+            if isinstance(sample, bytes):
+                results.append(sample)
+                continue
+            try:
+                series = self.storage.get_typed(key, "timeseries")
+                if series is None:
+                    results.append(error("TSDB: the key does not exist"))
+                    continue
+                timestamp = series.add(*sample)
+            except TypeError as e:
+                results.append(error(str(e)))
+                continue
+            except ValueError as e:
+                results.append(error(str(e)))
+                continue
+            self._propagate("TS.ADD", key, str(timestamp), args[i + 2])
+            results.append(integer(timestamp))
+        return array(results)
+
+    def ts_get(self, *args):
+        """Return the newest sample"""
+        if len(args) != 1:
+            return error("wrong number of arguments for 'ts.get' command")
+
+        series, failure = self._get_series(args[0])
+        if failure:
+            return failure
+
+        sample = series.get()
+        return self._sample_response(sample) if sample else array([])
+
+    def ts_del(self, *args):
+        """Delete samples in a range: key from to"""
+        if len(args) != 3:
+            return error("wrong number of arguments for 'ts.del' command")
+
+        bounds = self._parse_bounds(args[1], args[2])
+        if isinstance(bounds, bytes):
+            return bounds
+
+        series, failure = self._get_series(args[0])
+        if failure:
+            return failure
+        return integer(series.delete_range(*bounds))
+
+    def ts_range(self, *args):
+        """Samples in a range, oldest first: key from to [COUNT n] [AGGREGATION type bucket]"""
+        return self._range("ts.range", args, reverse=False)
+
+    def ts_revrange(self, *args):
+        """Samples in a range, newest first: key from to [COUNT n] [AGGREGATION type bucket]"""
+        return self._range("ts.revrange", args, reverse=True)
+
+    def ts_mrange(self, *args):
+        """Query every series matching the filters: from to [COUNT n] [AGGREGATION type bucket] [WITHLABELS] FILTER ..."""
+        return self._mrange("ts.mrange", args, reverse=False)
+
+    def ts_mrevrange(self, *args):
+        """Query every series matching the filters, newest first"""
+        return self._mrange("ts.mrevrange", args, reverse=True)
+
+    def ts_queryindex(self, *args):
+        """Keys of the series matching the filters"""
+        if len(args) < 1:
+            return error("wrong number of arguments for 'ts.queryindex' command")
+
+        filters = self._parse_filters(args)
+        if isinstance(filters, bytes):
+            return filters
+        return array([bulk_string(key) for key, _ in self._matching_series(filters)])
+
+    def ts_info(self, *args):
+        """Return series statistics and labels"""
+        if len(args) != 1:
+            return error("wrong number of arguments for 'ts.info' command")
+
+        series, failure = self._get_series(args[0])
+        if failure:
+            return failure
+
+        results = []
+        for name, value in series.get_info().items():
+            results.append(bulk_string(name))
+            results.append(integer(value) if isinstance(value, int) else bulk_string(value))
+        results.append(bulk_string("labels"))
+        results.append(self._labels_response(series))
+        return array(results)
+
+    def _range(self, name, args, reverse):
+        if len(args) < 3:
+            return error(f"wrong number of arguments for '{name}' command")
+
+        bounds = self._parse_bounds(args[1], args[2])
+        if isinstance(bounds, bytes):
+            return bounds
+        query = self._parse_query(args, 3)
+        if isinstance(query, bytes):
+            return query
+        if query.pop('filters') is not None or query.pop('with_labels'):
+            return error("TSDB: wrong parameters")
+
+        series, failure = self._get_series(args[0])
+        if failure:
+            return failure
+        return self._samples_response(self._query(series, bounds, query, reverse))
+
+    def _mrange(self, name, args, reverse):
+        if len(args) < 4:
+            return error(f"wrong number of arguments for '{name}' command")
+
+        bounds = self._parse_bounds(args[0], args[1])
+        if isinstance(bounds, bytes):
+            return bounds
+        query = self._parse_query(args, 2)
+        if isinstance(query, bytes):
+            return query
+        filters = query.pop('filters')
+        with_labels = query.pop('with_labels')
+        if filters is None:
+            return error("TSDB: missing FILTER argument")
+
+        results = []
+        for key, series in self._matching_series(filters):
+            labels = self._labels_response(series) if with_labels else array([])
+            samples = self._samples_response(self._query(series, bounds, query, reverse))
+            results.append(array([bulk_string(key), labels, samples]))
+        return array(results)
+
+    def _query(self, series, bounds, query, reverse):
+        if query['aggregator']:
+            return series.aggregate(*bounds, query['aggregator'], query['bucket'], query['count'], reverse)
+        return series.range(*bounds, query['count'], reverse)
+
+    def _parse_options(self, args, i):
+        """Parse TS.CREATE/TS.ADD options into TimeSeries keyword arguments"""
+        options = {}
+        while i < len(args):
+            option = args[i].upper()
+            if option == "LABELS":
+                rest = args[i + 1:]
+                if len(rest) % 2 != 0:
+                    return error("TSDB: wrong number of labels")
+                options['labels'] = dict(zip(rest[0::2], rest[1::2]))
+                break
+            if i + 1 >= len(args):
+                return error("wrong number of arguments")
+
+            value = args[i + 1]
+            if option in ("RETENTION", "CHUNK_SIZE"):
+                try:
+                    number = int(value)
+                except ValueError:
+                    return error(f"TSDB: invalid {option.lower().replace('_', ' ')}")
+                options['retention' if option == "RETENTION" else 'chunk_size'] = number
+            elif option in ("DUPLICATE_POLICY", "ON_DUPLICATE"):
+                policy = value.lower()
+                if policy not in DUPLICATE_POLICIES:
+                    return error(f"TSDB: unknown {option}")
+                options['duplicate_policy' if option == "DUPLICATE_POLICY" else 'on_duplicate'] = policy
+            else:
+                return error("TSDB: wrong parameters")
+            i += 2
+        return options
+
+    def _parse_query(self, args, i):
+        """Parse [COUNT n] [AGGREGATION type bucket] [WITHLABELS] [FILTER ...]"""
+        query = {'count': None, 'aggregator': None, 'bucket': None, 'with_labels': False, 'filters': None}
+        while i < len(args):
+            option = args[i].upper()
+            if option == "WITHLABELS":
+                query['with_labels'] = True
+                i += 1
+            elif option == "FILTER":
+                query['filters'] = self._parse_filters(args[i + 1:])
+                if isinstance(query['filters'], bytes):
+                    return query['filters']
+                break
+            elif option == "COUNT" and i + 1 < len(args):
+                try:
+                    query['count'] = int(args[i + 1])
+                except ValueError:
+                    return error("TSDB: Couldn't parse COUNT")
+                i += 2
+            elif option == "AGGREGATION" and i + 2 < len(args):
+                aggregator = args[i + 1].lower()
+                if aggregator not in AGGREGATORS:
+                    return error("TSDB: Unknown aggregation type")
+                try:
+                    bucket = int(args[i + 2])
+                except ValueError:
+                    return error("TSDB: bucketDuration must be an integer")
+                if bucket <= 0:
+                    return error("TSDB: bucketDuration must be greater than zero")
+                query['aggregator'], query['bucket'] = aggregator, bucket
+                i += 3
+            else:
+                return error("TSDB: wrong parameters")
+        return query
+
+    def _parse_filters(self, args):
+        """Parse label=value, label!=value, label=(a,b) and label!=(a,b) matchers"""
+        filters = []
+        for text in args:
+            if "!=" in text:
+                label, _, values = text.partition("!=")
+                equal = False
+            elif "=" in text:
+                label, _, values = text.partition("=")
+                equal = True
+            else:
+                return error("TSDB: failed parsing labels")
+            if values.startswith("(") and values.endswith(")"):
+                values = tuple(values[1:-1].split(","))
+            else:
+                values = (values,)
+            filters.append((label, equal, values))
+        if not any(equal and values != ("",) for _, equal, values in filters):
+            return error("TSDB: please provide at least one matcher")
+        return filters
+
+    def _matching_series(self, filters):
+        for key in sorted(self.storage.keys()):
+            if self.storage.get_type(key) != "timeseries":
+                continue
+            series = self.storage.get_typed(key, "timeseries")
+            if series.matches(filters):
+                yield key, series
+
+    def _parse_sample(self, timestamp_text, value_text):
+        """Return (timestamp, value) or an error response"""
+        try:
+            timestamp = int(time.time() * 1000) if timestamp_text == "*" else int(timestamp_text)
+        except ValueError:
+            return error("TSDB: invalid timestamp")
+        if timestamp < 0:
+            return error("TSDB: invalid timestamp, must be a nonnegative integer")
+        try:
+            value = float(value_text)
+        except ValueError:
+            return error("TSDB: invalid value")
+        return timestamp, value
+
+    def _parse_bounds(self, start_text, end_text):
+        """Return (start, end) for '-'/'+'/integer bounds or an error response"""
+        try:
+            start = 0 if start_text == "-" else int(start_text)
+            end = 2 ** 63 - 1 if end_text == "+" else int(end_text)
+        except ValueError:
+            return error("TSDB: invalid timestamp")
+        return start, end
+
+    def _get_series(self, key):
+        """Return (series, None) or (None, error response)"""
+        try:
+            series = self.storage.get_typed(key, "timeseries")
+        except TypeError as e:
+            return None, error(str(e))
+        if series is None:
+            return None, error("TSDB: the key does not exist")
+        return series, None
+
+    def _format_value(self, value):
+        text = repr(value)
+        return text[:-2] if text.endswith(".0") else text
+
+    def _sample_response(self, sample):
+        return array([integer(sample[0]), bulk_string(self._format_value(sample[1]))])
+
+    def _samples_response(self, samples):
+        return array([self._sample_response(sample) for sample in samples])
+
+    def _labels_response(self, series):
+        return array([array([bulk_string(label), bulk_string(value)]) for label, value in series.labels.items()])
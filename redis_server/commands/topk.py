@@ -0,0 +1,129 @@
+from .base import BaseCommandHandler
+from ..datatypes import TopK
+from ..response import *
+
+class TopKCommands(BaseCommandHandler):
+    """Top-K commands: TOPK.RESERVE, TOPK.ADD, TOPK.INCRBY, TOPK.QUERY, TOPK.COUNT, TOPK.LIST, TOPK.INFO"""
+
+    def topk_reserve(self, *args):
+        """Create a Top-K tracker: key topk [width depth decay]"""
+        if len(args) not in (2, 5):
+            return error("wrong number of arguments for 'topk.reserve' command")
+
+        key = args[0]
+        try:
+            k = int(args[1])
+            if len(args) == 5:
+                width, depth, decay = int(args[2]), int(args[3]), float(args[4])
+                topk = TopK(k, width, depth, decay)
+            else:
+                topk = TopK(k)
+        except ValueError as e:
+            return error(f"TopK: {e}")
+
+        if self.storage._is_key_valid(key):
+            return error("TopK: key already exists")
+
+        self.storage.set(key, topk)
+        return ok()
+
+    def topk_add(self, *args):
+        """Count items, replying with the item each one expelled from the list (or nil)"""
+        if len(args) < 2:
+            return error("wrong number of arguments for 'topk.add' command")
+
+        topk, failure = self._get_topk(args[0])
+        if failure:
+            return failure
+
+        return array([self._expelled(topk.incrby(item)) for item in args[1:]])
+
+    def topk_incrby(self, *args):
+        """Increase the count of items by the given increments"""
+        if len(args) < 3 or len(args) % 2 == 0:
+            return error("wrong number of arguments for 'topk.incrby' command")
+
+        pairs = []
+        for i in range(1, len(args), 2):
+            try:
+                increment = int(args[i + 1])
+            except ValueError:
+                return error("TopK: Cannot parse increment")
+            if increment < 1 or increment > 100000:
+                return error("TopK: increment must be an integer between 1 and 100000")
+            pairs.append((args[i], increment))
+
+        topk, failure = self._get_topk(args[0])
+        if failure:
+            return failure
+
+        return array([self._expelled(topk.incrby(item, increment)) for item, increment in pairs])
+
+    def topk_query(self, *args):
+        """Check whether items are in the top-k list"""
+        if len(args) < 2:
+            return error("wrong number of arguments for 'topk.query' command")
+
+        topk, failure = self._get_topk(args[0])
+        if failure:
+            return failure
+
+        return array([integer(1 if topk.query(item) else 0) for item in args[1:]])
+
+    def topk_count(self, *args):
+        """Return the estimated count of items"""
+        if len(args) < 2:
+            return error("wrong number of arguments for 'topk.count' command")
+
+        topk, failure = self._get_topk(args[0])
+        if failure:
+            return failure
+
+        return array([integer(topk.count(item)) for item in args[1:]])
+
+    def topk_list(self, *args):
+        """List the top-k items, highest count first"""
+        if len(args) not in (1, 2):
+            return error("wrong number of arguments for 'topk.list' command")
+        with_count = len(args) == 2
+        if with_count and args[1].upper() != "WITHCOUNT":
+            return error("syntax error")
+
+        topk, failure = self._get_topk(args[0])
+        if failure:
+            return failure
+
+        results = []
+        for item, count in topk.top_items():
+            results.append(bulk_string(item))
+            if with_count:
+                results.append(integer(count))
+        return array(results)
+
+    def topk_info(self, *args):
+        """Return the tracker parameters"""
+        if len(args) != 1:
+            return error("wrong number of arguments for 'topk.info' command")
+
+        topk, failure = self._get_topk(args[0])
+        if failure:
+            return failure
+
+        results = []
+        for name, value in topk.get_info().items():
+            results.append(bulk_string(name))
+            results.append(integer(value) if isinstance(value, int) else bulk_string(str(value)))
+        return array(results)
+
+    def _get_topk(self, key):
+        """Return (topk, None) or (None, error response)"""
+        try:
+            topk = self.storage.get_typed(key, "topk")
+        except TypeError as e:
+            return None, error(str(e))
+        if topk is None:
+            return None, error("TopK: key does not exist")
+        return topk, None
+
+    def _expelled(self, item):
+        return bulk_string(item) if item is not None else null_bulk_string()
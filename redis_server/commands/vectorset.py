@@ -0,0 +1,204 @@
+from .base import BaseCommandHandler
+from ..datatypes import VectorSet
+from ..response import *
+
+class VectorSetCommands(BaseCommandHandler):
+    """Vector set commands: VADD, VSIM, VREM, VCARD, VDIM, VEMB, VINFO"""
+
+    def vadd(self, *args):
+        """Add or update an element: key VALUES num v1 ... element [M m] [EF ef] [METRIC COSINE|L2] [NOQUANT]"""
+        if len(args) < 4:
+            return error("wrong number of arguments for 'vadd' command")
+
+        key = args[0]
+        vector, i = self._parse_vector(args, 1)
+        if isinstance(vector, bytes):
+            return vector
+        if i >= len(args):
+            return error("wrong number of arguments for 'vadd' command")
+        element = args[i]
+        i += 1
+
+        options = {}
+        while i < len(args):
+            option = args[i].upper()
+            if option == "NOQUANT":
+                i += 1
+            elif option in ("M", "EF") and i + 1 < len(args):
+                try:
+                    options['m' if option == "M" else 'ef_construction'] = int(args[i + 1])
+                except ValueError:
+                    return error(f"invalid {option} value")
+                i += 2
+            elif option == "METRIC" and i + 1 < len(args):
+                options['metric'] = args[i + 1].lower()
+                i += 2
+            else:
+                return error("syntax error")
+
+        try:
+            vector_set = self.storage.get_typed(key, "vectorset")
+            if vector_set is None:
+                vector_set = VectorSet(len(vector), **options)
+                self.storage.set(key, vector_set)
+            return integer(1 if vector_set.add(element, vector) else 0)
+        except TypeError as e:
+            return error(str(e))
+        except ValueError as e:
+            return error(str(e))
+
+    def vsim(self, *args):
+        """Nearest elements: key ELE element | VALUES num v1 ... [WITHSCORES] [COUNT n] [EF ef] [TRUTH]"""
+        if len(args) < 3:
+            return error("wrong number of arguments for 'vsim' command")
+
+        key = args[0]
+        element = None
+        if args[1].upper() == "ELE":
+            element = args[2]
+            i = 3
+        else:
+            vector, i = self._parse_vector(args, 1)
+            if isinstance(vector, bytes):
+                return vector
+
+        with_scores = False
+        exact = False
+        count = 10
+        ef = None
+        while i < len(args):
+            option = args[i].upper()
+            if option == "WITHSCORES":
+                with_scores = True
+                i += 1
+            elif option in ("TRUTH", "NOTHREAD"):
+                exact = exact or option == "TRUTH"
+                i += 1
+            elif option in ("COUNT", "EF") and i + 1 < len(args):
+                try:
+                    value = int(args[i + 1])
+                except ValueError:
+                    return error(f"invalid {option} value")
+                if value < 1:
+                    return error(f"invalid {option} value")
+                if option == "COUNT":
+                    count = value
+                else:
+                    ef = value
+                i += 2
+            else:
+                return error("syntax error")
+
+        vector_set, failure = self._get_vector_set(key)
+        if failure:
+            return failure
+        if vector_set is None:
+            return array([])
+
+        try:
+            if element is not None:
+                found = vector_set.search_element(element, count, ef, exact)
+                if found is None:
+                    return error("element not found in set")
+            else:
+                found = vector_set.search(vector, count, ef, exact)
+        except ValueError as e:
+            return error(str(e))
+
+        results = []
+        for name, score in found:
+            results.append(bulk_string(name))
+            if with_scores:
+                results.append(bulk_string(repr(score)))
+        return array(results)
+
+    def vrem(self, *args):
+        """Remove an element"""
+        if len(args) != 2:
+            return error("wrong number of arguments for 'vrem' command")
+
+        vector_set, failure = self._get_vector_set(args[0])
+        if failure:
+            return failure
+        if vector_set is None or not vector_set.remove(args[1]):
+            return integer(0)
+        if not len(vector_set):
+            self.storage.delete(args[0])
+        return integer(1)
+
+    def vcard(self, *args):
+        """Number of elements"""
+        if len(args) != 1:
+            return error("wrong number of arguments for 'vcard' command")
+
+        vector_set, failure = self._get_vector_set(args[0])
+        if failure:
+            return failure
+        return integer(len(vector_set) if vector_set else 0)
+
+    def vdim(self, *args):
+        """Dimension of the vectors"""
+        if len(args) != 1:
+            return error("wrong number of arguments for 'vdim' command")
+
+        vector_set, failure = self._get_vector_set(args[0])
+        if failure:
+            return failure
+        if vector_set is None:
+            return error("key does not exist")
+        return integer(vector_set.dim)
+
+    def vemb(self, *args):
+        """The vector of an element"""
+        if len(args) != 2:
+            return error("wrong number of arguments for 'vemb' command")
+
+        vector_set, failure = self._get_vector_set(args[0])
+        if failure:
+            return failure
+        vector = vector_set.get_vector(args[1]) if vector_set else None
+        if vector is None:
+            return null_array()
+        return array([bulk_string(repr(value)) for value in vector])
+
+    def vinfo(self, *args):
+        """Return set statistics"""
+        if len(args) != 1:
+            return error("wrong number of arguments for 'vinfo' command")
+
+        vector_set, failure = self._get_vector_set(args[0])
+        if failure:
+            return failure
+        if vector_set is None:
+            return null_array()
+
+        results = []
+        for name, value in vector_set.get_info().items():
+            results.append(bulk_string(name))
+            results.append(integer(value) if isinstance(value, int) else bulk_string(value))
+        return array(results)
+
+    def _parse_vector(self, args, i):
+        """Parse 'VALUES num v1 ... vnum'; returns (vector, next index) or (error response, i)"""
+        if args[i].upper() == "FP32":
+            return error("FP32 blobs are not supported by the inline protocol, use VALUES"), i
+        if args[i].upper() != "VALUES" or i + 1 >= len(args):
+            return error("syntax error"), i
+        try:
+            size = int(args[i + 1])
+        except ValueError:
+            return error("invalid vector specification"), i
+        values = args[i + 2:i + 2 + size]
+        if size < 1 or len(values) != size:
+            return error("invalid vector specification"), i
+        try:
+            return [float(value) for value in values], i + 2 + size
+        except ValueError:
+            return error("invalid vector specification"), i
+
+    def _get_vector_set(self, key):
+        """Return (vector set or None, None) or (None, error response)"""
+        try:
+            return self.storage.get_typed(key, "vectorset"), None
+        except TypeError as e:
+            return None, error(str(e))
@@ -0,0 +1,147 @@
+"""
+In-memory compression of large strings
+
+Strings of at least StringCompressor.threshold characters are kept in the
+store as a CompressedString: their UTF-8 bytes deflated with zlib at
+StringCompressor.level. Large JSON or HTML documents typically shrink to a
+fifth of their size or less, and values that don't shrink by at least
+MIN_SAVING are kept as they are.
+
+Reads decompress on the fly; a small LRU cache, bounded by the bytes it
+holds, keeps the text of the values read last so a hot key is not
+inflated again on every GET. Snapshots write the compressed bytes as they
+are (see persistence/rdb.py), so neither saving nor loading recompresses.
+"""
+
+import zlib
+from collections import OrderedDict
+from typing import Dict, Union
+
+
+DEFAULT_THRESHOLD = 4096  # characters; 0 turns compression off
+DEFAULT_LEVEL = 6
+DEFAULT_CACHE_BYTES = 4 * 1024 * 1024
+
+# Fraction of its size a value must lose to be kept compressed
+MIN_SAVING = 0.1
+
+
+class CompressedString:
+    """A string value held as its deflated UTF-8 bytes"""
+
+    __slots__ = ('data', 'size')
+
+    def __init__(self, data: bytes, size: int):
+        self.data = data
+        # Length of the UTF-8 bytes it inflates to
+        self.size = size
+
+    def decompress(self) -> bytes:
+        return zlib.decompress(self.data)
+
+    def decode(self) -> str:
+        return zlib.decompress(self.data).decode('utf-8')
+
+    def memory_usage(self) -> int:
+        return len(self.data) + 32
+
+
+class StringCompressor:
+    """Compresses large strings for a DataStore and caches their text on reads"""
+
+    def __init__(self, threshold: int = DEFAULT_THRESHOLD, level: int = DEFAULT_LEVEL,
+                 cache_bytes: int = DEFAULT_CACHE_BYTES):
+        """
+        Args:
+            threshold: Length from which strings are compressed (0 = never)
+            level: zlib compression level, 1 (fastest) to 9 (smallest)
+            cache_bytes: Decompressed bytes the LRU cache may hold
+        """
+        self.threshold = threshold
+        self.level = level
+        self.cache_bytes = cache_bytes
+
+        # key -> (CompressedString, its text), least recently read first
+        self._cache: "OrderedDict[str, tuple]" = OrderedDict()
+        self._cached_bytes = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+        # Totals over the compressed values in the store
+        self.compressed_values = 0
+        self.raw_bytes = 0
+        self.compressed_bytes = 0
+
+    def compress(self, value: str) -> Union[str, CompressedString]:
+        """value as a CompressedString if it is large enough and shrinks enough, else value"""
+        if not self.threshold or len(value) < self.threshold:
+            return value
+        data = value.encode('utf-8')
+        compressed = zlib.compress(data, self.level)
+        if len(compressed) > len(data) * (1 - MIN_SAVING):
+            return value
+        return CompressedString(compressed, len(data))
+
+    def decompress(self, key: str, value: CompressedString) -> str:
+        """Text of key's compressed value, from the cache if it was read lately"""
+        cache = self._cache
+        cached = cache.get(key)
+        if cached is not None and cached[0] is value:
+            cache.move_to_end(key)
+            self.cache_hits += 1
+            return cached[1]
+
+        self.cache_misses += 1
+        text = value.decode()
+        if value.size <= self.cache_bytes:
+            self.forget(key)
+            cache[key] = (value, text)
+            self._cached_bytes += value.size
+            while self._cached_bytes > self.cache_bytes:
+                _, (evicted, _) = cache.popitem(last=False)
+                self._cached_bytes -= evicted.size
+        return text
+
+    def forget(self, key: str) -> None:
+        """Drop key's cached text (its value changed or is gone)"""
+        cached = self._cache.pop(key, None)
+        if cached is not None:
+            self._cached_bytes -= cached[0].size
+
+    def added(self, value: CompressedString) -> None:
+        self.compressed_values += 1
+        self.raw_bytes += value.size
+        self.compressed_bytes += len(value.data)
+
+    def removed(self, key: str, value: CompressedString) -> None:
+        self.compressed_values -= 1
+        self.raw_bytes -= value.size
+        self.compressed_bytes -= len(value.data)
+        self.forget(key)
+
+    def merge(self, other: 'StringCompressor') -> None:
+        """Count the compressed values of another store moved into this one"""
+        self.compressed_values += other.compressed_values
+        self.raw_bytes += other.raw_bytes
+        self.compressed_bytes += other.compressed_bytes
+
+    def clear(self) -> None:
+        """Forget every value (the store was flushed)"""
+        self._cache.clear()
+        self._cached_bytes = 0
+        self.compressed_values = self.raw_bytes = self.compressed_bytes = 0
+
+    def compression_ratio(self) -> float:
+        """Bytes the compressed values inflate to per byte they take"""
+        return self.raw_bytes / self.compressed_bytes if self.compressed_bytes else 1.0
+
+    def stats(self) -> Dict[str, Union[int, float]]:
+        return {
+            'compressed_values': self.compressed_values,
+            'raw_bytes': self.raw_bytes,
+            'compressed_bytes': self.compressed_bytes,
+            'compression_ratio': self.compression_ratio(),
+            'cache_bytes': self._cached_bytes,
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+        }
@@ -0,0 +1,26 @@
+"""
+Redis Data Types Module
+
+Value types that don't map onto a plain Python builtin:
+- HyperLogLog cardinality estimator
+- Scalable Bloom and Cuckoo membership filters
+- Count-Min Sketch and HeavyKeeper Top-K frequency trackers
+- Stream append-only log with consumer groups
+- Time series of compressed sample chunks
+- Vector set with exact and HNSW similarity search
+- JSON document with path-addressed reads and writes
+- Sorted set ordered by score (geohash-scored for GEO*)
+"""
+
+from .hyperloglog import HyperLogLog
+from .bloom import BloomFilter
+from .cuckoo import CuckooFilter
+from .countmin import CountMinSketch
+from .topk import TopK
+from .stream import Stream
+from .timeseries import TimeSeries
+from .vectorset import VectorSet
+from .json_document import JSONDocument
+from .sorted_set import SortedSet
+
+__all__ = ['HyperLogLog', 'BloomFilter', 'CuckooFilter', 'CountMinSketch', 'TopK', 'Stream', 'TimeSeries', 'VectorSet', 'JSONDocument', 'SortedSet']
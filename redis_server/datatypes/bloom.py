@@ -0,0 +1,184 @@
+"""
+Scalable Bloom Filter Implementation
+
+A stack of bytearray bit arrays. Positions come from double hashing of one
+128-bit digest per item. When the newest sub-filter reaches its capacity, a
+larger sub-filter with a tighter error rate is added.
+"""
+
+import math
+import struct
+import hashlib
+from typing import List, Tuple
+
+
+DEFAULT_ERROR_RATE = 0.01
+DEFAULT_CAPACITY = 100
+DEFAULT_EXPANSION = 2
+TIGHTENING_RATIO = 0.5   # Each new sub-filter halves its error rate
+
+_HEADER = struct.Struct('<dQIB')            # error_rate, capacity, expansion, scaling
+_LAYER_HEADER = struct.Struct('<dQQQI')     # error_rate, capacity, count, num_bits, num_hashes
+
+
+def hash_pair(item) -> Tuple[int, int]:
+    """Two independent 64-bit hashes for double hashing (h1 + i*h2)"""
+    if isinstance(item, str):
+        item = item.encode('utf-8')
+    digest = hashlib.blake2b(bytes(item), digest_size=16).digest()
+    h1 = int.from_bytes(digest[:8], 'little')
+    h2 = int.from_bytes(digest[8:], 'little') | 1   # Odd, so it never degenerates to 0
+    return h1, h2
+
+
+class BloomLayer:
+    """A single fixed-size Bloom filter"""
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.count = 0
+        # Optimal size for the requested capacity and error rate
+        self.num_bits = max(8, math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, math.ceil(self.num_bits / capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+
+    def contains(self, h1: int, h2: int) -> bool:
+        bits = self.bits
+        num_bits = self.num_bits
+        for i in range(self.num_hashes):
+            position = (h1 + i * h2) % num_bits
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    def add(self, h1: int, h2: int) -> None:
+        bits = self.bits
+        num_bits = self.num_bits
+        for i in range(self.num_hashes):
+            position = (h1 + i * h2) % num_bits
+            bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def is_full(self) -> bool:
+        return self.count >= self.capacity
+
+
+class BloomFilter:
+    """Scalable Bloom filter backing the BF.* commands"""
+
+    def __init__(self, error_rate: float = DEFAULT_ERROR_RATE, capacity: int = DEFAULT_CAPACITY,
+                 expansion: int = DEFAULT_EXPANSION, scaling: bool = True):
+        if not 0 < error_rate < 1:
+            raise ValueError("(0 < error rate range < 1)")
+        if capacity < 1:
+            raise ValueError("(capacity should be larger than 0)")
+        if not 1 <= expansion <= 0xFFFFFFFF:
+            raise ValueError("expansion should be between 1 and 4294967295")
+        self.error_rate = error_rate
+        self.capacity = capacity
+        self.expansion = expansion
+        self.scaling = scaling
+        self.layers: List[BloomLayer] = [BloomLayer(capacity, error_rate)]
+
+    def add(self, item) -> bool:
+        """
+        Add an item to the filter
+
+        Returns:
+            True if the item was added, False if it may already exist
+        """
+        h1, h2 = hash_pair(item)
+        if self._contains_hashes(h1, h2):
+            return False
+
+        layer = self.layers[-1]
+        if layer.is_full():
+            if not self.scaling:
+                raise ValueError("non scaling filter is full")
+            layer = BloomLayer(layer.capacity * self.expansion, layer.error_rate * TIGHTENING_RATIO)
+            self.layers.append(layer)
+
+        layer.add(h1, h2)
+        return True
+
+    def exists(self, item) -> bool:
+        """Check if an item may exist in the filter"""
+        return self._contains_hashes(*hash_pair(item))
+
+    def _contains_hashes(self, h1: int, h2: int) -> bool:
+        # Newest layers hold the most items, so check them first
+        for layer in reversed(self.layers):
+            if layer.contains(h1, h2):
+                return True
+        return False
+
+    def __len__(self) -> int:
+        return sum(layer.count for layer in self.layers)
+
+    def get_info(self) -> dict:
+        """Filter statistics for BF.INFO"""
+        return {
+            'Capacity': sum(layer.capacity for layer in self.layers),
+            'Size': self.memory_usage(),
+            'Number of filters': len(self.layers),
+            'Number of items inserted': len(self),
+            'Expansion rate': self.expansion if self.scaling else None,
+        }
+
+    # Serialization
+
+    def to_bytes(self) -> bytes:
+        """Header followed by every layer's parameters and raw bit array"""
+        parts = [_HEADER.pack(self.error_rate, self.capacity, self.expansion, int(self.scaling)),
+                 struct.pack('<I', len(self.layers))]
+        for layer in self.layers:
+            parts.append(_LAYER_HEADER.pack(layer.error_rate, layer.capacity, layer.count,
+                                            layer.num_bits, layer.num_hashes))
+            parts.append(bytes(layer.bits))
+        return b''.join(parts)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'BloomFilter':
+        """Rebuild a filter from to_bytes() output"""
+        bloom = cls.__new__(cls)
+        bloom._restore(data)
+        return bloom
+
+    def _restore(self, data: bytes) -> None:
+        error_rate, capacity, expansion, scaling = _HEADER.unpack_from(data, 0)
+        offset = _HEADER.size
+        (layer_count,) = struct.unpack_from('<I', data, offset)
+        offset += 4
+
+        self.error_rate = error_rate
+        self.capacity = capacity
+        self.expansion = expansion
+        self.scaling = bool(scaling)
+        self.layers = []
+        for _ in range(layer_count):
+            layer_error, layer_capacity, count, num_bits, num_hashes = _LAYER_HEADER.unpack_from(data, offset)
+            offset += _LAYER_HEADER.size
+            layer = BloomLayer.__new__(BloomLayer)
+            layer.error_rate = layer_error
+            layer.capacity = layer_capacity
+            layer.count = count
+            layer.num_bits = num_bits
+            layer.num_hashes = num_hashes
+            size = (num_bits + 7) // 8
+            layer.bits = bytearray(data[offset:offset + size])
+            offset += size
+            self.layers.append(layer)
+
+    def __getstate__(self):
+        return self.to_bytes()
+
+    def __setstate__(self, state):
+        self._restore(state)
+
+    def memory_usage(self) -> int:
+        """Bytes used by the bit arrays"""
+        return sum(len(layer.bits) for layer in self.layers)
+
+    def __repr__(self) -> str:
+        return f"BloomFilter(layers={len(self.layers)}, items={len(self)}, bytes={self.memory_usage()})"
@@ -0,0 +1,114 @@
+"""
+Count-Min Sketch Implementation
+
+Approximate per-item counters in a depth x width matrix of unsigned 32-bit
+cells stored in a single array('I'). An item's count is the minimum over
+its cell in every row, so it can overestimate but never underestimate.
+"""
+
+import math
+import struct
+from array import array
+from typing import List
+
+from .bloom import hash_pair
+
+
+MAX_COUNTER = 0xFFFFFFFF
+MAX_TOTAL = 0xFFFFFFFFFFFFFFFF  # the total count is saved as a u64
+
+_HEADER = struct.Struct('<IIQ')   # width, depth, total count
+
+
+class CountMinSketch:
+    """Count-Min Sketch backing the CMS.* commands"""
+
+    def __init__(self, width: int, depth: int):
+        if width < 1 or depth < 1:
+            raise ValueError("width and depth must be positive")
+        self.width = width
+        self.depth = depth
+        self.total = 0
+        self.counters = array('I', bytes(4 * width * depth))
+
+    @classmethod
+    def from_error(cls, error: float, probability: float) -> 'CountMinSketch':
+        """Size the sketch for an overestimate of error*total with the given failure probability"""
+        if not 0 < error < 1 or not 0 < probability < 1:
+            raise ValueError("error and probability must be between 0 and 1")
+        width = math.ceil(2 / error)
+        depth = math.ceil(math.log10(probability) / math.log10(0.5))
+        return cls(width, depth)
+
+    def _cells(self, item) -> List[int]:
+        h1, h2 = hash_pair(item)
+        width = self.width
+        return [row * width + (h1 + row * h2) % width for row in range(self.depth)]
+
+    def incrby(self, item, increment: int) -> int:
+        """Increment an item's counters and return its new estimated count"""
+        counters = self.counters
+        estimate = MAX_COUNTER
+        for cell in self._cells(item):
+            value = min(counters[cell] + increment, MAX_COUNTER)
+            counters[cell] = value
+            estimate = min(estimate, value)
+        self.total = min(self.total + increment, MAX_TOTAL)
+        return estimate
+
+    def query(self, item) -> int:
+        """Estimated count of an item"""
+        counters = self.counters
+        return min(counters[cell] for cell in self._cells(item))
+
+    def merge(self, sources: List['CountMinSketch'], weights: List[int]) -> None:
+        """Replace this sketch with the weighted sum of the sources (weights can't be negative)"""
+        if any(weight < 0 for weight in weights):
+            raise ValueError("invalid weight value")
+        for source in sources:
+            if source.width != self.width or source.depth != self.depth:
+                raise ValueError("width/depth is not equal")
+
+        # Column-wise sums run in C via map/zip rather than a Python index loop
+        if all(weight == 1 for weight in weights):
+            summed = map(sum, zip(*(source.counters for source in sources)))
+        else:
+            summed = (sum(value * weight for value, weight in zip(cells, weights))
+                      for cells in zip(*(source.counters for source in sources)))
+        self.counters = array('I', (min(max(value, 0), MAX_COUNTER) for value in summed))
+        self.total = min(sum(source.total * weight for source, weight in zip(sources, weights)), MAX_TOTAL)
+
+    def get_info(self) -> dict:
+        """Sketch statistics for CMS.INFO"""
+        return {'width': self.width, 'depth': self.depth, 'count': self.total}
+
+    # Serialization
+
+    def to_bytes(self) -> bytes:
+        """Dimensions and total followed by the raw counter matrix"""
+        return _HEADER.pack(self.width, self.depth, self.total) + self.counters.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'CountMinSketch':
+        """Rebuild a sketch from to_bytes() output"""
+        sketch = cls.__new__(cls)
+        sketch._restore(data)
+        return sketch
+
+    def _restore(self, data: bytes) -> None:
+        self.width, self.depth, self.total = _HEADER.unpack_from(data, 0)
+        self.counters = array('I')
+        self.counters.frombytes(data[_HEADER.size:])
+
+    def __getstate__(self):
+        return self.to_bytes()
+
+    def __setstate__(self, state):
+        self._restore(state)
+
+    def memory_usage(self) -> int:
+        """Bytes used by the counter matrix"""
+        return len(self.counters) * self.counters.itemsize
+
+    def __repr__(self) -> str:
+        return f"CountMinSketch(width={self.width}, depth={self.depth}, count={self.total})"
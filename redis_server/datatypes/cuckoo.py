@@ -0,0 +1,225 @@
+"""
+Scalable Cuckoo Filter Implementation
+
+Buckets of one-byte fingerprints in a bytearray (0 marks an empty slot).
+Each item has two candidate buckets related by XOR with the fingerprint's
+hash, so items can be relocated and deleted without knowing the original
+value. When a sub-filter can't place an item, a new sub-filter is added.
+"""
+
+import random
+import struct
+import hashlib
+from typing import List, Tuple
+
+
+DEFAULT_CAPACITY = 1024
+DEFAULT_BUCKET_SIZE = 2
+DEFAULT_MAX_ITERATIONS = 20
+DEFAULT_EXPANSION = 1
+
+_HEADER = struct.Struct('<QHHHQI')      # capacity, bucket_size, max_iterations, expansion, items, layers
+_LAYER_HEADER = struct.Struct('<Q')     # num_buckets
+
+
+def fingerprint_hash(item) -> Tuple[int, int]:
+    """Return (bucket hash, fingerprint) for an item; fingerprints are 1..255"""
+    if isinstance(item, str):
+        item = item.encode('utf-8')
+    value = int.from_bytes(hashlib.blake2b(bytes(item), digest_size=8).digest(), 'little')
+    return value & 0xFFFFFFFF, (value >> 32) % 255 + 1
+
+
+class CuckooLayer:
+    """A single fixed-size cuckoo filter"""
+
+    def __init__(self, capacity: int, bucket_size: int):
+        self.bucket_size = bucket_size
+        # Power-of-two bucket count keeps the XOR alternate index symmetric
+        buckets = max(1, -(-capacity // bucket_size))
+        self.num_buckets = 1 << (buckets - 1).bit_length()
+        self.slots = bytearray(self.num_buckets * bucket_size)
+
+    def candidates(self, index_hash: int, fingerprint: int) -> Tuple[int, int]:
+        first = index_hash & (self.num_buckets - 1)
+        return first, self.alternate(first, fingerprint)
+
+    def alternate(self, bucket: int, fingerprint: int) -> int:
+        return (bucket ^ ((fingerprint * 0x5BD1E995) & 0xFFFFFFFF)) & (self.num_buckets - 1)
+
+    def find(self, bucket: int, fingerprint: int) -> int:
+        """Absolute slot index of fingerprint in the bucket, or -1"""
+        start = bucket * self.bucket_size
+        return self.slots.find(fingerprint, start, start + self.bucket_size)
+
+    def insert(self, index_hash: int, fingerprint: int, max_iterations: int) -> bool:
+        first, second = self.candidates(index_hash, fingerprint)
+        for bucket in (first, second):
+            slot = self.find(bucket, 0)
+            if slot != -1:
+                self.slots[slot] = fingerprint
+                return True
+
+        # Both buckets full: evict fingerprints along a random walk
+        path = []
+        bucket = random.choice((first, second))
+        for _ in range(max_iterations):
+            slot = bucket * self.bucket_size + random.randrange(self.bucket_size)
+            victim = self.slots[slot]
+            self.slots[slot] = fingerprint
+            path.append((slot, victim))
+
+            fingerprint = victim
+            bucket = self.alternate(bucket, fingerprint)
+            free = self.find(bucket, 0)
+            if free != -1:
+                self.slots[free] = fingerprint
+                return True
+
+        # Undo the evictions so no existing item is lost
+        for slot, victim in reversed(path):
+            self.slots[slot] = victim
+        return False
+
+    def count(self, index_hash: int, fingerprint: int) -> int:
+        first, second = self.candidates(index_hash, fingerprint)
+        total = 0
+        for bucket in ((first,) if first == second else (first, second)):
+            start = bucket * self.bucket_size
+            total += self.slots.count(fingerprint, start, start + self.bucket_size)
+        return total
+
+    def delete(self, index_hash: int, fingerprint: int) -> bool:
+        for bucket in self.candidates(index_hash, fingerprint):
+            slot = self.find(bucket, fingerprint)
+            if slot != -1:
+                self.slots[slot] = 0
+                return True
+        return False
+
+
+class CuckooFilter:
+    """Scalable cuckoo filter backing the CF.* commands"""
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY, bucket_size: int = DEFAULT_BUCKET_SIZE,
+                 max_iterations: int = DEFAULT_MAX_ITERATIONS, expansion: int = DEFAULT_EXPANSION):
+        if capacity < 1:
+            raise ValueError("Capacity must be a positive integer")
+        if not 1 <= bucket_size <= 255:
+            raise ValueError("Bucket size must be between 1 and 255")
+        if not 1 <= max_iterations <= 65535:
+            raise ValueError("Max iterations must be between 1 and 65535")
+        if not 0 <= expansion <= 65535:
+            raise ValueError("Expansion must be between 0 and 65535")
+        self.capacity = capacity
+        self.bucket_size = bucket_size
+        self.max_iterations = max_iterations
+        self.expansion = expansion
+        self.num_items = 0
+        self.layers: List[CuckooLayer] = [CuckooLayer(capacity, bucket_size)]
+
+    def add(self, item) -> bool:
+        """
+        Add an item (duplicates allowed)
+
+        Raises:
+            ValueError: if the filter is full and may not expand
+        """
+        index_hash, fingerprint = fingerprint_hash(item)
+        if not self.layers[-1].insert(index_hash, fingerprint, self.max_iterations):
+            if self.expansion == 0:
+                raise ValueError("Filter is full")
+            last = self.layers[-1]
+            layer = CuckooLayer(last.num_buckets * last.bucket_size * self.expansion, self.bucket_size)
+            self.layers.append(layer)
+            layer.insert(index_hash, fingerprint, self.max_iterations)
+        self.num_items += 1
+        return True
+
+    def add_nx(self, item) -> bool:
+        """Add an item only if it doesn't seem to exist yet"""
+        if self.exists(item):
+            return False
+        return self.add(item)
+
+    def exists(self, item) -> bool:
+        """Check if an item may exist in the filter"""
+        index_hash, fingerprint = fingerprint_hash(item)
+        for layer in self.layers:
+            first, second = layer.candidates(index_hash, fingerprint)
+            if layer.find(first, fingerprint) != -1 or layer.find(second, fingerprint) != -1:
+                return True
+        return False
+
+    def count(self, item) -> int:
+        """Approximate number of times an item was added"""
+        index_hash, fingerprint = fingerprint_hash(item)
+        return sum(layer.count(index_hash, fingerprint) for layer in self.layers)
+
+    def delete(self, item) -> bool:
+        """Delete one occurrence of an item"""
+        index_hash, fingerprint = fingerprint_hash(item)
+        for layer in reversed(self.layers):
+            if layer.delete(index_hash, fingerprint):
+                self.num_items -= 1
+                return True
+        return False
+
+    def get_info(self) -> dict:
+        """Filter statistics for CF.INFO"""
+        return {
+            'Size': self.memory_usage(),
+            'Number of buckets': sum(layer.num_buckets for layer in self.layers),
+            'Number of filters': len(self.layers),
+            'Number of items inserted': self.num_items,
+            'Bucket size': self.bucket_size,
+            'Expansion rate': self.expansion,
+            'Max iterations': self.max_iterations,
+        }
+
+    # Serialization
+
+    def to_bytes(self) -> bytes:
+        """Header followed by every layer's bucket count and fingerprint slots"""
+        parts = [_HEADER.pack(self.capacity, self.bucket_size, self.max_iterations,
+                              self.expansion, self.num_items, len(self.layers))]
+        for layer in self.layers:
+            parts.append(_LAYER_HEADER.pack(layer.num_buckets))
+            parts.append(bytes(layer.slots))
+        return b''.join(parts)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'CuckooFilter':
+        """Rebuild a filter from to_bytes() output"""
+        cuckoo = cls.__new__(cls)
+        cuckoo._restore(data)
+        return cuckoo
+
+    def _restore(self, data: bytes) -> None:
+        (self.capacity, self.bucket_size, self.max_iterations,
+         self.expansion, self.num_items, layer_count) = _HEADER.unpack_from(data, 0)
+        offset = _HEADER.size
+        self.layers = []
+        for _ in range(layer_count):
+            (num_buckets,) = _LAYER_HEADER.unpack_from(data, offset)
+            offset += _LAYER_HEADER.size
+            layer = CuckooLayer.__new__(CuckooLayer)
+            layer.bucket_size = self.bucket_size
+            layer.num_buckets = num_buckets
+            size = num_buckets * self.bucket_size
+            layer.slots = bytearray(data[offset:offset + size])
+            offset += size
+            self.layers.append(layer)
+
+    def __getstate__(self):
+        return self.to_bytes()
+
+    def __setstate__(self, state):
+        self._restore(state)
+
+    def memory_usage(self) -> int:
+        """Bytes used by the fingerprint slots"""
+        return sum(len(layer.slots) for layer in self.layers)
+
+    def __repr__(self) -> str:
+        return f"CuckooFilter(layers={len(self.layers)}, items={self.num_items}, bytes={self.memory_usage()})"
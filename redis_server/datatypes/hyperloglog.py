@@ -0,0 +1,284 @@
+"""
+HyperLogLog Implementation
+
+Probabilistic cardinality estimator with a sparse encoding for small sets and
+a 12KB dense encoding (16384 packed 6-bit registers) once it grows.
+"""
+
+import math
+import hashlib
+from array import array
+from bisect import bisect_left
+from typing import List, Optional
+
+
+HLL_P = 14                          # Precision: 2^14 registers
+HLL_REGISTERS = 1 << HLL_P          # 16384 registers
+HLL_BITS = 6                        # Bits per dense register
+HLL_Q = 64 - HLL_P                  # Bits left for the run of zeros
+HLL_DENSE_SIZE = (HLL_REGISTERS * HLL_BITS + 7) // 8   # 12288 bytes
+HLL_SPARSE_MAX_ENTRIES = 750        # ~3000 bytes before promoting to dense
+HLL_ALPHA_INF = 0.5 / math.log(2)
+
+SPARSE = 'sparse'
+DENSE = 'dense'
+
+# SWAR masks for converting between packed 6-bit registers and one register per byte
+_LANE_HIGH = int.from_bytes(b'\x80' * HLL_REGISTERS, 'little')
+_LANE_ALL = int.from_bytes(b'\xff' * HLL_REGISTERS, 'little')
+_spread_masks: Optional[List[tuple]] = None
+
+
+def _get_spread_masks() -> List[tuple]:
+    """
+    Build (half, keep_mask, move_mask) per level for spreading packed 6-bit
+    registers into 8-bit lanes. Each level moves the upper half of every block
+    of 2*half registers up by 2*half bits, so 14 big-int operations replace a
+    16384 iteration Python loop.
+    """
+    global _spread_masks
+    if _spread_masks is None:
+        masks = []
+        half = HLL_REGISTERS // 2
+        while half >= 1:
+            block_bytes = 2 * half  # a block of 2*half registers is 16*half bits once spread
+            keep = ((1 << (HLL_BITS * half)) - 1).to_bytes(block_bytes, 'little')
+            move = (((1 << (HLL_BITS * half)) - 1) << (HLL_BITS * half)).to_bytes(block_bytes, 'little')
+            repeat = HLL_REGISTERS // (2 * half)
+            masks.append((
+                half,
+                int.from_bytes(keep * repeat, 'little'),
+                int.from_bytes(move * repeat, 'little'),
+            ))
+            half //= 2
+        _spread_masks = masks
+    return _spread_masks
+
+
+def _hash_element(element) -> int:
+    """Stable 64-bit hash of an element (Python's hash() is salted per process)"""
+    if isinstance(element, str):
+        element = element.encode('utf-8')
+    return int.from_bytes(hashlib.blake2b(bytes(element), digest_size=8).digest(), 'little')
+
+
+def _tau(x: float) -> float:
+    if x == 0.0 or x == 1.0:
+        return 0.0
+    y = 1.0
+    z = 1 - x
+    while True:
+        x = math.sqrt(x)
+        z_prev = z
+        y *= 0.5
+        z -= (1 - x) ** 2 * y
+        if z_prev == z:
+            return z / 3
+
+
+def _sigma(x: float) -> float:
+    if x == 1.0:
+        return math.inf
+    y = 1.0
+    z = x
+    while True:
+        x *= x
+        z_prev = z
+        z += x * y
+        y += y
+        if z_prev == z:
+            return z
+
+
+class HyperLogLog:
+    """HyperLogLog with sparse and dense register encodings"""
+
+    def __init__(self):
+        self.encoding = SPARSE
+        # Sparse: sorted entries of (register_index << 6 | register_value)
+        self._sparse = array('I')
+        # Dense: 16384 registers packed 6 bits each, LSB first
+        self._dense: Optional[bytearray] = None
+        self._cached_cardinality: Optional[int] = None
+
+    # Element insertion
+
+    def add(self, *elements) -> bool:
+        """
+        Add elements to the HyperLogLog
+
+        Returns:
+            True if at least one register was altered
+        """
+        changed = False
+        for element in elements:
+            hash_value = _hash_element(element)
+            index = hash_value & (HLL_REGISTERS - 1)
+            # Run of zeros in the remaining bits, +1. Forcing bit Q keeps it <= Q+1
+            remaining = (hash_value >> HLL_P) | (1 << HLL_Q)
+            count = (remaining & -remaining).bit_length()
+            if self._update_register(index, count):
+                changed = True
+
+        if changed:
+            self._cached_cardinality = None
+        return changed
+
+    def _update_register(self, index: int, count: int) -> bool:
+        if self.encoding == SPARSE:
+            position = bisect_left(self._sparse, index << HLL_BITS)
+            if position < len(self._sparse) and self._sparse[position] >> HLL_BITS == index:
+                if self._sparse[position] & 63 >= count:
+                    return False
+                self._sparse[position] = (index << HLL_BITS) | count
+                return True
+
+            if len(self._sparse) >= HLL_SPARSE_MAX_ENTRIES:
+                self._promote_to_dense()
+            else:
+                self._sparse.insert(position, (index << HLL_BITS) | count)
+                return True
+
+        if self._get_dense_register(index) >= count:
+            return False
+        self._set_dense_register(index, count)
+        return True
+
+    def _get_dense_register(self, index: int) -> int:
+        bit_offset = index * HLL_BITS
+        byte = bit_offset >> 3
+        shift = bit_offset & 7
+        value = self._dense[byte] >> shift
+        if shift > 8 - HLL_BITS and byte + 1 < HLL_DENSE_SIZE:
+            value |= self._dense[byte + 1] << (8 - shift)
+        return value & 63
+
+    def _set_dense_register(self, index: int, value: int) -> None:
+        bit_offset = index * HLL_BITS
+        byte = bit_offset >> 3
+        shift = bit_offset & 7
+        self._dense[byte] = (self._dense[byte] & ~(63 << shift) & 0xFF) | ((value << shift) & 0xFF)
+        if shift > 8 - HLL_BITS:
+            self._dense[byte + 1] = (self._dense[byte + 1] & ~(63 >> (8 - shift)) & 0xFF) | (value >> (8 - shift))
+
+    def _promote_to_dense(self) -> None:
+        """Switch from the sparse to the dense representation"""
+        self._dense = bytearray(HLL_DENSE_SIZE)
+        for entry in self._sparse:
+            self._set_dense_register(entry >> HLL_BITS, entry & 63)
+        self._sparse = array('I')
+        self.encoding = DENSE
+
+    # Register lanes: one register per byte, used for counting and merging
+
+    def to_lanes(self) -> bytes:
+        """Return all registers as 16384 bytes, one register per byte"""
+        if self.encoding == SPARSE:
+            lanes = bytearray(HLL_REGISTERS)
+            for entry in self._sparse:
+                lanes[entry >> HLL_BITS] = entry & 63
+            return bytes(lanes)
+
+        value = int.from_bytes(self._dense, 'little')
+        for half, keep, move in _get_spread_masks():
+            value = (value & keep) | ((value & move) << (2 * half))
+        return value.to_bytes(HLL_REGISTERS, 'little')
+
+    def load_lanes(self, lanes: bytes) -> None:
+        """Replace all registers from 16384 one-per-byte lanes (always dense)"""
+        value = int.from_bytes(lanes, 'little')
+        for half, keep, move in reversed(_get_spread_masks()):
+            value = (value & keep) | ((value >> (2 * half)) & move)
+        self._dense = bytearray(value.to_bytes(HLL_DENSE_SIZE, 'little'))
+        self._sparse = array('I')
+        self.encoding = DENSE
+        self._cached_cardinality = None
+
+    @staticmethod
+    def max_lanes(first: bytes, second: bytes) -> bytes:
+        """Register-wise max of two lane buffers using SWAR big-int arithmetic"""
+        a = int.from_bytes(first, 'little')
+        b = int.from_bytes(second, 'little')
+        # Registers are < 64, so setting the high bit of every lane in `a`
+        # means the subtraction never borrows across lanes; the high bit
+        # survives exactly where a >= b
+        a_ge_b = (((a | _LANE_HIGH) - b) & _LANE_HIGH) >> 7
+        mask = a_ge_b * 0xFF
+        result = (a & mask) | (b & (mask ^ _LANE_ALL))
+        return result.to_bytes(HLL_REGISTERS, 'little')
+
+    def merge(self, *others: 'HyperLogLog') -> None:
+        """Merge other HyperLogLogs into this one (result is dense)"""
+        lanes = self.to_lanes()
+        for other in others:
+            lanes = self.max_lanes(lanes, other.to_lanes())
+        self.load_lanes(lanes)
+
+    # Cardinality estimation
+
+    def count(self) -> int:
+        """Estimated cardinality, cached until the registers change"""
+        if self._cached_cardinality is None:
+            self._cached_cardinality = self.estimate_lanes(self.to_lanes())
+        return self._cached_cardinality
+
+    @staticmethod
+    def estimate_lanes(lanes: bytes) -> int:
+        """Ertl's improved estimator over the register histogram"""
+        histogram = [lanes.count(value) for value in range(HLL_Q + 2)]
+        m = HLL_REGISTERS
+        if histogram[0] == m:
+            return 0
+
+        z = m * _tau((m - histogram[HLL_Q + 1]) / m)
+        for j in range(HLL_Q, 0, -1):
+            z += histogram[j]
+            z *= 0.5
+        z += m * _sigma(histogram[0] / m)
+        return int(round(HLL_ALPHA_INF * m * m / z))
+
+    # Serialization
+
+    def to_bytes(self) -> bytes:
+        """Compact representation: encoding tag followed by the registers"""
+        if self.encoding == SPARSE:
+            return b'S' + self._sparse.tobytes()
+        return b'D' + bytes(self._dense)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'HyperLogLog':
+        """Rebuild a HyperLogLog from to_bytes() output"""
+        hll = cls()
+        hll._restore(data)
+        return hll
+
+    def _restore(self, data: bytes) -> None:
+        self._cached_cardinality = None
+        if data[:1] == b'D':
+            if len(data) != HLL_DENSE_SIZE + 1:
+                raise ValueError("Invalid dense HyperLogLog payload")
+            self.encoding = DENSE
+            self._dense = bytearray(data[1:])
+            self._sparse = array('I')
+        elif data[:1] == b'S':
+            self.encoding = SPARSE
+            self._sparse = array('I')
+            self._sparse.frombytes(data[1:])
+            self._dense = None
+        else:
+            raise ValueError("Invalid HyperLogLog payload")
+
+    def __getstate__(self):
+        return self.to_bytes()
+
+    def __setstate__(self, state):
+        self._restore(state)
+
+    def memory_usage(self) -> int:
+        """Approximate bytes used by the registers"""
+        if self.encoding == SPARSE:
+            return len(self._sparse) * self._sparse.itemsize
+        return HLL_DENSE_SIZE
+
+    def __repr__(self) -> str:
+        return f"HyperLogLog(encoding={self.encoding}, bytes={self.memory_usage()})"
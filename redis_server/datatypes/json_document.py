@@ -0,0 +1,279 @@
+"""
+JSON Document Implementation
+
+A JSON value kept as a parsed tree of dicts, lists and scalars, addressed
+with a JSONPath subset:
+
+    $ / .                  the root
+    $.a.b  .a.b  a.b       object members
+    $['a b']               bracketed member names
+    $.list[0]  [-1]        array elements (negative counts from the end)
+    $.*  $.list[*]         every member / element
+    $..name                recursive descent
+
+Paths starting with '$' may match many nodes and commands answer with one
+result per match; legacy paths (without '$') address a single node.
+
+Writes walk only the path, so changing a field costs O(depth), and the
+document's size is kept up to date from per-node estimates of the part
+that changed rather than by re-measuring the whole tree.
+"""
+
+import json
+import re
+from functools import lru_cache
+from typing import Any, List, Optional, Tuple
+
+
+_STEP = re.compile(r"""
+      \.\.(?P<descend>[^.\[\]]+|\*)
+    | \.(?P<member>[^.\[\]]+)
+    | \[\s*(?P<quoted>'(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*")\s*\]
+    | \[\s*(?P<index>-?\d+)\s*\]
+    | \[\s*(?P<wild>\*)\s*\]
+""", re.VERBOSE)
+
+
+class PathError(ValueError):
+    """Raised for malformed paths"""
+
+
+@lru_cache(maxsize=256)
+def parse_path(path: str) -> Tuple[Tuple[Tuple[str, Any], ...], bool]:
+    """
+    Parse a path into steps of ('member', name), ('index', i), ('wild', None)
+    or ('descend', name), plus whether it is a '$' JSONPath
+    """
+    is_jsonpath = path.startswith('$')
+    if is_jsonpath:
+        rest = path[1:]
+    elif path == '.':
+        rest = ''
+    else:
+        rest = path if path.startswith(('.', '[')) else '.' + path
+
+    steps = []
+    position = 0
+    while position < len(rest):
+        match = _STEP.match(rest, position)
+        if not match:
+            raise PathError(f"JSON Path error: path error at offset {position + 1} of '{path}'")
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == 'member':
+            steps.append(('wild', None) if value == '*' else ('member', value))
+        elif kind == 'quoted':
+            steps.append(('member', value[1:-1]))
+        elif kind == 'index':
+            steps.append(('index', int(value)))
+        elif kind == 'wild':
+            steps.append(('wild', None))
+        else:
+            steps.append(('descend', value))
+        position = match.end()
+    return tuple(steps), is_jsonpath
+
+
+def node_size(value: Any) -> int:
+    """Approximate bytes held by a node and everything under it"""
+    if isinstance(value, dict):
+        return 64 + sum(49 + len(key) + node_size(item) for key, item in value.items())
+    if isinstance(value, list):
+        return 56 + sum(8 + node_size(item) for item in value)
+    if isinstance(value, str):
+        return 49 + len(value)
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return 28
+    return 16  # true/false/null are shared singletons, count the reference
+
+
+def type_name(value: Any) -> str:
+    if isinstance(value, bool):
+        return "boolean"
+    if isinstance(value, dict):
+        return "object"
+    if isinstance(value, list):
+        return "array"
+    if isinstance(value, str):
+        return "string"
+    if isinstance(value, int):
+        return "integer"
+    if isinstance(value, float):
+        return "number"
+    return "null"
+
+
+def dumps(value: Any) -> str:
+    return json.dumps(value, separators=(',', ':'), ensure_ascii=False)
+
+
+# A match: (parent container or None for the root, key or index in parent, value)
+Match = Tuple[Any, Any, Any]
+
+
+class JSONDocument:
+    """Parsed JSON value backing the JSON.* commands"""
+
+    def __init__(self, root: Any = None):
+        self.root = root
+        self._size = node_size(root)
+
+    @classmethod
+    def parse(cls, text: str) -> 'JSONDocument':
+        return cls(json.loads(text))
+
+    # Path resolution
+
+    def _resolve(self, steps) -> List[Match]:
+        matches: List[Match] = [(None, None, self.root)]
+        for kind, arg in steps:
+            found: List[Match] = []
+            for _, _, node in matches:
+                if kind == 'member':
+                    if isinstance(node, dict) and arg in node:
+                        found.append((node, arg, node[arg]))
+                elif kind == 'index':
+                    if isinstance(node, list) and -len(node) <= arg < len(node):
+                        index = arg % len(node)
+                        found.append((node, index, node[index]))
+                elif kind == 'wild':
+                    found.extend(self._children(node))
+                else:
+                    self._descend(node, arg, found)
+            matches = found
+            if not matches:
+                break
+        return matches
+
+    def _children(self, node) -> List[Match]:
+        if isinstance(node, dict):
+            return [(node, key, value) for key, value in node.items()]
+        if isinstance(node, list):
+            return [(node, index, value) for index, value in enumerate(node)]
+        return []
+
+    def _descend(self, node, name, found: List[Match]) -> None:
+        """Recursive descent: name (or every child for '*') at any depth below node"""
+        for match in self._children(node):
+            _, key, value = match
+            if name == '*' or key == name:
+                found.append(match)
+            self._descend(value, name, found)
+
+    def get(self, path: str) -> Tuple[List[Any], bool]:
+        """Values matched by path, and whether path was a '$' JSONPath"""
+        steps, is_jsonpath = parse_path(path)
+        return [value for _, _, value in self._resolve(steps)], is_jsonpath
+
+    # Writes
+
+    def _replace(self, parent, key, value) -> None:
+        if parent is None:
+            self._size += node_size(value) - node_size(self.root)
+            self.root = value
+        else:
+            self._size += node_size(value) - node_size(parent[key])
+            parent[key] = value
+
+    def set(self, path: str, value: Any, nx: bool = False, xx: bool = False) -> bool:
+        """
+        Replace the nodes matched by path, or add a member when only the last
+        step is missing. Returns False when NX/XX or a missing parent prevent it.
+        """
+        steps, _ = parse_path(path)
+        matches = self._resolve(steps)
+        if matches:
+            if nx:
+                return False
+            for parent, key, _ in matches:
+                self._replace(parent, key, value)
+            return True
+
+        if xx or not steps or steps[-1][0] != 'member':
+            return False
+        name = steps[-1][1]
+        parents = [node for _, _, node in self._resolve(steps[:-1]) if isinstance(node, dict)]
+        for parent in parents:
+            parent[name] = value
+            self._size += 49 + len(name) + node_size(value)
+        return bool(parents)
+
+    def delete(self, path: str) -> int:
+        """Remove matched nodes, returning how many; deleting the root is left to the caller"""
+        steps, _ = parse_path(path)
+        if not steps:
+            return 0
+        matches = self._resolve(steps)
+        # Delete array elements from the back so earlier indexes stay valid
+        for parent, key, value in sorted(matches, key=lambda match: match[1] if isinstance(match[1], int) else 0,
+                                         reverse=True):
+            self._size -= node_size(value) + (49 + len(key) if isinstance(parent, dict) else 8)
+            del parent[key]
+        return len(matches)
+
+    def numincrby(self, path: str, increment: float) -> List[Optional[float]]:
+        """Add increment to matched numbers; None for non-numeric matches"""
+        steps, _ = parse_path(path)
+        results = []
+        for parent, key, value in self._resolve(steps):
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                results.append(None)
+                continue
+            new_value = value + increment
+            self._replace(parent, key, new_value)
+            results.append(new_value)
+        return results
+
+    def arrappend(self, path: str, values: List[Any]) -> List[Optional[int]]:
+        """Append values to matched arrays, returning their new lengths (None for non-arrays)"""
+        steps, _ = parse_path(path)
+        results = []
+        for _, _, node in self._resolve(steps):
+            if not isinstance(node, list):
+                results.append(None)
+                continue
+            node.extend(values)
+            self._size += sum(8 + node_size(value) for value in values)
+            results.append(len(node))
+        return results
+
+    def objlen(self, path: str) -> List[Optional[int]]:
+        steps, _ = parse_path(path)
+        return [len(node) if isinstance(node, dict) else None for _, _, node in self._resolve(steps)]
+
+    def arrlen(self, path: str) -> List[Optional[int]]:
+        steps, _ = parse_path(path)
+        return [len(node) if isinstance(node, list) else None for _, _, node in self._resolve(steps)]
+
+    def types(self, path: str) -> List[str]:
+        steps, _ = parse_path(path)
+        return [type_name(node) for _, _, node in self._resolve(steps)]
+
+    # Serialization
+
+    def to_bytes(self) -> bytes:
+        """Compact JSON text (no whitespace)"""
+        return dumps(self.root).encode('utf-8')
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'JSONDocument':
+        """Rebuild a document from to_bytes() output"""
+        document = cls.__new__(cls)
+        document._restore(data)
+        return document
+
+    def _restore(self, data: bytes) -> None:
+        self.__init__(json.loads(data.decode('utf-8')))
+
+    def __getstate__(self):
+        return self.to_bytes()
+
+    def __setstate__(self, state):
+        self._restore(state)
+
+    def memory_usage(self) -> int:
+        """Estimated bytes of the tree, maintained incrementally"""
+        return self._size
+
+    def __repr__(self) -> str:
+        return f"JSONDocument(type={type_name(self.root)}, size={self._size})"
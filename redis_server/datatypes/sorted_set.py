@@ -0,0 +1,126 @@
+"""
+Sorted Set Implementation
+
+Members ordered by score (ties broken by member name), kept as a sorted
+array('d') of scores with a parallel list of members, plus a dict from
+member to score for O(1) lookups. A score range is located with two
+binary searches over the score array and read as a contiguous slice.
+
+Geo sets are sorted sets whose scores are 52-bit geohashes, which a
+double holds exactly.
+"""
+
+import struct
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Dict, Iterator, List, Optional, Tuple
+
+
+class SortedSet:
+    """Score-ordered set backing the GEO* commands"""
+
+    def __init__(self):
+        self.scores = array('d')
+        self.members: List[str] = []
+        self.dict: Dict[str, float] = {}
+        self._member_bytes = 0
+
+    def __len__(self) -> int:
+        return len(self.members)
+
+    def __contains__(self, member: str) -> bool:
+        return member in self.dict
+
+    def _position(self, member: str, score: float) -> int:
+        """Index of member (or where it belongs) within its run of equal scores"""
+        low = bisect_left(self.scores, score)
+        high = bisect_right(self.scores, score, low)
+        return bisect_left(self.members, member, low, high)
+
+    def add(self, member: str, score: float) -> bool:
+        """Insert member or move it to a new score; True if it was new"""
+        score = float(score)
+        old_score = self.dict.get(member)
+        if old_score is not None:
+            if old_score == score:
+                return False
+            self._unlink(member, old_score)
+        position = self._position(member, score)
+        self.scores.insert(position, score)
+        self.members.insert(position, member)
+        if old_score is None:
+            self._member_bytes += len(member.encode('utf-8'))
+        self.dict[member] = score
+        return old_score is None
+
+    def remove(self, member: str) -> bool:
+        score = self.dict.pop(member, None)
+        if score is None:
+            return False
+        self._unlink(member, score)
+        self._member_bytes -= len(member.encode('utf-8'))
+        return True
+
+    def _unlink(self, member: str, score: float) -> None:
+        position = self._position(member, score)
+        del self.scores[position]
+        del self.members[position]
+
+    def score(self, member: str) -> Optional[float]:
+        return self.dict.get(member)
+
+    def range_by_score(self, low: float, high: float) -> Iterator[Tuple[str, float]]:
+        """Members with low <= score < high, in order"""
+        start = bisect_left(self.scores, low)
+        end = bisect_left(self.scores, high, start)
+        return zip(self.members[start:end], self.scores[start:end])
+
+    def items(self) -> Iterator[Tuple[str, float]]:
+        return zip(self.members, self.scores)
+
+    # Serialization
+
+    def to_bytes(self) -> bytes:
+        """Member count, the score array, then length-prefixed members in score order"""
+        parts = [struct.pack('<I', len(self.members)), self.scores.tobytes()]
+        for member in self.members:
+            encoded = member.encode('utf-8')
+            parts.append(struct.pack('<I', len(encoded)))
+            parts.append(encoded)
+        return b''.join(parts)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'SortedSet':
+        """Rebuild a sorted set from to_bytes() output"""
+        sorted_set = cls.__new__(cls)
+        sorted_set._restore(data)
+        return sorted_set
+
+    def _restore(self, data: bytes) -> None:
+        (count,) = struct.unpack_from('<I', data, 0)
+        offset = 4
+        self.scores = array('d')
+        self.scores.frombytes(data[offset:offset + 8 * count])
+        offset += 8 * count
+        self.members = []
+        self._member_bytes = 0
+        for _ in range(count):
+            (length,) = struct.unpack_from('<I', data, offset)
+            offset += 4
+            self.members.append(data[offset:offset + length].decode('utf-8'))
+            offset += length
+            self._member_bytes += length
+        self.dict = dict(zip(self.members, self.scores))
+
+    def __getstate__(self):
+        return self.to_bytes()
+
+    def __setstate__(self, state):
+        self._restore(state)
+
+    def memory_usage(self) -> int:
+        """Score array, member strings and the member -> score dict"""
+        return 8 * len(self.scores) + self._member_bytes + 100 * len(self.members)
+
+    def __repr__(self) -> str:
+        return f"SortedSet(size={len(self.members)})"
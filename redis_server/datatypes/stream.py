@@ -0,0 +1,487 @@
+"""
+Stream Implementation
+
+Append-only log of (id, fields) entries with monotonically increasing
+millisecond-sequence IDs. Entries live in fixed-size chunks; the first ID
+of every chunk is kept in a sorted list so a range lookup is a binary
+search over chunks followed by one inside the chunk. Trimming drops whole
+chunks from the head.
+"""
+
+import struct
+import time
+from bisect import bisect_left, bisect_right, insort
+from typing import Dict, Iterator, List, Optional, Tuple
+
+
+StreamID = Tuple[int, int]
+
+MIN_ID: StreamID = (0, 0)
+MAX_ID: StreamID = (2 ** 64 - 1, 2 ** 64 - 1)
+CHUNK_SIZE = 100
+
+# length, last_id, max_deleted_id, entries_added, group count
+_HEADER = struct.Struct('<QQQQQQI')
+# entry ID, field count
+_ENTRY_HEADER = struct.Struct('<QQI')
+# last_id, entries_read (-1 for unknown), pending count, consumer count
+_GROUP_HEADER = struct.Struct('<QQqII')
+# entry ID, delivery_time, delivery_count
+_PENDING = struct.Struct('<QQqQ')
+
+
+def format_id(stream_id: StreamID) -> str:
+    return f"{stream_id[0]}-{stream_id[1]}"
+
+
+def parse_id(text: str, default_seq: int = 0) -> StreamID:
+    """
+    Parse 'ms-seq' or 'ms' into a stream ID
+
+    Raises:
+        ValueError: if the ID is malformed
+    """
+    ms_part, _, seq_part = text.partition('-')
+    try:
+        ms = int(ms_part)
+        seq = int(seq_part) if seq_part else default_seq
+    except ValueError:
+        raise ValueError("Invalid stream ID specified as stream command argument")
+    if ms < 0 or seq < 0 or ms > MAX_ID[0] or seq > MAX_ID[1]:
+        raise ValueError("Invalid stream ID specified as stream command argument")
+    return ms, seq
+
+
+def increment_id(stream_id: StreamID) -> StreamID:
+    ms, seq = stream_id
+    if seq < MAX_ID[1]:
+        return ms, seq + 1
+    if ms < MAX_ID[0]:
+        return ms + 1, 0
+    raise ValueError("invalid end ID for the interval")
+
+
+def decrement_id(stream_id: StreamID) -> StreamID:
+    ms, seq = stream_id
+    if seq > 0:
+        return ms, seq - 1
+    if ms > 0:
+        return ms - 1, MAX_ID[1]
+    raise ValueError("invalid start ID for the interval")
+
+
+def now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+def _pack_text(text: str) -> bytes:
+    encoded = text.encode('utf-8')
+    return struct.pack('<I', len(encoded)) + encoded
+
+
+def _unpack_text(data: bytes, offset: int) -> Tuple[str, int]:
+    """(text, offset after it) of a _pack_text() string"""
+    (length,) = struct.unpack_from('<I', data, offset)
+    offset += 4
+    return data[offset:offset + length].decode('utf-8'), offset + length
+
+
+class StreamChunk:
+    """A run of consecutive entries: parallel lists of IDs and field lists"""
+
+    __slots__ = ('ids', 'fields')
+
+    def __init__(self):
+        self.ids: List[StreamID] = []
+        self.fields: List[List[str]] = []
+
+
+class PendingEntry:
+    """Delivery state of an entry read through a consumer group but not yet acknowledged"""
+
+    __slots__ = ('consumer', 'delivery_time', 'delivery_count')
+
+    def __init__(self, consumer: str, delivery_time: int, delivery_count: int = 1):
+        self.consumer = consumer
+        self.delivery_time = delivery_time
+        self.delivery_count = delivery_count
+
+
+class Consumer:
+    def __init__(self, name: str):
+        self.name = name
+        self.seen_time = now_ms()
+        # Sorted IDs of this consumer's pending entries
+        self.pending: List[StreamID] = []
+
+
+class ConsumerGroup:
+    """Consumer group with a pending entries list (PEL) indexed by ID and by consumer"""
+
+    def __init__(self, name: str, last_id: StreamID, entries_read: Optional[int] = None):
+        self.name = name
+        self.last_id = last_id
+        self.entries_read = entries_read
+        self.pel: Dict[StreamID, PendingEntry] = {}
+        self.pel_ids: List[StreamID] = []
+        self.consumers: Dict[str, Consumer] = {}
+
+    def get_consumer(self, name: str, create: bool = True) -> Optional[Consumer]:
+        consumer = self.consumers.get(name)
+        if consumer is None and create:
+            consumer = Consumer(name)
+            self.consumers[name] = consumer
+        return consumer
+
+    def add_pending(self, stream_id: StreamID, consumer: Consumer, delivery_time: int) -> None:
+        """Record a delivery, moving ownership if another consumer had the entry"""
+        entry = self.pel.get(stream_id)
+        if entry is None:
+            self.pel[stream_id] = PendingEntry(consumer.name, delivery_time)
+            insort(self.pel_ids, stream_id)
+            insort(consumer.pending, stream_id)
+            return
+
+        if entry.consumer != consumer.name:
+            self._remove_from_consumer(entry.consumer, stream_id)
+            insort(consumer.pending, stream_id)
+            entry.consumer = consumer.name
+        entry.delivery_time = delivery_time
+        entry.delivery_count += 1
+
+    def ack(self, stream_id: StreamID) -> bool:
+        entry = self.pel.pop(stream_id, None)
+        if entry is None:
+            return False
+        index = bisect_left(self.pel_ids, stream_id)
+        del self.pel_ids[index]
+        self._remove_from_consumer(entry.consumer, stream_id)
+        return True
+
+    def delete_consumer(self, name: str) -> int:
+        """Delete a consumer and its pending entries, returning how many were pending"""
+        consumer = self.consumers.pop(name, None)
+        if consumer is None:
+            return 0
+        for stream_id in consumer.pending:
+            del self.pel[stream_id]
+            del self.pel_ids[bisect_left(self.pel_ids, stream_id)]
+        return len(consumer.pending)
+
+    def _remove_from_consumer(self, name: str, stream_id: StreamID) -> None:
+        consumer = self.consumers.get(name)
+        if consumer is not None:
+            index = bisect_left(consumer.pending, stream_id)
+            if index < len(consumer.pending) and consumer.pending[index] == stream_id:
+                del consumer.pending[index]
+
+    def pending_range(self, start: StreamID, end: StreamID, count: int,
+                      consumer: Optional[str] = None) -> List[StreamID]:
+        """IDs in the PEL between start and end, optionally for one consumer"""
+        ids = self.pel_ids
+        if consumer is not None:
+            owner = self.consumers.get(consumer)
+            ids = owner.pending if owner else []
+        position = bisect_left(ids, start)
+        result = []
+        while position < len(ids) and ids[position] <= end and len(result) < count:
+            result.append(ids[position])
+            position += 1
+        return result
+
+
+class Stream:
+    """Chunked append-only stream with consumer groups"""
+
+    def __init__(self):
+        self.chunks: List[StreamChunk] = []
+        # First ID of every chunk, for binary search
+        self.first_ids: List[StreamID] = []
+        self.length = 0
+        self.last_id: StreamID = MIN_ID
+        self.max_deleted_id: StreamID = MIN_ID
+        self.entries_added = 0
+        self.groups: Dict[str, ConsumerGroup] = {}
+
+    # ID generation
+
+    def next_id(self, spec: str) -> StreamID:
+        """
+        Resolve an XADD ID argument ('*', 'ms-*' or 'ms-seq') to a new ID
+
+        Raises:
+            ValueError: if the ID is malformed or not greater than the last ID
+        """
+        if spec == '*':
+            ms = now_ms()
+            if ms > self.last_id[0]:
+                return ms, 0
+            return increment_id(self.last_id)
+
+        if spec.endswith('-*'):
+            ms = parse_id(spec[:-2])[0]
+            if ms == self.last_id[0]:
+                if self.last_id[1] == MAX_ID[1]:
+                    raise ValueError("The ID specified in XADD is equal or smaller than the target stream top item")
+                return ms, self.last_id[1] + 1
+            stream_id = (ms, 1 if ms == 0 else 0)
+        else:
+            stream_id = parse_id(spec)
+
+        if stream_id == MIN_ID:
+            raise ValueError("The ID specified in XADD must be greater than 0-0")
+        if stream_id <= self.last_id:
+            raise ValueError("The ID specified in XADD is equal or smaller than the target stream top item")
+        return stream_id
+
+    # Entries
+
+    def append(self, stream_id: StreamID, fields: List[str]) -> None:
+        """Append an entry; the caller guarantees stream_id > last_id"""
+        if not self.chunks or len(self.chunks[-1].ids) >= CHUNK_SIZE:
+            self.chunks.append(StreamChunk())
+            self.first_ids.append(stream_id)
+        chunk = self.chunks[-1]
+        chunk.ids.append(stream_id)
+        chunk.fields.append(fields)
+        self.length += 1
+        self.last_id = stream_id
+        self.entries_added += 1
+
+    def range(self, start: StreamID, end: StreamID, count: Optional[int] = None,
+              reverse: bool = False) -> List[Tuple[StreamID, List[str]]]:
+        """Entries with start <= id <= end, oldest first (or newest first if reverse)"""
+        if start > end or not self.chunks:
+            return []
+        iterator = self._iter_reverse(end) if reverse else self._iter_from(start)
+        result = []
+        for stream_id, fields in iterator:
+            if (stream_id < start) if reverse else (stream_id > end):
+                break
+            result.append((stream_id, fields))
+            if count is not None and len(result) >= count:
+                break
+        return result
+
+    def _iter_from(self, start: StreamID) -> Iterator[Tuple[StreamID, List[str]]]:
+        chunk_index = max(0, bisect_right(self.first_ids, start) - 1)
+        position = bisect_left(self.chunks[chunk_index].ids, start)
+        for chunk in self.chunks[chunk_index:]:
+            ids, fields = chunk.ids, chunk.fields
+            while position < len(ids):
+                yield ids[position], fields[position]
+                position += 1
+            position = 0
+
+    def _iter_reverse(self, end: StreamID) -> Iterator[Tuple[StreamID, List[str]]]:
+        chunk_index = bisect_right(self.first_ids, end) - 1
+        if chunk_index < 0:
+            return
+        position = bisect_right(self.chunks[chunk_index].ids, end) - 1
+        for index in range(chunk_index, -1, -1):
+            chunk = self.chunks[index]
+            if index != chunk_index:
+                position = len(chunk.ids) - 1
+            while position >= 0:
+                yield chunk.ids[position], chunk.fields[position]
+                position -= 1
+
+    def _locate(self, stream_id: StreamID) -> Tuple[int, int]:
+        """(chunk index, position) of an ID, or (-1, -1) if absent"""
+        chunk_index = bisect_right(self.first_ids, stream_id) - 1
+        if chunk_index < 0:
+            return -1, -1
+        ids = self.chunks[chunk_index].ids
+        position = bisect_left(ids, stream_id)
+        if position < len(ids) and ids[position] == stream_id:
+            return chunk_index, position
+        return -1, -1
+
+    def get(self, stream_id: StreamID) -> Optional[List[str]]:
+        chunk_index, position = self._locate(stream_id)
+        if chunk_index < 0:
+            return None
+        return self.chunks[chunk_index].fields[position]
+
+    def delete(self, stream_id: StreamID) -> bool:
+        chunk_index, position = self._locate(stream_id)
+        if chunk_index < 0:
+            return False
+        chunk = self.chunks[chunk_index]
+        del chunk.ids[position]
+        del chunk.fields[position]
+        if not chunk.ids:
+            del self.chunks[chunk_index]
+            del self.first_ids[chunk_index]
+        elif position == 0:
+            self.first_ids[chunk_index] = chunk.ids[0]
+        self.length -= 1
+        self.max_deleted_id = max(self.max_deleted_id, stream_id)
+        return True
+
+    def first_entry_id(self) -> Optional[StreamID]:
+        return self.chunks[0].ids[0] if self.chunks else None
+
+    # Trimming
+
+    def trim_maxlen(self, maxlen: int, approximate: bool = False, limit: Optional[int] = None) -> int:
+        """Evict the oldest entries until at most maxlen remain"""
+        return self._trim(lambda chunk: max(0, self.length - maxlen),
+                          approximate, limit)
+
+    def trim_minid(self, minid: StreamID, approximate: bool = False, limit: Optional[int] = None) -> int:
+        """Evict entries with IDs lower than minid"""
+        return self._trim(lambda chunk: bisect_left(chunk.ids, minid), approximate, limit)
+
+    def _trim(self, removable, approximate: bool, limit: Optional[int]) -> int:
+        """
+        Drop entries from the head. removable(chunk) tells how many entries of
+        the head chunk may go. Approximate trimming only drops whole chunks.
+        """
+        removed = 0
+        while self.chunks:
+            chunk = self.chunks[0]
+            count = min(removable(chunk), len(chunk.ids))
+            if count == 0:
+                break
+            if limit is not None and removed + count > limit:
+                if approximate:
+                    break
+                count = limit - removed
+                if count == 0:
+                    break
+
+            if count == len(chunk.ids):
+                del self.chunks[0]
+                del self.first_ids[0]
+            elif approximate:
+                break
+            else:
+                self.max_deleted_id = max(self.max_deleted_id, chunk.ids[count - 1])
+                del chunk.ids[:count]
+                del chunk.fields[:count]
+                self.first_ids[0] = chunk.ids[0]
+                self.length -= count
+                removed += count
+                break
+
+            self.max_deleted_id = max(self.max_deleted_id, chunk.ids[-1])
+            self.length -= count
+            removed += count
+        return removed
+
+    # Consumer groups
+
+    def create_group(self, name: str, last_id: StreamID, entries_read: Optional[int] = None) -> bool:
+        if name in self.groups:
+            return False
+        self.groups[name] = ConsumerGroup(name, last_id, entries_read)
+        return True
+
+    def read_group_new(self, group: ConsumerGroup, consumer: Consumer, count: Optional[int],
+                       noack: bool) -> List[Tuple[StreamID, List[str]]]:
+        """Deliver entries after the group's last delivered ID ('>')"""
+        if group.last_id >= self.last_id:
+            return []
+        entries = self.range(increment_id(group.last_id), MAX_ID, count)
+        if not entries:
+            return []
+        delivery_time = now_ms()
+        for stream_id, _ in entries:
+            if not noack:
+                group.add_pending(stream_id, consumer, delivery_time)
+        group.last_id = entries[-1][0]
+        if group.entries_read is not None:
+            group.entries_read += len(entries)
+        consumer.seen_time = delivery_time
+        return entries
+
+    # Serialization
+
+    def to_bytes(self) -> bytes:
+        """Header, every entry oldest first, then the consumer groups with their PELs"""
+        parts = [_HEADER.pack(self.length, *self.last_id, *self.max_deleted_id,
+                              self.entries_added, len(self.groups))]
+        for chunk in self.chunks:
+            for stream_id, fields in zip(chunk.ids, chunk.fields):
+                parts.append(_ENTRY_HEADER.pack(*stream_id, len(fields)))
+                parts.extend(_pack_text(field) for field in fields)
+        for group in self.groups.values():
+            parts.append(_pack_text(group.name))
+            parts.append(_GROUP_HEADER.pack(*group.last_id,
+                                            -1 if group.entries_read is None else group.entries_read,
+                                            len(group.pel), len(group.consumers)))
+            for stream_id in group.pel_ids:
+                entry = group.pel[stream_id]
+                parts.append(_PENDING.pack(*stream_id, entry.delivery_time, entry.delivery_count))
+                parts.append(_pack_text(entry.consumer))
+            for consumer in group.consumers.values():
+                parts.append(_pack_text(consumer.name))
+                parts.append(struct.pack('<q', consumer.seen_time))
+        return b''.join(parts)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'Stream':
+        """Rebuild a stream from to_bytes() output"""
+        stream = cls.__new__(cls)
+        stream._restore(data)
+        return stream
+
+    def _restore(self, data: bytes) -> None:
+        self.__init__()
+        length, last_ms, last_seq, deleted_ms, deleted_seq, entries_added, group_count = \
+            _HEADER.unpack_from(data, 0)
+        offset = _HEADER.size
+        for _ in range(length):
+            ms, seq, field_count = _ENTRY_HEADER.unpack_from(data, offset)
+            offset += _ENTRY_HEADER.size
+            fields = []
+            for _ in range(field_count):
+                field, offset = _unpack_text(data, offset)
+                fields.append(field)
+            self.append((ms, seq), fields)
+        self.last_id = (last_ms, last_seq)
+        self.max_deleted_id = (deleted_ms, deleted_seq)
+        self.entries_added = entries_added
+
+        for _ in range(group_count):
+            name, offset = _unpack_text(data, offset)
+            ms, seq, entries_read, pending_count, consumer_count = _GROUP_HEADER.unpack_from(data, offset)
+            offset += _GROUP_HEADER.size
+            group = ConsumerGroup(name, (ms, seq), None if entries_read < 0 else entries_read)
+            pending = []
+            for _ in range(pending_count):
+                ms, seq, delivery_time, delivery_count = _PENDING.unpack_from(data, offset)
+                consumer_name, offset = _unpack_text(data, offset + _PENDING.size)
+                pending.append(((ms, seq), PendingEntry(consumer_name, delivery_time, delivery_count)))
+            for _ in range(consumer_count):
+                consumer_name, offset = _unpack_text(data, offset)
+                consumer = group.get_consumer(consumer_name)
+                (consumer.seen_time,) = struct.unpack_from('<q', data, offset)
+                offset += 8
+            # PEL entries were written in ID order, so the indexes stay sorted
+            for stream_id, entry in pending:
+                group.pel[stream_id] = entry
+                group.pel_ids.append(stream_id)
+                group.get_consumer(entry.consumer).pending.append(stream_id)
+            self.groups[name] = group
+
+    def __getstate__(self):
+        return self.to_bytes()
+
+    def __setstate__(self, state):
+        self._restore(state)
+
+    def memory_usage(self) -> int:
+        """Approximate bytes used by entry IDs and field data"""
+        size = 16 * self.length
+        for chunk in self.chunks:
+            for fields in chunk.fields:
+                size += sum(len(field) for field in fields)
+        return size
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __repr__(self) -> str:
+        return f"Stream(length={self.length}, last_id={format_id(self.last_id)}, groups={len(self.groups)})"
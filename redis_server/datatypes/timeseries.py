@@ -0,0 +1,446 @@
+"""
+Time Series Implementation
+
+Samples are (timestamp ms, float) pairs kept in time order. New samples go
+into an open chunk of parallel array('q') / array('d') columns; when it
+reaches chunk_size samples it is sealed into a compressed chunk:
+
+- timestamps as zigzag varints of delta-of-deltas (regular intervals
+  encode to one zero byte per sample)
+- values Gorilla-style: each value's bits are XORed with the previous
+  value's, and only the XOR shifted past its trailing zeros is stored
+
+Retention drops whole sealed chunks. Range aggregation decodes a chunk
+back into arrays once and reduces every bucket with a C-level builtin
+(sum/min/max/len) over an array slice, instead of visiting samples one by
+one in Python.
+"""
+
+import operator
+import struct
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Dict, Iterator, List, Optional, Tuple
+
+
+DUPLICATE_POLICIES = ('block', 'first', 'last', 'min', 'max', 'sum')
+
+DEFAULT_CHUNK_SIZE = 256
+
+# name -> (reduce a slice of values, combine two partial results, finalize)
+AGGREGATORS = {
+    'avg': (lambda part: (sum(part), len(part)),
+            lambda a, b: (a[0] + b[0], a[1] + b[1]),
+            lambda state: state[0] / state[1]),
+    'sum': (sum, operator.add, float),
+    'min': (min, min, float),
+    'max': (max, max, float),
+    'count': (len, operator.add, float),
+    'first': (lambda part: part[0], lambda a, b: a, float),
+    'last': (lambda part: part[-1], lambda a, b: b, float),
+    'range': (lambda part: (min(part), max(part)),
+              lambda a, b: (min(a[0], b[0]), max(a[1], b[1])),
+              lambda state: state[1] - state[0]),
+}
+
+_HEADER = struct.Struct('<QIBII')      # retention, chunk size, policy, label count, chunk count
+_CHUNK_HEADER = struct.Struct('<III')  # sample count, timestamp bytes, value bytes
+
+
+def _write_varint(out: bytearray, value: int) -> None:
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(data: bytes, position: int) -> Tuple[int, int]:
+    result = shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, position
+        shift += 7
+
+
+def encode_timestamps(timestamps: array) -> bytes:
+    """Zigzag varint delta-of-delta encoding"""
+    out = bytearray()
+    previous = previous_delta = 0
+    for timestamp in timestamps:
+        delta = timestamp - previous
+        dod = delta - previous_delta
+        _write_varint(out, (dod << 1) if dod >= 0 else ((-dod << 1) - 1))
+        previous, previous_delta = timestamp, delta
+    return bytes(out)
+
+
+def decode_timestamps(data: bytes, count: int) -> array:
+    timestamps = array('q', bytes(8 * count))
+    position = previous = previous_delta = 0
+    for i in range(count):
+        zigzag, position = _read_varint(data, position)
+        previous_delta += (zigzag >> 1) if not zigzag & 1 else -((zigzag + 1) >> 1)
+        previous += previous_delta
+        timestamps[i] = previous
+    return timestamps
+
+
+def encode_values(values: array) -> bytes:
+    """XOR each value's bits with the previous one and drop trailing zero bits"""
+    bits = array('Q')
+    bits.frombytes(values.tobytes())
+    out = bytearray()
+    previous = 0
+    for word in bits:
+        xor = word ^ previous
+        previous = word
+        if xor == 0:
+            out.append(0)
+            continue
+        trailing = (xor & -xor).bit_length() - 1
+        out.append(trailing + 1)
+        _write_varint(out, xor >> trailing)
+    return bytes(out)
+
+
+def decode_values(data: bytes, count: int) -> array:
+    bits = array('Q', bytes(8 * count))
+    position = previous = 0
+    for i in range(count):
+        marker = data[position]
+        position += 1
+        if marker:
+            xor, position = _read_varint(data, position)
+            previous ^= xor << (marker - 1)
+        bits[i] = previous
+    values = array('d')
+    values.frombytes(bits.tobytes())
+    return values
+
+
+class CompressedChunk:
+    """A sealed, immutable run of samples"""
+
+    __slots__ = ('count', 'first_ts', 'last_ts', 'ts_data', 'value_data')
+
+    def __init__(self, timestamps: array, values: array):
+        self.count = len(timestamps)
+        self.first_ts = timestamps[0]
+        self.last_ts = timestamps[-1]
+        self.ts_data = encode_timestamps(timestamps)
+        self.value_data = encode_values(values)
+
+    def decode(self) -> Tuple[array, array]:
+        return decode_timestamps(self.ts_data, self.count), decode_values(self.value_data, self.count)
+
+    def memory_usage(self) -> int:
+        return len(self.ts_data) + len(self.value_data) + 32
+
+
+class TimeSeries:
+    """Chunked, compressed time series backing the TS.* commands"""
+
+    def __init__(self, retention: int = 0, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 duplicate_policy: str = 'block', labels: Optional[Dict[str, str]] = None):
+        if retention < 0:
+            raise ValueError("invalid retention")
+        if chunk_size < 2:
+            raise ValueError("invalid chunk size")
+        if duplicate_policy not in DUPLICATE_POLICIES:
+            raise ValueError("unknown DUPLICATE_POLICY")
+        self.retention = retention
+        self.chunk_size = chunk_size
+        self.duplicate_policy = duplicate_policy
+        self.labels = dict(labels or {})
+
+        self.chunks: List[CompressedChunk] = []
+        # First timestamp of every sealed chunk, for binary search
+        self.first_timestamps: List[int] = []
+        self.open_timestamps = array('q')
+        self.open_values = array('d')
+        self.total_samples = 0
+
+    @property
+    def first_timestamp(self) -> Optional[int]:
+        if self.chunks:
+            return self.chunks[0].first_ts
+        return self.open_timestamps[0] if self.open_timestamps else None
+
+    @property
+    def last_timestamp(self) -> Optional[int]:
+        if self.open_timestamps:
+            return self.open_timestamps[-1]
+        return self.chunks[-1].last_ts if self.chunks else None
+
+    # Writes
+
+    def add(self, timestamp: int, value: float, policy: Optional[str] = None) -> int:
+        """
+        Insert a sample, resolving an existing timestamp with the duplicate policy
+
+        Raises:
+            ValueError: if the sample is too old or the policy rejects it
+        """
+        policy = policy or self.duplicate_policy
+        last = self.last_timestamp
+        if last is None or timestamp > last:
+            self._append(timestamp, value)
+            return timestamp
+
+        if self.retention and timestamp < last - self.retention:
+            raise ValueError("TSDB: Timestamp is older than retention")
+
+        if self.open_timestamps and (not self.chunks or timestamp >= self.open_timestamps[0]):
+            self._upsert(self.open_timestamps, self.open_values, timestamp, value, policy)
+        else:
+            index = max(0, bisect_right(self.first_timestamps, timestamp) - 1)
+            timestamps, values = self.chunks[index].decode()
+            self._upsert(timestamps, values, timestamp, value, policy)
+            self.chunks[index] = CompressedChunk(timestamps, values)
+            self.first_timestamps[index] = timestamps[0]
+        return timestamp
+
+    def _append(self, timestamp: int, value: float) -> None:
+        self.open_timestamps.append(timestamp)
+        self.open_values.append(value)
+        self.total_samples += 1
+        if len(self.open_timestamps) >= self.chunk_size:
+            self._seal()
+        self._apply_retention()
+
+    def _upsert(self, timestamps: array, values: array, timestamp: int, value: float, policy: str) -> None:
+        position = bisect_left(timestamps, timestamp)
+        if position < len(timestamps) and timestamps[position] == timestamp:
+            current = values[position]
+            if policy == 'block':
+                raise ValueError("TSDB: Error at upsert, update is not supported when DUPLICATE_POLICY is set to BLOCK mode")
+            if policy == 'last':
+                values[position] = value
+            elif policy == 'min':
+                values[position] = min(current, value)
+            elif policy == 'max':
+                values[position] = max(current, value)
+            elif policy == 'sum':
+                values[position] = current + value
+            return
+        timestamps.insert(position, timestamp)
+        values.insert(position, value)
+        self.total_samples += 1
+
+    def _seal(self) -> None:
+        self.chunks.append(CompressedChunk(self.open_timestamps, self.open_values))
+        self.first_timestamps.append(self.open_timestamps[0])
+        self.open_timestamps = array('q')
+        self.open_values = array('d')
+
+    def _apply_retention(self) -> None:
+        """Drop sealed chunks whose newest sample fell out of the retention window"""
+        if not self.retention or not self.chunks:
+            return
+        cutoff = self.last_timestamp - self.retention
+        expired = 0
+        while expired < len(self.chunks) and self.chunks[expired].last_ts < cutoff:
+            self.total_samples -= self.chunks[expired].count
+            expired += 1
+        if expired:
+            del self.chunks[:expired]
+            del self.first_timestamps[:expired]
+
+    def delete_range(self, start: int, end: int) -> int:
+        """Delete samples with start <= timestamp <= end, returning how many went"""
+        removed = 0
+        kept_chunks = []
+        for chunk in self.chunks:
+            if chunk.last_ts < start or chunk.first_ts > end:
+                kept_chunks.append(chunk)
+                continue
+            timestamps, values = chunk.decode()
+            lo, hi = bisect_left(timestamps, start), bisect_right(timestamps, end)
+            removed += hi - lo
+            del timestamps[lo:hi]
+            del values[lo:hi]
+            if timestamps:
+                kept_chunks.append(CompressedChunk(timestamps, values))
+        self.chunks = kept_chunks
+        self.first_timestamps = [chunk.first_ts for chunk in kept_chunks]
+
+        lo = bisect_left(self.open_timestamps, start)
+        hi = bisect_right(self.open_timestamps, end)
+        removed += hi - lo
+        del self.open_timestamps[lo:hi]
+        del self.open_values[lo:hi]
+
+        self.total_samples -= removed
+        return removed
+
+    # Reads
+
+    def get(self) -> Optional[Tuple[int, float]]:
+        """The newest sample"""
+        if self.open_timestamps:
+            return self.open_timestamps[-1], self.open_values[-1]
+        if self.chunks:
+            timestamps, values = self.chunks[-1].decode()
+            return timestamps[-1], values[-1]
+        return None
+
+    def _segments(self, start: int, end: int) -> Iterator[Tuple[array, array]]:
+        """Array slices holding the samples between start and end, oldest first"""
+        if self.retention and self.last_timestamp is not None:
+            start = max(start, self.last_timestamp - self.retention)
+        index = max(0, bisect_right(self.first_timestamps, start) - 1)
+        for chunk in self.chunks[index:]:
+            if chunk.first_ts > end:
+                return
+            if chunk.last_ts < start:
+                continue
+            timestamps, values = chunk.decode()
+            lo, hi = bisect_left(timestamps, start), bisect_right(timestamps, end)
+            if lo < hi:
+                yield timestamps[lo:hi], values[lo:hi]
+
+        lo = bisect_left(self.open_timestamps, start)
+        hi = bisect_right(self.open_timestamps, end)
+        if lo < hi:
+            yield self.open_timestamps[lo:hi], self.open_values[lo:hi]
+
+    def range(self, start: int, end: int, count: Optional[int] = None,
+              reverse: bool = False) -> List[Tuple[int, float]]:
+        """Raw samples between start and end"""
+        samples = []
+        for timestamps, values in self._segments(start, end):
+            samples.extend(zip(timestamps, values))
+        if reverse:
+            samples.reverse()
+        return samples[:count] if count is not None else samples
+
+    def aggregate(self, start: int, end: int, aggregator: str, bucket: int,
+                  count: Optional[int] = None, reverse: bool = False) -> List[Tuple[int, float]]:
+        """
+        Reduce samples between start and end into buckets of bucket ms,
+        keyed by bucket start timestamp
+        """
+        reduce, combine, finalize = AGGREGATORS[aggregator]
+        starts: List[int] = []
+        states: List = []
+        for timestamps, values in self._segments(start, end):
+            lo = 0
+            size = len(timestamps)
+            while lo < size:
+                bucket_start = timestamps[lo] - timestamps[lo] % bucket
+                hi = bisect_left(timestamps, bucket_start + bucket, lo)
+                partial = reduce(values[lo:hi])
+                # A bucket can straddle a chunk boundary
+                if starts and starts[-1] == bucket_start:
+                    states[-1] = combine(states[-1], partial)
+                else:
+                    starts.append(bucket_start)
+                    states.append(partial)
+                lo = hi
+
+        results = [(bucket_start, finalize(state)) for bucket_start, state in zip(starts, states)]
+        if reverse:
+            results.reverse()
+        return results[:count] if count is not None else results
+
+    def matches(self, filters: List[Tuple[str, bool, Tuple[str, ...]]]) -> bool:
+        """Check label filters of (label, equal, values); an empty value means 'label absent'"""
+        for label, equal, values in filters:
+            value = self.labels.get(label, '')
+            if (value in values) != equal:
+                return False
+        return True
+
+    def get_info(self) -> dict:
+        """Series statistics for TS.INFO"""
+        return {
+            'totalSamples': self.total_samples,
+            'memoryUsage': self.memory_usage(),
+            'firstTimestamp': self.first_timestamp or 0,
+            'lastTimestamp': self.last_timestamp or 0,
+            'retentionTime': self.retention,
+            'chunkCount': len(self.chunks) + (1 if self.open_timestamps else 0),
+            'chunkSize': self.chunk_size,
+            'duplicatePolicy': self.duplicate_policy,
+        }
+
+    # Serialization
+
+    def to_bytes(self) -> bytes:
+        """Settings, labels, then every chunk (the open one compressed too)"""
+        chunks = list(self.chunks)
+        if self.open_timestamps:
+            chunks.append(CompressedChunk(self.open_timestamps, self.open_values))
+        parts = [_HEADER.pack(self.retention, self.chunk_size,
+                              DUPLICATE_POLICIES.index(self.duplicate_policy),
+                              len(self.labels), len(chunks))]
+        for label, value in self.labels.items():
+            for text in (label, value):
+                encoded = text.encode('utf-8')
+                parts.append(struct.pack('<I', len(encoded)) + encoded)
+        for chunk in chunks:
+            parts.append(_CHUNK_HEADER.pack(chunk.count, len(chunk.ts_data), len(chunk.value_data)))
+            parts.append(chunk.ts_data)
+            parts.append(chunk.value_data)
+        return b''.join(parts)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'TimeSeries':
+        """Rebuild a series from to_bytes() output"""
+        series = cls.__new__(cls)
+        series._restore(data)
+        return series
+
+    def _restore(self, data: bytes) -> None:
+        retention, chunk_size, policy, label_count, chunk_count = _HEADER.unpack_from(data, 0)
+        self.__init__(retention, chunk_size, DUPLICATE_POLICIES[policy])
+        position = _HEADER.size
+
+        texts = []
+        for _ in range(2 * label_count):
+            (length,) = struct.unpack_from('<I', data, position)
+            position += 4
+            texts.append(data[position:position + length].decode('utf-8'))
+            position += length
+        self.labels = dict(zip(texts[0::2], texts[1::2]))
+
+        for _ in range(chunk_count):
+            count, ts_length, value_length = _CHUNK_HEADER.unpack_from(data, position)
+            position += _CHUNK_HEADER.size
+            chunk = CompressedChunk.__new__(CompressedChunk)
+            chunk.count = count
+            chunk.ts_data = data[position:position + ts_length]
+            position += ts_length
+            chunk.value_data = data[position:position + value_length]
+            position += value_length
+            timestamps, values = chunk.decode()
+            chunk.first_ts, chunk.last_ts = timestamps[0], timestamps[-1]
+            self.chunks.append(chunk)
+            self.first_timestamps.append(chunk.first_ts)
+            self.total_samples += count
+
+        # The last chunk was the open one if it isn't full
+        if self.chunks and self.chunks[-1].count < self.chunk_size:
+            chunk = self.chunks.pop()
+            self.first_timestamps.pop()
+            self.open_timestamps, self.open_values = chunk.decode()
+
+    def __getstate__(self):
+        return self.to_bytes()
+
+    def __setstate__(self, state):
+        self._restore(state)
+
+    def memory_usage(self) -> int:
+        """Bytes used by compressed chunks and the open chunk's arrays"""
+        size = sum(chunk.memory_usage() for chunk in self.chunks)
+        return size + 16 * len(self.open_timestamps)
+
+    def __len__(self) -> int:
+        return self.total_samples
+
+    def __repr__(self) -> str:
+        return f"TimeSeries(samples={self.total_samples}, chunks={len(self.chunks)}, retention={self.retention})"
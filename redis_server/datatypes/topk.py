@@ -0,0 +1,220 @@
+"""
+Top-K Implementation (HeavyKeeper)
+
+HeavyKeeper keeps a depth x width matrix of (fingerprint, count) buckets.
+Colliding items decay the resident count with probability decay^count, so
+heavy hitters survive while the long tail is worn away. A min-heap of size
+k holds the current top items and their estimated counts.
+"""
+
+import random
+import struct
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+from .bloom import hash_pair
+
+
+DEFAULT_WIDTH = 8
+DEFAULT_DEPTH = 7
+DEFAULT_DECAY = 0.9
+MAX_COUNTER = 0xFFFFFFFF
+
+_HEADER = struct.Struct('<IIId')   # k, width, depth, decay
+
+
+class TopK:
+    """HeavyKeeper Top-K backing the TOPK.* commands"""
+
+    def __init__(self, k: int, width: int = DEFAULT_WIDTH, depth: int = DEFAULT_DEPTH,
+                 decay: float = DEFAULT_DECAY):
+        if k < 1 or width < 1 or depth < 1:
+            raise ValueError("k, width and depth must be positive")
+        if not 0 < decay <= 1:
+            raise ValueError("decay must be between 0 and 1")
+        self.k = k
+        self.width = width
+        self.depth = depth
+        self.decay = decay
+        self.fingerprints = array('I', bytes(4 * width * depth))
+        self.counts = array('I', bytes(4 * width * depth))
+        # Min-heap of items ordered by count, with positions for in-place updates
+        self.heap: List[str] = []
+        self.heap_counts: Dict[str, int] = {}
+        self._positions: Dict[str, int] = {}
+        # Fixed seed so replaying the same AOF rebuilds the same state
+        self._random = random.Random(0)
+
+    # HeavyKeeper sketch
+
+    def _locate(self, item) -> Tuple[int, List[int]]:
+        h1, h2 = hash_pair(item)
+        fingerprint = (h1 >> 32) or 1
+        width = self.width
+        return fingerprint, [row * width + (h1 + row * h2) % width for row in range(self.depth)]
+
+    def incrby(self, item: str, increment: int = 1) -> Optional[str]:
+        """
+        Count an item
+
+        Returns:
+            The item expelled from the top-k list, if any
+        """
+        fingerprint, cells = self._locate(item)
+        fingerprints = self.fingerprints
+        counts = self.counts
+        estimate = 0
+
+        for cell in cells:
+            if counts[cell] == 0:
+                fingerprints[cell] = fingerprint
+                counts[cell] = min(increment, MAX_COUNTER)
+            elif fingerprints[cell] == fingerprint:
+                counts[cell] = min(counts[cell] + increment, MAX_COUNTER)
+            else:
+                # Each unit of the increment gets a chance to decay the resident
+                for remaining in range(increment, 0, -1):
+                    if self._random.random() < self.decay ** counts[cell]:
+                        counts[cell] -= 1
+                        if counts[cell] == 0:
+                            fingerprints[cell] = fingerprint
+                            counts[cell] = remaining
+                            break
+
+            if fingerprints[cell] == fingerprint:
+                estimate = max(estimate, counts[cell])
+
+        return self._update_heap(item, estimate)
+
+    def query(self, item: str) -> bool:
+        """Check if an item is currently in the top-k list"""
+        return item in self.heap_counts
+
+    def count(self, item: str) -> int:
+        """Estimated count of an item according to the sketch"""
+        fingerprint, cells = self._locate(item)
+        return max((self.counts[cell] for cell in cells if self.fingerprints[cell] == fingerprint), default=0)
+
+    def top_items(self) -> List[Tuple[str, int]]:
+        """Top items ordered by count, highest first"""
+        return sorted(self.heap_counts.items(), key=lambda entry: entry[1], reverse=True)
+
+    # Min-heap
+
+    def _update_heap(self, item: str, estimate: int) -> Optional[str]:
+        if item in self.heap_counts:
+            # Counts only grow, so the item can only move towards the leaves
+            self.heap_counts[item] = max(self.heap_counts[item], estimate)
+            self._sift_down(self._positions[item])
+            return None
+
+        if len(self.heap) < self.k:
+            self.heap.append(item)
+            self.heap_counts[item] = estimate
+            self._positions[item] = len(self.heap) - 1
+            self._sift_up(len(self.heap) - 1)
+            return None
+
+        smallest = self.heap[0]
+        if estimate <= self.heap_counts[smallest]:
+            return None
+
+        del self.heap_counts[smallest]
+        del self._positions[smallest]
+        self.heap[0] = item
+        self.heap_counts[item] = estimate
+        self._positions[item] = 0
+        self._sift_down(0)
+        return smallest
+
+    def _swap(self, i: int, j: int) -> None:
+        heap = self.heap
+        heap[i], heap[j] = heap[j], heap[i]
+        self._positions[heap[i]] = i
+        self._positions[heap[j]] = j
+
+    def _sift_up(self, position: int) -> None:
+        counts = self.heap_counts
+        while position > 0:
+            parent = (position - 1) // 2
+            if counts[self.heap[parent]] <= counts[self.heap[position]]:
+                break
+            self._swap(parent, position)
+            position = parent
+
+    def _sift_down(self, position: int) -> None:
+        counts = self.heap_counts
+        size = len(self.heap)
+        while True:
+            smallest = position
+            for child in (2 * position + 1, 2 * position + 2):
+                if child < size and counts[self.heap[child]] < counts[self.heap[smallest]]:
+                    smallest = child
+            if smallest == position:
+                return
+            self._swap(position, smallest)
+            position = smallest
+
+    def get_info(self) -> dict:
+        """Parameters for TOPK.INFO"""
+        return {'k': self.k, 'width': self.width, 'depth': self.depth, 'decay': self.decay}
+
+    # Serialization
+
+    def to_bytes(self) -> bytes:
+        """Parameters, bucket arrays and the heap entries"""
+        parts = [_HEADER.pack(self.k, self.width, self.depth, self.decay),
+                 self.fingerprints.tobytes(), self.counts.tobytes(),
+                 struct.pack('<I', len(self.heap))]
+        for item in self.heap:
+            encoded = item.encode('utf-8')
+            parts.append(struct.pack('<IQ', len(encoded), self.heap_counts[item]))
+            parts.append(encoded)
+        return b''.join(parts)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'TopK':
+        """Rebuild a Top-K from to_bytes() output"""
+        topk = cls.__new__(cls)
+        topk._restore(data)
+        return topk
+
+    def _restore(self, data: bytes) -> None:
+        self.k, self.width, self.depth, self.decay = _HEADER.unpack_from(data, 0)
+        offset = _HEADER.size
+        size = 4 * self.width * self.depth
+        self.fingerprints = array('I')
+        self.fingerprints.frombytes(data[offset:offset + size])
+        offset += size
+        self.counts = array('I')
+        self.counts.frombytes(data[offset:offset + size])
+        offset += size
+
+        (heap_size,) = struct.unpack_from('<I', data, offset)
+        offset += 4
+        self.heap = []
+        self.heap_counts = {}
+        self._positions = {}
+        for position in range(heap_size):
+            length, count = struct.unpack_from('<IQ', data, offset)
+            offset += 12
+            item = data[offset:offset + length].decode('utf-8')
+            offset += length
+            self.heap.append(item)
+            self.heap_counts[item] = count
+            self._positions[item] = position
+        self._random = random.Random(0)
+
+    def __getstate__(self):
+        return self.to_bytes()
+
+    def __setstate__(self, state):
+        self._restore(state)
+
+    def memory_usage(self) -> int:
+        """Bytes used by the buckets and heap items"""
+        items = sum(len(item) for item in self.heap)
+        return 8 * self.width * self.depth + items
+
+    def __repr__(self) -> str:
+        return f"TopK(k={self.k}, width={self.width}, depth={self.depth}, decay={self.decay})"
@@ -0,0 +1,413 @@
+"""
+Vector Set Implementation
+
+Named float32 vectors kept in one contiguous array('f') matrix (row per
+element, rows compacted on removal), with the row norms alongside.
+
+- Cosine sets store unit vectors, so similarity is a dot product; the
+  original norm is kept to give back the vector that was added.
+- L2 sets store raw vectors; distances come from |x|^2 - 2x.q + |q|^2.
+
+Exact search multiplies the whole matrix against the query in one C-level
+pass (map over the matrix and the query repeated per row) and then sums
+each row's products. Once a set grows past hnsw_threshold elements an HNSW
+graph (Malkov & Yashunin) is built and maintained, and searches walk it
+instead, trading a little recall for sub-linear latency.
+"""
+
+import heapq
+import math
+import random
+import struct
+from array import array
+from operator import mul
+from typing import Dict, List, Optional, Tuple
+
+
+METRICS = ('cosine', 'l2')
+
+_HEADER = struct.Struct('<IBIIIIiiB')  # dim, metric, M, ef, threshold, count, entry, max level, indexed
+
+
+def _dot(a, b) -> float:
+    return sum(map(mul, a, b))
+
+
+class VectorSet:
+    """Vector set with exact and HNSW similarity search backing the V* commands"""
+
+    def __init__(self, dim: int, metric: str = 'cosine', m: int = 16,
+                 ef_construction: int = 200, hnsw_threshold: int = 1000):
+        if dim < 1:
+            raise ValueError("vector dimension must be positive")
+        if metric not in METRICS:
+            raise ValueError("unknown metric")
+        if m < 2 or ef_construction < 1:
+            raise ValueError("invalid M or EF")
+        self.dim = dim
+        self.metric = metric
+        self.m = m
+        self.ef_construction = ef_construction
+        self.hnsw_threshold = hnsw_threshold
+
+        self.vectors = array('f')   # count x dim matrix, row-major
+        self.norms = array('d')     # L2 norm of every row as added
+        self.elements: List[str] = []       # row -> element
+        self.rows: Dict[str, int] = {}      # element -> row
+
+        # HNSW graph: per element, one neighbor list per layer it lives on
+        self.indexed = False
+        self.links: Dict[str, List[List[str]]] = {}
+        self.entry_point: Optional[str] = None
+        self.max_level = -1
+        self._level_factor = 1 / math.log(m)
+        self._rng = random.Random(0)
+
+    # Vector math
+
+    def _prepare(self, vector: List[float]) -> Tuple[array, float]:
+        """Return the row to store and the original norm"""
+        if len(vector) != self.dim:
+            raise ValueError(f"Vector dimension mismatch - got {len(vector)} but set has {self.dim}")
+        norm = math.sqrt(_dot(vector, vector))
+        if self.metric == 'cosine':
+            if norm == 0:
+                raise ValueError("zero vector is not allowed with cosine similarity")
+            return array('f', (value / norm for value in vector)), norm
+        return array('f', vector), norm
+
+    def _row(self, row: int) -> array:
+        return self.vectors[row * self.dim:(row + 1) * self.dim]
+
+    def _distance(self, query: array, query_norm: float, element: str) -> float:
+        """Cosine distance (1 - cos) or squared L2 distance to a stored element"""
+        row = self.rows[element]
+        dot = _dot(query, self._row(row))
+        if self.metric == 'cosine':
+            return 1.0 - dot
+        return max(0.0, self.norms[row] ** 2 - 2 * dot + query_norm ** 2)
+
+    def score(self, distance: float) -> float:
+        """Similarity in [0, 1] for cosine sets, Euclidean distance for L2 sets"""
+        if self.metric == 'cosine':
+            return max(0.0, min(1.0, 1.0 - distance / 2))
+        return math.sqrt(distance)
+
+    # Writes
+
+    def add(self, element: str, vector: List[float]) -> bool:
+        """Add or replace an element's vector, returning True if it was new"""
+        stored, norm = self._prepare(vector)
+        existed = element in self.rows
+        if existed:
+            self.remove(element)
+
+        self.rows[element] = len(self.elements)
+        self.elements.append(element)
+        self.vectors.extend(stored)
+        self.norms.append(norm)
+
+        if self.indexed:
+            self._insert(element)
+        elif len(self.elements) > self.hnsw_threshold:
+            self.build_index()
+        return not existed
+
+    def remove(self, element: str) -> bool:
+        row = self.rows.get(element)
+        if row is None:
+            return False
+        if self.indexed:
+            self._unlink(element)
+        del self.rows[element]
+
+        # Keep the matrix dense: move the last row into the hole
+        last = len(self.elements) - 1
+        dim = self.dim
+        if row != last:
+            moved = self.elements[last]
+            self.vectors[row * dim:(row + 1) * dim] = self.vectors[last * dim:]
+            self.norms[row] = self.norms[last]
+            self.elements[row] = moved
+            self.rows[moved] = row
+        del self.vectors[last * dim:]
+        del self.norms[last]
+        self.elements.pop()
+        return True
+
+    def get_vector(self, element: str) -> Optional[List[float]]:
+        """The vector as added (up to float32 precision)"""
+        row = self.rows.get(element)
+        if row is None:
+            return None
+        values = self._row(row)
+        if self.metric == 'cosine':
+            return [value * self.norms[row] for value in values]
+        return list(values)
+
+    # Search
+
+    def search(self, vector: List[float], count: int = 10, ef: Optional[int] = None,
+               exact: bool = False) -> List[Tuple[str, float]]:
+        """The count nearest elements as (element, score), best first"""
+        if not self.elements:
+            return []
+        query, query_norm = self._prepare(vector)
+        if exact or not self.indexed or len(self.elements) <= self.hnsw_threshold:
+            found = self._exact(query, query_norm, count)
+        else:
+            found = self._approximate(query, query_norm, count, max(ef or self.ef_construction, count))
+        return [(element, self.score(distance)) for distance, element in found]
+
+    def search_element(self, element: str, count: int = 10, ef: Optional[int] = None,
+                       exact: bool = False) -> Optional[List[Tuple[str, float]]]:
+        vector = self.get_vector(element)
+        if vector is None:
+            return None
+        return self.search(vector, count, ef, exact)
+
+    def _exact(self, query: array, query_norm: float, count: int) -> List[Tuple[float, str]]:
+        """Brute-force scan: one pass of products over the whole matrix, then per-row sums"""
+        dim = self.dim
+        rows = len(self.elements)
+        products = array('d', map(mul, self.vectors, query * rows))
+        dots = [sum(products[start:start + dim]) for start in range(0, rows * dim, dim)]
+        if self.metric == 'cosine':
+            distances = [1.0 - dot for dot in dots]
+        else:
+            query_square = query_norm ** 2
+            distances = [max(0.0, norm * norm - 2 * dot + query_square)
+                         for norm, dot in zip(self.norms, dots)]
+        return heapq.nsmallest(count, zip(distances, self.elements))
+
+    # HNSW
+
+    def build_index(self) -> None:
+        """Index every element in an HNSW graph; later adds and removes keep it current"""
+        self.indexed = True
+        self.links = {}
+        self.entry_point = None
+        self.max_level = -1
+        for element in self.elements:
+            self._insert(element)
+
+    def _random_level(self) -> int:
+        return int(-math.log(1.0 - self._rng.random()) * self._level_factor)
+
+    def _max_links(self, level: int) -> int:
+        return 2 * self.m if level == 0 else self.m
+
+    def _search_layer(self, query, query_norm, entry_points: List[Tuple[float, str]],
+                      ef: int, level: int) -> List[Tuple[float, str]]:
+        """Best-first search on one layer, returning up to ef (distance, element) pairs"""
+        visited = {element for _, element in entry_points}
+        candidates = list(entry_points)
+        heapq.heapify(candidates)
+        best = [(-distance, element) for distance, element in entry_points]
+        heapq.heapify(best)
+        links = self.links
+
+        while candidates:
+            distance, element = heapq.heappop(candidates)
+            if distance > -best[0][0] and len(best) >= ef:
+                break
+            for neighbor in links[element][level]:
+                # Skip links to removed nodes (or to re-added ones on fewer layers)
+                if neighbor in visited or neighbor not in links or len(links[neighbor]) <= level:
+                    continue
+                visited.add(neighbor)
+                neighbor_distance = self._distance(query, query_norm, neighbor)
+                if len(best) < ef or neighbor_distance < -best[0][0]:
+                    heapq.heappush(candidates, (neighbor_distance, neighbor))
+                    heapq.heappush(best, (-neighbor_distance, neighbor))
+                    if len(best) > ef:
+                        heapq.heappop(best)
+        return sorted((-negative, element) for negative, element in best)
+
+    def _select_neighbors(self, candidates: List[Tuple[float, str]], limit: int) -> List[str]:
+        """Heuristic selection: skip candidates closer to a chosen neighbor than to the base"""
+        selected: List[Tuple[str, array, float]] = []
+        skipped = []
+        for distance, element in candidates:
+            if len(selected) >= limit:
+                break
+            row = self.rows[element]
+            vector, norm = self._row(row), self.norms[row]
+            if all(self._distance(vector, norm, chosen) > distance for chosen, _, _ in selected):
+                selected.append((element, vector, norm))
+            else:
+                skipped.append(element)
+        # Fill up with the closest skipped candidates to keep the graph connected
+        result = [element for element, _, _ in selected]
+        result.extend(skipped[:limit - len(result)])
+        return result
+
+    def _insert(self, element: str) -> None:
+        row = self.rows[element]
+        query, query_norm = self._row(row), self.norms[row]
+        level = self._random_level()
+        self.links[element] = [[] for _ in range(level + 1)]
+
+        if self.entry_point is None:
+            self.entry_point, self.max_level = element, level
+            return
+
+        entry = [(self._distance(query, query_norm, self.entry_point), self.entry_point)]
+        for layer in range(self.max_level, level, -1):
+            entry = self._search_layer(query, query_norm, entry, 1, layer)
+
+        for layer in range(min(level, self.max_level), -1, -1):
+            candidates = self._search_layer(query, query_norm, entry, self.ef_construction, layer)
+            neighbors = self._select_neighbors(candidates, self.m)
+            self.links[element][layer] = neighbors
+            for neighbor in neighbors:
+                self._connect(neighbor, element, layer)
+            entry = candidates
+
+        if level > self.max_level:
+            self.entry_point, self.max_level = element, level
+
+    def _connect(self, element: str, neighbor: str, layer: int) -> None:
+        """Add a back link, shrinking the neighbor list if it overflows"""
+        neighbors = self.links[element][layer]
+        neighbors.append(neighbor)
+        limit = self._max_links(layer)
+        if len(neighbors) > limit:
+            row = self.rows[element]
+            vector, norm = self._row(row), self.norms[row]
+            candidates = sorted((self._distance(vector, norm, other), other)
+                                for other in neighbors if other in self.rows)
+            self.links[element][layer] = self._select_neighbors(candidates, limit)
+
+    def _unlink(self, element: str) -> None:
+        """Remove a node, reconnecting its former neighbors among themselves"""
+        links = self.links
+        layers = links.pop(element)
+        for layer, neighbors in enumerate(layers):
+            # Only nodes still on this layer: a neighbor may have been removed,
+            # or removed and re-added on fewer layers, since it was linked
+            live = [neighbor for neighbor in neighbors
+                    if neighbor in links and len(links[neighbor]) > layer]
+            for neighbor in live:
+                own = links[neighbor][layer]
+                if element in own:
+                    own.remove(element)
+                row = self.rows[neighbor]
+                vector, norm = self._row(row), self.norms[row]
+                candidates = sorted((self._distance(vector, norm, other), other)
+                                    for other in set(own).union(live)
+                                    if other != neighbor and other in links and len(links[other]) > layer)
+                links[neighbor][layer] = self._select_neighbors(candidates, self._max_links(layer))
+
+        if self.entry_point == element:
+            self.entry_point, self.max_level = None, -1
+            for other, other_layers in self.links.items():
+                if len(other_layers) - 1 > self.max_level:
+                    self.entry_point, self.max_level = other, len(other_layers) - 1
+
+    def _approximate(self, query: array, query_norm: float, count: int, ef: int) -> List[Tuple[float, str]]:
+        entry = [(self._distance(query, query_norm, self.entry_point), self.entry_point)]
+        for layer in range(self.max_level, 0, -1):
+            entry = self._search_layer(query, query_norm, entry, 1, layer)
+        return self._search_layer(query, query_norm, entry, ef, 0)[:count]
+
+    def get_info(self) -> dict:
+        """Set statistics for VINFO"""
+        return {
+            'size': len(self.elements),
+            'vector-dim': self.dim,
+            'metric': self.metric,
+            'hnsw-m': self.m,
+            'hnsw-ef': self.ef_construction,
+            'indexed': int(self.indexed),
+            'max-level': self.max_level,
+        }
+
+    # Serialization
+
+    def to_bytes(self) -> bytes:
+        """Settings, element names, the vector matrix, norms and the HNSW links as row numbers"""
+        entry = self.rows[self.entry_point] if self.entry_point is not None else -1
+        parts = [_HEADER.pack(self.dim, METRICS.index(self.metric), self.m, self.ef_construction,
+                              self.hnsw_threshold, len(self.elements), entry, self.max_level,
+                              int(self.indexed))]
+        for element in self.elements:
+            encoded = element.encode('utf-8')
+            parts.append(struct.pack('<I', len(encoded)) + encoded)
+        parts.append(self.vectors.tobytes())
+        parts.append(self.norms.tobytes())
+        if self.indexed:
+            rows, links = self.rows, self.links
+            for element in self.elements:
+                layers = links[element]
+                parts.append(struct.pack('<I', len(layers)))
+                for layer, neighbors in enumerate(layers):
+                    # Stale links to removed nodes are dropped here
+                    live = array('I', (rows[neighbor] for neighbor in neighbors
+                                       if neighbor in links and len(links[neighbor]) > layer))
+                    parts.append(struct.pack('<I', len(live)))
+                    parts.append(live.tobytes())
+        return b''.join(parts)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'VectorSet':
+        """Rebuild a set, graph included, from to_bytes() output"""
+        vector_set = cls.__new__(cls)
+        vector_set._restore(data)
+        return vector_set
+
+    def _restore(self, data: bytes) -> None:
+        (dim, metric, m, ef_construction, threshold, count,
+         entry, max_level, indexed) = _HEADER.unpack_from(data, 0)
+        self.__init__(dim, METRICS[metric], m, ef_construction, threshold)
+        position = _HEADER.size
+
+        for row in range(count):
+            (length,) = struct.unpack_from('<I', data, position)
+            position += 4
+            element = data[position:position + length].decode('utf-8')
+            position += length
+            self.elements.append(element)
+            self.rows[element] = row
+
+        self.vectors.frombytes(data[position:position + 4 * dim * count])
+        position += 4 * dim * count
+        self.norms.frombytes(data[position:position + 8 * count])
+        position += 8 * count
+
+        if indexed:
+            self.indexed = True
+            elements = self.elements
+            for element in elements:
+                (layer_count,) = struct.unpack_from('<I', data, position)
+                position += 4
+                layers = []
+                for _ in range(layer_count):
+                    (size,) = struct.unpack_from('<I', data, position)
+                    position += 4
+                    neighbors = array('I')
+                    neighbors.frombytes(data[position:position + 4 * size])
+                    position += 4 * size
+                    layers.append([elements[row] for row in neighbors])
+                self.links[element] = layers
+            self.entry_point = elements[entry] if entry >= 0 else None
+            self.max_level = max_level
+
+    def __getstate__(self):
+        return self.to_bytes()
+
+    def __setstate__(self, state):
+        self._restore(state)
+
+    def memory_usage(self) -> int:
+        """Bytes used by the matrix, norms, names and graph links"""
+        size = len(self.vectors) * 4 + len(self.norms) * 8
+        size += sum(len(element) for element in self.elements)
+        size += 8 * sum(len(neighbors) for layers in self.links.values() for neighbors in layers)
+        return size
+
+    def __len__(self) -> int:
+        return len(self.elements)
+
+    def __repr__(self) -> str:
+        return f"VectorSet(size={len(self.elements)}, dim={self.dim}, metric={self.metric}, indexed={self.indexed})"
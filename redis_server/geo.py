@@ -0,0 +1,210 @@
+"""
+Geohash encoding and area search for the GEO* commands
+
+A position is stored as a 52-bit interleaved geohash (26 bits each of
+longitude and latitude, longitude in the higher bit of every pair) used as
+a sorted set score. Any geohash cell at precision `step` then covers one
+contiguous score range, so a radius or box search:
+
+  1. picks the finest step whose 3x3 block of cells around the centre
+     still contains the whole search area,
+  2. scans the score range of each of those (at most 9, merged when
+     adjacent) cells,
+  3. filters the candidates by a cheap latitude/longitude bound and then
+     the exact haversine distance.
+"""
+
+import math
+from typing import Iterator, List, Optional, Tuple
+
+from .datatypes import SortedSet
+
+
+LON_MIN, LON_MAX = -180.0, 180.0
+LAT_MIN, LAT_MAX = -85.05112878, 85.05112878
+STEP_MAX = 26
+HASH_BITS = 2 * STEP_MAX
+
+EARTH_RADIUS = 6372797.560856  # meters, same constant as Redis
+UNITS = {"m": 1.0, "km": 1000.0, "mi": 1609.34, "ft": 0.3048}
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+# Widen degree bounds a hair so rounding never drops a point on the edge
+_SLACK = 1 + 1e-9
+
+
+def _spread(value: int) -> int:
+    """Put the 32 bits of value on the even bit positions of a 64-bit int"""
+    value &= 0xFFFFFFFF
+    value = (value | (value << 16)) & 0x0000FFFF0000FFFF
+    value = (value | (value << 8)) & 0x00FF00FF00FF00FF
+    value = (value | (value << 4)) & 0x0F0F0F0F0F0F0F0F
+    value = (value | (value << 2)) & 0x3333333333333333
+    return (value | (value << 1)) & 0x5555555555555555
+
+
+def _squash(value: int) -> int:
+    """Inverse of _spread: collect the even bits of value"""
+    value &= 0x5555555555555555
+    value = (value | (value >> 1)) & 0x3333333333333333
+    value = (value | (value >> 2)) & 0x0F0F0F0F0F0F0F0F
+    value = (value | (value >> 4)) & 0x00FF00FF00FF00FF
+    value = (value | (value >> 8)) & 0x0000FFFF0000FFFF
+    return (value | (value >> 16)) & 0x00000000FFFFFFFF
+
+
+def _cells(longitude: float, latitude: float, step: int = STEP_MAX,
+           lat_min: float = LAT_MIN, lat_max: float = LAT_MAX) -> Tuple[int, int]:
+    """Longitude and latitude cell numbers at a precision of step bits each"""
+    scale = 1 << step
+    lon_cell = int((longitude - LON_MIN) / (LON_MAX - LON_MIN) * scale)
+    lat_cell = int((latitude - lat_min) / (lat_max - lat_min) * scale)
+    return min(lon_cell, scale - 1), min(lat_cell, scale - 1)
+
+
+def valid_position(longitude: float, latitude: float) -> bool:
+    return LON_MIN <= longitude <= LON_MAX and LAT_MIN <= latitude <= LAT_MAX
+
+
+def encode(longitude: float, latitude: float) -> int:
+    """52-bit geohash score of a position"""
+    lon_cell, lat_cell = _cells(longitude, latitude)
+    return (_spread(lon_cell) << 1) | _spread(lat_cell)
+
+
+def decode(score: float) -> Tuple[float, float]:
+    """Longitude and latitude of the centre of a score's cell"""
+    bits = int(score)
+    lon_cell, lat_cell = _squash(bits >> 1), _squash(bits)
+    lon_size = (LON_MAX - LON_MIN) / (1 << STEP_MAX)
+    lat_size = (LAT_MAX - LAT_MIN) / (1 << STEP_MAX)
+    longitude = LON_MIN + (lon_cell + 0.5) * lon_size
+    latitude = LAT_MIN + (lat_cell + 0.5) * lat_size
+    return max(LON_MIN, min(LON_MAX, longitude)), max(LAT_MIN, min(LAT_MAX, latitude))
+
+
+def geohash_string(score: float) -> str:
+    """Standard 11 character geohash (which uses latitudes of -90..90)"""
+    longitude, latitude = decode(score)
+    lon_cell, lat_cell = _cells(longitude, latitude, lat_min=-90.0, lat_max=90.0)
+    bits = (_spread(lon_cell) << 1) | _spread(lat_cell)
+    # 52 bits give 10 full characters; like Redis the 11th is always '0'
+    return "".join(_BASE32[(bits >> (HASH_BITS - 5 * (i + 1))) & 31] for i in range(10)) + "0"
+
+
+def distance(lon1: float, lat1: float, lon2: float, lat2: float) -> float:
+    """Haversine distance in meters"""
+    lat1r, lat2r = math.radians(lat1), math.radians(lat2)
+    u = math.sin((lat2r - lat1r) / 2)
+    v = math.sin(math.radians(lon2 - lon1) / 2)
+    return 2.0 * EARTH_RADIUS * math.asin(math.sqrt(u * u + math.cos(lat1r) * math.cos(lat2r) * v * v))
+
+
+def area_bounds(longitude: float, latitude: float, radius: Optional[float] = None,
+                width: Optional[float] = None, height: Optional[float] = None) -> Tuple[float, float, float, float]:
+    """
+    Degree bounds (lon_low, lon_high, lat_low, lat_high) of everything within
+    radius meters, or inside a width x height meter box, around a point.
+    Longitudes may run past +-180 when the area crosses the antimeridian.
+    """
+    half_height = radius if radius is not None else height / 2
+    lat_delta = math.degrees(half_height / EARTH_RADIUS) * _SLACK
+    lat_low, lat_high = latitude - lat_delta, latitude + lat_delta
+
+    if radius is not None:
+        # Meridians touching the circle: sin(delta) = sin(r) / cos(latitude)
+        ratio = math.sin(min(math.pi / 2, radius / EARTH_RADIUS)) / math.cos(math.radians(latitude))
+        lon_delta = math.degrees(math.asin(ratio)) if ratio < 1 else 180.0
+    else:
+        # Box members are measured along their own parallel, and a great
+        # circle between two points on the parallel at latitude p spans
+        # sin(d / 2) = cos(p) * sin(delta / 2); the highest latitude is widest
+        widest = math.cos(math.radians(min(90.0, max(abs(lat_low), abs(lat_high)))))
+        ratio = math.sin(min(math.pi / 2, width / 2 / EARTH_RADIUS / 2)) / widest if widest > 0 else 1.0
+        lon_delta = 2 * math.degrees(math.asin(ratio)) if ratio < 1 else 180.0
+    lon_delta = min(180.0, lon_delta * _SLACK)
+    return longitude - lon_delta, longitude + lon_delta, lat_low, lat_high
+
+
+def score_ranges(longitude: float, latitude: float,
+                 bounds: Tuple[float, float, float, float]) -> List[Tuple[int, int]]:
+    """
+    Half-open score ranges of the cells covering area_bounds() around a
+    point, merged where adjacent
+    """
+    lon_low, lon_high, lat_low, lat_high = bounds
+    if lon_high - lon_low >= 180.0 or lat_low <= LAT_MIN or lat_high >= LAT_MAX:
+        return [(0, 1 << HASH_BITS)]
+
+    # Cells at step s are 360/2^s degrees wide, so start from the finest step
+    # where a cell is at least as large as the search box and refine down
+    # until the centre cell and its neighbours contain the box
+    lat_span = LAT_MAX - LAT_MIN
+    step = STEP_MAX
+    while step > 1 and ((LON_MAX - LON_MIN) / (1 << step) < lon_high - lon_low
+                        or lat_span / (1 << step) < lat_high - lat_low):
+        step -= 1
+    while step > 0:
+        lon_cell, lat_cell = _cells(longitude, latitude, step)
+        lon_size = (LON_MAX - LON_MIN) / (1 << step)
+        lat_size = lat_span / (1 << step)
+        if (LON_MIN + (lon_cell - 1) * lon_size <= lon_low and LON_MIN + (lon_cell + 2) * lon_size >= lon_high
+                and LAT_MIN + (lat_cell - 1) * lat_size <= lat_low and LAT_MIN + (lat_cell + 2) * lat_size >= lat_high):
+            break
+        step -= 1
+    if step == 0:
+        return [(0, 1 << HASH_BITS)]
+
+    scale = 1 << step
+    shift = HASH_BITS - 2 * step
+    hashes = set()
+    for lat_offset in (-1, 0, 1):
+        neighbour_lat = lat_cell + lat_offset
+        if not 0 <= neighbour_lat < scale:
+            continue
+        for lon_offset in (-1, 0, 1):
+            neighbour_lon = (lon_cell + lon_offset) % scale  # wraps at the antimeridian
+            hashes.add((_spread(neighbour_lon) << 1) | _spread(neighbour_lat))
+
+    ranges = []
+    for cell_hash in sorted(hashes):
+        low, high = cell_hash << shift, (cell_hash + 1) << shift
+        if ranges and ranges[-1][1] == low:
+            ranges[-1] = (ranges[-1][0], high)
+        else:
+            ranges.append((low, high))
+    return ranges
+
+
+def search(geo_set: SortedSet, longitude: float, latitude: float, radius: Optional[float] = None,
+           width: Optional[float] = None, height: Optional[float] = None) -> Iterator[Tuple[str, float, float]]:
+    """
+    (member, distance, score) for every member within radius meters, or
+    inside a width x height meter box, centred on a position
+    """
+    bounds = area_bounds(longitude, latitude, radius, width, height)
+    lon_low, lon_high, lat_low, lat_high = bounds
+    crosses_antimeridian = lon_low < LON_MIN or lon_high > LON_MAX
+
+    for low, high in score_ranges(longitude, latitude, bounds):
+        for member, score in geo_set.range_by_score(low, high):
+            point_lon, point_lat = decode(score)
+            # Degree bounds first: most candidates outside the area stop here
+            if not lat_low <= point_lat <= lat_high:
+                continue
+            if not crosses_antimeridian and not lon_low <= point_lon <= lon_high:
+                continue
+            if radius is not None:
+                meters = distance(longitude, latitude, point_lon, point_lat)
+                if meters > radius:
+                    continue
+            else:
+                # Same rule as Redis: north/south offset along the centre's
+                # meridian, east/west offset along the point's parallel
+                if distance(longitude, latitude, longitude, point_lat) > height / 2:
+                    continue
+                if distance(longitude, point_lat, point_lon, point_lat) > width / 2:
+                    continue
+                meters = distance(longitude, latitude, point_lon, point_lat)
+            yield member, meters, score
@@ -2,16 +2,24 @@
 Redis Persistence Module
 
 This module provides persistence functionality for the Redis-like server including:
-- Append-Only File (AOF) logging
-- Redis Database (RDB) snapshots
+- Append-Only File (AOF) logging, as a base plus incremental segments
+- Redis Database (RDB) snapshots, in independently decodable chunks of a
+  type-tagged binary format, or as a hash table served in place with mmap,
+  optionally extended by delta files of the keys changed since
 - Configuration management
-- Data recovery on startup
+- Data recovery on startup, with a bulk-parsing AOF loader and an RDB
+  loader decoding chunks in parallel
 """
 
 from .config import PersistenceConfig
 from .aof import AOFWriter
+from .manifest import AOFManifest
 from .rdb import RDBHandler
+from .mapped import MappedKeyspace, MappedRDBHandler, MappedSnapshot
+from .delta import DeltaChain
+from .loader import AOFLoader
+from .rdb_loader import RDBLoader
 from .recovery import RecoveryManager
 from .manager import PersistenceManager
 
-__all__ = ['PersistenceConfig', 'AOFWriter', 'RDBHandler', 'RecoveryManager', 'PersistenceManager']
\ No newline at end of file
+__all__ = ['PersistenceConfig', 'AOFWriter', 'AOFManifest', 'RDBHandler', 'MappedSnapshot', 'MappedKeyspace', 'MappedRDBHandler', 'DeltaChain', 'AOFLoader', 'RDBLoader', 'RecoveryManager', 'PersistenceManager']
\ No newline at end of file
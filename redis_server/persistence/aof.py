@@ -2,93 +2,548 @@
 Append-Only File (AOF) Implementation
 
 Handles logging of write commands to disk for data persistence and recovery.
+
+Commands are stored as RESP arrays of bulk strings (*<argc> then $<len>
+<bytes> per argument), so arguments may hold spaces, newlines or any
+other bytes. The event loop only appends encoded commands to an in-memory
+buffer; once per loop iteration the buffer is handed to a writer thread
+as one batch, and the thread writes (and under 'always' fsyncs) every
+batch queued since its last pass. Clients whose writes are in a batch are
+answered once that batch is on disk, so one fsync acknowledges them all.
+A batch that fails to write is retried until it succeeds, and is never
+acknowledged meanwhile; write commands are refused with -MISCONF until
+then, as in Redis.
+
+Under 'everysec' a separate fsync thread runs fdatasync once a second, so
+a slow disk never stalls the event loop. While that fsync is in progress
+the event loop keeps buffering instead of handing over more writes, for
+up to MAX_FSYNC_POSTPONE seconds; after that it writes anyway and counts
+a delayed fsync (Redis's aof_delayed_fsync).
+
+The log is multi-part (see manifest.py): a base file plus numbered
+incremental segments in the AOF directory, and the writer appends to the
+newest segment. A single appendonly.aof from before the switch becomes
+the base on first start.
+
+A rewrite (BGREWRITEAOF, or automatic once the log has grown by
+aof_rewrite_percentage since the last one) starts a new segment for the
+writes that follow, then writes a new base from the store as it was at
+that moment, in a forked child (see child.py): in the RDB format, or with
+aof_use_rdb_preamble off as the smallest command sequence (variadic
+RPUSH/SADD/HSET of up to REWRITE_ITEMS_PER_CMD items, a RESTORE record
+with the serialized value for other types, TTLs as absolute PXAT and
+PEXPIREAT deadlines). Search index definitions aren't keys: they are
+logged as FT.CREATE commands at the start of the new segment.
+Once the base is on disk the manifest is switched to it and the segments
+it replaces are deleted; nothing is copied.
 """
 
 import os
+import base64
+import queue
+import socket
 import time
 import threading
-import tempfile
-import shutil
-from typing import List, Optional, Dict, Any
+from collections import deque
+from itertools import chain
+from typing import Iterator, List, Optional, Tuple
+
+from .manifest import AOFManifest, AOFFile, BASE, HISTORY
+from .child import BackgroundJob
+from .rdb import RDBHandler, dump_value
+from ..commands.base import WRITE_COMMANDS
+
+
+# Longest the event loop holds back writes while a background fsync runs
+MAX_FSYNC_POSTPONE = 2.0
+
+# fdatasync skips flushing metadata that doesn't matter for reading the data back
+_datasync = getattr(os, 'fdatasync', os.fsync)
+
+# Elements per RPUSH/SADD/HSET command emitted by a rewrite (same as Redis)
+REWRITE_ITEMS_PER_CMD = 64
+
+# Seconds between attempts to write a batch that failed
+WRITE_RETRY_INTERVAL = 1.0
+
+# Queued to the writer thread in place of a batch number to move on to a new segment
+_SWITCH_FILE = object()
+
+
+class AOFFormatError(ValueError):
+    """Raised for an AOF record that is malformed or cut short"""
+
+    def __init__(self, message: str, offset: int):
+        super().__init__(f"{message} at offset {offset}")
+        self.offset = offset
+
+
+def encode_command(command: str, *args) -> bytes:
+    """RESP array encoding of a command and its arguments"""
+    parts = [f"*{len(args) + 1}\r\n".encode()]
+    for arg in (command.upper(),) + args:
+        data = arg if isinstance(arg, bytes) else str(arg).encode('utf-8')
+        parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+    return b"".join(parts)
+
+
+def rewrite_commands(key: str, value, expiry_time: Optional[float]) -> Iterator[bytes]:
+    """Encoded commands that recreate one key"""
+    if isinstance(value, (str, int, float)):
+        if expiry_time is not None:
+            yield encode_command("SET", key, value, "PXAT", int(expiry_time * 1000))
+            return
+        yield encode_command("SET", key, value)
+    elif isinstance(value, dict):
+        fields = [part for field in value.items() for part in field]
+        for start in range(0, len(fields), 2 * REWRITE_ITEMS_PER_CMD):
+            yield encode_command("HSET", key, *fields[start:start + 2 * REWRITE_ITEMS_PER_CMD])
+    elif isinstance(value, (deque, list, set)):
+        command = "SADD" if isinstance(value, set) else "RPUSH"
+        items = list(value)
+        for start in range(0, len(items), REWRITE_ITEMS_PER_CMD):
+            yield encode_command(command, key, *items[start:start + REWRITE_ITEMS_PER_CMD])
+    else:
+        # Bitmaps, compressed strings and the custom types: their
+        # serialized form, as RDB stores it
+        yield encode_command("RESTORE", key, base64.b64encode(dump_value(value)))
+    if expiry_time is not None:
+        yield encode_command("PEXPIREAT", key, int(expiry_time * 1000))
+
+
+def parse_commands(data: bytes, start: int = 0) -> Iterator[Tuple[str, List[str], int]]:
+    """
+    Yield (command, args, end offset) for each record in AOF contents
+    (bytes, or an mmap), beginning at offset start.
+    Lines in the older "timestamp COMMAND args" text format are accepted
+    too, so files written before the switch still load.
+    Raises AOFFormatError at the first incomplete or malformed record.
+    """
+    position = start
+    size = len(data)
+    while position < size:
+        if data[position] in b"\r\n":
+            position += 1
+            continue
+
+        if data[position] != ord('*'):
+            line_end = data.find(b"\n", position)
+            if line_end < 0:
+                raise AOFFormatError("truncated text record", position)
+            parts = data[position:line_end].decode('utf-8').split()
+            position = line_end + 1
+            if len(parts) >= 2:
+                yield parts[1].upper(), parts[2:], position
+            continue
+
+        start = position
+        header_end = data.find(b"\r\n", position)
+        if header_end < 0:
+            raise AOFFormatError("truncated record header", start)
+        try:
+            count = int(data[position + 1:header_end])
+        except ValueError:
+            raise AOFFormatError("bad array length", start)
+        position = header_end + 2
+
+        args = []
+        for _ in range(count):
+            length_end = data.find(b"\r\n", position)
+            if length_end < 0 or data[position] != ord('$'):
+                raise AOFFormatError("truncated or malformed bulk string", start)
+            try:
+                length = int(data[position + 1:length_end])
+            except ValueError:
+                raise AOFFormatError("bad bulk string length", start)
+            value_start = length_end + 2
+            value_end = value_start + length
+            if value_end + 2 > size:
+                raise AOFFormatError("truncated bulk string", start)
+            args.append(data[value_start:value_end].decode('utf-8'))
+            position = value_end + 2
+
+        if args:
+            yield args[0].upper(), args[1:], position
+
+
+def parse_resp_block(block: bytes) -> Tuple[List[List[str]], int]:
+    """
+    Bulk parser for the complete RESP records at the start of block.
+    
+    The block is decoded and split on CRLF in one call each, records are
+    cut out of the token list by their element counts, and the bulk
+    lengths of every record in the block are checked against the values
+    with one string comparison, so no Python code runs per argument.
+    Returns (records, bytes consumed), each record being the command name
+    (as written) followed by its args. Stops at the first record it can't
+    take this way: one cut off by the end of block, a value containing
+    CRLF, an old text line or malformed data; parse_commands() handles
+    those one at a time.
+    """
+    ascii_only = block.isascii()
+    # latin-1 maps bytes to characters one to one, so lengths stay byte counts
+    tokens = block.decode('ascii' if ascii_only else 'latin-1').split("\r\n")
+    last = len(tokens) - 1  # tokens[last] isn't followed by CRLF
+    records, lengths, starts = [], [], []
+    i = 0
+    while i < last:
+        header = tokens[i]
+        if not header:
+            i += 1
+            continue
+        if header[0] != "*":
+            break
+        try:
+            end = i + 1 + 2 * int(header[1:])
+        except ValueError:
+            break
+        if end > last or end <= i + 1:
+            break
+        starts.append(i)
+        lengths.append(tokens[i + 1:end:2])
+        records.append(tokens[i + 2:end:2])
+        i = end
+    
+    # Tokens never contain CRLF, so joining with it compares token by token
+    if records and ("\r\n".join(chain.from_iterable(lengths))
+                    != "$" + "\r\n$".join(map(str, map(len, chain.from_iterable(records))))):
+        good = 0
+        for record_lengths, values in zip(lengths, records):
+            if "\r\n".join(record_lengths) != "$" + "\r\n$".join(map(str, map(len, values))):
+                break
+            good += 1
+        i = starts[good]
+        del records[good:]
+    if not ascii_only:
+        for index, values in enumerate(records):
+            try:
+                records[index] = [value if value.isascii() else value.encode('latin-1').decode('utf-8')
+                                  for value in values]
+            except UnicodeDecodeError:
+                i = starts[index]
+                del records[index:]
+                break
+    
+    # Every token taken was followed by CRLF
+    return records, sum(map(len, tokens[:i])) + 2 * i
 
 
 class AOFWriter:
     """Handles AOF (Append-Only File) operations for command logging"""
     
-    def __init__(self, filename: str, sync_policy: str = 'everysec'):
+    def __init__(self, filename: str, sync_policy: str = 'everysec',
+                 dirname: Optional[str] = None, use_rdb_preamble: bool = True):
         """
         Initialize AOF writer
         
         Args:
-            filename: Path to AOF file
+            filename: Path of the single-file AOF; its name prefixes the
+                multi-part files, and an existing one is upgraded to a base
             sync_policy: Sync policy ('always', 'everysec', 'no')
+            dirname: AOF directory (default: appendonlydir next to filename)
+            use_rdb_preamble: Write rewritten bases in the RDB format
         """
         self.filename = filename
         self.sync_policy = sync_policy
+        self.use_rdb_preamble = use_rdb_preamble
+        self.manifest = AOFManifest(dirname or os.path.join(os.path.dirname(filename), 'appendonlydir'),
+                                    os.path.basename(filename))
         self.file_handle = None
         self.last_sync_time = time.time()
         self.pending_writes = 0
-        self._lock = threading.Lock()
+        self._lock = threading.Lock()  # serializes file access between threads
+        
+        # Commands logged since the last hand-off to the writer thread
+        self._buffer = bytearray()
+        # Batches are numbered in hand-off order; written_batch is the last
+        # one the writer thread has finished with (fsynced under 'always')
+        self._next_batch = 1
+        self.written_batch = 0
+        self._queue: "queue.Queue[Tuple[Optional[int], bytes]]" = queue.Queue()
+        self._thread = None
+        # Set by close() so the writer thread stops retrying a failed batch
+        self._closing = threading.Event()
+        # The error of the last failed write; None once a write succeeds
+        # (writes are refused meanwhile, see PersistenceManager.write_error)
+        self.last_write_error = None
+        # Segment a switch moves to once it can be opened (None: no switch
+        # pending); until then writes wait rather than land in the old one
+        self._next_segment = None
+        
+        # Background fsync state ('everysec'); synced_batch is the last batch
+        # covered by a completed fsync
+        self.synced_batch = 0
+        self.fsync_in_progress = False
+        self.last_fsync_duration = 0.0
+        self.delayed_fsync = 0
+        self._postponed_since = None
+        self._fsync_requested = threading.Event()
+        self._fsync_thread = None
+        self._stopping = False
         
-        # Write commands that should be logged
-        self.write_commands = {
-            'SET', 'DEL', 'EXPIRE', 'EXPIREAT', 'PERSIST', 'FLUSHALL',
-            'LPUSH', 'RPUSH', 'LPOP', 'RPOP', 'LSET',
-            'HSET', 'HMSET', 'HDEL',
-            'SADD', 'SREM', 'SINTERSTORE'
-        }
+        # Rewrite state: the segment started with the rewrite, the base
+        # being written and the BackgroundJob writing it (None when no
+        # rewrite runs), and how the last one went
+        self._rewrite_incr = None
+        self._rewrite_base = None
+        self._rewrite_job = None
+        self.last_rewrite_status = 'ok'
+        # Log size right after the last rewrite (or at startup), the base
+        # that automatic rewrites measure growth against
+        self.base_size = 0
+        
+        # Written to by the writer thread so the event loop's select() wakes
+        # up to answer clients waiting for their batch
+        self.wakeup_socket, self._wakeup_sender = socket.socketpair()
+        self.wakeup_socket.setblocking(False)
+        self._wakeup_sender.setblocking(False)
         
         # Ensure directory exists
-        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        os.makedirs(self.manifest.dirname, exist_ok=True)
+    
+    @property
+    def incr_filename(self) -> Optional[str]:
+        """Segment new writes are appended to"""
+        if not self.manifest.incrs:
+            return None
+        return self.manifest.path(self.manifest.incrs[-1])
     
     def open(self) -> None:
-        """Open AOF file for writing"""
+        """Load (or create) the manifest, open the newest segment and start the writer thread"""
         try:
-            self.file_handle = open(self.filename, 'a', encoding='utf-8')
-        except IOError as e:
-            raise RuntimeError(f"Failed to open AOF file {self.filename}: {e}")
+            self._load_manifest()
+            # Unbuffered: the writer thread's writes go straight to the OS,
+            # so an fsync from another thread never misses buffered bytes
+            self.file_handle = open(self.incr_filename, 'ab', buffering=0)
+        except (IOError, ValueError) as e:
+            raise RuntimeError(f"Failed to open AOF in {self.manifest.dirname}: {e}")
+        self.base_size = self.get_file_size()
+        self._stopping = False
+        self._closing.clear()
+        self._thread = threading.Thread(target=self._writer_loop, name="aof-writer", daemon=True)
+        self._thread.start()
+        if self.sync_policy == 'everysec':
+            self._fsync_thread = threading.Thread(target=self._fsync_loop, name="aof-fsync", daemon=True)
+            self._fsync_thread.start()
     
     def close(self) -> None:
-        """Close AOF file"""
+        """Write out everything logged, stop the writer thread and close the AOF file"""
         if self.file_handle:
+            if self._rewrite_job:
+                # Let a running rewrite finish so its base is put in place
+                self._rewrite_job.wait()
+                self.finish_rewrite()
+            self.flush_buffer(force=True)
+            self._queue.put((None, b""))
+            # A batch that fails from now on isn't retried: the disk is failing
+            self._closing.set()
+            self._thread.join()
+            self._thread = None
+            if self._fsync_thread:
+                self._stopping = True
+                self._fsync_requested.set()
+                self._fsync_thread.join()
+                self._fsync_thread = None
             self.sync_to_disk()  # Final sync before closing
             self.file_handle.close()
             self.file_handle = None
     
+    def _load_manifest(self) -> None:
+        """Read the manifest, or create one (upgrading a single-file AOF to the base)"""
+        manifest = self.manifest
+        if manifest.load():
+            # Left behind by a crash between a rewrite and its cleanup
+            manifest.delete_history()
+            if manifest.incrs:
+                return
+        elif os.path.exists(self.filename):
+            os.replace(self.filename, os.path.join(manifest.dirname, manifest.basename))
+            manifest.base = AOFFile(manifest.basename, 1, BASE)
+            print(f"Upgraded {self.filename} to the base of a multi-part AOF in {manifest.dirname}")
+        manifest.incrs.append(manifest.next_incr())
+        manifest.save()
+    
     def log_command(self, command: str, *args) -> None:
         """
-        Log a command to the AOF file
+        Log a command to the AOF buffer (event loop only; written by flush_buffer)
         
         Args:
             command: Command name (e.g., 'SET', 'DEL')
             *args: Command arguments
         """
-        if not self.file_handle or command.upper() not in self.write_commands:
+        if not self.file_handle or command.upper() not in WRITE_COMMANDS:
             return
         
+        self._buffer += self._format_command(command, *args)
+        self.pending_writes += 1
+    
+    def _format_command(self, command: str, *args) -> bytes:
+        """Format command in Redis protocol format for AOF"""
+        return encode_command(command, *args)
+    
+    def flush_buffer(self, force: bool = False) -> Optional[int]:
+        """
+        Hand the commands logged since the last call to the writer thread
+        as one batch. Called once per event loop iteration.
+        
+        Under 'everysec' the hand-off is postponed while a background fsync
+        is running, for at most MAX_FSYNC_POSTPONE seconds.
+        
+        Returns:
+            The batch number, or None if nothing was handed off
+        """
+        if not self._buffer:
+            return None
+        if self.fsync_in_progress and not force:
+            now = time.time()
+            if self._postponed_since is None:
+                self._postponed_since = now
+            if now - self._postponed_since < MAX_FSYNC_POSTPONE:
+                return None
+            # The disk is too slow: write without waiting for the fsync
+            self.delayed_fsync += 1
+            print("Asynchronous AOF fsync is taking too long (disk is busy?). "
+                  "Writing the AOF buffer without waiting for fsync to complete.")
+        self._postponed_since = None
+        batch = self._next_batch
+        self._next_batch += 1
+        data, self._buffer = bytes(self._buffer), bytearray()
+        self._queue.put((batch, data))
+        return batch
+    
+    def unwritten_batch(self) -> Optional[int]:
+        """
+        Batch a reply sent now has to wait for under 'always': the one being
+        buffered, or the last one still with the writer thread. None when
+        everything logged so far is already on disk (or the policy doesn't
+        hold replies).
+        """
+        if self.sync_policy != 'always' or not self.file_handle:
+            return None
+        if self._buffer:
+            return self._next_batch
+        if self.written_batch < self._next_batch - 1:
+            return self._next_batch - 1
+        return None
+    
+    def _writer_loop(self) -> None:
+        """Writer thread: write (and fsync under 'always') queued batches, several per pass"""
+        while True:
+            batch, data = self._queue.get()
+            if batch is None:
+                return
+            if batch is _SWITCH_FILE:
+                self._switch_file(data)
+                continue
+            chunks = [data]
+            stopping = False
+            switch = None
+            while True:
+                try:
+                    next_batch, next_data = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if next_batch is None:
+                    stopping = True
+                    break
+                if next_batch is _SWITCH_FILE:
+                    switch = next_data
+                    break
+                batch = next_batch
+                chunks.append(next_data)
+            
+            data = b"".join(chunks)
+            # Nothing in the batch is acknowledged before it is on disk: on
+            # an error, retry it until it succeeds (or the writer is closed)
+            while not self._write_batch(data, batch):
+                if self._closing.wait(WRITE_RETRY_INTERVAL):
+                    return
+            
+            self.written_batch = batch
+            if self.sync_policy == 'always':
+                try:
+                    self._wakeup_sender.send(b"\0")
+                except OSError:
+                    pass  # socket buffer full: a wakeup is already pending
+            if switch is not None:
+                self._switch_file(switch)
+            if stopping:
+                return
+    
+    def _write_batch(self, data: bytes, batch: int) -> bool:
+        """
+        Writer thread: append data (and fsync it under 'always'). On an
+        error the file is cut back to where it was, so no partial command
+        is left behind, and the error is kept in last_write_error until a
+        write succeeds.
+        """
         with self._lock:
+            position = None
             try:
-                # Format command in Redis protocol format
-                formatted_command = self._format_command(command, *args)
-                self.file_handle.write(formatted_command)
-                self.pending_writes += 1
-                
-                # Sync based on policy
+                if self._next_segment is not None:
+                    self._open_next_segment()
+                position = self.file_handle.tell()
+                self._write_all(data)
                 if self.sync_policy == 'always':
-                    self.file_handle.flush()
-                    os.fsync(self.file_handle.fileno())
+                    started = time.time()
+                    _datasync(self.file_handle.fileno())
                     self.last_sync_time = time.time()
+                    self.last_fsync_duration = self.last_sync_time - started
+                    self.synced_batch = batch
                     self.pending_writes = 0
-                    
-            except IOError as e:
-                print(f"Error writing to AOF file: {e}")
+            except (OSError, ValueError) as e:
+                if self.last_write_error is None:
+                    print(f"Error writing to AOF file: {e}")
+                self.last_write_error = e
+                if position is not None:
+                    try:
+                        self.file_handle.truncate(position)
+                    except OSError:
+                        pass
+                return False
+        if self.last_write_error is not None:
+            print("AOF write error looks solved, the server can write again.")
+            self.last_write_error = None
+        return True
     
-    def _format_command(self, command: str, *args) -> str:
-        """Format command in Redis protocol format for AOF"""
-        # Simple text format for AOF (easier to read and debug)
-        timestamp = int(time.time())
-        formatted_args = ' '.join(str(arg) for arg in args)
-        return f"{timestamp} {command.upper()} {formatted_args}\n"
+    def _write_all(self, data: bytes) -> None:
+        view = memoryview(data)
+        while view:
+            written = self.file_handle.write(view)
+            view = view[written:]
+    
+    def request_fsync(self) -> None:
+        """Ask the fsync thread for an fdatasync; returns immediately"""
+        if self._fsync_thread is None or self.fsync_in_progress:
+            return
+        self.fsync_in_progress = True
+        self._fsync_requested.set()
+    
+    def _fsync_loop(self) -> None:
+        """Fsync thread ('everysec'): fdatasync whatever has been written, on request"""
+        while True:
+            self._fsync_requested.wait()
+            self._fsync_requested.clear()
+            if self._stopping:
+                return
+            batch = self.written_batch
+            started = time.time()
+            with self._lock:
+                try:
+                    _datasync(self.file_handle.fileno())
+                except (OSError, ValueError) as e:
+                    print(f"Error syncing AOF file: {e}")
+            finished = time.time()
+            self.last_fsync_duration = finished - started
+            self.last_sync_time = finished
+            self.synced_batch = batch
+            self.fsync_in_progress = False
+    
+    def fsync_lag(self) -> float:
+        """Seconds since the last completed fsync, or 0 if everything written is synced"""
+        if self.written_batch <= self.synced_batch and not self._buffer:
+            return 0.0
+        return time.time() - self.last_sync_time
     
     def sync_to_disk(self) -> None:
         """Force sync to disk based on policy"""
@@ -97,9 +552,9 @@ class AOFWriter:
             
         with self._lock:
             try:
-                self.file_handle.flush()
-                os.fsync(self.file_handle.fileno())
+                _datasync(self.file_handle.fileno())
                 self.last_sync_time = time.time()
+                self.synced_batch = self.written_batch
                 self.pending_writes = 0
             except IOError as e:
                 print(f"Error syncing AOF file: {e}")
@@ -109,62 +564,149 @@ class AOFWriter:
         if self.sync_policy == 'always':
             return False  # Already synced immediately
         elif self.sync_policy == 'everysec':
-            return time.time() - self.last_sync_time >= 1.0
+            return (self.written_batch > self.synced_batch and not self.fsync_in_progress
+                    and time.time() - self.last_sync_time >= 1.0)
         else:  # 'no'
             return False
     
-    def rewrite_aof(self, data_store, temp_filename: str) -> bool:
+    def start_rewrite(self, data_store, temp_filename: str) -> bool:
         """
-        Create a compacted version of the AOF file
+        Move new writes to a fresh segment and start writing a new base from
+        data_store as it is now, in a forked child (see child.py; event
+        loop only). finish_rewrite() completes it.
         
         Args:
-            data_store: Current data store state
-            temp_filename: Temporary file to write to
+            data_store: Data store to rewrite
+            temp_filename: Temporary file to write the base to
             
         Returns:
-            True if rewrite was successful
+            True if the rewrite was started, False if one is already running
         """
+        if not self.file_handle or self.rewrite_in_progress():
+            return False
+        
+        # The manifest lists the new segment before anything is written to
+        # it; the writes still buffered predate the fork and go to the old
+        # segment
+        manifest = self.manifest
+        rewrite_incr = manifest.next_incr()
+        rewrite_base = manifest.next_base(self.use_rdb_preamble)
+        manifest.incrs.append(rewrite_incr)
+        manifest.save()
+        self.flush_buffer(force=True)
+        self._queue.put((_SWITCH_FILE, manifest.path(rewrite_incr)))
+        # The base only holds keys, and the segments that defined the rest
+        # go with the rewrite: state kept besides the keys (search index
+        # definitions) opens the new segment. Should the rewrite fail, the
+        # old segments are replayed too and the repeat is refused, harmlessly.
+        for command, args in data_store.listener_commands():
+            self.log_command(command, *args)
+        self._rewrite_incr = rewrite_incr
+        self._rewrite_base = rewrite_base
+        
+        base_filename = manifest.path(rewrite_base)
         try:
-            with open(temp_filename, 'w', encoding='utf-8') as temp_file:
-                current_time = int(time.time())
-                
-                # Write all current keys as SET commands
-                for key in data_store.keys():
-                    value = data_store.get(key)
-                    if value is not None:
-                        # Get TTL if exists
-                        ttl = data_store.ttl(key)
-                        
-                        # Write SET command
-                        temp_file.write(f"{current_time} SET {key} {value}\n")
-                        
-                        # Write EXPIRE command if TTL exists
-                        if ttl > 0:
-                            temp_file.write(f"{current_time} EXPIRE {key} {ttl}\n")
-            
-            # Atomically replace original file
-            shutil.move(temp_filename, self.filename)
-            
-            # Reopen file handle if it was open
-            if self.file_handle:
-                self.file_handle.close()
-                self.open()
-            
-            return True
-            
-        except Exception as e:
-            print(f"Error during AOF rewrite: {e}")
-            # Clean up temp file
+            self._rewrite_job = BackgroundJob.start(
+                "aof-rewrite", data_store,
+                lambda entries: self._write_base(entries, temp_filename, base_filename))
+        except OSError as e:
+            # The new segment stays in the manifest: it holds the writes from now on
+            print(f"Error starting AOF rewrite: {e}")
+            self._rewrite_incr = None
+            self._rewrite_base = None
+            self.last_rewrite_status = 'err'
+            return False
+        return True
+    
+    def rewrite_in_progress(self) -> bool:
+        return self._rewrite_incr is not None
+    
+    def _write_base(self, entries, temp_filename: str, base_filename: str) -> str:
+        """Rewrite child: write the base that rebuilds entries, via temp_filename"""
+        started = time.time()
+        try:
+            if self.use_rdb_preamble:
+                keys = RDBHandler(base_filename).write_file(entries, temp_filename)
+            else:
+                keys = 0
+                with open(temp_filename, 'wb') as temp_file:
+                    for key, value, expiry_time in entries:
+                        if expiry_time is not None and expiry_time <= started:
+                            continue
+                        temp_file.writelines(rewrite_commands(key, value, expiry_time))
+                        keys += 1
+                    temp_file.flush()
+                    _datasync(temp_file.fileno())
+            os.replace(temp_filename, base_filename)
+        except BaseException:
             if os.path.exists(temp_filename):
                 os.remove(temp_filename)
-            return False
+            raise
+        return f"{keys} keys"
     
-    def get_file_size(self) -> int:
-        """Get current AOF file size"""
+    def finish_rewrite(self) -> Optional[bool]:
+        """
+        Once the rewrite child has exited, make its base the manifest's base
+        and delete the base and segments it replaces (event loop only)
+        
+        Returns:
+            None while no rewrite has finished, else whether it succeeded
+        """
+        job = self._rewrite_job
+        if job is None or job.poll() is None:
+            return None
+        success = job.result
+        if success:
+            manifest = self.manifest
+            replaced = [aof_file for aof_file in manifest.files() if aof_file.seq < self._rewrite_incr.seq
+                        or aof_file.file_type == BASE]
+            for aof_file in replaced:
+                aof_file.file_type = HISTORY
+            manifest.history.extend(replaced)
+            manifest.base = self._rewrite_base
+            manifest.incrs = [aof_file for aof_file in manifest.incrs if aof_file.seq >= self._rewrite_incr.seq]
+            manifest.save()
+            # Only once the new manifest is in place: a crash before this
+            # point still loads the old base and every segment
+            manifest.delete_history()
+            self.base_size = self.get_file_size()
+        else:
+            print(f"Error during AOF rewrite: {job.message}")
+        
+        self.last_rewrite_status = 'ok' if success else 'err'
+        self._rewrite_incr = None
+        self._rewrite_base = None
+        self._rewrite_job = None
+        return success
+    
+    def _switch_file(self, filename: str) -> None:
+        """
+        Writer thread: append to filename from now on. If it can't be
+        opened, the current segment stays open and _write_batch() tries
+        again before every write, which fails (and is retried) until then.
+        """
+        with self._lock:
+            self._next_segment = filename
+            try:
+                self._open_next_segment()
+            except OSError as e:
+                self.last_write_error = e
+                print(f"Error switching to AOF segment {filename}: {e}")
+
+    def _open_next_segment(self) -> None:
+        """Writer thread, holding _lock: open the pending segment, then close the current one"""
+        handle = open(self._next_segment, 'ab', buffering=0)
+        previous, self.file_handle, self._next_segment = self.file_handle, handle, None
         try:
-            return os.path.getsize(self.filename)
-        except OSError:
-            return 0
+            # The fsync thread only ever syncs the current segment
+            if self.sync_policy == 'everysec':
+                _datasync(previous.fileno())
+        finally:
+            previous.close()
+    
+    def get_file_size(self) -> int:
+        """Get current AOF size: the base plus every segment"""
+        return self.manifest.total_size()
     
     def needs_rewrite(self, min_size: int, percentage: int) -> bool:
         """
@@ -178,8 +720,9 @@ class AOFWriter:
             True if AOF should be rewritten
         """
         current_size = self.get_file_size()
-        if current_size < min_size:
+        if percentage <= 0 or current_size < min_size:
             return False
         
-        # For now, trigger rewrite if file is larger than min_size * 2
-        return current_size > min_size * 2
\ No newline at end of file
+        # Growth since the last rewrite, as Redis measures it
+        base_size = self.base_size or 1
+        return (current_size - base_size) * 100 / base_size >= percentage
\ No newline at end of file
@@ -0,0 +1,170 @@
+"""
+Background Persistence Jobs
+
+BGSAVE and AOF rewrites serialize the whole dataset. Where os.fork() is
+available they do it in a child process: the child sees the store
+exactly as it was at the fork while the kernel shares its memory with the
+server copy-on-write, so the event loop keeps serving and only the pages
+it writes to get copied. gc.freeze() right before the fork moves every
+object out of the collector's generations, so a collection in either
+process doesn't write to their GC headers and unshare their pages.
+
+The child reports one status line over a pipe and exits; the event loop
+reaps it with poll(), which never blocks. Without fork() the job runs on
+a thread over a copy-on-write DataStore.snapshot() instead.
+"""
+
+import gc
+import os
+import sys
+import threading
+import time
+from typing import Any, Callable, Collection, Iterable, Optional, Tuple
+
+from ..tiering import SpilledValue
+
+
+FORK_SUPPORTED = hasattr(os, 'fork')
+
+# The status line a child sends is cut to fit in a pipe write done at once
+MAX_REPORT_SIZE = 512
+
+Entries = Iterable[Tuple[str, Any, Optional[float]]]
+
+
+class BackgroundJob:
+    """A serialization job running in a forked child (or on a thread)"""
+
+    def __init__(self, purpose: str):
+        self.purpose = purpose
+        self.started = time.time()
+        self.duration = 0.0
+        # None while running, then whether it succeeded and its report
+        self.result: Optional[bool] = None
+        self.message = ''
+        self.pid: Optional[int] = None
+        self._status_fd: Optional[int] = None
+        self._thread: Optional[threading.Thread] = None
+        self._thread_report = ''
+        self._data_store = None
+
+    @classmethod
+    def start(cls, purpose: str, data_store, job: Callable[[Entries], Optional[str]],
+              keys: Optional[Collection[str]] = None) -> 'BackgroundJob':
+        """
+        Run job over the (key, value, expiry_time) entries of data_store as
+        they are now (event loop only)
+
+        Args:
+            purpose: What the job does, for messages
+            data_store: Store to serialize
+            job: Writes the entries out; returns a short report or raises
+            keys: Only serialize these, with None as the value of the ones
+                that don't exist (see DataStore.entries)
+
+        Raises:
+            OSError: if the child can't be created
+        """
+        background = cls(purpose)
+        if FORK_SUPPORTED:
+            background._fork(data_store, job, keys)
+        else:
+            background._data_store = data_store
+            snapshot = data_store.snapshot()
+            background._thread = threading.Thread(target=background._run_thread, args=(snapshot, job, keys),
+                                                  name=purpose, daemon=True)
+            background._thread.start()
+        return background
+
+    def _fork(self, data_store, job, keys) -> None:
+        read_fd, write_fd = os.pipe()
+        gc.freeze()
+        try:
+            pid = os.fork()
+        except OSError:
+            gc.unfreeze()
+            os.close(read_fd)
+            os.close(write_fd)
+            raise
+
+        if pid == 0:
+            # Child: never return into the server's code, whatever happens
+            code = 1
+            try:
+                os.close(read_fd)
+                report = "ok " + (job(data_store.entries(keys)) or '')
+                code = 0
+            except BaseException as e:
+                report = f"err {e}"
+            try:
+                sys.stdout.flush()
+                os.write(write_fd, report.encode('utf-8', 'replace')[:MAX_REPORT_SIZE])
+            finally:
+                os._exit(code)
+
+        os.close(write_fd)
+        gc.unfreeze()
+        self.pid = pid
+        self._status_fd = read_fd
+
+    def _run_thread(self, snapshot, job, keys) -> None:
+        try:
+            if keys is None:
+                items = snapshot.items()
+            else:
+                items = ((key, snapshot.get(key, (None, None, None))) for key in keys)
+            # Spilled values are read from the value log, whose files outlive any compaction meanwhile
+            report = "ok " + (job((key, value.load() if isinstance(value, SpilledValue) else value, expiry_time)
+                                  for key, (value, _, expiry_time) in items) or '')
+        except Exception as e:
+            report = f"err {e}"
+        self._thread_report = report
+
+    def poll(self) -> Optional[bool]:
+        """
+        Reap the job if it has ended, without blocking (event loop only)
+
+        Returns:
+            None while it runs, else whether it succeeded
+        """
+        if self.result is None:
+            if self.pid is not None:
+                pid, status = os.waitpid(self.pid, os.WNOHANG)
+                if pid:
+                    self._reap(status)
+            elif not self._thread.is_alive():
+                self._join_thread()
+        return self.result
+
+    def wait(self) -> bool:
+        """Block until the job ends (shutdown and tests)"""
+        if self.result is None:
+            if self.pid is not None:
+                _, status = os.waitpid(self.pid, 0)
+                self._reap(status)
+            else:
+                self._join_thread()
+        return self.result
+
+    def _reap(self, status: int) -> None:
+        with os.fdopen(self._status_fd, 'rb') as pipe:
+            report = pipe.read().decode('utf-8', 'replace')
+        self._status_fd = None
+        self._finish(report, os.waitstatus_to_exitcode(status))
+
+    def _finish(self, report: str, code: int) -> None:
+        self.duration = time.time() - self.started
+        if code < 0:
+            self.message = f"child killed by signal {-code}"
+        elif not report:
+            self.message = f"child exited with code {code}"
+        else:
+            self.message = report.partition(' ')[2]
+        self.result = code == 0 and report.startswith("ok ")
+
+    def _join_thread(self) -> None:
+        self._thread.join()
+        # The thread has read everything it needs from the snapshot
+        self._data_store.release_snapshot()
+        self._data_store = None
+        self._finish(self._thread_report, 0)
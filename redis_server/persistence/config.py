@@ -35,6 +35,8 @@ class PersistenceConfig:
             # AOF Configuration
             'aof_enabled': True,
             'aof_filename': 'appendonly.aof',
+            'aof_dirname': 'appendonlydir',  # Multi-part AOF: base, segments and manifest
+            'aof_use_rdb_preamble': True,  # Write rewritten bases in the RDB format
             'aof_sync_policy': 'everysec',  # 'always', 'everysec', 'no'
             'aof_rewrite_percentage': 100,  # Auto rewrite when AOF is 100% larger
             'aof_rewrite_min_size': 1024 * 1024,  # Minimum AOF size for rewrite (1MB)
@@ -44,6 +46,11 @@ class PersistenceConfig:
             'rdb_filename': 'dump.rdb',
             'rdb_compression': True,
             'rdb_checksum': True,
+            'rdb_load_workers': 0,  # Processes decoding snapshot chunks on load (0 = one per CPU)
+            'rdb_format': 'chunked',  # 'chunked', or 'mapped' to serve the snapshot in place (see mapped.py)
+            'rdb_incremental': False,  # Auto-saves write only the changed keys, as delta files (see delta.py)
+            'rdb_delta_max_chain': 16,  # Deltas after which the next auto-save is a full snapshot
+            'rdb_delta_max_ratio': 0.5,  # Likewise once the deltas add up to this fraction of the base
             
             # RDB Save Conditions: (seconds, changes)
             'rdb_save_conditions': [
@@ -56,6 +63,11 @@ class PersistenceConfig:
             'data_dir': './data',
             'temp_dir': './data/temp',
             
+            # Tiered storage (see tiering.py)
+            'tiering_max_memory': 0,  # Spill values of cold keys to disk above this many bytes (0 = never)
+            'tiering_dirname': 'valuelog',  # Value log directory, in data_dir
+            'tiering_promote_hits': 2,  # Reads from disk after which a value moves back to memory
+            
             # General Settings
             'persistence_enabled': True,
             'recovery_on_startup': True,
@@ -69,6 +81,15 @@ class PersistenceConfig:
         if self._config['aof_sync_policy'] not in valid_sync_policies:
             raise ValueError(f"Invalid AOF sync policy. Must be one of: {valid_sync_policies}")
         
+        # Validate RDB format
+        valid_rdb_formats = ['chunked', 'mapped']
+        if self._config['rdb_format'] not in valid_rdb_formats:
+            raise ValueError(f"Invalid RDB format. Must be one of: {valid_rdb_formats}")
+        if self._config['rdb_incremental'] and self._config['rdb_format'] == 'mapped':
+            raise ValueError("Incremental RDB snapshots need the 'chunked' RDB format")
+        if self._config['rdb_delta_max_chain'] < 1:
+            raise ValueError("rdb_delta_max_chain must be at least 1")
+        
         # Validate RDB save conditions
         for condition in self._config['rdb_save_conditions']:
             if not isinstance(condition, tuple) or len(condition) != 2:
@@ -113,6 +134,10 @@ class PersistenceConfig:
     def aof_filename(self) -> str:
         return os.path.join(self._config['data_dir'], self._config['aof_filename'])
     
+    @property
+    def aof_dirname(self) -> str:
+        return os.path.join(self._config['data_dir'], self._config['aof_dirname'])
+    
     @property
     def rdb_filename(self) -> str:
         return os.path.join(self._config['data_dir'], self._config['rdb_filename'])
@@ -0,0 +1,138 @@
+"""
+Incremental RDB Snapshots
+
+With rdb_incremental on, an automatic save writes only the keys changed
+since the previous one (DataStore.take_dirty_keys()) to a delta file next
+to the RDB file, so its I/O follows the write rate instead of the size of
+the dataset:
+
+  dump.rdb            full snapshot, aux snapshot-id=<id>
+  dump.rdb.delta.1    changed keys, aux base-id=<id> delta-seq=1
+  dump.rdb.delta.2    ...
+
+Deltas are ordinary version 0003 RDB files; keys deleted or expired since
+the last save are OPCODE_DELETE records. Recovery loads the base, then
+applies its deltas in sequence. A delta whose base-id or delta-seq
+doesn't continue the chain (left over from a crash between a new base and
+the removal of the old deltas) is removed, never applied.
+
+Once the chain holds max_deltas files, or its deltas add up to more than
+max_ratio of the base's size, the next save is a full snapshot again,
+which consolidates the chain: its deltas are removed once the new base is
+in place. SAVE and BGSAVE always write a full snapshot.
+"""
+
+import os
+from typing import Dict, List, Optional, Tuple
+
+from .mapped import MAGIC, MappedSnapshot
+from .rdb import RDBHandler, read_aux
+
+
+DEFAULT_MAX_DELTAS = 16
+DEFAULT_MAX_RATIO = 0.5
+
+
+def snapshot_aux(filename: str) -> Dict[str, str]:
+    """Aux fields of a version 0003 RDB file or a mapped snapshot; empty for a missing, older or unreadable file"""
+    try:
+        size = os.path.getsize(filename)
+        with open(filename, 'rb') as f:
+            header = f.read(len(RDBHandler.MAGIC_STRING) + len(RDBHandler.VERSION))
+            if header == MAGIC:
+                return MappedSnapshot(filename).aux
+            if header != RDBHandler.MAGIC_STRING + RDBHandler.VERSION:
+                return {}
+            return read_aux(f, size)
+    except (OSError, ValueError):
+        return {}
+
+
+def delta_files(filename: str) -> List[Tuple[int, str]]:
+    """(seq, path) of every delta file next to an RDB file, in sequence"""
+    directory = os.path.dirname(filename) or '.'
+    prefix = os.path.basename(filename) + '.delta.'
+    if not os.path.isdir(directory):
+        return []
+    files = []
+    for name in os.listdir(directory):
+        seq = name[len(prefix):]
+        if name.startswith(prefix) and seq.isdigit():
+            files.append((int(seq), os.path.join(directory, name)))
+    return sorted(files)
+
+
+def find_chain(filename: str) -> Tuple[Optional[str], List[str], List[str]]:
+    """
+    The snapshot-id of an RDB file, the delta files chained to it in
+    sequence, and the other delta files next to it (stale)
+    """
+    base_id = snapshot_aux(filename).get('snapshot-id')
+    chained, stale = [], []
+    for seq, path in delta_files(filename):
+        aux = snapshot_aux(path)
+        if (base_id is not None and aux.get('base-id') == base_id
+                and aux.get('delta-seq') == str(seq) == str(len(chained) + 1)):
+            chained.append(path)
+        else:
+            stale.append(path)
+    return base_id, chained, stale
+
+
+class DeltaChain:
+    """The delta files chained to an RDB file"""
+
+    def __init__(self, filename: str, max_deltas: int = DEFAULT_MAX_DELTAS, max_ratio: float = DEFAULT_MAX_RATIO):
+        """
+        Args:
+            filename: Path to the RDB file the deltas are chained to
+            max_deltas: Deltas after which the next save is a full snapshot
+            max_ratio: Size of the deltas, as a fraction of the base's, after
+                which the next save is a full snapshot
+        """
+        self.filename = filename
+        self.max_deltas = max_deltas
+        self.max_ratio = max_ratio
+        # snapshot-id of the base, None while it has none (nothing can be chained to it)
+        self.base_id = None
+        self.deltas: List[str] = []
+        self.delta_bytes = 0
+        self.scan()
+
+    def delta_filename(self, seq: int) -> str:
+        return f"{self.filename}.delta.{seq}"
+
+    def scan(self) -> None:
+        """Find the base's id and the deltas chained to it; remove any other delta file"""
+        self.base_id, chained, stale = find_chain(self.filename)
+        self.deltas, self.delta_bytes = [], 0
+        for path in chained:
+            self.extended(path)
+        for path in stale:
+            print(f"Removing {path}: not chained to {self.filename}")
+            os.remove(path)
+
+    def next_seq(self) -> int:
+        return len(self.deltas) + 1
+
+    def can_extend(self) -> bool:
+        """Whether the next save may be a delta rather than a full snapshot"""
+        if self.base_id is None or len(self.deltas) >= self.max_deltas:
+            return False
+        try:
+            base_size = os.path.getsize(self.filename)
+        except OSError:
+            return False
+        return self.delta_bytes <= base_size * self.max_ratio
+
+    def extended(self, path: str) -> None:
+        """A delta was saved at path, next in sequence"""
+        self.deltas.append(path)
+        self.delta_bytes += os.path.getsize(path)
+
+    def rebased(self, base_id: str) -> None:
+        """A full snapshot with base_id replaced the base: the old deltas are removed"""
+        for _, path in delta_files(self.filename):
+            os.remove(path)
+        self.base_id = base_id
+        self.deltas, self.delta_bytes = [], 0
@@ -0,0 +1,236 @@
+"""
+AOF Loader
+
+Replays an AOF file into a data store as fast as pure Python allows:
+
+- the file is mmapped and read in blocks of BLOCK_SIZE bytes, so memory
+  stays bounded however large the file is;
+- each block is parsed in bulk by parse_resp_block(), with
+  parse_commands() taking over only for the records it can't take (old
+  text lines, values containing CRLF, records larger than a block);
+- the commands an AOF is mostly made of go straight to DataStore methods,
+  and every other write command to its implementation in the command
+  table; either way CommandHandler.execute is bypassed, so nothing is
+  logged again and no stats or pub/sub work is done;
+- the garbage collector is paused while loading: every list the parser
+  and the store allocate survives, so its collections would find nothing
+  to free and only rescan a growing heap;
+- load_steps() hands control back after every block, so the event loop
+  can answer clients while a file loads;
+- progress and throughput are printed every PROGRESS_INTERVAL seconds.
+"""
+
+import base64
+import gc
+import mmap
+import os
+import time
+from typing import Callable, Dict, Iterator, List
+
+from .aof import AOFFormatError, parse_commands, parse_resp_block
+from .rdb import load_value
+
+
+BLOCK_SIZE = 4 * 1024 * 1024
+PROGRESS_INTERVAL = 1.0
+
+# Failed commands printed individually; the rest are only counted
+MAX_REPORTED_ERRORS = 5
+
+
+class AOFLoader:
+    """Streams AOF files into a data store"""
+
+    def __init__(self, data_store, command_handler=None, block_size: int = BLOCK_SIZE,
+                 progress_interval: float = PROGRESS_INTERVAL):
+        """
+        Args:
+            data_store: Data store to populate
+            command_handler: Command handler whose command table replays the
+                commands without a DataStore fast path (optional)
+            block_size: Bytes parsed per block
+            progress_interval: Seconds between progress lines
+        """
+        self.data_store = data_store
+        self.block_size = block_size
+        self.progress_interval = progress_interval
+
+        self.commands_loaded = 0
+        self.bytes_loaded = 0
+        self.bytes_total = 0
+        self.errors = 0
+        self.elapsed = 0.0
+
+        self._dispatch = self._build_dispatch(data_store, getattr(command_handler, 'commands', {}))
+
+    @staticmethod
+    def _build_dispatch(data_store, command_table) -> Dict[str, Callable[[List[str]], None]]:
+        """Command name -> function of its args"""
+        dispatch = {name: (lambda handler: lambda args: handler(*args))(handler)
+                    for name, handler in command_table.items()}
+
+        set_command = dispatch.get('SET')
+
+        def expire_at(key, timestamp_ms, value=None):
+            # A key whose deadline passed while the server was down is
+            # dropped rather than loaded and left for expiry to find
+            expiry_time = timestamp_ms / 1000
+            if expiry_time <= time.time():
+                data_store.delete(key)
+            elif value is not None:
+                data_store.set(key, value, expiry_time)
+            else:
+                data_store.expire_at(key, expiry_time)
+
+        def set_string(args):
+            if len(args) == 2:
+                data_store.set(args[0], args[1])
+            elif len(args) == 4 and args[2].upper() == 'PXAT':
+                expire_at(args[0], int(args[3]), args[1])
+            elif set_command:
+                set_command(args)  # options such as EX or NX
+
+        def hset(args):
+            data_store.get_or_create_hash(args[0]).update(zip(args[1::2], args[2::2]))
+            data_store.notify_key_changed(args[0])
+
+        def pfmerge(args):
+            sources = [data_store.get_or_create_hyperloglog(key) for key in args[1:] if data_store.exists(key)]
+            data_store.get_or_create_hyperloglog(args[0]).merge(*sources)
+
+        dispatch.update({
+            'SET': set_string,
+            'DEL': lambda args: data_store.delete(*args),
+            'EXPIRE': lambda args: data_store.expire(args[0], int(args[1])),
+            'EXPIREAT': lambda args: data_store.expire_at(args[0], int(args[1])),
+            'PEXPIREAT': lambda args: expire_at(args[0], int(args[1])),
+            'PERSIST': lambda args: data_store.persist(args[0]),
+            'FLUSHALL': lambda args: data_store.flush(),
+            # Written by AOF rewrites for values without a plain command form
+            'RESTORE': lambda args: data_store.set(args[0], load_value(base64.b64decode(args[1]))),
+            'RPUSH': lambda args: data_store.get_or_create_list(args[0]).extend(args[1:]),
+            'LPUSH': lambda args: data_store.get_or_create_list(args[0]).extendleft(args[1:]),
+            'SADD': lambda args: data_store.get_or_create_set(args[0]).update(args[1:]),
+            'HSET': hset,
+            'PFADD': lambda args: data_store.get_or_create_hyperloglog(args[0]).add(*args[1:]),
+            'PFMERGE': pfmerge,
+        })
+        return dispatch
+
+    def load(self, filename: str, allow_truncated: bool = True) -> int:
+        """
+        Replay one AOF file
+
+        Args:
+            filename: AOF file to replay
+            allow_truncated: Keep the commands before a torn last record
+                instead of raising
+
+        Returns:
+            Number of commands replayed from this file
+
+        Raises:
+            AOFFormatError: for a malformed record (or a torn one, unless allowed)
+        """
+        loaded_before = self.commands_loaded
+        for _ in self.load_steps(filename, allow_truncated):
+            pass
+        return self.commands_loaded - loaded_before
+
+    def load_steps(self, filename: str, allow_truncated: bool = True) -> Iterator[int]:
+        """
+        Replay one AOF file a block at a time, like load()
+
+        Yields:
+            Bytes of the file replayed so far, after every block
+        """
+        size = os.path.getsize(filename)
+        self.bytes_total += size
+        if size == 0:
+            return
+
+        started = resumed = time.perf_counter()
+        loaded_before = self.commands_loaded
+        bytes_before = self.bytes_loaded
+        next_report = started + self.progress_interval
+        dispatch = self._dispatch
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        with open(filename, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            position = 0
+            # Replayed commands change the values they are handed, even when
+            # DEBUG RELOAD (a read-only command) runs this
+            reading, self.data_store.reading = self.data_store.reading, False
+            try:
+                while position < size:
+                    records, consumed = parse_resp_block(data[position:position + self.block_size])
+                    self.commands_loaded += len(records)
+                    for record in records:
+                        handler = dispatch.get(record[0])
+                        if handler is None:
+                            self._apply(record[0], record[1:], counted=True)
+                            continue
+                        try:
+                            handler(record[1:])
+                        except Exception as e:
+                            self._report_error(record[0], e)
+                    position += consumed
+                    if not consumed:
+                        # A record the bulk parser leaves to parse_commands()
+                        record = next(parse_commands(data, position), None)
+                        if record is None:
+                            position = size  # only line breaks were left
+                        else:
+                            command, args, position = record
+                            self._apply(command, args)
+                    self.bytes_loaded = bytes_before + position
+
+                    now = time.perf_counter()
+                    if now >= next_report:
+                        next_report = now + self.progress_interval
+                        self._report_progress(filename, size, position, now - started,
+                                              self.commands_loaded - loaded_before)
+                    # Time spent away from the file isn't loading time
+                    self.elapsed += now - resumed
+                    yield position
+                    resumed = time.perf_counter()
+            except AOFFormatError as e:
+                if not allow_truncated:
+                    raise
+                # A crash mid-write leaves a partial last record: keep everything before it
+                print(f"AOF is truncated or corrupted ({e}); loaded the "
+                      f"{self.commands_loaded - loaded_before} commands before it")
+            finally:
+                self.elapsed += time.perf_counter() - resumed
+                self.data_store.reading = reading
+                if gc_was_enabled:
+                    gc.enable()
+
+    def _apply(self, command: str, args: List[str], counted: bool = False) -> None:
+        if not counted:
+            self.commands_loaded += 1
+        handler = self._dispatch.get(command.upper())
+        if handler is None:
+            return  # not a write command this server knows
+        try:
+            handler(args)
+        except Exception as e:
+            self._report_error(command, e)
+
+    def _report_error(self, command: str, error: Exception) -> None:
+        self.errors += 1
+        if self.errors <= MAX_REPORTED_ERRORS:
+            print(f"Error executing recovery command {command}: {error}")
+
+    def _report_progress(self, filename: str, size: int, position: int, elapsed: float, commands: int) -> None:
+        print(f"Loading {os.path.basename(filename)}: {position * 100 / size:.1f}% "
+              f"({commands} commands, {commands / elapsed:.0f} commands/s)")
+
+    def summary(self) -> str:
+        """One line with the totals over every file loaded"""
+        rate = self.commands_loaded / self.elapsed if self.elapsed else 0
+        line = (f"Replayed {self.commands_loaded} commands from AOF in {self.elapsed:.2f}s "
+                f"({rate:.0f} commands/s, {self.bytes_loaded / (1024 * 1024) / max(self.elapsed, 1e-9):.1f} MB/s)")
+        if self.errors:
+            line += f", {self.errors} failed"
+        return line
@@ -9,8 +9,13 @@ from typing import Optional,Dict,Any
 from .config import PersistenceConfig
 from .aof import AOFWriter
 from .rdb import RDBHandler
+from .mapped import MappedRDBHandler
+from .delta import DeltaChain
 from .recovery import RecoveryManager
+from ..commands.base import WRITE_COMMANDS
 
+# Seconds of recovery work load_step() does before the event loop gets back to clients
+LOADING_SLICE=0.05
 
 class PersistenceManager:
 
@@ -34,8 +39,13 @@ class PersistenceManager:
 
         # State tracking
         self.changes_since_save=0
+        # BGREWRITEAOF asked for while a BGSAVE child runs: started once it exits
+        self.aof_rewrite_scheduled=False
         self.last_rdb_save_time=time.time()
         self.last_aof_sync_time=time.time()
+        # True from start_loading() until recovery ends; commands get -LOADING meanwhile
+        self.loading=False
+        self._loading_steps=None
 
         # Thread lock
         self._lock=threading.Lock()
@@ -49,26 +59,40 @@ class PersistenceManager:
         if self.config.aof_enabled:
             self.aof_writer=AOFWriter(
                 self.config.aof_filename,
-                self.config.aof_sync_policy
+                self.config.aof_sync_policy,
+                self.config.aof_dirname,
+                self.config.get('aof_use_rdb_preamble',True),
             )
         
         if self.config.rdb_enabled:
-            self.rdb_handler=RDBHandler(
+            rdb_handler_class=MappedRDBHandler if self.config.get('rdb_format')=='mapped' else RDBHandler
+            chain=None
+            if self.config.get('rdb_incremental',False):
+                chain=DeltaChain(
+                    self.config.rdb_filename,
+                    self.config.get('rdb_delta_max_chain',16),
+                    self.config.get('rdb_delta_max_ratio',0.5),
+                )
+            self.rdb_handler=rdb_handler_class(
                 self.config.rdb_filename,
                 self.config.get('rdb_compression',True),
                 self.config.get('rdb_checksum',True),
+                chain,
             )
         
         self.recovery_manager=RecoveryManager(
             self.config.aof_filename,
-            self.config.rdb_filename
+            self.config.rdb_filename,
+            self.config.aof_dirname,
+            self.config.get('rdb_load_workers',0) or None,
+            bool(self.rdb_handler and self.rdb_handler.chain),
         )
     
     def start(self)->None:
         """Start persistence operations"""
         if self.aof_writer:
             self.aof_writer.open()
-            print(f"AOF enabled: {self.config.aof_filename}")
+            print(f"AOF enabled: {self.aof_writer.incr_filename}")
 
         if self.rdb_handler:
             print(f"RDB enabled: {self.config.rdb_filename}")
@@ -77,6 +101,14 @@ class PersistenceManager:
     
     def stop(self)->None:
         """Stop persistence operations"""
+        if self._loading_steps:
+            # Nothing has been written from the partial dataset: just stop loading it
+            self._loading_steps.close()
+            self._loading_steps=None
+            self.loading=False
+        if self.rdb_handler and self.rdb_handler.bgsave_job:
+            self.rdb_handler.bgsave_job.wait()
+            self.rdb_handler.poll_background_save()
         if self.aof_writer:
             self.aof_writer.close()
 
@@ -101,39 +133,138 @@ class PersistenceManager:
             return self.recovery_manager.recover_data(data_store,command_handler)
         
         return True
+
+    def start_loading(self,data_store,command_handler=None)->None:
+        """
+        Start recovering data in the background of the event loop, which
+        calls load_step() until it returns a result. Until then, loading
+        is True and commands that need the data are refused.
+
+        Args:
+            data_store: Data store to populate
+            command_handler: Command handler for AOF replay
+        """
+        if not self.config.get('recovery_on_startup',True):
+            print("Recovery on startup disabled")
+            return
+        if self.recovery_manager:
+            self._loading_steps=self.recovery_manager.recover_steps(data_store,command_handler)
+            self.loading=True
+
+    def load_step(self,budget:float=LOADING_SLICE)->Optional[bool]:
+        """
+        Run recovery for about budget seconds, and at least one step
+        (event loop only)
+
+        Returns:
+            None while loading goes on, else whether recovery succeeded
+        """
+        deadline=time.perf_counter()+budget
+        try:
+            next(self._loading_steps)
+            while time.perf_counter()<deadline:
+                next(self._loading_steps)
+        except StopIteration as done:
+            self._loading_steps=None
+            self.loading=False
+            return done.value
+        return None
     
     def log_write_command(self,command:str,*args)->None:
         """
-        Log a write command (for AOF)
+        Log a write command (for AOF), and count it towards the automatic
+        RDB saves (with or without AOF)
 
         Args:
             command: Command name
             *args: Command arguments
         """
 
-        if self.aof_writer and self._is_write_command(command):
-            self.aof_writer.log_command(command,*args)
+        if self._is_write_command(command):
             self.changes_since_save+=1
+            if self.aof_writer:
+                self.aof_writer.log_command(command,*args)
+
+    def flush_aof(self)->None:
+        """
+        Hand the commands logged during this event loop iteration to the
+        AOF writer thread as one batch
+        """
+        if self.aof_writer:
+            self.aof_writer.flush_buffer()
+
+    def reply_barrier(self)->Optional[int]:
+        """
+        AOF batch that must be on disk before a reply may be sent, or None
+        to send it right away (only 'always' holds replies back)
+        """
+        if self.aof_writer:
+            return self.aof_writer.unwritten_batch()
+        return None
+
+    def written_batch(self)->int:
+        """Last AOF batch the writer thread has written (and fsynced under 'always')"""
+        if self.aof_writer:
+            return self.aof_writer.written_batch
+        return 0
+
+    def write_error(self)->Optional[str]:
+        """Why writes are refused (the AOF can't be written to), or None"""
+        if self.aof_writer and self.aof_writer.last_write_error is not None:
+            error=self.aof_writer.last_write_error
+            return f"Errors writing to the AOF file: {getattr(error,'strerror',None) or error}"
+        return None
+
+    def aof_wakeup_socket(self):
+        """Socket that turns readable when the AOF writer finishes a batch, or None"""
+        if self.aof_writer:
+            return self.aof_writer.wakeup_socket
+        return None
 
-    def periodic_tasks(self)->None:
+    def periodic_tasks(self,data_store=None)->None:
         """
         Execute periodic persistence tasks
         Should be called from the main event loop
+
+        Args:
+            data_store: Data store for automatic AOF rewrites and RDB saves
         """
+        if self.loading:
+            return  # nothing is written while loading, and a partial dataset must not be saved
         current_time=time.time()
 
-        #Handle AOF sync based on policy
+        # Reap a BGSAVE child that has exited
+        if self.rdb_handler:
+            self.rdb_handler.poll_background_save()
+
+        #Handle AOF sync based on policy: the fsync itself runs on the AOF
+        #fsync thread, the event loop only asks for it
 
         if self.aof_writer:
             if self.aof_writer.should_sync():
-                self.aof_writer.sync_to_disk()
-                self.last_aof_sync_time=current_time
+                self.aof_writer.request_fsync()
+            self.last_aof_sync_time=self.aof_writer.last_sync_time
+
+            # Swap in a finished rewrite, or start one once the AOF has grown
+            # by aof_rewrite_percentage since the last
+            finished=self.aof_writer.finish_rewrite()
+            if finished is not None:
+                print("Background AOF rewrite "+("terminated with success" if finished else "failed"))
+            elif data_store is None or self.background_job_in_progress():
+                pass
+            elif self.aof_rewrite_scheduled:
+                print("Starting scheduled AOF rewrite")
+                self.rewrite_aof_background(data_store)
+            elif self.aof_writer.needs_rewrite(
+                    self.config.get('aof_rewrite_min_size',1024*1024),self.config.get('aof_rewrite_percentage',100)):
+                print(f"Starting automatic AOF rewrite: {self.aof_writer.get_file_size()} bytes, base {self.aof_writer.base_size}")
+                self.rewrite_aof_background(data_store)
         
         # Handle automatic RDB saves
-        if self.rdb_handler:
+        if self.rdb_handler and data_store is not None and not self.background_job_in_progress():
             if self.config.should_auto_rdb_save(self.changes_since_save,self.last_rdb_save_time):
                 print(f"Auto-saving RDB: {self.changes_since_save} changes in {current_time-self.last_rdb_save_time:.1f}s")
-                if self.create_rdb_snapshot_background():
+                if self.create_rdb_snapshot_background(data_store,incremental=True):
                     self.changes_since_save=0
                     self.last_rdb_save_time=current_time
 
@@ -157,20 +288,22 @@ class PersistenceManager:
         
         return success
     
-    def create_rdb_snapshot_background(self, data_store=None) -> bool:
+    def create_rdb_snapshot_background(self, data_store, incremental: bool = False) -> bool:
         """
         Create background RDB snapshot
         
         Args:
             data_store: Current data store state
+            incremental: Write a delta of the changed keys if rdb_incremental is on and the chain can take one
             
         Returns:
-            True if background process started successfully
+            True if background process started successfully (False while
+            a BGSAVE or AOF rewrite child runs)
         """
-        if not self.rdb_handler:
+        if not self.rdb_handler or self.background_job_in_progress():
             return False
         
-        return self.rdb_handler.create_background_snapshot(data_store)
+        return self.rdb_handler.create_background_snapshot(data_store, incremental)
     
     def rewrite_aof_background(self, data_store) -> bool:
         """
@@ -180,27 +313,28 @@ class PersistenceManager:
             data_store: Current data store state
             
         Returns:
-            True if rewrite process started successfully
+            True if rewrite process started successfully (False if one is
+            already running, or a BGSAVE child is)
         """
-        if not self.aof_writer:
+        if not self.aof_writer or self.background_job_in_progress():
             return False
         
-        try:
-            def background_rewrite():
-                temp_filename = self.config.get_aof_temp_filename()
-                success = self.aof_writer.rewrite_aof(data_store, temp_filename)
-                if success:
-                    print("Background AOF rewrite completed")
-                else:
-                    print("Background AOF rewrite failed")
-            
-            thread = threading.Thread(target=background_rewrite, daemon=True)
-            thread.start()
-            return True
-            
-        except Exception as e:
-            print(f"Error starting background AOF rewrite: {e}")
-            return False
+        self.aof_rewrite_scheduled=False
+        return self.aof_writer.start_rewrite(data_store, self.config.get_aof_temp_filename())
+    
+    def schedule_aof_rewrite(self) -> None:
+        """Start an AOF rewrite as soon as the running BGSAVE child exits"""
+        self.aof_rewrite_scheduled=True
+    
+    def aof_rewrite_in_progress(self) -> bool:
+        return bool(self.aof_writer and self.aof_writer.rewrite_in_progress())
+    
+    def rdb_bgsave_in_progress(self) -> bool:
+        return bool(self.rdb_handler and self.rdb_handler.bgsave_in_progress())
+    
+    def background_job_in_progress(self) -> bool:
+        """True while a BGSAVE or AOF rewrite child runs: only one at a time"""
+        return self.rdb_bgsave_in_progress() or self.aof_rewrite_in_progress()
     
     def get_last_save_time(self) -> int:
         """Get timestamp of last RDB save"""
@@ -210,13 +344,42 @@ class PersistenceManager:
     
     def get_stats(self) -> Dict[str, Any]:
         """Get persistence statistics"""
+        recovery = self.recovery_manager
+        total_bytes = recovery.loading_total_bytes if recovery else 0
+        loaded_bytes = recovery.loading_loaded_bytes if recovery else 0
+        chain = self.rdb_handler.chain if self.rdb_handler else None
         return {
+            'loading': self.loading,
+            'loading_start_time': int(recovery.loading_start_time) if recovery else 0,
+            'loading_total_bytes': total_bytes,
+            'loading_loaded_bytes': loaded_bytes,
+            'loading_loaded_perc': round(loaded_bytes * 100 / total_bytes, 2) if total_bytes else 0,
+            'loading_eta_seconds': round(recovery.loading_eta()) if self.loading else 0,
             'aof_enabled': self.config.aof_enabled,
             'rdb_enabled': self.config.rdb_enabled,
             'changes_since_save': self.changes_since_save,
             'last_rdb_save_time': self.get_last_save_time(),
             'last_aof_sync_time': int(self.last_aof_sync_time),
-            'aof_filename': self.config.aof_filename if self.config.aof_enabled else None,
+            'aof_delayed_fsync': self.aof_writer.delayed_fsync if self.aof_writer else 0,
+            'aof_last_fsync_duration_ms': round(self.aof_writer.last_fsync_duration * 1000, 3) if self.aof_writer else 0,
+            'aof_fsync_lag_sec': round(self.aof_writer.fsync_lag(), 3) if self.aof_writer else 0,
+            'rdb_bgsave_in_progress': self.rdb_bgsave_in_progress(),
+            'rdb_last_bgsave_status': self.rdb_handler.last_bgsave_status if self.rdb_handler else 'ok',
+            'rdb_last_bgsave_time_sec': round(self.rdb_handler.last_bgsave_duration, 3) if self.rdb_handler else -1,
+            'rdb_incremental': bool(self.rdb_handler and self.rdb_handler.chain),
+            'rdb_last_save_type': self.rdb_handler.last_save_type if self.rdb_handler else 'full',
+            'rdb_last_save_keys': self.rdb_handler.last_save_keys if self.rdb_handler else 0,
+            'rdb_delta_count': len(chain.deltas) if chain else 0,
+            'rdb_delta_bytes': chain.delta_bytes if chain else 0,
+            'aof_rewrite_in_progress': self.aof_rewrite_in_progress(),
+            'aof_rewrite_scheduled': self.aof_rewrite_scheduled,
+            'aof_last_bgrewrite_status': self.aof_writer.last_rewrite_status if self.aof_writer else 'ok',
+            'aof_last_write_status': 'err' if self.write_error() else 'ok',
+            'aof_current_size': self.aof_writer.get_file_size() if self.aof_writer else 0,
+            'aof_base_size': self.aof_writer.base_size if self.aof_writer else 0,
+            # The multi-part AOF: its manifest, and the segment writes go to now
+            'aof_manifest': self.aof_writer.manifest.filename if self.aof_writer else None,
+            'aof_incr_filename': self.aof_writer.incr_filename if self.aof_writer else None,
             'rdb_filename': self.config.rdb_filename if self.config.rdb_enabled else None,
         }
     
@@ -230,10 +393,4 @@ class PersistenceManager:
         Returns:
             True if it's a write command
         """
-        write_commands = {
-            'SET', 'DEL', 'EXPIRE', 'EXPIREAT', 'PERSIST', 'FLUSHALL',
-            'SETEX', 'SETNX', 'MSET', 'MSETNX', 'APPEND', 'INCR', 'DECR',
-            'INCRBY', 'DECRBY', 'LPUSH', 'RPUSH', 'LPOP', 'RPOP', 'SADD',
-            'SREM', 'SPOP', 'HSET', 'HDEL', 'HINCRBY', 'ZADD', 'ZREM'
-        }
-        return command.upper() in write_commands
\ No newline at end of file
+        return command.upper() in WRITE_COMMANDS
\ No newline at end of file
@@ -0,0 +1,147 @@
+"""
+Multi-part AOF Manifest
+
+The append-only log is a directory of files rather than one file:
+
+  appendonly.aof.1.base.rdb    snapshot the log starts from (.base.aof
+                               when written as commands instead)
+  appendonly.aof.1.incr.aof    commands logged after that snapshot,
+  appendonly.aof.2.incr.aof    oldest segment first
+  appendonly.aof.manifest      the list of files above
+
+The manifest has one line per file, e.g.
+
+  file appendonly.aof.1.base.rdb seq 1 type b
+  file appendonly.aof.1.incr.aof seq 1 type i
+
+Type b is the base, i an incremental segment and h a history file left
+over from before a rewrite, which is deleted and dropped from the
+manifest. The manifest is replaced atomically (temp file, fsync,
+rename), so it always describes a complete log.
+"""
+
+import os
+from typing import List, Optional
+
+
+BASE, INCR, HISTORY = 'b', 'i', 'h'
+
+
+class AOFFile:
+    """One file listed in the manifest"""
+
+    def __init__(self, name: str, seq: int, file_type: str):
+        self.name = name
+        self.seq = seq
+        self.file_type = file_type
+
+    def __repr__(self) -> str:
+        return f"AOFFile({self.name!r}, seq={self.seq}, type={self.file_type})"
+
+
+class AOFManifest:
+    """Base file, incremental segments and history files of a multi-part AOF"""
+
+    def __init__(self, dirname: str, basename: str):
+        """
+        Args:
+            dirname: Directory holding the AOF files and the manifest
+            basename: Name the files are derived from (e.g. 'appendonly.aof')
+        """
+        self.dirname = dirname
+        self.basename = basename
+        self.base: Optional[AOFFile] = None
+        self.incrs: List[AOFFile] = []
+        self.history: List[AOFFile] = []
+
+    @property
+    def filename(self) -> str:
+        return os.path.join(self.dirname, f"{self.basename}.manifest")
+
+    def path(self, aof_file: AOFFile) -> str:
+        return os.path.join(self.dirname, aof_file.name)
+
+    def exists(self) -> bool:
+        return os.path.exists(self.filename)
+
+    def load(self) -> bool:
+        """
+        Read the manifest file
+
+        Returns:
+            False if there is none
+
+        Raises:
+            ValueError: for a malformed line
+        """
+        if not self.exists():
+            return False
+        self.base, self.incrs, self.history = None, [], []
+        with open(self.filename, 'r', encoding='utf-8') as f:
+            for number, line in enumerate(f, 1):
+                parts = line.split()
+                if not parts or parts[0].startswith('#'):
+                    continue
+                fields = dict(zip(parts[::2], parts[1::2]))
+                try:
+                    aof_file = AOFFile(fields['file'], int(fields['seq']), fields['type'])
+                except (KeyError, ValueError):
+                    raise ValueError(f"Invalid AOF manifest line {number}: {line.strip()}")
+                if aof_file.file_type == BASE:
+                    self.base = aof_file
+                elif aof_file.file_type == INCR:
+                    self.incrs.append(aof_file)
+                elif aof_file.file_type == HISTORY:
+                    self.history.append(aof_file)
+                else:
+                    raise ValueError(f"Unknown AOF file type {aof_file.file_type!r} on manifest line {number}")
+        self.incrs.sort(key=lambda aof_file: aof_file.seq)
+        return True
+
+    def save(self) -> None:
+        """Atomically replace the manifest file with the current file list"""
+        lines = [f"file {aof_file.name} seq {aof_file.seq} type {aof_file.file_type}\n"
+                 for aof_file in ([self.base] if self.base else []) + self.incrs + self.history]
+        temp_filename = f"{self.filename}.tmp"
+        with open(temp_filename, 'w', encoding='utf-8') as f:
+            f.writelines(lines)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_filename, self.filename)
+
+    def files(self) -> List[AOFFile]:
+        """Base then incremental segments: the order to load them in"""
+        return ([self.base] if self.base else []) + list(self.incrs)
+
+    def next_incr(self) -> AOFFile:
+        """A new incremental segment, numbered after the last one"""
+        seq = self.incrs[-1].seq + 1 if self.incrs else 1
+        return AOFFile(f"{self.basename}.{seq}.incr.aof", seq, INCR)
+
+    def next_base(self, rdb_format: bool) -> AOFFile:
+        """A new base file, numbered after the current one"""
+        seq = self.base.seq + 1 if self.base else 1
+        extension = 'rdb' if rdb_format else 'aof'
+        return AOFFile(f"{self.basename}.{seq}.base.{extension}", seq, BASE)
+
+    def total_size(self) -> int:
+        """Bytes in the base and all incremental segments"""
+        size = 0
+        for aof_file in self.files():
+            try:
+                size += os.path.getsize(self.path(aof_file))
+            except OSError:
+                pass
+        return size
+
+    def delete_history(self) -> None:
+        """Delete history files, then drop them from the manifest"""
+        if not self.history:
+            return
+        for aof_file in self.history:
+            try:
+                os.remove(self.path(aof_file))
+            except FileNotFoundError:
+                pass
+        self.history = []
+        self.save()
@@ -0,0 +1,360 @@
+"""
+Memory-mapped snapshots
+
+A snapshot format for large, read-mostly datasets that the server serves
+straight from the file instead of loading it: the file is an on-disk
+open-addressing hash table, mmap()ed at startup, so starting takes the
+same time whatever its size and the OS page cache holding it is shared by
+every process mapping the file.
+
+File layout (version M001, little endian):
+
+  header      REDISM001, then <slot count> <keys> <memory usage>
+              <end of records> <slot table offset> <stats offset> (u64s)
+  records     <key length u32> <value length u32> <expiry f64, 0 = none>
+              <key UTF-8> <value>, one per key, the value in the RDB
+              encoding with its type tag first (see rdb.dump_value)
+  slot table  <record offset u64, 0 = empty> <hash tag u32> per slot; a
+              power of two slots at most half full, probed linearly from
+              hash & (slots - 1)
+  stats       JSON: keys per type and compressed string totals, so the
+              store's INFO counters are right without reading the records,
+              and the aux fields (see rdb.py)
+
+Keys are hashed with 64-bit BLAKE2b; the upper half of the hash, kept in
+the slot, lets a probe skip most other keys without touching their record.
+
+MappedKeyspace stands in for DataStore's key table: reads decode a value
+from the mapped pages when it is asked for, while writes land in an
+in-memory overlay and deletes in a set of tombstones, so the file itself
+is never modified. A mutable value (a list, a hash...) is copied into the
+overlay when the store hands it out (see DataStore._unshare), so changes
+made to it in place stick.
+
+Only the header is checked when a file is mapped: verifying the records
+would mean reading all of them, which is what the format avoids.
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import random
+import struct
+import time
+from array import array
+from collections.abc import MutableMapping
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .rdb import (RDBHandler, dump_value, load_value, TYPE_STRING, TYPE_LIST, TYPE_SET, TYPE_ZSET, TYPE_HASH,
+                  TYPE_BITMAP, TYPE_HYPERLOGLOG, TYPE_BLOOM, TYPE_CUCKOO, TYPE_CMS, TYPE_TOPK, TYPE_STREAM,
+                  TYPE_TIMESERIES, TYPE_VECTORSET, TYPE_JSON, TYPE_COMPRESSED_STRING)
+from ..compression import CompressedString
+from ..storage import DataStore
+
+
+MAPPED_VERSION = b'M001'
+MAGIC = RDBHandler.MAGIC_STRING + MAPPED_VERSION
+
+_HEADER = struct.Struct('<9s7xQQQQQQ')
+_RECORD = struct.Struct('<IId')
+_SLOT = struct.Struct('<QI')
+
+# Slots per key, at least: probes stay short
+LOAD_FACTOR = 0.5
+
+# TYPE as the store reports it, by RDB type tag
+TYPE_NAMES = {
+    TYPE_STRING: "string", TYPE_BITMAP: "string", TYPE_COMPRESSED_STRING: "string",
+    TYPE_LIST: "list", TYPE_SET: "set", TYPE_HASH: "hash", TYPE_ZSET: "zset",
+    TYPE_HYPERLOGLOG: "hyperloglog", TYPE_BLOOM: "bloom", TYPE_CUCKOO: "cuckoo", TYPE_CMS: "cms",
+    TYPE_TOPK: "topk", TYPE_STREAM: "stream", TYPE_TIMESERIES: "timeseries", TYPE_VECTORSET: "vectorset",
+    TYPE_JSON: "json",
+}
+
+Entry = Tuple[Any, str, Optional[float]]
+
+
+def _hash(key_data: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(key_data, digest_size=8).digest(), 'little')
+
+
+def is_mapped_file(filename: str) -> bool:
+    with open(filename, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def write_mapped_file(entries, filename: str, aux: Optional[Dict[str, str]] = None) -> int:
+    """
+    Write (key, value, expiry_time) entries into filename as a mapped
+    snapshot, skipping expired keys, and fsync it, with aux fields.
+    Raises on errors.
+
+    Returns:
+        Number of keys written
+    """
+    now = time.time()
+    sizes = DataStore()  # for the memory estimate the store would make
+    hashes, offsets = array('Q'), array('Q')
+    type_counts: Dict[str, int] = {}
+    compressed = [0, 0, 0]  # values, raw bytes, compressed bytes
+    memory_usage = 0
+
+    with open(filename, 'wb') as f:
+        f.write(bytes(_HEADER.size))
+        offset = _HEADER.size
+        for key, value, expiry_time in entries:
+            if expiry_time is not None and expiry_time <= now:
+                continue
+            key_data = key.encode('utf-8')
+            value_data = dump_value(value)
+            f.write(_RECORD.pack(len(key_data), len(value_data), expiry_time or 0.0))
+            f.write(key_data)
+            f.write(value_data)
+            hashes.append(_hash(key_data))
+            offsets.append(offset)
+            offset += _RECORD.size + len(key_data) + len(value_data)
+
+            data_type = TYPE_NAMES[value_data[0]]
+            type_counts[data_type] = type_counts.get(data_type, 0) + 1
+            memory_usage += sizes._calculate_memory_usage(key, value)
+            if isinstance(value, CompressedString):
+                compressed[0] += 1
+                compressed[1] += value.size
+                compressed[2] += len(value.data)
+
+        records_end = offset
+        slots_offset = (records_end + 7) & ~7
+        slot_count = 8
+        while slot_count * LOAD_FACTOR < len(offsets):
+            slot_count *= 2
+        table = bytearray(slot_count * _SLOT.size)
+        mask = slot_count - 1
+        for key_hash, record_offset in zip(hashes, offsets):
+            slot = key_hash & mask
+            while _SLOT.unpack_from(table, slot * _SLOT.size)[0]:
+                slot = (slot + 1) & mask
+            _SLOT.pack_into(table, slot * _SLOT.size, record_offset, key_hash >> 32)
+
+        f.write(bytes(slots_offset - records_end))
+        f.write(table)
+        stats_offset = slots_offset + len(table)
+        f.write(json.dumps({'types': type_counts, 'compressed': compressed, 'aux': aux or {}}).encode('utf-8'))
+
+        f.seek(0)
+        f.write(_HEADER.pack(MAGIC, slot_count, len(offsets), memory_usage, records_end, slots_offset,
+                             stats_offset))
+        f.flush()
+        os.fsync(f.fileno())
+    return len(offsets)
+
+
+class MappedSnapshot:
+    """A mapped snapshot file, read in place"""
+
+    def __init__(self, filename: str):
+        """
+        Raises:
+            ValueError: for a file that isn't a valid mapped snapshot
+        """
+        self.filename = filename
+        with open(filename, 'rb') as f:
+            self.size = os.fstat(f.fileno()).st_size
+            if self.size < _HEADER.size:
+                raise ValueError("Invalid mapped snapshot")
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (magic, self.slot_count, self.key_count, self.memory_usage, self.records_end, self.slots_offset,
+         stats_offset) = _HEADER.unpack_from(self._map, 0)
+        if (magic != MAGIC or not self.slot_count or self.slot_count & (self.slot_count - 1)
+                or self.slots_offset + self.slot_count * _SLOT.size != stats_offset or stats_offset > self.size):
+            raise ValueError("Invalid mapped snapshot")
+        stats = json.loads(self._map[stats_offset:].decode('utf-8'))
+        self.type_counts: Dict[str, int] = stats['types']
+        self.compressed: List[int] = stats['compressed']
+        self.aux: Dict[str, str] = stats.get('aux', {})
+
+    def _find(self, key_data: bytes) -> int:
+        """Offset of key_data's record, or 0"""
+        data = self._map
+        key_hash = _hash(key_data)
+        tag = key_hash >> 32
+        mask = self.slot_count - 1
+        slot = key_hash & mask
+        while True:
+            offset, slot_tag = _SLOT.unpack_from(data, self.slots_offset + slot * _SLOT.size)
+            if not offset:
+                return 0
+            if slot_tag == tag:
+                key_length = _RECORD.unpack_from(data, offset)[0]
+                start = offset + _RECORD.size
+                if data[start:start + key_length] == key_data:
+                    return offset
+            slot = (slot + 1) & mask
+
+    def __contains__(self, key: str) -> bool:
+        return self._find(key.encode('utf-8')) != 0
+
+    def lookup(self, key: str) -> Optional[Entry]:
+        """(value, type, expiry_time) of key, decoded from the file, or None"""
+        offset = self._find(key.encode('utf-8'))
+        return self._entry(offset)[1] if offset else None
+
+    def _entry(self, offset: int) -> Tuple[str, Entry]:
+        data = self._map
+        key_length, value_length, expiry_time = _RECORD.unpack_from(data, offset)
+        start = offset + _RECORD.size
+        key = data[start:start + key_length].decode('utf-8')
+        value_data = data[start + key_length:start + key_length + value_length]
+        return key, (load_value(value_data), TYPE_NAMES[value_data[0]], expiry_time or None)
+
+    def keys(self) -> Iterator[str]:
+        """Every key, in file order"""
+        data = self._map
+        offset = _HEADER.size
+        while offset < self.records_end:
+            key_length, value_length, _ = _RECORD.unpack_from(data, offset)
+            start = offset + _RECORD.size
+            yield data[start:start + key_length].decode('utf-8')
+            offset = start + key_length + value_length
+
+    def entries(self) -> Iterator[Tuple[str, Entry]]:
+        """(key, (value, type, expiry_time)) of every key, in file order"""
+        offset = _HEADER.size
+        while offset < self.records_end:
+            key_length, value_length, _ = _RECORD.unpack_from(self._map, offset)
+            yield self._entry(offset)
+            offset += _RECORD.size + key_length + value_length
+
+    def random_key(self) -> Optional[str]:
+        """The key of a random slot, or None if it is empty"""
+        offset = _SLOT.unpack_from(self._map, self.slots_offset + random.randrange(self.slot_count) * _SLOT.size)[0]
+        if not offset:
+            return None
+        key_length = _RECORD.unpack_from(self._map, offset)[0]
+        start = offset + _RECORD.size
+        return self._map[start:start + key_length].decode('utf-8')
+
+
+class MappedKeyspace(MutableMapping):
+    """
+    A DataStore key table {key: (value, type, expiry_time)} over a mapped
+    snapshot: an overlay dict of the keys written since, and tombstones
+    for the snapshot keys deleted since
+    """
+
+    def __init__(self, snapshot: MappedSnapshot):
+        self.snapshot = snapshot
+        self.overlay: Dict[str, Entry] = {}
+        self.tombstones = set()
+        # Snapshot keys hidden by the overlay or a tombstone
+        self._hidden = 0
+        # The snapshot entry decoded last: a command usually reads its key twice
+        self._last: Optional[Tuple[str, Entry]] = None
+
+    def _visible_in_snapshot(self, key: str) -> bool:
+        return key not in self.tombstones and key in self.snapshot
+
+    def __getitem__(self, key: str) -> Entry:
+        entry = self.overlay.get(key)
+        if entry is not None:
+            return entry
+        last = self._last
+        if last is not None and last[0] == key:
+            return last[1]
+        if key in self.tombstones:
+            raise KeyError(key)
+        entry = self.snapshot.lookup(key)
+        if entry is None:
+            raise KeyError(key)
+        self._last = (key, entry)
+        return entry
+
+    def __setitem__(self, key: str, entry: Entry) -> None:
+        if key in self.tombstones:
+            self.tombstones.discard(key)  # still hidden, by the overlay now
+        elif key not in self.overlay and key in self.snapshot:
+            self._hidden += 1
+        self.overlay[key] = entry
+        self._forget(key)
+
+    def __delitem__(self, key: str) -> None:
+        if key in self.overlay:
+            del self.overlay[key]
+            if key in self.snapshot:
+                self.tombstones.add(key)
+        elif self._visible_in_snapshot(key):
+            self.tombstones.add(key)
+            self._hidden += 1
+        else:
+            raise KeyError(key)
+        self._forget(key)
+
+    def _forget(self, key: str) -> None:
+        if self._last is not None and self._last[0] == key:
+            self._last = None
+
+    def __contains__(self, key) -> bool:
+        return key in self.overlay or self._visible_in_snapshot(key)
+
+    def __len__(self) -> int:
+        return len(self.overlay) + self.snapshot.key_count - self._hidden
+
+    def __iter__(self) -> Iterator[str]:
+        yield from self.overlay
+        overlay, tombstones = self.overlay, self.tombstones
+        for key in self.snapshot.keys():
+            if key not in overlay and key not in tombstones:
+                yield key
+
+    def pin(self, key: str, value) -> None:
+        """Move key's snapshot value, about to be handed out, into the overlay so changes to it are kept"""
+        if key in self.overlay:
+            return
+        entry = self[key]
+        self[key] = (value, entry[1], entry[2])
+
+    def copy(self) -> 'MappedKeyspace':
+        """A keyspace with the same contents that changes independently (for DataStore.snapshot)"""
+        other = MappedKeyspace(self.snapshot)
+        other.overlay = dict(self.overlay)
+        other.tombstones = set(self.tombstones)
+        other._hidden = self._hidden
+        return other
+
+    def sample(self, count: int) -> List[str]:
+        """Up to count random keys, from the overlay and from the snapshot"""
+        overlay = self.overlay
+        keys = random.sample(list(overlay), min(len(overlay), count // 2 or count))
+        # At most half the slots are taken: twice as many probes find most of the rest
+        for _ in range((count - len(keys)) * 2):
+            key = self.snapshot.random_key()
+            if key is not None and key not in overlay and key not in self.tombstones and key not in keys:
+                keys.append(key)
+                if len(keys) == count:
+                    break
+        return keys
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'mapped_keys': self.snapshot.key_count - self._hidden,
+            'mapped_file_bytes': self.snapshot.size,
+            'overlay_keys': len(self.overlay),
+            'tombstones': len(self.tombstones),
+        }
+
+
+class MappedRDBHandler(RDBHandler):
+    """RDBHandler saving snapshots in the mapped format (rdb_format 'mapped')"""
+
+    def write_file(self, entries, filename: str, aux: Optional[Dict[str, str]] = None, delta: bool = False) -> int:
+        # No deltas are chained to the format
+        return write_mapped_file(entries, filename, aux)
+
+    def iter_snapshot(self, filename: Optional[str] = None) -> Iterator[Tuple[str, Any, Optional[float]]]:
+        filename = filename or self.filename
+        if not is_mapped_file(filename):
+            yield from super().iter_snapshot(filename)
+            return
+        for key, (value, _, expiry_time) in MappedSnapshot(filename).entries():
+            yield key, value, expiry_time
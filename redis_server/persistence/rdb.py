@@ -2,258 +2,794 @@
 Redis Database (RDB) Implementation
 
 Handles creating and loading binary snapshots of the database state.
+
+File layout (version 0003):
+
+  REDIS 0003 <flags>        magic, version, FLAG_* bits
+  chunk ...                 runs of whole records, each compressed on its
+                            own with zlib when FLAG_COMPRESSED is set
+  index                     <offset> <size> <keys> <crc32> of every chunk
+                            (u64, u64, u32, u32, little endian)
+  footer                    <index offset> <chunks> <crc32 of the index>
+                            (u64, u32, u32)
+
+A chunk is a sequence of records, each starting with an opcode byte:
+
+  OPCODE_AUX <name> <value>           metadata such as the creation time
+  OPCODE_EXPIRETIME_MS <u64>          expiry of the key record that follows
+  <TYPE_*> <key> <value>              one key
+  OPCODE_DELETE <key>                 a key deleted (delta files only)
+  OPCODE_EOF                          end of the chunk
+
+Lengths are unsigned LEB128 varints and strings are a length followed by
+UTF-8 bytes. Lists and sets are a count followed by their members, hashes
+a count followed by field/value pairs, bitmaps a length followed by raw
+bytes, and the other types a length followed by their to_bytes() form.
+Strings the store keeps compressed are written as they are held: their
+inflated size, then a length and the zlib stream.
+
+Chunks close once they hold CHUNK_SIZE bytes of records, so writing and
+reading hold one chunk at a time. Each one can be found through the index
+and decoded without the others, which lets RDBLoader spread them over
+worker processes (see rdb_loader.py). Their CRC-32, when FLAG_CHECKSUM is
+set, is taken over the bytes as stored.
+
+A delta file (see delta.py) is a version 0003 file holding only the keys
+changed since the snapshot it is chained to, as named by its aux fields.
+
+Every snapshot also carries, in its 'commands' aux field (COMMANDS_AUX),
+the commands recreating what the store keeps besides its keys: the
+search index definitions (see DataStore.listener_commands). Recovery runs
+the ones of the last file it loads once the keys are in.
+
+Version 0002 files (the records as one zlib stream with a trailing CRC-32)
+still load so an existing dump survives the upgrade; they are never
+written. Version 0001 files are a pickled dict, and unpickling can run
+arbitrary code, so the server refuses them (LegacyRDBError): only the
+offline tool converts one, when asked to with --allow-pickle (see
+tools.py).
 """
 
 import os
+import json
 import time
 import pickle
-import subprocess
+import struct
 import threading
 import hashlib
 import gzip
-import tempfile
-import shutil
-from typing import Dict, Any, Optional
+import zlib
+from collections import deque
+from typing import Dict, Any, Iterator, List, NamedTuple, Optional, Tuple
+
+from .child import BackgroundJob
+from ..compression import CompressedString
+from ..datatypes import (HyperLogLog, BloomFilter, CuckooFilter, CountMinSketch, TopK, Stream,
+                         TimeSeries, VectorSet, JSONDocument, SortedSet)
+
+
+FLAG_COMPRESSED = 0x01
+FLAG_CHECKSUM = 0x02
+
+OPCODE_DELETE = 0xF9
+OPCODE_AUX = 0xFA
+OPCODE_EXPIRETIME_MS = 0xFC
+OPCODE_EOF = 0xFF
+
+# Aux field holding the commands that recreate what isn't keys, as a JSON list of [command, *args]
+COMMANDS_AUX = 'commands'
+
+TYPE_STRING = 0
+TYPE_LIST = 1
+TYPE_SET = 2
+TYPE_ZSET = 3
+TYPE_HASH = 4
+TYPE_BITMAP = 5
+TYPE_HYPERLOGLOG = 6
+TYPE_BLOOM = 7
+TYPE_CUCKOO = 8
+TYPE_CMS = 9
+TYPE_TOPK = 10
+TYPE_STREAM = 11
+TYPE_TIMESERIES = 12
+TYPE_VECTORSET = 13
+TYPE_JSON = 14
+TYPE_COMPRESSED_STRING = 15
+
+# Types stored as their own to_bytes() form
+OBJECT_TYPES = {
+    TYPE_ZSET: SortedSet,
+    TYPE_HYPERLOGLOG: HyperLogLog,
+    TYPE_BLOOM: BloomFilter,
+    TYPE_CUCKOO: CuckooFilter,
+    TYPE_CMS: CountMinSketch,
+    TYPE_TOPK: TopK,
+    TYPE_STREAM: Stream,
+    TYPE_TIMESERIES: TimeSeries,
+    TYPE_VECTORSET: VectorSet,
+    TYPE_JSON: JSONDocument,
+}
+_OBJECT_TAGS = {cls: tag for tag, cls in OBJECT_TYPES.items()}
+
+# Record bytes gathered into a chunk before it is compressed and written
+CHUNK_SIZE = 1024 * 1024
+# Bytes read from a version 0002 file at a time
+READ_BUFFER_SIZE = 64 * 1024
+
+_EXPIRY = struct.Struct('<Q')
+_CHECKSUM = struct.Struct('<I')
+_INDEX_ENTRY = struct.Struct('<QQII')
+_FOOTER = struct.Struct('<QII')
+# Varints of the lengths nearly every string has
+_SMALL_LENGTHS = [bytes((n,)) for n in range(0x80)]
+
+
+def encode_length(n: int) -> bytes:
+    """Unsigned LEB128 varint"""
+    if n < 0x80:
+        return _SMALL_LENGTHS[n]
+    out = bytearray()
+    while n >= 0x80:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+    return bytes(out)
+
+
+def encode_value(value, parts: list) -> int:
+    """Append the encoded value to parts and return its TYPE_* tag"""
+    if isinstance(value, str):
+        data = value.encode('utf-8')
+        parts.append(encode_length(len(data)))
+        parts.append(data)
+        return TYPE_STRING
+    if isinstance(value, (bytes, bytearray)):
+        parts.append(encode_length(len(value)))
+        parts.append(bytes(value))
+        return TYPE_BITMAP
+    if isinstance(value, CompressedString):
+        parts.append(encode_length(value.size))
+        parts.append(encode_length(len(value.data)))
+        parts.append(value.data)
+        return TYPE_COMPRESSED_STRING
+    if isinstance(value, (int, float)):
+        return encode_value(str(value), parts)  # numbers are strings
+    if isinstance(value, dict):
+        parts.append(encode_length(len(value)))
+        for field, field_value in value.items():
+            for text in (field, field_value):
+                data = text.encode('utf-8')
+                parts.append(encode_length(len(data)))
+                parts.append(data)
+        return TYPE_HASH
+    if isinstance(value, (deque, list, set)):
+        parts.append(encode_length(len(value)))
+        for member in value:
+            data = member.encode('utf-8')
+            parts.append(encode_length(len(data)))
+            parts.append(data)
+        return TYPE_SET if isinstance(value, set) else TYPE_LIST
+    tag = _OBJECT_TAGS.get(type(value))
+    if tag is None:
+        raise TypeError(f"Can't save a value of type {type(value).__name__}")
+    data = value.to_bytes()
+    parts.append(encode_length(len(data)))
+    parts.append(data)
+    return tag
+
+
+class Chunk(NamedTuple):
+    """Where a chunk is in the file, as its index entry gives it"""
+    offset: int
+    size: int
+    keys: int
+    crc: int
+
+
+def dump_value(value) -> bytes:
+    """A value in the RDB encoding, type tag first (the RESTORE payload)"""
+    parts = []
+    tag = encode_value(value, parts)
+    return bytes((tag,)) + b''.join(parts)
+
+
+def load_value(data: bytes):
+    """Inverse of dump_value()"""
+    reader = RDBReader(None)
+    reader._buffer, reader._position = data, 1
+    return reader.read_value(data[0])
+
+
+class RDBWriter:
+    """Writes key records into a file in independently decodable chunks"""
+
+    def __init__(self, file, compression: bool = True, checksum: bool = True):
+        self.file = file
+        self.compression = compression
+        self.checksum = checksum
+        self.chunks: List[Chunk] = []
+        self.bytes_written = 0
+        self.keys_written = 0
+        self._parts = []
+        self._pending = 0
+        self._chunk_keys = 0
+
+        flags = (FLAG_COMPRESSED if compression else 0) | (FLAG_CHECKSUM if checksum else 0)
+        self._emit(RDBHandler.MAGIC_STRING + RDBHandler.VERSION + bytes((flags,)))
+
+    def write_aux(self, name: str, value: str) -> None:
+        parts = [bytes((OPCODE_AUX,))]
+        for text in (name, value):
+            data = text.encode('utf-8')
+            parts.append(encode_length(len(data)))
+            parts.append(data)
+        self._write(parts)
+
+    def write_key(self, key: str, value, expiry_time: Optional[float] = None) -> None:
+        encoded_key = key.encode('utf-8')
+        parts = [b'', b'', encode_length(len(encoded_key)), encoded_key]
+        if expiry_time is not None:
+            parts[0] = bytes((OPCODE_EXPIRETIME_MS,)) + _EXPIRY.pack(int(expiry_time * 1000))
+        parts[1] = bytes((encode_value(value, parts),))
+        self._chunk_keys += 1
+        self.keys_written += 1
+        self._write(parts)
+
+    def write_deleted(self, key: str) -> None:
+        encoded_key = key.encode('utf-8')
+        self._chunk_keys += 1
+        self.keys_written += 1
+        self._write([bytes((OPCODE_DELETE,)), encode_length(len(encoded_key)), encoded_key])
+
+    def finish(self) -> None:
+        """Write the last chunk, the index and the footer"""
+        self._close_chunk()
+        index = b''.join(_INDEX_ENTRY.pack(*chunk) for chunk in self.chunks)
+        index_offset = self.bytes_written
+        self._emit(index)
+        self._emit(_FOOTER.pack(index_offset, len(self.chunks), zlib.crc32(index)))
+
+    def _write(self, parts: list) -> None:
+        self._parts.extend(parts)
+        self._pending += sum(map(len, parts))
+        if self._pending >= CHUNK_SIZE:
+            self._close_chunk()
+
+    def _close_chunk(self) -> None:
+        if not self._parts:
+            return
+        self._parts.append(bytes((OPCODE_EOF,)))
+        data = b''.join(self._parts)
+        if self.compression:
+            data = zlib.compress(data, 1)
+        crc = zlib.crc32(data) if self.checksum else 0
+        self.chunks.append(Chunk(self.bytes_written, len(data), self._chunk_keys, crc))
+        self._emit(data)
+        self._parts, self._pending, self._chunk_keys = [], 0, 0
+
+    def _emit(self, data: bytes) -> None:
+        if data:
+            self.file.write(data)
+            self.bytes_written += len(data)
+
+
+def read_index(file, size: int) -> Tuple[int, List[Chunk]]:
+    """
+    Flags and chunk index of a version 0003 file
+
+    Raises:
+        ValueError: for a truncated file or a corrupted index
+    """
+    header_size = len(RDBHandler.MAGIC_STRING) + len(RDBHandler.VERSION)
+    if size < header_size + 1 + _FOOTER.size:
+        raise ValueError("RDB file is truncated")
+    file.seek(header_size)
+    flags = file.read(1)[0]
+    file.seek(size - _FOOTER.size)
+    index_offset, count, crc = _FOOTER.unpack(file.read(_FOOTER.size))
+    if index_offset + count * _INDEX_ENTRY.size + _FOOTER.size != size:
+        raise ValueError("RDB file is truncated or its index is corrupted")
+    file.seek(index_offset)
+    index = file.read(count * _INDEX_ENTRY.size)
+    if zlib.crc32(index) != crc:
+        raise ValueError("RDB index checksum verification failed")
+    return flags, [Chunk(*_INDEX_ENTRY.unpack_from(index, n * _INDEX_ENTRY.size)) for n in range(count)]
+
+
+def read_chunk(file, chunk: Chunk, flags: int) -> Iterator[Tuple[str, Any, Optional[float]]]:
+    """
+    Yield (key, value, expiry_time) for every key of one chunk
+
+    Raises:
+        ValueError: for a truncated or corrupted chunk
+    """
+    return _chunk_reader(file, chunk, flags).entries()
+
+
+def read_aux(file, size: int) -> Dict[str, str]:
+    """
+    Aux fields of a version 0003 file, which come before its first key
+
+    Raises:
+        ValueError: for a truncated or corrupted file
+    """
+    flags, chunks = read_index(file, size)
+    if not chunks:
+        return {}
+    reader = _chunk_reader(file, chunks[0], flags)
+    next(reader.entries(), None)
+    return reader.aux
+
+
+def commands_aux(commands: List[Tuple[str, List[str]]]) -> Dict[str, str]:
+    """The COMMANDS_AUX field holding (command, args) commands, or nothing without any"""
+    if not commands:
+        return {}
+    return {COMMANDS_AUX: json.dumps([[command, *args] for command, args in commands])}
+
+
+def aux_commands(aux: Dict[str, str]) -> List[Tuple[str, List[str]]]:
+    """(command, args) held in a snapshot's COMMANDS_AUX field"""
+    return [(record[0], record[1:]) for record in json.loads(aux.get(COMMANDS_AUX, '[]'))]
+
+
+def _chunk_reader(file, chunk: Chunk, flags: int) -> 'RDBReader':
+    file.seek(chunk.offset)
+    data = file.read(chunk.size)
+    if len(data) != chunk.size:
+        raise ValueError("RDB file is truncated")
+    if flags & FLAG_CHECKSUM and zlib.crc32(data) != chunk.crc:
+        raise ValueError(f"RDB checksum verification failed for the chunk at offset {chunk.offset}")
+    if flags & FLAG_COMPRESSED:
+        try:
+            data = zlib.decompress(data)
+        except zlib.error as e:
+            raise ValueError(f"RDB chunk at offset {chunk.offset} is corrupted: {e}")
+    reader = RDBReader(None)
+    reader._buffer = data
+    return reader
+
+
+class RDBReader:
+    """Decoder for the records of a chunk, or streaming over a version 0002 file"""
+
+    def __init__(self, file, size: int = 0):
+        """
+        Args:
+            file: Version 0002 file positioned just after the magic and
+                version, or None to decode records set in _buffer
+            size: Size of the whole file
+        """
+        self.file = file
+        self.aux: Dict[str, str] = {}
+        self._buffer = b''
+        self._position = 0
+        if file is None:
+            # Decoding a chunk or a dump_value() payload held in memory
+            self._decompressor = None
+            return
+
+        header_size = len(RDBHandler.MAGIC_STRING) + len(RDBHandler.STREAM_VERSION)
+        flags = file.read(1)
+        if len(flags) != 1:
+            raise ValueError("RDB file is truncated")
+        flags = flags[0]
+        self.checksum = bool(flags & FLAG_CHECKSUM)
+        self.crc = zlib.crc32(RDBHandler.MAGIC_STRING + RDBHandler.STREAM_VERSION + bytes((flags,)))
+        self._decompressor = zlib.decompressobj() if flags & FLAG_COMPRESSED else None
+        # Raw bytes of the body left to read
+        self._remaining = size - header_size - 1 - (_CHECKSUM.size if self.checksum else 0)
+        if self._remaining < 0:
+            raise ValueError("RDB file is truncated")
+
+    def entries(self) -> Iterator[Tuple[str, Any, Optional[float]]]:
+        """
+        Yield (key, value, expiry_time) for every key record, and
+        (key, None, None) for every deleted key
+
+        Raises:
+            ValueError: for a truncated or corrupted file; a checksum
+                mismatch is only found after the last key
+        """
+        expiry_time = None
+        while True:
+            opcode = self._read(1)[0]
+            if opcode == OPCODE_EOF:
+                self._verify()
+                return
+            if opcode == OPCODE_EXPIRETIME_MS:
+                expiry_time = _EXPIRY.unpack(self._read(_EXPIRY.size))[0] / 1000
+            elif opcode == OPCODE_AUX:
+                name = self._read_string()
+                self.aux[name] = self._read_string()
+            elif opcode == OPCODE_DELETE:
+                yield self._read_string(), None, None
+            else:
+                key = self._read_string()
+                yield key, self.read_value(opcode), expiry_time
+                expiry_time = None
+
+    def read_value(self, tag: int):
+        if tag == TYPE_STRING:
+            return self._read_string()
+        if tag == TYPE_LIST:
+            return deque([self._read_string() for _ in range(self._read_length())])
+        if tag == TYPE_SET:
+            return {self._read_string() for _ in range(self._read_length())}
+        if tag == TYPE_HASH:
+            count = self._read_length()
+            return {self._read_string(): self._read_string() for _ in range(count)}
+        if tag == TYPE_BITMAP:
+            return bytearray(self._read(self._read_length()))
+        if tag == TYPE_COMPRESSED_STRING:
+            size = self._read_length()
+            return CompressedString(self._read(self._read_length()), size)
+        cls = OBJECT_TYPES.get(tag)
+        if cls is None:
+            raise ValueError(f"Unknown RDB value type {tag}")
+        return cls.from_bytes(self._read(self._read_length()))
+
+    def _read_length(self) -> int:
+        buffer, position = self._buffer, self._position
+        if position < len(buffer) and buffer[position] < 0x80:
+            self._position = position + 1
+            return buffer[position]
+        n, shift = 0, 0
+        while True:
+            byte = self._read(1)[0]
+            n |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                return n
+            shift += 7
+
+    def _read_string(self) -> str:
+        length = self._read_length()
+        position = self._position
+        end = position + length
+        if end <= len(self._buffer):
+            self._position = end
+            return self._buffer[position:end].decode('utf-8')
+        return self._read(length).decode('utf-8')
+
+    def _read(self, n: int) -> bytes:
+        position = self._position
+        end = position + n
+        if end > len(self._buffer):
+            self._fill(n)
+            position, end = 0, n
+        self._position = end
+        return self._buffer[position:end]
+
+    def _fill(self, n: int) -> None:
+        """Refill the buffer until n unread bytes are at its start"""
+        pieces = [self._buffer[self._position:]]
+        available = len(pieces[0])
+        while available < n:
+            data = self._next_piece()
+            if data is None:
+                raise ValueError("RDB file is truncated")
+            pieces.append(data)
+            available += len(data)
+        self._buffer = b''.join(pieces)
+        self._position = 0
+
+    def _next_piece(self) -> Optional[bytes]:
+        """Next decoded piece of the body, or None at its end"""
+        decompressor = self._decompressor
+        while True:
+            if decompressor and decompressor.unconsumed_tail:
+                data = decompressor.decompress(decompressor.unconsumed_tail, READ_BUFFER_SIZE)
+            else:
+                raw = self._read_raw(READ_BUFFER_SIZE)
+                if not raw:
+                    return None
+                if not decompressor:
+                    return raw
+                # Bounded output: highly compressible data can't blow up memory
+                data = decompressor.decompress(raw, READ_BUFFER_SIZE)
+            if data:
+                return data
+
+    def _read_raw(self, n: int) -> bytes:
+        if self.file is None:
+            return b''
+        data = self.file.read(min(n, self._remaining))
+        self._remaining -= len(data)
+        self.crc = zlib.crc32(data, self.crc)
+        return data
+
+    def _verify(self) -> None:
+        """Consume the rest of the body and check the checksum"""
+        if self.file is None:
+            return
+        while self._read_raw(READ_BUFFER_SIZE):
+            pass
+        if self.checksum:
+            stored = self.file.read(_CHECKSUM.size)
+            if len(stored) != _CHECKSUM.size or _CHECKSUM.unpack(stored)[0] != self.crc:
+                raise ValueError("RDB checksum verification failed")
+
+
+class SavePlan(NamedTuple):
+    """What one save writes"""
+    filename: str
+    aux: Dict[str, str]
+    # Keys of a delta save, None for a full snapshot
+    keys: Optional[set]
+    # What DataStore.take_dirty_keys() returned, put back if the save fails
+    dirty: Optional[set]
+
+
+class LegacyRDBError(ValueError):
+    """Raised for a version 0001 (pickled) RDB file read without allow_pickle"""
+
+    def __init__(self, filename: str):
+        super().__init__(f"{filename} is a version 0001 RDB file, which is pickled; if it is trusted, convert it "
+                         f"with: python -m redis_server.tools convert --allow-pickle {filename} TARGET")
+        self.filename = filename
 
 
 class RDBHandler:
     """Handles RDB (Redis Database) snapshot operations"""
-    
+
     # RDB file format constants
     MAGIC_STRING = b'REDIS'
-    VERSION = b'0001'
-    
-    def __init__(self, filename: str, compression: bool = True, checksum: bool = True):
+    VERSION = b'0003'
+    STREAM_VERSION = b'0002'  # one zlib stream, read only
+    LEGACY_VERSION = b'0001'  # pickled dict, read only with allow_pickle
+
+    def __init__(self, filename: str, compression: bool = True, checksum: bool = True, chain=None,
+                 allow_pickle: bool = False):
         """
         Initialize RDB handler
-        
+
         Args:
             filename: Path to RDB file
             compression: Enable compression
             checksum: Enable checksum verification
+            chain: DeltaChain incremental saves extend (None: every save is full)
+            allow_pickle: Read version 0001 files, which unpickles them;
+                only ever for a trusted file
         """
         self.filename = filename
         self.compression = compression
         self.checksum = checksum
+        self.chain = chain
+        self.allow_pickle = allow_pickle
         self.last_save_time = 0
+        self.last_save_type = 'full'
+        self.last_save_keys = 0
         self._lock = threading.Lock()
-        
+
+        # BackgroundJob of the running BGSAVE and its SavePlan, and how the last one went
+        self.bgsave_job = None
+        self._bgsave_plan = None
+        self.last_bgsave_status = 'ok'
+        self.last_bgsave_duration = -1.0
+
         # Ensure directory exists
         os.makedirs(os.path.dirname(filename), exist_ok=True)
-    
-    def create_snapshot(self, data_store) -> bool:
+
+    def create_snapshot(self, data_store, incremental: bool = False) -> bool:
         """
         Create a synchronous RDB snapshot
-        
+
         Args:
             data_store: Current data store state
-            
+            incremental: Only write the keys changed since the last save,
+                as a delta file, if the chain can take one
+
         Returns:
             True if snapshot was created successfully
         """
         with self._lock:
+            plan = self._plan_save(data_store, incremental)
             try:
-                temp_filename = f"{self.filename}.tmp"
-                
-                # Serialize data
-                data = self._extract_data_store_state(data_store)
-                binary_data = self._serialize_data(data)
-                
-                # Write to temporary file
-                with open(temp_filename, 'wb') as f:
-                    f.write(binary_data)
-                
-                # Atomically replace original file
-                shutil.move(temp_filename, self.filename)
-                self.last_save_time = time.time()
-                
-                print(f"RDB snapshot saved to {self.filename}")
+                report = self._save(data_store.entries(plan.keys), plan)
+                self._saved(plan, report, data_store, True)
+                print(f"RDB snapshot saved to {plan.filename}")
                 return True
-                
+
             except Exception as e:
+                self._saved(plan, '', data_store, False)
                 print(f"Error creating RDB snapshot: {e}")
-                if os.path.exists(temp_filename):
-                    os.remove(temp_filename)
                 return False
-    
-    def create_background_snapshot(self, data_store) -> bool:
+
+    def create_background_snapshot(self, data_store, incremental: bool = False) -> bool:
         """
-        Create a background RDB snapshot using subprocess
-        
+        Start a BGSAVE: a forked child writes the store as it is now while
+        the server keeps running (see child.py); poll_background_save()
+        reaps it
+
         Args:
             data_store: Current data store state
-            
+            incremental: As for create_snapshot()
+
         Returns:
-            True if background process started successfully
+            True if the background save was started
         """
+        if self.bgsave_in_progress():
+            return False
+        plan = self._plan_save(data_store, incremental)
         try:
-            # For this implementation, we'll use threading instead of subprocess
-            # In production, Redis uses fork()
-            def background_save():
-                success = self.create_snapshot(data_store)
-                if success:
-                    print("Background RDB save completed")
-                else:
-                    print("Background RDB save failed")
-            
-            thread = threading.Thread(target=background_save, daemon=True)
-            thread.start()
+            self.bgsave_job = BackgroundJob.start("rdb-bgsave", data_store, lambda entries: self._save(entries, plan),
+                                                  plan.keys)
+            self._bgsave_plan = (plan, data_store)
             return True
-            
+
         except Exception as e:
+            self._saved(plan, '', data_store, False)
             print(f"Error starting background RDB save: {e}")
+            self.last_bgsave_status = 'err'
             return False
-    
-    def load_snapshot(self) -> Optional[Dict[str, Any]]:
+
+    def _plan_save(self, data_store, incremental: bool) -> SavePlan:
+        """A delta of the store's dirty keys if incremental and the chain can take one, else a full snapshot"""
+        chain = self.chain
+        commands = commands_aux(data_store.listener_commands())
+        if chain is None:
+            return SavePlan(self.filename, commands, None, None)
+        # Taken even for a full snapshot: the deltas after it start from here
+        dirty = data_store.take_dirty_keys()
+        if incremental and dirty is not None and chain.can_extend():
+            seq = chain.next_seq()
+            return SavePlan(chain.delta_filename(seq), {'base-id': chain.base_id, 'delta-seq': str(seq), **commands},
+                            dirty, dirty)
+        return SavePlan(self.filename, {'snapshot-id': os.urandom(8).hex(), **commands}, None, dirty)
+
+    def _saved(self, plan: SavePlan, report: str, data_store, success: bool) -> None:
+        """Record how a save went, in the chain and the store's dirty keys"""
+        if not success:
+            if self.chain is not None:
+                data_store.restore_dirty_keys(plan.dirty)
+            return
+        self.last_save_time = time.time()
+        self.last_save_type = 'full' if plan.keys is None else 'delta'
+        self.last_save_keys = int(report.split()[0]) if report else 0
+        if self.chain is not None:
+            if plan.keys is None:
+                self.chain.rebased(plan.aux['snapshot-id'])
+            else:
+                self.chain.extended(plan.filename)
+
+    def bgsave_in_progress(self) -> bool:
+        return self.bgsave_job is not None
+
+    def poll_background_save(self) -> Optional[bool]:
         """
-        Load RDB snapshot from file
-        
+        Reap a finished BGSAVE (event loop only)
+
         Returns:
-            Dictionary containing the loaded data or None if file doesn't exist
+            None unless a BGSAVE has just ended, else whether it succeeded
         """
-        if not self.file_exists():
+        job = self.bgsave_job
+        if job is None or job.poll() is None:
             return None
-        
+        self.bgsave_job = None
+        plan, data_store = self._bgsave_plan
+        self._bgsave_plan = None
+        self.last_bgsave_status = 'ok' if job.result else 'err'
+        self.last_bgsave_duration = job.duration
+        self._saved(plan, job.message if job.result else '', data_store, job.result)
+        if job.result:
+            print(f"Background RDB save completed: {job.message} in {job.duration:.2f}s")
+        else:
+            print(f"Background RDB save failed: {job.message}")
+        return job.result
+
+    def _save(self, entries, plan: Optional[SavePlan] = None) -> str:
+        """Write entries to a temp file and rename it over the planned file (default: the RDB file); raises on errors"""
+        plan = plan or SavePlan(self.filename, {}, None, None)
+        # Named per process: a BGSAVE child and the server never share one
+        temp_filename = f"{plan.filename}.{os.getpid()}.tmp"
         try:
-            with open(self.filename, 'rb') as f:
-                binary_data = f.read()
-            
-            data = self._deserialize_data(binary_data)
-            print(f"RDB snapshot loaded from {self.filename}")
-            return data
-            
-        except Exception as e:
-            print(f"Error loading RDB snapshot: {e}")
-            return None
-    
-    def _extract_data_store_state(self, data_store) -> Dict[str, Any]:
-        """Extract current state from data store"""
-        state = {
-            'keys': {},
-            'metadata': {
-                'created_time': time.time(),
-                'key_count': 0
-            }
-        }
-        
-        # Extract all valid keys
-        for key in data_store.keys():
-            value = data_store.get(key)
-            if value is not None:
-                ttl = data_store.ttl(key)
-                data_type = data_store.get_type(key)
-                
-                state['keys'][key] = {
-                    'value': value,
-                    'type': data_type,
-                    'ttl': ttl if ttl > 0 else None,
-                    'expiry_time': time.time() + ttl if ttl > 0 else None
-                }
-        
-        state['metadata']['key_count'] = len(state['keys'])
-        return state
-    
-    def _serialize_data(self, data: Dict[str, Any]) -> bytes:
+            keys = self.write_file(entries, temp_filename, plan.aux, plan.keys is not None)
+            # Atomically replace original file
+            os.replace(temp_filename, plan.filename)
+        except BaseException:
+            if os.path.exists(temp_filename):
+                os.remove(temp_filename)
+            raise
+        return f"{keys} keys"
+
+    def iter_snapshot(self, filename: Optional[str] = None) -> Iterator[Tuple[str, Any, Optional[float]]]:
         """
-        Serialize data store to binary format
-        
+        Stream the keys of an RDB file
+
         Args:
-            data: Data store state to serialize
-            
-        Returns:
-            Binary representation of data
+            filename: RDB file to read (default: this handler's)
+
+        Yields:
+            (key, value, expiry_time) in file order, expired keys included
+
+        Raises:
+            ValueError: for a file that isn't a valid RDB file
+            LegacyRDBError: for a version 0001 file without allow_pickle
         """
-        try:
-            # Create RDB header: MAGIC_STRING = b'REDIS' + VERSION = b'0001'
-            header = self.MAGIC_STRING + self.VERSION
-            
-            # Serialize data using pickle
-            serialized_data = pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
-            
-            # Compress if enabled
-            if self.compression:
-                serialized_data = gzip.compress(serialized_data)
-            
-            # Add checksum if enabled
-            if self.checksum:
-                checksum = hashlib.md5(serialized_data).digest()
-                result = header + checksum + serialized_data
-            else:
-                result = header + serialized_data
-            
-            return result
-            
-        except Exception as e:
-            print(f"Error serializing data: {e}")
-            raise
-    
-    def _deserialize_data(self, binary_data: bytes) -> Dict[str, Any]:
+        filename = filename or self.filename
+        size = os.path.getsize(filename)
+        with open(filename, 'rb') as f:
+            header = f.read(len(self.MAGIC_STRING) + len(self.VERSION))
+            if header == self.MAGIC_STRING + self.LEGACY_VERSION:
+                if not self.allow_pickle:
+                    raise LegacyRDBError(filename)
+                yield from self._iter_legacy(header + f.read())
+                return
+            if header == self.MAGIC_STRING + self.STREAM_VERSION:
+                yield from RDBReader(f, size).entries()
+                return
+            if header != self.MAGIC_STRING + self.VERSION:
+                raise ValueError("Invalid RDB file format")
+            flags, chunks = read_index(f, size)
+            for chunk in chunks:
+                yield from read_chunk(f, chunk, flags)
+
+    def write_file(self, entries, filename: str, aux: Optional[Dict[str, str]] = None, delta: bool = False) -> int:
         """
-        Deserialize binary data to data store format
-        
+        Stream (key, value, expiry_time) entries into filename, skipping
+        expired keys, and fsync it. Raises on errors.
+
         Args:
-            binary_data: Binary data to deserialize
-            
+            aux: Aux fields to write besides the creation time
+            delta: Write keys without a value, or expired, as deleted
+
         Returns:
-            Deserialized data dictionary
+            Number of keys written (deleted ones included)
         """
-        try:
-            # Check magic string and version
-            if not binary_data.startswith(self.MAGIC_STRING + self.VERSION):
-                raise ValueError("Invalid RDB file format")
-            
-            offset = len(self.MAGIC_STRING + self.VERSION)
-            
-            # Extract checksum if enabled
-            if self.checksum:
-                checksum = binary_data[offset:offset + 16]  # MD5 is 16 bytes
-                offset += 16
-                
-                # Verify checksum
-                data_to_verify = binary_data[offset:]
-                expected_checksum = hashlib.md5(data_to_verify).digest()
-                if checksum != expected_checksum:
-                    raise ValueError("RDB checksum verification failed")
-            
-            # Extract serialized data
-            serialized_data = binary_data[offset:]
-            
-            # Decompress if needed
-            if self.compression:
-                try:
-                    serialized_data = gzip.decompress(serialized_data)
-                except gzip.BadGzipFile:
-                    # Try without compression for backward compatibility
-                    pass
-            
-            # Deserialize data
-            data = pickle.loads(serialized_data)
-            return data
-            
-        except Exception as e:
-            print(f"Error deserializing data: {e}")
-            raise
-    
+        now = time.time()
+        with open(filename, 'wb') as f:
+            writer = RDBWriter(f, self.compression, self.checksum)
+            writer.write_aux('ctime', str(int(now)))
+            for name, value in (aux or {}).items():
+                writer.write_aux(name, value)
+            for key, value, expiry_time in entries:
+                if value is None or (expiry_time is not None and expiry_time <= now):
+                    if delta:
+                        writer.write_deleted(key)
+                    continue
+                writer.write_key(key, value, expiry_time)
+            writer.finish()
+            f.flush()
+            os.fsync(f.fileno())
+        return writer.keys_written
+
+    def _iter_legacy(self, binary_data: bytes) -> Iterator[Tuple[str, Any, Optional[float]]]:
+        """Keys of a version 0001 file: an md5-checked, gzipped pickle of every key"""
+        offset = len(self.MAGIC_STRING + self.LEGACY_VERSION)
+        if self.checksum:
+            checksum = binary_data[offset:offset + 16]  # MD5 is 16 bytes
+            offset += 16
+            if checksum != hashlib.md5(binary_data[offset:]).digest():
+                raise ValueError("RDB checksum verification failed")
+        serialized_data = binary_data[offset:]
+        if self.compression:
+            try:
+                serialized_data = gzip.decompress(serialized_data)
+            except gzip.BadGzipFile:
+                pass  # written without compression
+        for key, key_data in pickle.loads(serialized_data).get('keys', {}).items():
+            yield key, key_data.get('value'), key_data.get('expiry_time')
+
     def get_last_save_time(self) -> int:
         """Get timestamp of last successful save"""
         return int(self.last_save_time)
-    
+
     def file_exists(self) -> bool:
         """Check if RDB file exists"""
         return os.path.exists(self.filename)
-    
+
     def get_file_size(self) -> int:
         """Get RDB file size"""
         try:
             return os.path.getsize(self.filename)
         except OSError:
             return 0
-    
+
     def get_file_info(self) -> Dict[str, Any]:
         """Get information about the RDB file"""
         if not self.file_exists():
             return {'exists': False}
-        
+
         try:
             stat = os.stat(self.filename)
             return {
@@ -263,4 +799,4 @@ class RDBHandler:
                 'last_save_time': self.last_save_time
             }
         except OSError:
-            return {'exists': False}
\ No newline at end of file
+            return {'exists': False}
@@ -0,0 +1,212 @@
+"""
+RDB Loader
+
+Loads an RDB file into a data store using every core:
+
+- a version 0003 file is read through its chunk index, and each chunk is
+  decoded by a worker process of a ProcessPoolExecutor into a DataStore
+  of its own; that store comes back pickled (unpickling runs in C) and is
+  moved into the keyspace in bulk by DataStore.merge();
+- at most CHUNKS_PER_WORKER chunks per worker are in flight, so memory
+  stays bounded by a few chunks whatever the size of the file;
+- workers are started with forkserver (or spawn), never forked from the
+  server, whose AOF threads may hold locks at that point;
+- with one worker, a single chunk, an older file or a broken pool, keys
+  are decoded and set in process instead;
+- a delta file (see delta.py) is loaded with one worker, in process, as
+  its keys replace or delete the ones already loaded;
+- a mapped snapshot (see mapped.py) isn't decoded at all: the store is
+  attached to the file and serves its keys in place;
+- load_steps() hands control back after every chunk, so the event loop
+  can answer clients while a file loads;
+- the garbage collector is paused while loading (see loader.py), and
+  progress is printed every PROGRESS_INTERVAL seconds.
+"""
+
+import gc
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Iterator, Optional
+
+from .mapped import MAGIC as MAPPED_MAGIC, MappedKeyspace, MappedSnapshot
+from .rdb import RDBHandler, read_chunk, read_index
+from ..compression import StringCompressor
+from ..storage import DataStore
+
+
+PROGRESS_INTERVAL = 1.0
+
+# Chunks submitted ahead of the one being merged, per worker
+CHUNKS_PER_WORKER = 2
+
+# Keys of a file without chunks loaded between two steps
+KEYS_PER_STEP = 65536
+
+
+def _decode_chunk(filename: str, chunk, flags: int, now: float, threshold: int, level: int) -> DataStore:
+    """Worker: the unexpired keys of one chunk, in a store of their own"""
+    store = DataStore(StringCompressor(threshold, level))
+    with open(filename, 'rb') as f:
+        for key, value, expiry_time in read_chunk(f, chunk, flags):
+            if expiry_time is None or expiry_time > now:
+                store.set(key, value, expiry_time)
+    return store
+
+
+def _pool_context():
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+
+
+class RDBLoader:
+    """Loads RDB files into a data store, decoding chunks in worker processes"""
+
+    def __init__(self, data_store, workers: Optional[int] = None, progress_interval: float = PROGRESS_INTERVAL):
+        """
+        Args:
+            data_store: Data store to populate
+            workers: Worker processes (default: one per CPU)
+            progress_interval: Seconds between progress lines
+        """
+        self.data_store = data_store
+        self.workers = workers or os.cpu_count() or 1
+        self.progress_interval = progress_interval
+
+        self.keys_loaded = 0
+        self.bytes_loaded = 0
+        self.bytes_total = 0
+        self.elapsed = 0.0
+
+        self._next_report = 0.0
+        self._resumed = 0.0
+
+    def load(self, filename: str) -> int:
+        """
+        Load the unexpired keys of an RDB file into the store
+
+        Returns:
+            Number of keys loaded from this file
+
+        Raises:
+            ValueError: for a file that isn't a valid RDB file
+        """
+        loaded_before = self.keys_loaded
+        for _ in self.load_steps(filename):
+            pass
+        return self.keys_loaded - loaded_before
+
+    def load_steps(self, filename: str) -> Iterator[int]:
+        """
+        Load an RDB file a chunk at a time, like load()
+
+        Yields:
+            Bytes of the file loaded so far, after every chunk (or every
+            KEYS_PER_STEP keys of an older file)
+        """
+        size = os.path.getsize(filename)
+        self.bytes_total += size
+        self._next_report = time.perf_counter() + self.progress_interval
+        bytes_before = self.bytes_loaded
+        self._resumed = time.perf_counter()
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            with open(filename, 'rb') as f:
+                header = f.read(len(RDBHandler.MAGIC_STRING) + len(RDBHandler.VERSION))
+                if header == MAPPED_MAGIC:
+                    steps = self._attach(filename)
+                elif header == RDBHandler.MAGIC_STRING + RDBHandler.VERSION:
+                    flags, chunks = read_index(f, size)
+                    if self.workers > 1 and len(chunks) > 1:
+                        steps = self._load_parallel(filename, f, flags, chunks)
+                    else:
+                        steps = self._load_chunks(filename, f, flags, chunks)
+                else:
+                    # Older formats have no chunks to spread out
+                    steps = self._load_entries(RDBHandler(filename).iter_snapshot())
+                for _ in steps:
+                    self._pause()
+                    yield self.bytes_loaded - bytes_before
+                    self._resumed = time.perf_counter()
+            self.bytes_loaded = bytes_before + size
+        finally:
+            self._pause()
+            if gc_was_enabled:
+                gc.enable()
+
+    def _pause(self) -> None:
+        """Count the loading time up to now (time spent away from the file isn't)"""
+        now = time.perf_counter()
+        self.elapsed += now - self._resumed
+        self._resumed = now
+
+    def _attach(self, filename: str) -> Iterator[None]:
+        self.keys_loaded += self.data_store.attach_snapshot(MappedKeyspace(MappedSnapshot(filename)))
+        yield
+
+    def _load_chunks(self, filename: str, f, flags: int, chunks) -> Iterator[None]:
+        for chunk in chunks:
+            for _ in self._load_entries(read_chunk(f, chunk, flags)):
+                pass
+            self._chunk_done(filename, chunk)
+            yield
+
+    def _load_parallel(self, filename: str, f, flags: int, chunks) -> Iterator[None]:
+        compressor = self.data_store.compressor
+        now = time.time()
+        pending = deque()
+        merged = submitted = 0
+        try:
+            with ProcessPoolExecutor(self.workers, mp_context=_pool_context(), initializer=gc.disable) as pool:
+                while merged < len(chunks):
+                    while submitted < len(chunks) and submitted - merged < self.workers * CHUNKS_PER_WORKER:
+                        pending.append(pool.submit(_decode_chunk, filename, chunks[submitted], flags, now,
+                                                   compressor.threshold, compressor.level))
+                        submitted += 1
+                    # In file order, so the keyspace fills as a sequential load would
+                    self.keys_loaded += self.data_store.merge(pending.popleft().result())
+                    self._chunk_done(filename, chunks[merged])
+                    merged += 1
+                    yield
+        except (BrokenProcessPool, OSError) as e:
+            print(f"RDB load workers failed ({e}); loading the remaining chunks in process")
+            yield from self._load_chunks(filename, f, flags, chunks[merged:])
+
+    def _load_entries(self, entries) -> Iterator[None]:
+        data_store = self.data_store
+        now = time.time()
+        loaded = 0
+        for key, value, expiry_time in entries:
+            if value is None or (expiry_time is not None and expiry_time <= now):
+                # Deleted or expired since the snapshot a delta file is applied to
+                data_store.delete(key)
+                continue
+            data_store.set(key, value, expiry_time)
+            loaded += 1
+            if loaded == KEYS_PER_STEP:
+                self.keys_loaded += loaded
+                loaded = 0
+                yield
+        self.keys_loaded += loaded
+
+    def _chunk_done(self, filename: str, chunk) -> None:
+        self.bytes_loaded += chunk.size
+        now = time.perf_counter()
+        if now >= self._next_report:
+            self._next_report = now + self.progress_interval
+            print(f"Loading {os.path.basename(filename)}: {self.progress() * 100:.1f}% "
+                  f"({self.keys_loaded} keys)")
+
+    def progress(self) -> float:
+        """Fraction of the bytes of the files loaded so far"""
+        return self.bytes_loaded / self.bytes_total if self.bytes_total else 1.0
+
+    def summary(self) -> str:
+        """One line with the totals over every file loaded"""
+        rate = self.keys_loaded / self.elapsed if self.elapsed else 0
+        return (f"Loaded {self.keys_loaded} keys from RDB in {self.elapsed:.2f}s "
+                f"({rate:.0f} keys/s, {self.workers} workers)")
@@ -2,13 +2,21 @@
 Data Recovery Management System
 
 Handles loading data from persistence files on server startup.
+
+recover_steps() does it one block or chunk at a time, so the server can
+serve clients (with -LOADING errors) while a large dataset loads;
+recover_data() runs the same steps to the end in one call.
 """
 
 import os 
 import time
-from typing import Optional,Dict
-from .aof import AOFWriter
-from .rdb import RDBHandler
+from typing import Optional,Dict,Generator
+from .aof import AOFWriter, AOFFormatError, parse_commands
+from .loader import AOFLoader
+from .rdb import RDBHandler, LegacyRDBError, aux_commands
+from .rdb_loader import RDBLoader
+from .delta import DeltaChain, snapshot_aux
+from .manifest import AOFManifest, BASE
 
 class RecoveryManager:
     """
@@ -16,15 +24,32 @@ class RecoveryManager:
     Args:
         aof_filename: Path to AOF file.
         rdb_filename: Path to RDB file.
+        aof_dirname: Multi-part AOF directory (default: appendonlydir next to aof_filename)
+        rdb_load_workers: Processes decoding RDB chunks (default: one per CPU)
+        rdb_incremental: Saves extend the delta chain of the RDB file, so the
+            store starts tracking its changed keys once the chain is loaded
     """
 
-    def __init__(self,aof_filename:str,rdb_filename:str):
+    def __init__(self,aof_filename:str,rdb_filename:str,aof_dirname:Optional[str]=None,rdb_load_workers:Optional[int]=None,
+                 rdb_incremental:bool=False):
 
         self.aof_filename=aof_filename
         self.rdb_filename=rdb_filename
+        self.manifest=AOFManifest(aof_dirname or os.path.join(os.path.dirname(aof_filename),'appendonlydir'),
+                                  os.path.basename(aof_filename))
 
         self.aof_handler=None
         self.rdb_handler=None
+        self.rdb_load_workers=rdb_load_workers
+        self.rdb_incremental=rdb_incremental
+        self.loader=None  # AOFLoader of the last recovery, for its progress and totals
+        self.rdb_loader=None  # RDBLoader of the last RDB load, likewise
+
+        # Progress of the running (or last) recovery, for INFO
+        self.loading_start_time=0.0
+        self.loading_total_bytes=0
+        self.loading_loaded_bytes=0
+        self._loaded_files_bytes=0  # of the files already loaded
 
     def recover_data(self,data_store,command_handler=None)->bool:
         """
@@ -39,159 +64,200 @@ class RecoveryManager:
             True if data was successfully recovered.
 
         """
+        steps=self.recover_steps(data_store,command_handler)
+        while True:
+            try:
+                next(steps)
+            except StopIteration as done:
+                return done.value
 
+    def recover_steps(self,data_store,command_handler=None)->Generator[None,None,bool]:
+        """
+        recover_data() one step at a time: yields after every block of AOF
+        or chunk of RDB, and returns what recover_data() would. Progress is
+        in loading_loaded_bytes out of loading_total_bytes meanwhile.
+        """
+        self.loader=AOFLoader(data_store,command_handler)
+        self.loading_start_time=time.time()
+        self.loading_total_bytes=self.loading_loaded_bytes=self._loaded_files_bytes=0
         try:
             # Check which persistence file exist
             aof_exists=os.path.exists(self.aof_filename)
             rdb_exists=os.path.exists(self.rdb_filename)
 
-            if not aof_exists and not rdb_exists:
+            if not self.manifest.exists() and not aof_exists and not rdb_exists:
                 print("No persistence files found, starting with empty database.")
 
             # AOF takes precedence over RDB
-            if aof_exists:
+            if self.manifest.load():
+                print(f"Loading data from multi-part AOF: {self.manifest.filename}")
+                self.loading_total_bytes=sum(os.path.getsize(path) for path in
+                                             (self.manifest.path(aof_file) for aof_file in self.manifest.files())
+                                             if os.path.exists(path))
+                loaded=yield from self._load_multipart_aof(data_store,command_handler)
+                print(self.loader.summary())
+                return loaded
+
+            elif aof_exists:
                 print(f"Loading data from AOF file: {self.aof_filename}")
-                return self._replay_aof(data_store,command_handler)
+                self.loading_total_bytes=os.path.getsize(self.aof_filename)
+                loaded=yield from self._replay_aof(data_store,command_handler)
+                print(self.loader.summary())
+                return loaded
             
             elif rdb_exists:
                 print(f"Loading data from RDB file: {self.rdb_filename}")
-                return self._load_from_rdb(data_store)
+                self.loading_total_bytes=os.path.getsize(self.rdb_filename)
+                return (yield from self._load_from_rdb(data_store,command_handler=command_handler))
             
             return False
         
         except Exception as e:
             print(f"Error during data recovery: {e}")
             return self._handle_corruption(e)
+
+    def _track_progress(self,steps,filename:str):
+        """Pass through a loader's steps, which yield the bytes of filename loaded so far"""
+        for position in steps:
+            self.loading_loaded_bytes=self._loaded_files_bytes+position
+            yield
+        self._loaded_files_bytes+=os.path.getsize(filename)
+        self.loading_loaded_bytes=self._loaded_files_bytes
+
+    def loading_eta(self)->float:
+        """Seconds the running recovery should still take at its pace so far, or -1 before it has one"""
+        elapsed=time.time()-self.loading_start_time
+        if not self.loading_loaded_bytes or not elapsed:
+            return -1
+        rate=self.loading_loaded_bytes/elapsed
+        return max(self.loading_total_bytes-self.loading_loaded_bytes,0)/rate
         
-    def _load_from_rdb(self,data_store)->bool:
+    def _load_multipart_aof(self,data_store,command_handler)->Generator[None,None,bool]:
         """
-        Load data from RDB file
+        Load the base of a multi-part AOF (at RDB speed when it is in the RDB
+        format), then replay the incremental segments after it in order.
 
         Args:
-            data_store: Data store to populate.
+            data_store: Data store to populate
+            command_handler: Command handler to execute commands
+
         Returns:
             True if successful
         """
-        try:
-            rdb_handler=RDBHandler(self.rdb_filename)
-            rdb_data=rdb_handler.load_snapshot()
-
-            if rdb_data is None:
-                print("No data found in RDB file")
+        files=self.manifest.files()
+        for index,aof_file in enumerate(files):
+            path=self.manifest.path(aof_file)
+            if not os.path.exists(path):
+                if aof_file.file_type==BASE:
+                    print(f"AOF base file {path} is missing")
+                    return False
+                continue  # listed before anything was written to it
+            if aof_file.file_type==BASE and self._is_rdb_file(path):
+                loaded=yield from self._load_from_rdb(data_store,path)
+            else:
+                # Only the newest segment can end in a torn write
+                loaded=yield from self._replay_aof(data_store,command_handler,path,allow_truncated=index==len(files)-1)
+            if not loaded:
                 return False
-            data_store.flush()
-            
-            # Load keys from RDB data
+        return True
 
-            keys_data=rdb_data.get('keys',{})
-            current_time=time.time()
-            loaded_keys=0
-            for key,key_data in keys_data.items():
-                value=key_data.get('value')
-                expiry_time=key_data.get('expiry_time')
+    def _is_rdb_file(self,filename:str)->bool:
+        with open(filename,'rb') as f:
+            return f.read(len(RDBHandler.MAGIC_STRING))==RDBHandler.MAGIC_STRING
 
-                #   Skip expired keys
-                if expiry_time and expiry_time <=current_time:
-                    continue
+    def _load_from_rdb(self,data_store,filename:Optional[str]=None,command_handler=None)->Generator[None,None,bool]:
+        """
+        Load data from RDB file, in steps, then the delta files chained to
+        the configured one (see delta.py), then run the commands the last
+        of them keeps in its aux fields (the search index definitions)
 
-                data_store.set(key,value,expiry_time)
-                loaded_keys+=1
+        Args:
+            data_store: Data store to populate.
+            filename: RDB file to load (default: the configured one)
+            command_handler: Command handler whose command table runs the
+                aux commands (optional)
+        Returns:
+            True if successful
+        """
+        try:
+            data_store.flush()
 
-            print(f"loaded {loaded_keys} keys from RDB file")
+            # Chunks are decoded in parallel and merged as they come, never all held at once
+            chained=filename is None
+            deltas=DeltaChain(self.rdb_filename).deltas if chained else []
+            filename=filename or self.rdb_filename
+            self.loading_total_bytes+=sum(os.path.getsize(path) for path in deltas)
+            self.rdb_loader=RDBLoader(data_store,self.rdb_load_workers)
+            yield from self._track_progress(self.rdb_loader.load_steps(filename),filename)
+            print(f"loaded {self.rdb_loader.keys_loaded} keys from RDB file")
+            print(self.rdb_loader.summary())
+            if deltas:
+                # Applied in sequence, each over the keys loaded before it
+                delta_loader=RDBLoader(data_store,1)
+                for path in deltas:
+                    yield from self._track_progress(delta_loader.load_steps(path),path)
+                print(f"Applied {len(deltas)} delta files ({delta_loader.keys_loaded} keys)")
+            if command_handler is not None:
+                self._run_aux_commands((deltas or [filename])[-1],command_handler)
+            if chained and self.rdb_incremental:
+                # The store is what the chain holds: the next save can be a delta
+                data_store.take_dirty_keys()
             return True
+        except LegacyRDBError as e:
+            # Never unpickled here; moved aside so the next save doesn't overwrite it
+            os.replace(e.filename,e.filename+'.0001')
+            print(f"{e} (moved to {e.filename}.0001)")
+            data_store.flush()
+            return False
         except Exception as e:
-            print("Error loading RDB file: {e}")
+            print(f"Error loading RDB file: {e}")
+            data_store.flush()  # don't serve part of a corrupted snapshot
             return False
         
-    def _replay_aof(self,datastore,command_handler)->bool:
+    def _run_aux_commands(self,filename:str,command_handler)->None:
+        """Run the commands a snapshot keeps besides its keys (see rdb.COMMANDS_AUX)"""
+        for command,args in aux_commands(snapshot_aux(filename)):
+            handler=command_handler.commands.get(command.upper())
+            if handler is not None:
+                handler(*args)
+
+    def _replay_aof(self,datastore,command_handler,filename:Optional[str]=None,allow_truncated:bool=True)->Generator[None,None,bool]:
         """ 
-        Replay commands from AOF file
+        Replay commands from AOF file, in steps
         Args:
             data_store: Data store to populate
             command Handler: Command handler to execute commands.
+            filename: AOF file to replay (default: the single-file AOF)
+            allow_truncated: Keep the commands before a torn last record instead of failing
 
         Returns: 
             True if successful         
         """
+        filename=filename or self.aof_filename
+        if self.loader is None or self.loader.data_store is not datastore:
+            self.loader=AOFLoader(datastore,command_handler)
+        replayed_before=self.loader.commands_loaded
         try:
-            command_replayed=0
-            with open(self.aof_filename,'r',encoding='utf-8') as f:
-                for line_num,line in enumerate(f,1):
-                    line=line.strip()
-                    if not line:
-                        continue
-
-                    try:
-                        # parse command from aof format: "timestamp COMMAND args..."
-                        parts=line.split(' ',2)
-                        if len(parts)<2:
-                            continue
-
-                        timestamp=parts[0]
-                        command=parts[1].upper()
-                        args=parts[2].split() if len(parts) > 2 else []
-
-                        # Execute command directly on data store
-                        self._execute_recovery_command(datastore,command,args)
-                        command_replayed+=1
-
-                    except Exception as e:
-                        print(f"Error replaying command at line {line_num}: {e}")
-                        print(f"Problematic line : {line}")
-                        continue
-                print(f"Replayed {command_replayed} commands from AOF")
-                return True
-            
+            yield from self._track_progress(self.loader.load_steps(filename,allow_truncated),filename)
+            replayed=self.loader.commands_loaded-replayed_before
+        except AOFFormatError as e:
+            print(f"AOF file {filename} is corrupted ({e})")
+            return False
         except Exception as e:
             print(f"Error replaying AOF file: {e}")
             return False
 
+        print(f"Replayed {replayed} commands from {os.path.basename(filename)}")
+        return True
 
-    def _execute_recovery_command(self,data_store,command:str,args:list)->None:
-        """
-        Execute a single recovery command on the data store.
-        Args:
-            data_store: Data store to execute command on 
-            command: Command to execute 
-            args: command arguments
-        """
+    def _multipart_aof_valid(self)->bool:
+        """Valid when the manifest parses, lists at least one file and its base exists"""
         try:
-            if command =="SET":
-                if len(args)>=2:
-                    key=args[0]
-                    value=' '.join(args[1:])
-                    data_store.set(key,value)
-
-            elif command=="DEL":
-                if args:
-                    data_store.delete(*args)
-
-            elif command == 'EXPIRE':
-                if len(args) == 2:
-                    key = args[0]
-                    seconds = int(args[1])
-                    data_store.expire(key, seconds)
-            
-            elif command == 'EXPIREAT':
-                if len(args) == 2:
-                    key = args[0]
-                    timestamp = int(args[1])
-                    data_store.expire_at(key, timestamp)
-            
-            elif command == 'PERSIST':
-                if len(args) == 1:
-                    key = args[0]
-                    data_store.persist(key)
-            
-            elif command == 'FLUSHALL':
-                data_store.flush()
-            
-            else:
-                # Unknown command - ignore during recovery
-                pass
-                
-        except Exception as e:
-            print(f"Error executing recovery command {command}: {e}")
+            self.manifest.load()
+        except (OSError,ValueError):
+            return False
+        base=self.manifest.base
+        return bool(self.manifest.files()) and (base is None or os.path.exists(self.manifest.path(base)))
 
     def _handle_corruption(self, error) -> bool:
         """
@@ -221,30 +287,27 @@ class RecoveryManager:
         """
 
         results={
-            'aof_exists': os.path.exists(self.aof_filename),
+            'aof_exists': self.manifest.exists() or os.path.exists(self.aof_filename),
             'rdb_exists':os.path.exists(self.rdb_filename),
             'aof_valid':False,
             'rdb_valid':False,
         }
 
         # Validate AOF file
-        if results['aof_exists']:
+        if self.manifest.exists():
+            results['aof_valid']=self._multipart_aof_valid()
+        elif results['aof_exists']:
             try:
-                with open(self.aof_filename,'r',encoding='utf-8') as f:
-                    for i, line in enumerate(f):
-                        if i>=5:
-                            break
-                        # basic fprmat validtion
-                        parts=line.strip().split(' ',2)
-                        if len(parts)>=2:
-                            try:
-                                int(parts[0]) #timestamp should be integer
-                            except ValueError:
-                                break
-
-                    else:
-                        results['aof_valid']=True
-
+                with open(self.aof_filename,'rb') as f:
+                    head=f.read(64 * 1024)
+                # Valid if the first few records parse (a record cut off by the read size is fine)
+                records=parse_commands(head)
+                for _ in range(5):
+                    if next(records,None) is None:
+                        break
+                results['aof_valid']=True
+            except AOFFormatError:
+                results['aof_valid']=len(head)==64 * 1024
             except Exception:
                 results['aof_valid']=False
 
@@ -7,17 +7,28 @@ def pong():
 def null_bulk_string():
     return b"$-1\r\n"
 
+def null_array():
+    return b"*-1\r\n"
+
 def simple_string(value):
     return f"+{value}\r\n".encode()
 
 def bulk_string(value):
     if value is None:
         return null_bulk_string()
+    if isinstance(value, (bytes, bytearray)):
+        return b"$%d\r\n%b\r\n" % (len(value), value)
     return f"${len(value)}\r\n{value}\r\n".encode()
 
 def error(message):
     return f"-ERR {message}\r\n".encode()
 
+def loading_error():
+    return b"-LOADING Redis is loading the dataset in memory\r\n"
+
+def misconf_error(message):
+    return f"-MISCONF {message}\r\n".encode()
+
 def integer(value):
     return f":{value}\r\n".encode()
 
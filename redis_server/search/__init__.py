@@ -0,0 +1,13 @@
+"""
+Redis Search Module
+
+Secondary indexes over hash keys for the FT.* commands:
+- Index definitions with NUMERIC, TAG and TEXT fields
+- Incremental maintenance driven by DataStore key changes
+- Query parsing and set-based evaluation
+"""
+
+from .index import SchemaField, SearchIndex, IndexManager, tokenize
+from .query import QueryError, parse_query, evaluate
+
+__all__ = ['SchemaField', 'SearchIndex', 'IndexManager', 'tokenize', 'QueryError', 'parse_query', 'evaluate']
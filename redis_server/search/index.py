@@ -0,0 +1,278 @@
+"""
+Secondary indexes over hash keys
+
+A SearchIndex covers every hash whose key starts with one of its prefixes
+and keeps, per schema field:
+
+- NUMERIC: a sorted array('d') of values with a parallel list of keys, so
+  a range is two bisects and a slice
+- TAG: an inverted index tag -> set of keys
+- TEXT: an inverted index token -> set of keys
+
+Each document's indexed values are remembered so a change to one hash only
+touches that hash's postings. The IndexManager listens to the DataStore
+and re-indexes a key whenever its value is replaced, modified in place by
+HSET/HDEL, deleted or expired. An AOF rewrite carries the index
+definitions over as FT.CREATE commands (see rewrite_commands()).
+"""
+
+import re
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+
+FIELD_TYPES = ('NUMERIC', 'TAG', 'TEXT')
+
+STOPWORDS = frozenset(
+    "a an and are as at be but by for if in into is it no not of on or such "
+    "that the their then there these they this to was will with".split()
+)
+
+_WORD = re.compile(r"[^\W_]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased words of text, without stopwords"""
+    return [word for word in _WORD.findall(text.lower()) if word not in STOPWORDS]
+
+
+class SchemaField:
+    def __init__(self, name: str, field_type: str, sortable: bool = False,
+                 separator: str = ',', case_sensitive: bool = False):
+        if field_type not in FIELD_TYPES:
+            raise ValueError(f"Invalid field type for field `{name}`")
+        self.name = name
+        self.type = field_type
+        self.sortable = sortable
+        self.separator = separator
+        self.case_sensitive = case_sensitive
+
+    def split_tags(self, value: str) -> Set[str]:
+        tags = (tag.strip() for tag in value.split(self.separator))
+        return {tag if self.case_sensitive else tag.lower() for tag in tags if tag}
+
+
+class NumericIndex:
+    """Sorted values with their keys; duplicates allowed"""
+
+    def __init__(self):
+        self.values = array('d')
+        self.keys: List[str] = []
+
+    def add(self, value: float, key: str) -> None:
+        position = bisect_right(self.values, value)
+        self.values.insert(position, value)
+        self.keys.insert(position, key)
+
+    def remove(self, value: float, key: str) -> None:
+        position = bisect_left(self.values, value)
+        end = bisect_right(self.values, value, position)
+        for index in range(position, end):
+            if self.keys[index] == key:
+                del self.values[index]
+                del self.keys[index]
+                return
+
+    def range(self, low: float, high: float, low_exclusive: bool = False,
+              high_exclusive: bool = False) -> Set[str]:
+        start = (bisect_right if low_exclusive else bisect_left)(self.values, low)
+        end = (bisect_left if high_exclusive else bisect_right)(self.values, high)
+        return set(self.keys[start:end]) if start < end else set()
+
+
+class SearchIndex:
+    """Index definition plus its numeric, tag and text postings"""
+
+    def __init__(self, name: str, prefixes: List[str], fields: List[SchemaField]):
+        self.name = name
+        self.prefixes = prefixes or ['']
+        self.fields: Dict[str, SchemaField] = {field.name: field for field in fields}
+        self.clear()
+
+    def clear(self) -> None:
+        # key -> {field: number or (terms, raw string)}, and insertion order for stable results
+        self.docs: Dict[str, Dict[str, object]] = {}
+        self.doc_order: Dict[str, int] = {}
+        self._next_doc = 0
+        self.numeric: Dict[str, NumericIndex] = {}
+        self.postings: Dict[str, Dict[str, Set[str]]] = {}
+        for name, field in self.fields.items():
+            if field.type == 'NUMERIC':
+                self.numeric[name] = NumericIndex()
+            else:
+                self.postings[name] = {}
+
+    def covers(self, key: str) -> bool:
+        return any(key.startswith(prefix) for prefix in self.prefixes)
+
+    # Maintenance
+
+    def index_document(self, key: str, hash_obj: dict) -> None:
+        """(Re)index one hash"""
+        self.remove_document(key)
+        indexed = {}
+        for name, field in self.fields.items():
+            raw = hash_obj.get(name)
+            if raw is None:
+                continue
+            if field.type == 'NUMERIC':
+                try:
+                    value = float(raw)
+                except ValueError:
+                    continue
+                self.numeric[name].add(value, key)
+                indexed[name] = value
+            else:
+                terms = field.split_tags(raw) if field.type == 'TAG' else set(tokenize(raw))
+                postings = self.postings[name]
+                for term in terms:
+                    postings.setdefault(term, set()).add(key)
+                indexed[name] = (terms, raw)
+        self.docs[key] = indexed
+        self.doc_order[key] = self._next_doc
+        self._next_doc += 1
+
+    def remove_document(self, key: str) -> bool:
+        indexed = self.docs.pop(key, None)
+        if indexed is None:
+            return False
+        del self.doc_order[key]
+        for name, value in indexed.items():
+            if name in self.numeric:
+                self.numeric[name].remove(value, key)
+                continue
+            postings = self.postings[name]
+            for term in value[0]:
+                keys = postings.get(term)
+                if keys is not None:
+                    keys.discard(key)
+                    if not keys:
+                        del postings[term]
+        return True
+
+    # Lookups
+
+    def all_keys(self) -> Set[str]:
+        return set(self.docs)
+
+    def numeric_range(self, name: str, low: float, high: float,
+                      low_exclusive: bool = False, high_exclusive: bool = False) -> Set[str]:
+        index = self.numeric.get(name)
+        if index is None:
+            raise ValueError(f"Unknown numeric field `{name}`")
+        return index.range(low, high, low_exclusive, high_exclusive)
+
+    def tag_match(self, name: str, tags: Iterable[str]) -> Set[str]:
+        field = self.fields.get(name)
+        if field is None or field.type != 'TAG':
+            raise ValueError(f"Unknown tag field `{name}`")
+        postings = self.postings[name]
+        result: Set[str] = set()
+        for tag in tags:
+            result |= postings.get(tag if field.case_sensitive else tag.lower(), set())
+        return result
+
+    def text_match(self, name: Optional[str], term: str) -> Set[str]:
+        """Keys whose text field (any text field if name is None) holds term; 'pre*' matches prefixes"""
+        if name is not None:
+            field = self.fields.get(name)
+            if field is None or field.type != 'TEXT':
+                raise ValueError(f"Unknown text field `{name}`")
+            names = [name]
+        else:
+            names = [field.name for field in self.fields.values() if field.type == 'TEXT']
+
+        term = term.lower()
+        result: Set[str] = set()
+        for field_name in names:
+            postings = self.postings[field_name]
+            if term.endswith('*'):
+                prefix = term[:-1]
+                for word, keys in postings.items():
+                    if word.startswith(prefix):
+                        result |= keys
+            else:
+                result |= postings.get(term, set())
+        return result
+
+    def sort_key(self, key: str, name: str) -> Tuple[int, object]:
+        """Sort value of a document: numbers numerically, others by their raw string; missing last"""
+        value = self.docs[key].get(name)
+        if value is None:
+            return (1, 0.0 if name in self.numeric else '')
+        return (0, value) if name in self.numeric else (0, value[1].lower())
+
+    def create_args(self) -> List[str]:
+        """FT.CREATE arguments that define this index again"""
+        args = [self.name, 'ON', 'HASH']
+        if self.prefixes != ['']:
+            args += ['PREFIX', str(len(self.prefixes))] + self.prefixes
+        args.append('SCHEMA')
+        for field in self.fields.values():
+            args += [field.name, field.type]
+            if field.type == 'TAG' and field.separator != ',':
+                args += ['SEPARATOR', field.separator]
+            if field.type == 'TAG' and field.case_sensitive:
+                args.append('CASESENSITIVE')
+            if field.sortable:
+                args.append('SORTABLE')
+        return args
+
+    def get_info(self) -> dict:
+        return {
+            'index_name': self.name,
+            'prefixes': self.prefixes,
+            'attributes': [(field.name, field.type) for field in self.fields.values()],
+            'num_docs': len(self.docs),
+            'num_terms': sum(len(postings) for postings in self.postings.values()),
+            'num_records': sum(len(keys) for postings in self.postings.values() for keys in postings.values())
+                           + sum(len(index.values) for index in self.numeric.values()),
+        }
+
+
+class IndexManager:
+    """Owns the indexes of a DataStore and keeps them current as keys change"""
+
+    def __init__(self, storage):
+        self.storage = storage
+        self.indexes: Dict[str, SearchIndex] = {}
+        storage.add_listener(self)
+
+    def create(self, name: str, prefixes: List[str], fields: List[SchemaField]) -> SearchIndex:
+        """Create an index and backfill it from the hashes already stored"""
+        if name in self.indexes:
+            raise ValueError("Index already exists")
+        index = SearchIndex(name, prefixes, fields)
+        # Only read: the hashes aren't copied or marked changed
+        for key, value, _ in self.storage.entries([key for key in self.storage.keys() if index.covers(key)]):
+            if isinstance(value, dict):
+                index.index_document(key, value)
+        self.indexes[name] = index
+        return index
+
+    def drop(self, name: str) -> Optional[SearchIndex]:
+        return self.indexes.pop(name, None)
+
+    def key_changed(self, key: str, value) -> None:
+        """DataStore listener: value is the key's new value, or None if it is gone"""
+        for index in self.indexes.values():
+            if not index.covers(key):
+                continue
+            if isinstance(value, dict):
+                index.index_document(key, value)
+            else:
+                index.remove_document(key)
+
+    def covers(self, key: str) -> bool:
+        """DataStore listener: whether any index covers key"""
+        return any(index.covers(key) for index in self.indexes.values())
+
+    def rewrite_commands(self) -> List[Tuple[str, List[str]]]:
+        """DataStore listener: commands that define every index again (for an AOF rewrite)"""
+        return [('FT.CREATE', index.create_args()) for index in self.indexes.values()]
+
+    def flushed(self) -> None:
+        """DataStore listener: every key was removed"""
+        for index in self.indexes.values():
+            index.clear()
@@ -0,0 +1,194 @@
+"""
+Query parsing and evaluation for FT.SEARCH
+
+Supported syntax (a subset of RediSearch's):
+
+    *                         every document
+    word  pre*                text in any TEXT field (prefix with *)
+    @field:word               text in one field; @field:(a b) needs both
+    @field:[min max]          numeric range; ( excludes a bound, -inf/+inf
+    @field:{a | b}            any of the tags
+    a b                       intersection
+    a | b                     union
+    -a                        negation
+    ( ... )                   grouping
+
+Evaluation only looks at index postings and returns a set of keys;
+intersections start from the smallest operand.
+"""
+
+import re
+from typing import List, Optional, Set, Tuple
+
+from .index import SearchIndex
+
+
+class QueryError(ValueError):
+    """Raised for queries that cannot be parsed"""
+
+
+_TOKEN = re.compile(r"""
+    \s*(?:
+        (?P<field>@[\w.]+:)
+      | (?P<range>\[[^\]]*\])
+      | (?P<tags>\{[^}]*\})
+      | (?P<op>[()|-])
+      | (?P<word>[^\s()|\[\]{}@]+)
+    )""", re.VERBOSE)
+
+
+def _lex(text: str) -> List[Tuple[str, str]]:
+    tokens = []
+    position = 0
+    text = text.strip()
+    while position < len(text):
+        match = _TOKEN.match(text, position)
+        if not match or match.end() == position:
+            raise QueryError(f"Syntax error at offset {position} near {text[position:position + 10]}")
+        tokens.append((match.lastgroup, match.group(match.lastgroup)))
+        position = match.end()
+    return tokens
+
+
+class _Parser:
+    def __init__(self, text: str):
+        self.tokens = _lex(text)
+        self.position = 0
+
+    def peek(self) -> Optional[Tuple[str, str]]:
+        return self.tokens[self.position] if self.position < len(self.tokens) else None
+
+    def take(self) -> Tuple[str, str]:
+        token = self.peek()
+        if token is None:
+            raise QueryError("Syntax error: unexpected end of query")
+        self.position += 1
+        return token
+
+    def parse(self) -> tuple:
+        node = self.union()
+        if self.peek() is not None:
+            raise QueryError(f"Syntax error near '{self.peek()[1]}'")
+        return node
+
+    def union(self) -> tuple:
+        branches = [self.intersection()]
+        while self.peek() == ('op', '|'):
+            self.take()
+            branches.append(self.intersection())
+        return branches[0] if len(branches) == 1 else ('or', branches)
+
+    def intersection(self) -> tuple:
+        items = []
+        while self.peek() is not None and self.peek() not in (('op', ')'), ('op', '|')):
+            items.append(self.unary())
+        if not items:
+            raise QueryError("Syntax error: empty expression")
+        return items[0] if len(items) == 1 else ('and', items)
+
+    def unary(self) -> tuple:
+        if self.peek() == ('op', '-'):
+            self.take()
+            return ('not', self.unary())
+        return self.atom()
+
+    def atom(self) -> tuple:
+        kind, value = self.take()
+        if (kind, value) == ('op', '('):
+            node = self.union()
+            if self.take() != ('op', ')'):
+                raise QueryError("Syntax error: missing ')'")
+            return node
+        if kind == 'word':
+            return ('all',) if value == '*' else ('text', None, [value])
+        if kind == 'field':
+            return self.field_atom(value[1:-1])
+        raise QueryError(f"Syntax error near '{value}'")
+
+    def field_atom(self, name: str) -> tuple:
+        kind, value = self.take()
+        if kind == 'range':
+            return ('numeric', name) + _parse_range(value[1:-1])
+        if kind == 'tags':
+            tags = [tag.strip() for tag in value[1:-1].split('|') if tag.strip()]
+            if not tags:
+                raise QueryError(f"Syntax error: empty tag list for @{name}")
+            return ('tag', name, tags)
+        if kind == 'word':
+            return ('text', name, [value])
+        if (kind, value) == ('op', '('):
+            words = []
+            while self.peek() is not None and self.peek()[0] == 'word':
+                words.append(self.take()[1])
+            if not words or self.take() != ('op', ')'):
+                raise QueryError(f"Syntax error in text group for @{name}")
+            return ('text', name, words)
+        raise QueryError(f"Syntax error after @{name}:")
+
+
+def _parse_bound(text: str) -> Tuple[float, bool]:
+    exclusive = text.startswith('(')
+    if exclusive:
+        text = text[1:]
+    try:
+        return float(text), exclusive
+    except ValueError:
+        raise QueryError(f"Expecting numeric argument, got {text}")
+
+
+def _parse_range(text: str) -> tuple:
+    parts = text.split()
+    if len(parts) != 2:
+        raise QueryError("Syntax error: numeric range needs min and max")
+    low, low_exclusive = _parse_bound(parts[0])
+    high, high_exclusive = _parse_bound(parts[1])
+    return low, high, low_exclusive, high_exclusive
+
+
+def parse_query(text: str) -> tuple:
+    """Parse a query string into a tuple tree"""
+    return _Parser(text).parse()
+
+
+def evaluate(node: tuple, index: SearchIndex) -> Set[str]:
+    """Keys of the documents matching a parsed query"""
+    kind = node[0]
+    if kind == 'all':
+        return index.all_keys()
+    if kind == 'numeric':
+        return index.numeric_range(*node[1:])
+    if kind == 'tag':
+        return index.tag_match(node[1], node[2])
+    if kind == 'text':
+        result = None
+        for word in node[2]:
+            keys = index.text_match(node[1], word)
+            result = keys if result is None else result & keys
+            if not result:
+                break
+        return result
+    if kind == 'or':
+        result = set()
+        for branch in node[1]:
+            result |= evaluate(branch, index)
+        return result
+    if kind == 'not':
+        return index.all_keys() - evaluate(node[1], index)
+    if kind == 'and':
+        positive = [evaluate(item, index) for item in node[1] if item[0] != 'not']
+        negative = [item[1] for item in node[1] if item[0] == 'not']
+        if positive:
+            positive.sort(key=len)
+            result = positive[0]
+            for keys in positive[1:]:
+                if not result:
+                    break
+                result = result & keys
+        else:
+            result = index.all_keys()
+        for item in negative:
+            if not result:
+                break
+            result = result - evaluate(item, index)
+        return result
+    raise QueryError(f"Unknown query node {kind}")
@@ -1,10 +1,14 @@
+import os
 import socket
 import select
 import time
+from collections import deque
 from .command_handler import CommandHandler
 from .storage import DataStore
+from .tiering import ValueTier
 from .persistence import PersistenceManager,PersistenceConfig
 from .pubsub import PubSubManager
+from .blocking import BlockingManager
 
 
 class RedisServer:
@@ -14,18 +18,31 @@ class RedisServer:
         self.running=False
         self.server_socket=None
         self.clients={}
-        self.storage=DataStore()
 
         # Initialize pub/sub manager
         self.pubsub_manager=PubSubManager()
 
+        # Initialize blocking manager (XREAD BLOCK and friends)
+        self.blocking_manager=BlockingManager(self._send_reply)
+
+        # Replies waiting for their AOF batch to reach disk (appendfsync always),
+        # as (batch, client, response) in send order
+        self.held_replies=deque()
+
         # Initialize Persistence        
         self.persistence_config=persistence_config or PersistenceConfig() #default or custom.
         self.persistence_manager=PersistenceManager(self.persistence_config)
 
+        # Values of cold keys are spilled to a log next to the persistence files
+        self.storage=DataStore(tier=ValueTier(
+            os.path.join(self.persistence_config.data_dir,self.persistence_config.get('tiering_dirname','valuelog')),
+            self.persistence_config.get('tiering_max_memory',0),
+            self.persistence_config.get('tiering_promote_hits',2),
+        ))
+
         # command handler needs reference to persistence manager and pubsub manager.
 
-        self.command_handler=CommandHandler(self.storage,self.persistence_manager,self.pubsub_manager)
+        self.command_handler=CommandHandler(self.storage,self.persistence_manager,self.pubsub_manager,self.blocking_manager)
         
 
         # Extras
@@ -38,13 +55,10 @@ class RedisServer:
         # Start persistence
         self.persistence_manager.start()
         
-        # Recover data from persistence files
+        # Recover data from persistence files, a slice per event loop
+        # iteration, so clients can connect (and get -LOADING) meanwhile
         print("Recovering data from persistence files...")
-        recovery_success = self.persistence_manager.recover_data(self.storage, self.command_handler)
-        if recovery_success:
-            print("Data recovery completed successfully")
-        else:
-            print("Data recovery failed, starting with empty database")
+        self.persistence_manager.start_loading(self.storage, self.command_handler)
 
         # Initialize server socket
         self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
@@ -59,20 +73,38 @@ class RedisServer:
         self._event_loop()
 
     def _event_loop(self):
+        aof_wakeup = self.persistence_manager.aof_wakeup_socket()
+        wakeup_sockets = [aof_wakeup] if aof_wakeup is not None else []
         while self.running:
             try:
+                loading = self.persistence_manager.loading
                 # Use shorter timeout to enable regular cleanup for TTL
+                # (no wait at all while there is data left to load)
                 read, _, _ = select.select(
-                    [self.server_socket] + list(self.clients.keys()),
-                    [], [], 0.05  # 50ms timeout for more responsive cleanup
+                    [self.server_socket] + list(self.clients.keys()) + wakeup_sockets,
+                    [], [], 0 if loading else 0.05  # 50ms timeout for more responsive cleanup
                 )
                 
                 for sock in read:
                     if sock is self.server_socket:  # if sock is the server socket, then accept a new client
                         self._accept_client()
+                    elif sock is aof_wakeup:        # the AOF writer finished a batch
+                        self._drain_wakeup(sock)
                     else:                           # if sock is a client socket, then handle the client
                         self._handle_client(sock)
                 
+                # Serve blocked clients whose keys were written to, or whose timeout expired
+                self._process_blocked_clients()
+                
+                # Hand this iteration's AOF writes to the writer thread as one
+                # batch, then answer clients whose batch is already on disk
+                self.persistence_manager.flush_aof()
+                self._release_replies()
+
+                if loading:
+                    self._load_step()
+                    continue
+                
                 # Perform background tasks
                 current_time = time.time()
                 
@@ -91,10 +123,56 @@ class RedisServer:
             except Exception as e:
                 print(f"Event loop error: {e}")
     
+    def _process_blocked_clients(self):
+        """Retry blocked commands and resume reading from clients that got unblocked"""
+        unblocked = self.blocking_manager.process_ready_keys()
+        unblocked += self.blocking_manager.process_timeouts()
+        for client in unblocked:
+            if client in self.clients:
+                self._process_buffer(client)
+
+    def _send_reply(self, client, response):
+        """Send a reply now, or hold it until the AOF batch it depends on is on disk"""
+        batch = self.persistence_manager.reply_barrier()
+        if batch is None and not self.held_replies:
+            client.send(response)
+            return
+        # Anything queued behind a held reply waits too, so replies keep their order
+        self.held_replies.append((batch or 0, client, response))
+
+    def _release_replies(self):
+        """Send held replies whose AOF batch has been written and fsynced"""
+        written = self.persistence_manager.written_batch()
+        while self.held_replies and self.held_replies[0][0] <= written:
+            _, client, response = self.held_replies.popleft()
+            if client not in self.clients:
+                continue
+            try:
+                client.send(response)
+            except Exception as e:
+                print(f"Error sending reply: {e}")
+
+    def _load_step(self):
+        """Load the next slice of the dataset, and report when it is all in"""
+        recovery_success = self.persistence_manager.load_step()
+        self._spill_cold_values()  # a dataset larger than memory can't wait for loading to end
+        if recovery_success is None:
+            return
+        if recovery_success:
+            print("Data recovery completed successfully")
+        else:
+            print("Data recovery failed, starting with empty database")
+
+    def _drain_wakeup(self, sock):
+        try:
+            sock.recv(4096)
+        except BlockingIOError:
+            pass
+
     def _background_persistence_tasks(self):
         """Perform background persistence tasks"""
         try:
-            self.persistence_manager.periodic_tasks()
+            self.persistence_manager.periodic_tasks(self.storage)
         except Exception as e:
             print(f"Error during persistence tasks: {e}")
 
@@ -126,16 +204,18 @@ class RedisServer:
     def _process_buffer(self, client):
         buffer = self.clients[client]["buffer"]
         
-        while b"\r\n" in buffer:
+        # A blocked client's remaining commands wait until it is served
+        while b"\r\n" in buffer and not self.blocking_manager.is_blocked(client):
             command, buffer = buffer.split(b"\r\n", 1)
             if command:
                 try:
                     response = self._process_command(command.decode('utf-8'), client)
-                    client.send(response)
+                    if response is not None:  # None: the client blocked, reply comes later
+                        self._send_reply(client, response)
                 except Exception as e:
                     print(f"Error processing command: {e}")
                     error_response = f"-ERR {str(e)}\r\n".encode()
-                    client.send(error_response)
+                    self._send_reply(client, error_response)
         
         self.clients[client]["buffer"] = buffer
 
@@ -153,6 +233,14 @@ class RedisServer:
                 print(f"Cleaned up {expired_count} expired keys")
         except Exception as e:
             print(f"Error during background cleanup: {e}")
+        self._spill_cold_values()
+
+    def _spill_cold_values(self):
+        """Move values of cold keys to the value log while memory is over its limit"""
+        try:
+            self.storage.spill_cold_values()
+        except Exception as e:
+            print(f"Error spilling values to disk: {e}")
 
     def _disconnect_client(self, client):
         try:
@@ -161,6 +249,7 @@ class RedisServer:
             
             # Clean up pub/sub subscriptions
             self.pubsub_manager.cleanup_client(client)
+            self.blocking_manager.unblock(client)
             
             client.close()
             self.clients.pop(client, None)
@@ -173,6 +262,7 @@ class RedisServer:
         # Stop persistence
         try:
             self.persistence_manager.stop()
+            self._release_replies()
         except Exception as e:
             print(f"Error stopping persistence: {e}")
         
@@ -1,48 +1,394 @@
+import copy
 import time
 import random
 import fnmatch
 from collections import deque
+from .datatypes import HyperLogLog, BloomFilter, CuckooFilter, CountMinSketch, TopK, Stream, TimeSeries, VectorSet, JSONDocument, SortedSet
+from .compression import CompressedString, StringCompressor
+from .tiering import MIN_SPILL_BYTES, SpilledValue, ValueTier
+
+# Every data type the store can hold, as reported by TYPE
+DATA_TYPES = ("string", "list", "set", "hash", "hyperloglog", "bloom", "cuckoo", "cms", "topk", "stream", "timeseries", "vectorset", "json", "zset")
+
+# Values spilled per spill_cold_values() call, at most
+SPILL_BATCH = 1000
+
+# OBJECT ENCODING of the types whose encoding doesn't depend on the value
+TYPE_ENCODINGS = {"list": "quicklist", "set": "hashtable", "hash": "hashtable", "zset": "skiplist", "stream": "stream"}
 
 class DataStore:
-    def __init__(self):
+    def __init__(self, compressor=None, tier=None):
         # Storage format: {key: (value, type, expiry_time)}
         self._data = {}
+        # Keeps large strings compressed, see compression.py
+        self.compressor = compressor or StringCompressor()
+        # Spills the values of cold keys to disk, see tiering.py
+        self.tier = tier or ValueTier()
         self._memory_usage = 0
+        # Keys whose value was handed out to be changed in place, with the
+        # size counted for it then; see _settle_memory_usage
+        self._unmeasured = {}
         # Type statistics for INFO command
-        self._type_stats = {
-            "string": 0,
-            "list": 0,
-            "set": 0,
-            "hash": 0
-        }
+        self._type_stats = {data_type: 0 for data_type in DATA_TYPES}
+        # Objects told about key changes (e.g. search indexes), see add_listener
+        self._listeners = []
+        # Point-in-time view handed out by snapshot(), see _unshare
+        self._snapshot = None
+        # True while _data is a MappedKeyspace, see attach_snapshot
+        self._mapped = False
+        # Keys changed since the last take_dirty_keys() (None until it is
+        # first called), and whether the store was flushed meanwhile
+        self._dirty = None
+        self._dirty_all = False
+        # True while a read-only command runs (see CommandHandler.execute):
+        # values it is handed are only read, see _unshare
+        self.reading = False
+
+    def add_listener(self, listener):
+        """Register an object with key_changed(key, value), covers(key) and
+        flushed() methods. value is the key's new value, or None once the
+        key is gone; keys loaded in bulk are only announced to a listener
+        that covers them. It may also have rewrite_commands(), for state it
+        keeps besides the keys."""
+        self._listeners.append(listener)
+
+    def listener_commands(self):
+        """(command, args) recreating what listeners keep besides the keys (e.g. search index definitions)"""
+        commands = []
+        for listener in self._listeners:
+            if hasattr(listener, 'rewrite_commands'):
+                commands.extend(listener.rewrite_commands())
+        return commands
+
+    def notify_key_changed(self, key):
+        """Tell listeners a value was modified in place (e.g. fields set on a hash)"""
+        self._changed(key)
+        value = self.get(key)
+        for listener in self._listeners:
+            listener.key_changed(key, value)
+
+    def _announce_loaded(self, keys):
+        """Tell listeners about keys loaded in bulk; only the values a listener covers are decoded, and only to be read"""
+        listeners = self._listeners
+        reading, self.reading = self.reading, True
+        try:
+            for key in keys:
+                if any(listener.covers(key) for listener in listeners):
+                    value = self.get(key)
+                    for listener in listeners:
+                        listener.key_changed(key, value)
+        finally:
+            self.reading = reading
+
+    def snapshot(self):
+        """
+        Point-in-time view {key: (value, type, expiry_time)} that another
+        thread can read while the store keeps changing. Taking it only
+        copies the key table; a value is copied the first time it is
+        fetched for reading or writing afterwards (copy-on-write), so the
+        view's objects are never modified in place. Call release_snapshot()
+        when done.
+        """
+        self._snapshot = self._data.copy()
+        return self._snapshot
+
+    def entries(self, keys=None):
+        """
+        Yield (key, value, expiry_time) for every key without copying
+        anything but the key list; the values must only be read, and only
+        until the store next changes (unlike snapshot()).
+
+        With keys, only those are yielded, and the ones that don't exist
+        with None as their value.
+        """
+        data = self._data
+        for key in list(data) if keys is None else keys:
+            entry = data.get(key)
+            if entry is None:
+                if keys is not None:
+                    yield key, None, None
+            else:
+                value = entry[0]
+                if isinstance(value, SpilledValue):
+                    value = value.load()  # read from the log, but left there
+                yield key, value, entry[2]
+
+    def release_snapshot(self):
+        self._snapshot = None
+
+    def _changed(self, key):
+        if self._dirty is not None:
+            self._dirty.add(key)
+
+    def take_dirty_keys(self):
+        """
+        Keys set, changed, expired or deleted since the last call, for an
+        incremental snapshot; None when that isn't known (the first call,
+        which starts the tracking, or a flush since): every key must then
+        be saved. Mutable values handed out count as changed, unless only
+        a read-only command was handed them.
+        """
+        dirty, self._dirty = self._dirty, set()
+        if dirty is None or self._dirty_all:
+            self._dirty_all = False
+            return None
+        return dirty
+
+    def restore_dirty_keys(self, keys):
+        """Mark keys dirty again after the save that took them failed (None: every key)"""
+        if self._dirty is None:
+            return
+        if keys is None:
+            self._dirty_all = True
+        else:
+            self._dirty |= keys
+
+    def _unshare(self, key, value):
+        """Give the store its own copy of a value the snapshot still holds, before it is handed out"""
+        if isinstance(value, (str, bytes, int, float, CompressedString)):
+            return value
+        if self.reading:
+            return value  # only read: the write that changes it copies, marks and pins it
+        # It may be changed in place: the next incremental snapshot saves it,
+        # and its size is measured again
+        self._changed(key)
+        if key not in self._unmeasured:
+            self._unmeasured[key] = self._calculate_memory_usage(key, value)
+        if self._mapped:
+            # Decoded from a mapped file: changes made to it must land in the overlay
+            self._data.pin(key, value)
+        snapshot = self._snapshot
+        if snapshot is None:
+            return value
+        entry = snapshot.get(key)
+        if entry is None or entry[0] is not value:
+            return value  # replaced or already copied since the snapshot
+        if isinstance(value, (deque, list, set, dict, bytearray)):
+            value = type(value)(value)  # members are immutable strings
+        else:
+            value = copy.deepcopy(value)
+        _, data_type, expiry_time = self._data[key]
+        self._data[key] = (value, data_type, expiry_time)
+        return value
+
+    def _remove_key(self, key):
+        """Drop a key that is known to exist, updating stats and listeners"""
+        value, data_type, _ = self._data.pop(key)
+        self._changed(key)
+        self._uncount(key, value)
+        self._type_stats[data_type] -= 1
+        if isinstance(value, CompressedString):
+            self.compressor.removed(key, value)
+        elif isinstance(value, SpilledValue):
+            self.tier.removed(value)
+        self.tier.forget(key)
+        for listener in self._listeners:
+            listener.key_changed(key, None)
 
     def set(self, key, value, expiry_time=None):
         # Remove old key if exists to update memory usage and type stats
         if key in self._data:
             old_value, old_type, _ = self._data[key] # Return value,type,ttl
-            self._memory_usage -= self._calculate_memory_usage(key, old_value)
+            self._uncount(key, old_value)
             self._type_stats[old_type] -= 1
+            if isinstance(old_value, CompressedString):
+                self.compressor.removed(key, old_value)
+            elif isinstance(old_value, SpilledValue):
+                self.tier.removed(old_value)
         
-        data_type = self._get_data_type(value)
-        self._data[key] = (value, data_type, expiry_time)
-        self._memory_usage += self._calculate_memory_usage(key, value)
+        # Large strings are stored compressed; listeners still get the text
+        stored = value
+        if type(value) is str:
+            stored = self.compressor.compress(value)
+        if isinstance(stored, CompressedString):
+            self.compressor.added(stored)
+        
+        data_type = self._get_data_type(stored)
+        self._data[key] = (stored, data_type, expiry_time)
+        self._changed(key)
+        size = self._calculate_memory_usage(key, stored)
+        self._memory_usage += size
+        if not isinstance(stored, (str, bytes, int, float, CompressedString)):
+            self._unmeasured[key] = size  # the caller may fill it in place (e.g. a new list)
         self._type_stats[data_type] += 1
+        self.tier.touch(key)
+        for listener in self._listeners:
+            listener.key_changed(key, value)
+
+    def _uncount(self, key, value):
+        """Take key's value, about to be dropped, out of the memory estimate: the size that was counted for it"""
+        size = self._unmeasured.pop(key, None)
+        if size is None:
+            size = self._calculate_memory_usage(key, value)
+        self._memory_usage = max(0, self._memory_usage - size)
+
+    def _settle_memory_usage(self):
+        """Measure again the values handed out to be changed in place since the last call"""
+        unmeasured, self._unmeasured = self._unmeasured, {}
+        data = self._data
+        for key, size in unmeasured.items():
+            entry = data.get(key)
+            if entry is not None:
+                self._memory_usage += self._calculate_memory_usage(key, entry[0]) - size
+        self._memory_usage = max(0, self._memory_usage)
 
     def get(self, key):
         # check if key exists and hasn't expired
         if not self._is_key_valid(key):
             return None
         value, _, _ = self._data[key] # value, type, expiry_time
+        if isinstance(value, SpilledValue):
+            value = self._fetch(key)
+        else:
+            self.tier.touch(key)
+        if isinstance(value, CompressedString):
+            return self.compressor.decompress(key, value)
+        return self._unshare(key, value)
+
+    def _resident(self, key):
+        """key's (value, type, expiry_time), moving a spilled value back to memory first"""
+        entry = self._data[key]
+        if isinstance(entry[0], SpilledValue):
+            return self._promote(key, entry, entry[0].load())
+        self.tier.touch(key)
+        return entry
+
+    def _fetch(self, key):
+        """Read key's spilled value from disk, promoting it if it is read often or can be changed in place"""
+        entry = self._data[key]
+        spilled = entry[0]
+        value = spilled.load()
+        spilled.hits += 1
+        if spilled.hits >= self.tier.promote_hits or not isinstance(value, (str, bytes, int, float, CompressedString)):
+            self._promote(key, entry, value)
+        else:
+            self.tier.fetched()
         return value
 
+    def _promote(self, key, entry, value):
+        spilled, data_type, expiry_time = entry
+        self.tier.removed(spilled, promoted=True)
+        self._memory_usage += self._calculate_memory_usage(key, value) - self._calculate_memory_usage(key, spilled)
+        if isinstance(value, CompressedString):
+            self.compressor.added(value)
+        entry = (value, data_type, expiry_time)
+        self._data[key] = entry
+        self.tier.touch(key)
+        return entry
+
+    def spill_cold_values(self, limit=SPILL_BATCH):
+        """
+        While the memory estimate is above tier.max_memory, move the values
+        of the least recently used keys to the value log (event loop only).
+        Also drives the log's compaction. Returns the number of values spilled.
+        """
+        tier = self.tier
+        if not tier.enabled():
+            return 0
+        for key, old, new in tier.compact_step():
+            _, data_type, expiry_time = self._data[key]
+            self._data[key] = (new, data_type, expiry_time)
+        if not tier.tracking:
+            tier.track(key for key in list(self._data) if not (self._mapped and key not in self._data.overlay))
+        tier.sample_rates()
+
+        self._settle_memory_usage()
+        spilled = 0
+        while self._memory_usage > tier.max_memory and spilled < limit:
+            key = tier.coldest()
+            if key is None:
+                break
+            entry = self._data.get(key)
+            if entry is None or isinstance(entry[0], SpilledValue):
+                continue
+            if self._mapped and key not in self._data.overlay:
+                continue  # already served from a file
+            value, data_type, expiry_time = entry
+            memory = self._calculate_memory_usage(key, value)
+            if memory < MIN_SPILL_BYTES:
+                continue  # tracked again once it is used
+            if isinstance(value, CompressedString):
+                self.compressor.removed(key, value)
+            placeholder = tier.spill(key, value)
+            self._data[key] = (placeholder, data_type, expiry_time)
+            self._memory_usage += self._calculate_memory_usage(key, placeholder) - memory
+            spilled += 1
+        return spilled
+
+    def get_tiering_stats(self):
+        """Get the value log's split of the data and spill/fetch counters"""
+        return self.tier.stats()
+
+    def get_encoding(self, key):
+        """Representation of a key's value as OBJECT ENCODING reports it, or None if key doesn't exist"""
+        if not self._is_key_valid(key):
+            return None
+        
+        value, data_type, _ = self._data[key]
+        if isinstance(value, SpilledValue):
+            return "spilled"
+        if data_type != "string":
+            return TYPE_ENCODINGS.get(data_type, "raw")
+        if isinstance(value, CompressedString):
+            return "compressed"
+        if isinstance(value, int) or (isinstance(value, str) and len(value) <= 20 and value.lstrip("-").isdigit()):
+            return "int"
+        if isinstance(value, str) and len(value) <= 44:
+            return "embstr"
+        return "raw"
+
+    def merge(self, other):
+        """
+        Move every key of other, a store filled separately (e.g. from one
+        chunk of a snapshot), into this one in bulk. other's keys must not
+        exist here. Returns the number of keys moved.
+        """
+        self._data.update(other._data)
+        self._memory_usage += other._memory_usage
+        self._unmeasured.update(other._unmeasured)
+        for data_type, count in other._type_stats.items():
+            self._type_stats[data_type] += count
+        self.compressor.merge(other.compressor)
+        if self._dirty is not None:
+            self._dirty.update(other._data)
+        if self.tier.tracking:
+            self.tier.track(other._data)
+        if self._listeners:
+            self._announce_loaded(other._data)
+        return len(other._data)
+
+    def attach_snapshot(self, keyspace):
+        """
+        Serve the keys of a mapped snapshot (a MappedKeyspace, see
+        persistence/mapped.py) in place instead of loading them: values are
+        decoded from the file when read, and changes go to an in-memory
+        overlay. The store must be empty. Only the keys a listener covers
+        (e.g. hashes a search index takes) are decoded up front. Returns
+        the number of keys.
+        """
+        if self._data:
+            raise ValueError("A snapshot can only be attached to an empty store")
+        snapshot = keyspace.snapshot
+        self._data = keyspace
+        self._mapped = True
+        self._memory_usage = snapshot.memory_usage
+        for data_type, count in snapshot.type_counts.items():
+            self._type_stats[data_type] += count
+        compressor = self.compressor
+        compressor.compressed_values, compressor.raw_bytes, compressor.compressed_bytes = snapshot.compressed
+        if self._listeners:
+            self._announce_loaded(keyspace)
+        return len(keyspace)
+
+    def get_mapped_stats(self):
+        """Keys served from a mapped snapshot, overlay and tombstones, or None without one"""
+        return self._data.stats() if self._mapped else None
+
     def delete(self, *keys):
         count = 0
         for key in keys:
             if key in self._data:
-                value, data_type, _ = self._data[key] # retrieve the value and type
-                self._memory_usage -= self._calculate_memory_usage(key, value) # remove memory usage
-                self._type_stats[data_type] -= 1  # Update type statistics
-                del self._data[key] # delete the key
+                self._remove_key(key) # updates memory usage, type statistics and listeners
                 count += 1 # increment count to track deleted keys
         return count
 
@@ -58,21 +404,25 @@ class DataStore:
     """
 
     def keys(self, pattern="*"):
-        valid_keys = [key for key in self._data.keys() if self._is_key_valid(key)]
+        valid_keys = [key for key in list(self._data) if self._is_key_valid(key)]
         if pattern == "*":
             return valid_keys
         return [key for key in valid_keys if fnmatch.fnmatch(key, pattern)]
 
     def flush(self):
-        self._data.clear()
+        self._data = {}  # lets go of a mapped snapshot too
+        self._mapped = False
+        self._unmeasured = {}
+        if self._dirty is not None:
+            self._dirty = set()
+            self._dirty_all = True
         self._memory_usage = 0
+        self.compressor.clear()
+        self.tier.clear()
         # Reset type statistics
-        self._type_stats = {
-            "string": 0,
-            "list": 0,
-            "set": 0,
-            "hash": 0
-        }
+        self._type_stats = {data_type: 0 for data_type in DATA_TYPES}
+        for listener in self._listeners:
+            listener.flushed()
 
     def expire(self, key, seconds):
         """Set expiration time in seconds from now"""
@@ -82,6 +432,7 @@ class DataStore:
         value, data_type, _ = self._data[key]
         expiry_time = time.time() + seconds # calculate future expiration time
         self._data[key] = (value, data_type, expiry_time)
+        self._changed(key)
         return True
 
     def expire_at(self, key, timestamp):
@@ -91,6 +442,7 @@ class DataStore:
         
         value, data_type, _ = self._data[key]
         self._data[key] = (value, data_type, timestamp)
+        self._changed(key)
         return True
  
     def ttl(self, key):
@@ -105,9 +457,7 @@ class DataStore:
         remaining = expiry_time - time.time()
         if remaining <= 0:
             # Key expired, remove it
-            self._memory_usage -= self._calculate_memory_usage(key, value)
-            self._type_stats[data_type] -= 1
-            del self._data[key]
+            self._remove_key(key)
             return -2
         
         return int(remaining)
@@ -124,9 +474,7 @@ class DataStore:
         remaining = expiry_time - time.time()
         if remaining <= 0:
             # Key expired, remove it
-            self._memory_usage -= self._calculate_memory_usage(key, value)
-            self._type_stats[data_type] -= 1
-            del self._data[key]
+            self._remove_key(key)
             return -2
         
         return int(remaining * 1000)
@@ -138,6 +486,7 @@ class DataStore:
         
         value, data_type, _ = self._data[key]
         self._data[key] = (value, data_type, None)
+        self._changed(key)
         return True
 
     def get_type(self, key):
@@ -150,6 +499,7 @@ class DataStore:
 
     def get_memory_usage(self):
         """Get current memory usage in bytes"""
+        self._settle_memory_usage()
         return self._memory_usage
 
     def cleanup_expired_keys(self):
@@ -162,7 +512,10 @@ class DataStore:
         
         # Sample random keys for expiration check
         sample_size = min(20, len(self._data))  # Check up to 20 keys
-        sample_keys = random.sample(list(self._data.keys()), sample_size)
+        if self._mapped:
+            sample_keys = self._data.sample(sample_size)  # without listing the file's keys
+        else:
+            sample_keys = random.sample(list(self._data.keys()), sample_size)
         
         for key in sample_keys:
             value, _, expiry_time = self._data[key]
@@ -171,10 +524,7 @@ class DataStore:
         
         # Remove expired keys
         for key in expired_keys:
-            value, data_type, _ = self._data[key]
-            self._memory_usage -= self._calculate_memory_usage(key, value)
-            self._type_stats[data_type] -= 1
-            del self._data[key]
+            self._remove_key(key)
         
         return len(expired_keys)
 
@@ -182,6 +532,10 @@ class DataStore:
         """Get statistics for each data type"""
         return self._type_stats.copy()
 
+    def get_compression_stats(self):
+        """Get compressed string totals and decompression cache counters"""
+        return self.compressor.stats()
+
     def check_type(self, key, expected_type):
         """Check if key exists and has the expected type"""
         if not self._is_key_valid(key):
@@ -198,11 +552,11 @@ class DataStore:
             self.set(key, new_list)
             return new_list
         
-        value, data_type, _ = self._data[key]
+        value, data_type, _ = self._resident(key)
         if data_type != "list":
             raise TypeError(f"WRONGTYPE Operation against a key holding the wrong kind of value")
         
-        return value
+        return self._unshare(key, value)
 
     def get_or_create_hash(self, key):
         """Get existing hash or create new one"""
@@ -212,11 +566,11 @@ class DataStore:
             self.set(key, new_hash)
             return new_hash
         
-        value, data_type, _ = self._data[key]
+        value, data_type, _ = self._resident(key)
         if data_type != "hash":
             raise TypeError(f"WRONGTYPE Operation against a key holding the wrong kind of value")
         
-        return value
+        return self._unshare(key, value)
 
     def get_or_create_set(self, key):
         """Get existing set or create new one"""
@@ -226,11 +580,89 @@ class DataStore:
             self.set(key, new_set)
             return new_set
         
-        value, data_type, _ = self._data[key]
+        value, data_type, _ = self._resident(key)
         if data_type != "set":
             raise TypeError(f"WRONGTYPE Operation against a key holding the wrong kind of value")
         
-        return value
+        return self._unshare(key, value)
+
+    def get_or_create_hyperloglog(self, key):
+        """Get existing HyperLogLog or create new one"""
+        return self._get_or_create(key, "hyperloglog", HyperLogLog)
+
+    def get_or_create_bloom(self, key):
+        """Get existing Bloom filter or create one with default parameters"""
+        return self._get_or_create(key, "bloom", BloomFilter)
+
+    def get_or_create_cuckoo(self, key):
+        """Get existing Cuckoo filter or create one with default parameters"""
+        return self._get_or_create(key, "cuckoo", CuckooFilter)
+
+    def get_or_create_stream(self, key):
+        """Get existing stream or create new one"""
+        return self._get_or_create(key, "stream", Stream)
+
+    def get_typed(self, key, expected_type):
+        """Get value of expected_type, or None if key doesn't exist"""
+        if not self._is_key_valid(key):
+            return None
+        
+        value, data_type, _ = self._resident(key)
+        if data_type != expected_type:
+            raise TypeError(f"WRONGTYPE Operation against a key holding the wrong kind of value")
+        
+        return self._unshare(key, value)
+
+    def _get_or_create(self, key, expected_type, factory):
+        """Get existing value of expected_type or store a new factory() value"""
+        if not self._is_key_valid(key):
+            new_value = factory()
+            self.set(key, new_value)
+            return new_value
+        
+        value, data_type, _ = self._resident(key)
+        if data_type != expected_type:
+            raise TypeError(f"WRONGTYPE Operation against a key holding the wrong kind of value")
+        
+        return self._unshare(key, value)
+
+    def get_or_create_bitmap(self, key):
+        """Get existing bitmap or create new one (strings are converted to bytearray in place)"""
+        if not self._is_key_valid(key):
+            # Create new bitmap
+            new_bitmap = bytearray()
+            self.set(key, new_bitmap)
+            return new_bitmap
+        
+        value, data_type, expiry_time = self._resident(key)
+        if data_type != "string":
+            raise TypeError(f"WRONGTYPE Operation against a key holding the wrong kind of value")
+        
+        if not isinstance(value, bytearray):
+            # Keep the TTL while switching the representation
+            if isinstance(value, CompressedString):
+                bitmap = bytearray(value.decompress())
+            else:
+                bitmap = bytearray(value if isinstance(value, bytes) else str(value).encode('utf-8'))
+            self.set(key, bitmap, expiry_time)
+            return bitmap
+        
+        return self._unshare(key, value)
+
+    def get_string_bytes(self, key):
+        """Get a string value as bytes for bit-level reads, or None if key doesn't exist"""
+        if not self._is_key_valid(key):
+            return None
+        
+        value, data_type, _ = self._resident(key)
+        if data_type != "string":
+            raise TypeError(f"WRONGTYPE Operation against a key holding the wrong kind of value")
+        
+        if isinstance(value, (bytes, bytearray)):
+            return self._unshare(key, value)
+        if isinstance(value, CompressedString):
+            return value.decompress()
+        return str(value).encode('utf-8')
 
     def _is_key_valid(self, key):
         """Check if key exists and hasn't expired (lazy expiration)"""
@@ -240,10 +672,7 @@ class DataStore:
         value, _, expiry_time = self._data[key]
         if expiry_time is not None and expiry_time <= time.time():
             # Key expired, remove it
-            value, data_type, _ = self._data[key]
-            self._memory_usage -= self._calculate_memory_usage(key, value)
-            self._type_stats[data_type] -= 1
-            del self._data[key]
+            self._remove_key(key)
             return False
         
         return True
@@ -252,8 +681,12 @@ class DataStore:
         """Determine Redis data type"""
         if isinstance(value, str):
             return "string"
+        elif isinstance(value, (bytes, bytearray)):
+            return "string"  # Bitmaps are byte strings
         elif isinstance(value, int):
             return "string"  # Redis stores numbers as strings
+        elif isinstance(value, CompressedString):
+            return "string"  # Large strings kept compressed
         elif isinstance(value, deque):
             return "list"
         elif isinstance(value, list):
@@ -262,6 +695,26 @@ class DataStore:
             return "set"
         elif isinstance(value, dict):
             return "hash"
+        elif isinstance(value, HyperLogLog):
+            return "hyperloglog"
+        elif isinstance(value, BloomFilter):
+            return "bloom"
+        elif isinstance(value, CuckooFilter):
+            return "cuckoo"
+        elif isinstance(value, CountMinSketch):
+            return "cms"
+        elif isinstance(value, TopK):
+            return "topk"
+        elif isinstance(value, Stream):
+            return "stream"
+        elif isinstance(value, TimeSeries):
+            return "timeseries"
+        elif isinstance(value, VectorSet):
+            return "vectorset"
+        elif isinstance(value, JSONDocument):
+            return "json"
+        elif isinstance(value, SortedSet):
+            return "zset"
         else:
             return "string"
 
@@ -276,6 +729,11 @@ class DataStore:
         elif isinstance(value, dict):
             value_size = sum(len(str(k).encode('utf-8')) + len(str(v).encode('utf-8')) 
                            for k, v in value.items())
+        elif isinstance(value, (bytes, bytearray)):
+            value_size = len(value)
+        elif hasattr(value, 'memory_usage'):
+            # Custom data types report their own footprint
+            value_size = value.memory_usage()
         else:
             value_size = len(str(value).encode('utf-8'))
         
@@ -0,0 +1,302 @@
+"""
+Tiered storage of cold values
+
+When the store's memory estimate passes ValueTier.max_memory, the values
+of its least recently used keys are spilled to an append-only value log
+on local disk; the key, its type and its expiry stay in memory, with a
+SpilledValue in place of the value. Reading a spilled value is one slice
+of the log's mmap()ed pages (and a pickle.loads); a value read
+promote_hits times, or fetched to be changed, is promoted back to memory.
+
+The log is a series of segment files of up to segment_bytes each. Values
+promoted, overwritten or deleted leave dead bytes behind; once less than
+COMPACT_LIVE_RATIO of a full segment is live, a compactor thread copies
+its live values into the segment compactions fill (a new one once it is
+full), and the event loop points the keys at their new place before the
+old file is removed; a sealed segment with no live values left is removed
+at once. The log only ever holds
+values that are also in the dataset persistence saves, so its files are
+cleared when the server starts.
+"""
+
+import os
+import pickle
+import mmap
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+DEFAULT_MAX_MEMORY = 0  # bytes of values kept in memory; 0 turns spilling off
+DEFAULT_PROMOTE_HITS = 2
+SEGMENT_BYTES = 64 * 1024 * 1024
+
+# Values whose memory estimate is smaller stay in memory: the placeholder saves too little
+MIN_SPILL_BYTES = 256
+# Fraction of a full segment that must still be live for it to be left alone
+COMPACT_LIVE_RATIO = 0.5
+# Spill/fetch counter samples the rates in INFO are taken over
+RATE_SAMPLES = 16
+
+
+class SpilledValue:
+    """Where a spilled value is in the value log"""
+
+    __slots__ = ('segment', 'offset', 'length', 'hits')
+
+    def __init__(self, segment: 'Segment', offset: int, length: int, hits: int = 0):
+        self.segment = segment
+        self.offset = offset
+        self.length = length
+        # Reads served from disk, counted towards promotion
+        self.hits = hits
+
+    def load(self):
+        return pickle.loads(self.segment.read(self.offset, self.length))
+
+    def memory_usage(self) -> int:
+        return 48
+
+
+class Segment:
+    """One append-only file of the value log"""
+
+    def __init__(self, path: str):
+        self.path = path
+        # Unbuffered: what is appended can be read at once, and a forked child has nothing to flush
+        self.file = open(path, 'w+b', buffering=0)
+        self.size = 0
+        # offset -> (key, SpilledValue) of the values that are still live
+        self.live: Dict[int, Tuple[str, SpilledValue]] = {}
+        self.live_bytes = 0
+        self._map: Optional[mmap.mmap] = None
+
+    def append(self, data: bytes) -> int:
+        offset = self.size
+        self.file.write(data)
+        self.size += len(data)
+        return offset
+
+    def read(self, offset: int, length: int) -> bytes:
+        data = self._map
+        if data is None or offset + length > len(data):
+            # Appended to since it was mapped
+            data = self._map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        return data[offset:offset + length]
+
+    def remove(self) -> None:
+        """Close and delete the file; values still being read keep their mapping until released"""
+        if self._map is None and self.size:
+            self._map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.file.close()
+        os.remove(self.path)
+
+
+class ValueTier:
+    """Spills the values of cold keys of a DataStore to an on-disk value log"""
+
+    def __init__(self, dirname: Optional[str] = None, max_memory: int = DEFAULT_MAX_MEMORY,
+                 promote_hits: int = DEFAULT_PROMOTE_HITS, segment_bytes: int = SEGMENT_BYTES):
+        """
+        Args:
+            dirname: Directory of the value log (None: spilling stays off)
+            max_memory: Memory estimate of the store above which values are spilled (0 = never)
+            promote_hits: Reads from disk after which a value is moved back to memory
+            segment_bytes: Size at which a log file is sealed and a new one started
+        """
+        self.dirname = dirname
+        self.max_memory = max_memory
+        self.promote_hits = promote_hits
+        self.segment_bytes = segment_bytes
+
+        # Keys whose values are in memory, least recently used first; only
+        # kept while tracking, which starts with spilling
+        self._lru: "OrderedDict[str, None]" = OrderedDict()
+        self.tracking = self.enabled()
+
+        self._segments: List[Segment] = []
+        self._active: Optional[Segment] = None
+        self._next_segment = 1
+        # (thread, old segment, new segment, moves) of the running compaction
+        self._compaction = None
+        # Segment compactions copy live values into until it is full; only
+        # the compactor thread appends to it
+        self._compact_target: Optional[Segment] = None
+
+        self.spilled_values = 0
+        self.spills = 0
+        self.fetches = 0
+        self.promotions = 0
+        self.compactions = 0
+        self._samples = deque(maxlen=RATE_SAMPLES)
+
+    def enabled(self) -> bool:
+        return bool(self.max_memory and self.dirname)
+
+    def track(self, keys: Iterable[str]) -> None:
+        """Keep the recency of keys from now on, as used in the order given"""
+        self.tracking = True
+        lru = self._lru
+        for key in keys:
+            lru[key] = None
+
+    def touch(self, key: str) -> None:
+        """key's value was used and is in memory"""
+        if self.tracking:
+            self._lru[key] = None
+            self._lru.move_to_end(key)
+
+    def forget(self, key: str) -> None:
+        self._lru.pop(key, None)
+
+    def coldest(self) -> Optional[str]:
+        """Take the least recently used key out of the recency list, or None"""
+        if not self._lru:
+            return None
+        return self._lru.popitem(last=False)[0]
+
+    def spill(self, key: str, value) -> SpilledValue:
+        """Append value to the log (event loop only)"""
+        segment = self._active
+        if segment is None or segment.size >= self.segment_bytes:
+            segment = self._active = self._new_segment()
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        offset = segment.append(data)
+        spilled = SpilledValue(segment, offset, len(data))
+        segment.live[offset] = (key, spilled)
+        segment.live_bytes += len(data)
+        self.spilled_values += 1
+        self.spills += 1
+        return spilled
+
+    def fetched(self) -> None:
+        self.fetches += 1
+
+    def removed(self, spilled: SpilledValue, promoted: bool = False) -> None:
+        """A spilled value was promoted back to memory, overwritten or deleted"""
+        segment = spilled.segment
+        if segment.live.pop(spilled.offset, None) is not None:
+            segment.live_bytes -= spilled.length
+        self.spilled_values -= 1
+        if promoted:
+            self.promotions += 1
+
+    def _new_segment(self) -> Segment:
+        if self._next_segment == 1:
+            self._remove_old_files()
+        os.makedirs(self.dirname, exist_ok=True)
+        segment = Segment(os.path.join(self.dirname, f"values.{self._next_segment}.log"))
+        self._next_segment += 1
+        self._segments.append(segment)
+        return segment
+
+    def _remove_old_files(self) -> None:
+        """Clear the log of a previous run: its values are in the persisted dataset"""
+        if os.path.isdir(self.dirname):
+            for name in os.listdir(self.dirname):
+                if name.startswith("values.") and name.endswith(".log"):
+                    os.remove(os.path.join(self.dirname, name))
+
+    def compact_step(self) -> List[Tuple[str, SpilledValue, SpilledValue]]:
+        """
+        Finish the compaction that ended, remove sealed segments with
+        nothing live left, and start compacting the emptiest of the others
+        (event loop only)
+
+        Returns:
+            (key, old, new) places of the values moved by a finished
+            compaction; the caller repoints the keys still holding old
+        """
+        moved = []
+        if self._compaction is not None:
+            thread, old, new, moves = self._compaction
+            if thread.is_alive():
+                return []
+            self._compaction = None
+            moved = self._adopt(old, new, moves)
+
+        target = self._compact_target
+        if target is not None and target.size >= self.segment_bytes:
+            target = self._compact_target = None  # full: sealed like any other
+        sealed = [segment for segment in self._segments if segment is not self._active and segment is not target]
+        for segment in sealed:
+            if not segment.live:
+                # Nothing to copy: the file just goes
+                self._segments.remove(segment)
+                segment.remove()
+                self.compactions += 1
+        candidates = [segment for segment in sealed
+                      if segment.live and segment.live_bytes < segment.size * COMPACT_LIVE_RATIO]
+        if not candidates:
+            return moved
+        old = min(candidates, key=lambda segment: segment.live_bytes)
+        new = target or self._new_segment()
+        self._compact_target = new
+        records = [(offset, spilled.length) for offset, (_, spilled) in old.live.items()]
+        moves = []
+        thread = threading.Thread(target=self._copy_records, args=(old, new, records, moves),
+                                  name="value-log-compaction", daemon=True)
+        self._compaction = (thread, old, new, moves)
+        thread.start()
+        return moved
+
+    @staticmethod
+    def _copy_records(old: Segment, new: Segment, records, moves: list) -> None:
+        """Compactor thread: copy records of old into new, which nothing else uses meanwhile"""
+        for offset, length in records:
+            moves.append((offset, new.append(old.read(offset, length))))
+
+    def _adopt(self, old: Segment, new: Segment, moves) -> List[Tuple[str, SpilledValue, SpilledValue]]:
+        moved = []
+        for old_offset, new_offset in moves:
+            live = old.live.pop(old_offset, None)
+            if live is None:
+                continue  # promoted, overwritten or deleted while it was copied
+            key, spilled = live
+            replacement = SpilledValue(new, new_offset, spilled.length, spilled.hits)
+            new.live[new_offset] = (key, replacement)
+            new.live_bytes += spilled.length
+            moved.append((key, spilled, replacement))
+        self._segments.remove(old)
+        old.remove()
+        self.compactions += 1
+        return moved
+
+    def sample_rates(self) -> None:
+        """Record the spill and fetch counters, for the rates stats() reports"""
+        self._samples.append((time.time(), self.spills, self.fetches))
+
+    def clear(self) -> None:
+        """Forget every spilled value (the store was flushed)"""
+        if self._compaction is not None:
+            self._compaction[0].join()
+            self._compaction = None
+        for segment in self._segments:
+            segment.remove()
+        self._segments = []
+        self._active = None
+        self._compact_target = None
+        self._lru.clear()
+        self.tracking = self.enabled()
+        self.spilled_values = 0
+
+    def stats(self) -> Dict[str, float]:
+        spills_per_sec = fetches_per_sec = 0.0
+        if len(self._samples) > 1:
+            (start, spills, fetches), (end, spills_now, fetches_now) = self._samples[0], self._samples[-1]
+            if end > start:
+                spills_per_sec = (spills_now - spills) / (end - start)
+                fetches_per_sec = (fetches_now - fetches) / (end - start)
+        return {
+            'spilled_values': self.spilled_values,
+            'disk_live_bytes': sum(segment.live_bytes for segment in self._segments),
+            'disk_bytes': sum(segment.size for segment in self._segments),
+            'segments': len(self._segments),
+            'spills': self.spills,
+            'fetches': self.fetches,
+            'promotions': self.promotions,
+            'compactions': self.compactions,
+            'spills_per_sec': spills_per_sec,
+            'fetches_per_sec': fetches_per_sec,
+        }
@@ -0,0 +1,506 @@
+"""
+Offline Persistence Tools
+
+Checks, repairs, converts and analyzes persistence files without a
+running server:
+
+  python -m redis_server.tools check FILE...
+  python -m redis_server.tools repair AOF [--dry-run]
+  python -m redis_server.tools convert SOURCE TARGET [--format rdb|mapped|aof] [--max-memory BYTES] [--allow-pickle]
+  python -m redis_server.tools analyze SNAPSHOT [--top N] [--separator S]
+
+A file may be an RDB file of any version (delta files included), a mapped
+snapshot, a single-file AOF, or a multi-part AOF directory or manifest;
+its kind is told from its contents. check, repair and analyze read a file
+a chunk or a block at a time, so they hold the same memory whatever its
+size: check reads every record and verifies every checksum the format
+has (an AOF has none, so each record is parsed instead).
+
+convert streams a snapshot into the target. A source that has to be
+replayed instead (an AOF, or an RDB file with delta files, which it
+consolidates) is loaded into a DataStore first; with --max-memory its
+values spill to a temporary value log (see tiering.py), so only the keys
+stay in memory. Search index definitions go along with the keys. A
+version 0001 RDB file is pickled, and unpickling can run arbitrary code:
+the server refuses one, and convert only reads it with --allow-pickle,
+for a file that is trusted.
+
+The exit status is 0 when every file is sound and every step succeeded,
+1 otherwise.
+"""
+
+import argparse
+import heapq
+import mmap
+import os
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional, Tuple
+
+from .command_handler import CommandHandler
+from .persistence.aof import AOFFormatError, encode_command, parse_commands, parse_resp_block, rewrite_commands
+from .persistence.delta import find_chain, snapshot_aux
+from .persistence.loader import AOFLoader, BLOCK_SIZE
+from .persistence.manifest import AOFManifest, BASE
+from .persistence.mapped import MAGIC as MAPPED_MAGIC, MappedRDBHandler, MappedSnapshot, write_mapped_file
+from .persistence.rdb import RDBHandler, aux_commands, commands_aux, read_chunk, read_index
+from .persistence.rdb_loader import RDBLoader
+from .storage import DataStore
+from .tiering import ValueTier
+
+
+RDB, MAPPED, AOF, MULTIPART = 'RDB', 'mapped snapshot', 'AOF', 'multi-part AOF'
+
+# Distinct key prefixes analyze keeps apart; keys with any other prefix are counted together
+MAX_PREFIXES = 10000
+OTHER_PREFIX = '(other)'
+NO_PREFIX = '(none)'
+
+
+def _format_bytes(bytes_count) -> str:
+    for unit in ['B', 'K', 'M', 'G']:
+        if bytes_count < 1024:
+            return f"{bytes_count:.1f}{unit}"
+        bytes_count /= 1024
+    return f"{bytes_count:.1f}T"
+
+
+def file_kind(path: str) -> str:
+    """RDB, MAPPED, AOF or MULTIPART, from the contents of path"""
+    if os.path.isdir(path) or path.endswith('.manifest'):
+        return MULTIPART
+    with open(path, 'rb') as f:
+        header = f.read(len(MAPPED_MAGIC))
+    if header == MAPPED_MAGIC:
+        return MAPPED
+    if header.startswith(RDBHandler.MAGIC_STRING):
+        return RDB
+    return AOF
+
+
+def open_manifest(path: str) -> AOFManifest:
+    """
+    The manifest of a multi-part AOF, given its directory or manifest file
+
+    Raises:
+        ValueError: if there is no single manifest, or it is malformed
+    """
+    if os.path.isdir(path):
+        names = [name for name in os.listdir(path) if name.endswith('.manifest')]
+        if len(names) != 1:
+            raise ValueError(f"{path} holds {len(names)} AOF manifests, expected one")
+        path = os.path.join(path, names[0])
+    manifest = AOFManifest(os.path.dirname(path), os.path.basename(path)[:-len('.manifest')])
+    if not manifest.load():
+        raise ValueError(f"AOF manifest {path} doesn't exist")
+    return manifest
+
+
+def scan_aof(path: str) -> Tuple[int, int, Optional[AOFFormatError]]:
+    """
+    Parse every record of an AOF file, a block at a time
+
+    Returns:
+        (commands, end of the last complete command, the error that
+        stopped the scan or None)
+    """
+    size = os.path.getsize(path)
+    if not size:
+        return 0, 0, None
+    commands = position = 0
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        try:
+            while position < size:
+                records, consumed = parse_resp_block(data[position:position + BLOCK_SIZE])
+                commands += len(records)
+                position += consumed
+                if not consumed:
+                    record = next(parse_commands(data, position), None)
+                    if record is None:
+                        break  # only line breaks were left
+                    commands += 1
+                    position = record[2]
+        except AOFFormatError as e:
+            return commands, e.offset, e
+        except UnicodeDecodeError:
+            return commands, position, AOFFormatError("invalid UTF-8 in record", position)
+    return commands, size, None
+
+
+def check_rdb(path: str) -> str:
+    """
+    Read every record of an RDB file or mapped snapshot, verifying its
+    checksums (and the deltas chained to an RDB file)
+
+    Returns:
+        A summary of the file
+
+    Raises:
+        ValueError (or another decoding error) for a corrupted file
+    """
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        header = f.read(len(MAPPED_MAGIC))
+    if header == MAPPED_MAGIC:
+        snapshot = MappedSnapshot(path)
+        keys = 0
+        for key, _ in snapshot.entries():
+            if key not in snapshot:
+                raise ValueError(f"key {key!r} is missing from the slot table")
+            keys += 1
+        if keys != snapshot.key_count:
+            raise ValueError(f"{keys} records, but the header counts {snapshot.key_count}")
+        return f"mapped snapshot, {keys} keys, {_format_bytes(size)}"
+
+    version = header[len(RDBHandler.MAGIC_STRING):len(RDBHandler.MAGIC_STRING) + len(RDBHandler.VERSION)]
+    if version != RDBHandler.VERSION:
+        # Older files have no chunks: reading them to the end verifies their checksum
+        keys = sum(1 for _ in RDBHandler(os.path.abspath(path)).iter_snapshot())
+        return f"RDB {version.decode('ascii', 'replace')}, {keys} keys, {_format_bytes(size)}"
+
+    keys = deleted = 0
+    with open(path, 'rb') as f:
+        flags, chunks = read_index(f, size)
+        for chunk in chunks:
+            records = 0
+            for _, value, _ in read_chunk(f, chunk, flags):
+                records += 1
+                if value is None:
+                    deleted += 1
+            if records != chunk.keys:
+                raise ValueError(f"chunk at offset {chunk.offset} holds {records} keys, its index entry {chunk.keys}")
+            keys += records
+    summary = f"RDB {version.decode('ascii')}, {len(chunks)} chunks, {keys - deleted} keys"
+    aux = snapshot_aux(path)
+    if 'base-id' in aux:
+        return f"{summary}, {deleted} deleted, delta {aux.get('delta-seq')} of snapshot {aux['base-id']}"
+    summary += f", {_format_bytes(size)}"
+    _, chained, stale = find_chain(path)
+    for delta in chained:
+        check_rdb(delta)
+    if chained:
+        summary += f", {len(chained)} delta files chained"
+    if stale:
+        summary += f" ({len(stale)} stale delta files, removed on the next start)"
+    return summary
+
+
+def check_file(path: str) -> Tuple[bool, str]:
+    """(whether path is sound, a one-line report) for any persistence file"""
+    try:
+        kind = file_kind(path)
+        if kind in (RDB, MAPPED):
+            return True, check_rdb(path)
+        if kind == AOF:
+            commands, end, error = scan_aof(path)
+            if error is not None:
+                return False, (f"AOF, {commands} commands, then {error}: {os.path.getsize(path) - end} bytes "
+                               f"after the last complete command (repair cuts them)")
+            return True, f"AOF, {commands} commands, {_format_bytes(end)}"
+
+        manifest = open_manifest(path)
+        files = manifest.files()
+        if not files:
+            return False, "multi-part AOF manifest lists no files"
+        parts = []
+        for aof_file in files:
+            part = manifest.path(aof_file)
+            if not os.path.exists(part):
+                if aof_file.file_type == BASE:
+                    return False, f"AOF base file {aof_file.name} is missing"
+                continue  # listed before anything was written to it
+            ok, report = check_file(part)
+            if not ok:
+                return False, f"{aof_file.name}: {report}"
+            parts.append(f"{aof_file.name} ({report})")
+        return True, "multi-part AOF: " + "; ".join(parts)
+    except Exception as e:
+        return False, f"corrupted: {e}"
+
+
+def repair_aof(path: str, dry_run: bool = False) -> Tuple[bool, str]:
+    """
+    Cut a torn or corrupted tail off an AOF file (the newest segment of a
+    multi-part AOF) at the end of its last complete command
+
+    Returns:
+        (whether the AOF is sound afterwards, a one-line report)
+    """
+    kind = file_kind(path)
+    if kind == MULTIPART:
+        manifest = open_manifest(path)
+        files = [aof_file for aof_file in manifest.files() if os.path.exists(manifest.path(aof_file))]
+        for aof_file in files[:-1]:
+            ok, report = check_file(manifest.path(aof_file))
+            if not ok:
+                return False, f"{aof_file.name} is corrupted before the newest segment ({report}); restore it from a backup"
+        if not files:
+            return True, "nothing to repair"
+        path = manifest.path(files[-1])
+        if file_kind(path) != AOF:
+            ok, report = check_file(path)
+            return ok, report if ok else f"{report}; an RDB base can't be repaired, restore it from a backup"
+    elif kind != AOF:
+        return False, f"{path} isn't an AOF ({kind}); restore it from a backup"
+
+    commands, end, error = scan_aof(path)
+    if error is None:
+        return True, f"{path}: nothing to repair ({commands} commands)"
+    cut = os.path.getsize(path) - end
+    if not dry_run:
+        with open(path, 'r+b') as f:
+            f.truncate(end)
+            f.flush()
+            os.fsync(f.fileno())
+    action = "would cut" if dry_run else "cut"
+    return True, f"{path}: {action} {cut} bytes at offset {end} ({error}), keeping {commands} commands"
+
+
+def _replay(source: str, kind: str, deltas: List[str], store: DataStore) -> None:
+    """Load a dataset that can't be streamed into store, spilling values as it goes"""
+    command_handler = CommandHandler(store)
+    if kind == MULTIPART:
+        manifest = open_manifest(source)
+        files = [manifest.path(aof_file) for aof_file in manifest.files() if os.path.exists(manifest.path(aof_file))]
+    else:
+        files = [source] + deltas
+    for path in files:
+        if file_kind(path) == AOF:
+            steps = AOFLoader(store, command_handler).load_steps(path)
+        else:
+            # Delta files are applied in process, in sequence
+            steps = RDBLoader(store, 1 if path in deltas else None).load_steps(path)
+        for _ in steps:
+            while store.spill_cold_values():
+                pass
+
+
+def write_dataset(entries, target: str, target_format: str, commands=()) -> int:
+    """
+    Write (key, value, expiry_time) entries to target in target_format
+    ('rdb', 'mapped' or 'aof'), replacing it atomically, with the
+    (command, args) commands that recreate what isn't keys (search index
+    definitions): as an aux field of a snapshot, first in an AOF
+
+    Returns:
+        Number of keys written
+    """
+    temp_filename = f"{target}.{os.getpid()}.tmp"
+    try:
+        if target_format == 'mapped':
+            keys = write_mapped_file(entries, temp_filename, commands_aux(commands))
+        elif target_format == 'rdb':
+            keys = RDBHandler(os.path.abspath(target)).write_file(entries, temp_filename, commands_aux(commands))
+        else:
+            now = time.time()
+            keys = 0
+            with open(temp_filename, 'wb') as f:
+                for command, args in commands:
+                    f.write(encode_command(command, *args))
+                for key, value, expiry_time in entries:
+                    if value is None or (expiry_time is not None and expiry_time <= now):
+                        continue
+                    f.writelines(rewrite_commands(key, value, expiry_time))
+                    keys += 1
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(temp_filename, target)
+    except BaseException:
+        if os.path.exists(temp_filename):
+            os.remove(temp_filename)
+        raise
+    return keys
+
+
+def convert(source: str, target: str, target_format: str, max_memory: int = 0, allow_pickle: bool = False) -> int:
+    """
+    Rewrite the dataset of source into target
+
+    Args:
+        source: Any persistence file (see file_kind)
+        target: File to write
+        target_format: 'rdb', 'mapped' or 'aof'
+        max_memory: Memory estimate above which a replayed dataset spills
+            its values to a temporary value log (0 = never)
+        allow_pickle: Read a version 0001 source, which unpickles it
+
+    Returns:
+        Number of keys written
+    """
+    source = os.path.abspath(source)
+    kind = file_kind(source)
+    deltas = find_chain(source)[1] if kind == RDB else []
+    # A snapshot's are in the aux fields of the last file of its chain, an AOF's are replayed
+    commands = aux_commands(snapshot_aux(([source] + deltas)[-1])) if kind in (RDB, MAPPED) else None
+    if kind in (RDB, MAPPED) and not deltas:
+        return write_dataset(MappedRDBHandler(source, allow_pickle=allow_pickle).iter_snapshot(), target, target_format,
+                             commands)
+
+    with tempfile.TemporaryDirectory(prefix='redis-convert-') as scratch:
+        store = DataStore(tier=ValueTier(os.path.join(scratch, 'valuelog'), max_memory))
+        try:
+            _replay(source, kind, deltas, store)
+            if commands is None:
+                commands = store.listener_commands()
+            return write_dataset(store.entries(), target, target_format, commands)
+        finally:
+            store.flush()  # closes the value log before its directory goes
+
+
+class SnapshotAnalysis:
+    """Memory and type totals over the keys of a snapshot, in bounded memory"""
+
+    def __init__(self, top: int = 10, separator: str = ':'):
+        """
+        Args:
+            top: Largest keys to keep
+            separator: What ends the prefix keys are grouped by
+        """
+        self.top = top
+        self.separator = separator
+        self.keys = self.volatile = self.expired = self.deleted = 0
+        self.memory = 0
+        # type -> [keys, bytes]; prefix -> [keys, bytes]
+        self.types: Dict[str, List[int]] = {}
+        self.prefixes: Dict[str, List[int]] = {}
+        # Min-heap of (bytes, key, type) of the largest keys
+        self._largest: List[Tuple[int, str, str]] = []
+        self._sizes = DataStore()  # for the memory estimate the store would make
+        self._now = time.time()
+
+    def add(self, key: str, value, expiry_time: Optional[float]) -> None:
+        if value is None:
+            self.deleted += 1
+            return
+        if expiry_time is not None:
+            if expiry_time <= self._now:
+                self.expired += 1
+                return
+            self.volatile += 1
+        memory = self._sizes._calculate_memory_usage(key, value)
+        data_type = self._sizes._get_data_type(value)
+        self.keys += 1
+        self.memory += memory
+        self._count(self.types, data_type, memory)
+
+        prefix = key.partition(self.separator)[0] if self.separator in key else NO_PREFIX
+        if prefix not in self.prefixes and len(self.prefixes) >= MAX_PREFIXES:
+            prefix = OTHER_PREFIX
+        self._count(self.prefixes, prefix, memory)
+
+        if len(self._largest) < self.top:
+            heapq.heappush(self._largest, (memory, key, data_type))
+        elif self._largest and memory > self._largest[0][0]:
+            heapq.heapreplace(self._largest, (memory, key, data_type))
+
+    @staticmethod
+    def _count(table: Dict[str, List[int]], name: str, memory: int) -> None:
+        totals = table.get(name)
+        if totals is None:
+            table[name] = [1, memory]
+        else:
+            totals[0] += 1
+            totals[1] += memory
+
+    def largest(self) -> List[Tuple[int, str, str]]:
+        """(bytes, key, type) of the largest keys, largest first"""
+        return sorted(self._largest, reverse=True)
+
+    def report(self, prefixes: int = 20) -> List[str]:
+        share = lambda memory: f"{memory * 100 / self.memory:.1f}%" if self.memory else "0.0%"
+        lines = [f"{self.keys} keys ({self.volatile} with a TTL), estimated memory {_format_bytes(self.memory)}"]
+        if self.expired or self.deleted:
+            lines.append(f"{self.expired} expired keys skipped, {self.deleted} deletions")
+        lines += ["", f"{'type':<12}{'keys':>10}{'memory':>10}{'share':>8}"]
+        for data_type, (keys, memory) in sorted(self.types.items(), key=lambda item: -item[1][1]):
+            lines.append(f"{data_type:<12}{keys:>10}{_format_bytes(memory):>10}{share(memory):>8}")
+        lines += ["", f"Largest {len(self._largest)} keys"]
+        for memory, key, data_type in self.largest():
+            lines.append(f"{_format_bytes(memory):>10}  {data_type:<12}{key}")
+        lines += ["", f"Top {min(prefixes, len(self.prefixes))} of {len(self.prefixes)} prefixes "
+                      f"(keys up to {self.separator!r})",
+                  f"{'prefix':<30}{'keys':>10}{'memory':>10}{'share':>8}"]
+        top_prefixes = heapq.nlargest(prefixes, self.prefixes.items(), key=lambda item: item[1][1])
+        for prefix, (keys, memory) in top_prefixes:
+            lines.append(f"{prefix:<30}{keys:>10}{_format_bytes(memory):>10}{share(memory):>8}")
+        return lines
+
+
+def analyze(path: str, top: int = 10, separator: str = ':') -> SnapshotAnalysis:
+    """Analyze the keys of an RDB file (of any version) or mapped snapshot, streaming it"""
+    analysis = SnapshotAnalysis(top, separator)
+    for key, value, expiry_time in MappedRDBHandler(os.path.abspath(path)).iter_snapshot():
+        analysis.add(key, value, expiry_time)
+    return analysis
+
+
+def _parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='python -m redis_server.tools',
+                                     description="Check, repair, convert and analyze persistence files offline")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    check = commands.add_parser('check', help="verify every record and checksum of AOF/RDB files")
+    check.add_argument('files', nargs='+', metavar='FILE')
+
+    repair = commands.add_parser('repair', help="cut a torn AOF tail at the last complete command")
+    repair.add_argument('aof', metavar='AOF', help="AOF file, or multi-part AOF directory or manifest")
+    repair.add_argument('--dry-run', action='store_true', help="only report what would be cut")
+
+    convert_command = commands.add_parser('convert', help="rewrite a dataset in another format")
+    convert_command.add_argument('source', metavar='SOURCE')
+    convert_command.add_argument('target', metavar='TARGET')
+    convert_command.add_argument('--format', choices=['rdb', 'mapped', 'aof'],
+                                 help="target format (default: aof for a .aof target, else rdb)")
+    convert_command.add_argument('--max-memory', type=int, default=0, metavar='BYTES',
+                                 help="spill values of a replayed dataset to disk above this estimate")
+    convert_command.add_argument('--allow-pickle', action='store_true',
+                                 help="read a version 0001 (pickled) RDB file; only for a trusted one")
+
+    analyze_command = commands.add_parser('analyze', help="memory and type breakdown of a snapshot")
+    analyze_command.add_argument('snapshot', metavar='SNAPSHOT')
+    analyze_command.add_argument('--top', type=int, default=10, help="largest keys to list")
+    analyze_command.add_argument('--prefixes', type=int, default=20, help="key prefixes to list")
+    analyze_command.add_argument('--separator', default=':', help="what ends a key prefix")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = _parser().parse_args(argv)
+
+    if args.command == 'check':
+        sound = True
+        for path in args.files:
+            ok, report = check_file(path)
+            sound = sound and ok
+            print(f"{path}: {'OK' if ok else 'ERROR'} - {report}")
+        return 0 if sound else 1
+
+    if args.command == 'repair':
+        ok, report = repair_aof(args.aof, args.dry_run)
+        print(report)
+        return 0 if ok else 1
+
+    if args.command == 'convert':
+        target_format = args.format or ('aof' if args.target.endswith('.aof') else 'rdb')
+        started = time.perf_counter()
+        try:
+            keys = convert(args.source, args.target, target_format, args.max_memory, args.allow_pickle)
+        except Exception as e:
+            print(f"Error converting {args.source}: {e}")
+            return 1
+        print(f"Wrote {keys} keys to {args.target} ({target_format}) in {time.perf_counter() - started:.2f}s")
+        return 0
+
+    try:
+        analysis = analyze(args.snapshot, args.top, args.separator)
+    except Exception as e:
+        print(f"Error analyzing {args.snapshot}: {e}")
+        return 1
+    print(f"{args.snapshot}: {_format_bytes(os.path.getsize(args.snapshot))}")
+    print("\n".join(analysis.report(args.prefixes)))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,3 +1,4 @@
+import os
 import pytest
 import subprocess
 import time
@@ -7,10 +8,13 @@ import sys
 HOST = "127.0.0.1"
 PORT = 6379
 
+MAIN = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main.py")
+
 @pytest.fixture(scope="session", autouse=True)
-def redis_server():
+def redis_server(tmp_path_factory):
     """Start the Redis server before tests and stop after."""
-    process = subprocess.Popen([sys.executable, "main.py"])
+    # Run in a temporary directory, so the server's ./data isn't the repo's
+    process = subprocess.Popen([sys.executable, MAIN], cwd=tmp_path_factory.mktemp("server"))
     time.sleep(0.5)  # wait for server to start
     yield process
     process.terminate()
@@ -31,3 +35,16 @@ def send_command(cmd: str) -> str:
     data = s.recv(4096)
     s.close()
     return data.decode()
+
+
+def rdb_only_handler(data_dir, **config):
+    """A command handler over a store recovered from the snapshots in data_dir (AOF off)."""
+    from redis_server.command_handler import CommandHandler
+    from redis_server.persistence import PersistenceConfig, PersistenceManager
+    from redis_server.storage import DataStore
+    config = {"aof_enabled": False, "data_dir": str(data_dir), "temp_dir": str(data_dir / "temp"), **config}
+    manager = PersistenceManager(PersistenceConfig(config))
+    store = DataStore()
+    handler = CommandHandler(store, manager)
+    manager.recover_data(store, handler)
+    return handler
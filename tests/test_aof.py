@@ -0,0 +1,311 @@
+import os
+import threading
+import time
+import pytest
+from redis_server.persistence import AOFWriter, RecoveryManager
+from redis_server.persistence.aof import encode_command, parse_commands
+from redis_server.storage import DataStore
+
+def test_aof_is_binary_safe(tmp_path):
+    filename = str(tmp_path / "appendonly.aof")
+    writer = AOFWriter(filename, "always")
+    writer.open()
+    writer.log_command("SET", "greeting", "hello world\r\nsecond line")
+    writer.log_command("DEL", "other")
+    batch = writer.flush_buffer()
+    assert writer.unwritten_batch() in (None, batch)
+    writer.close()
+    assert writer.written_batch == batch
+
+    with open(writer.incr_filename, "rb") as f:
+        commands = [(command, args) for command, args, _ in parse_commands(f.read())]
+    assert commands == [("SET", ["greeting", "hello world\r\nsecond line"]), ("DEL", ["other"])]
+
+def test_aof_replay_stops_at_truncated_record(tmp_path):
+    filename = str(tmp_path / "appendonly.aof")
+    writer = AOFWriter(filename, "everysec")
+    writer.open()
+    writer.log_command("SET", "a", "1 2 3")
+    writer.log_command("SET", "b", "2")
+    writer.close()
+    # Simulate a crash in the middle of the last record
+    os.truncate(writer.incr_filename, os.path.getsize(writer.incr_filename) - 3)
+
+    store = DataStore()
+    assert RecoveryManager(filename, str(tmp_path / "dump.rdb")).recover_data(store)
+    assert store.get("a") == "1 2 3"
+    assert store.get("b") is None
+
+def test_everysec_fsync_runs_in_background(tmp_path, monkeypatch):
+    from redis_server.persistence import aof
+    release = threading.Event()
+    monkeypatch.setattr(aof, "_datasync", lambda fd: release.wait(5))
+    monkeypatch.setattr(aof, "MAX_FSYNC_POSTPONE", 0.05)
+
+    writer = AOFWriter(str(tmp_path / "appendonly.aof"), "everysec")
+    writer.open()
+    writer.log_command("SET", "a", "1")
+    writer.flush_buffer()
+    while writer.written_batch < 1:
+        time.sleep(0.01)
+    writer.last_sync_time -= 1
+    assert writer.should_sync()
+    writer.request_fsync()  # returns at once although the "disk" is stuck
+    assert writer.fsync_in_progress
+
+    # Writes are held back while the fsync runs, then go out anyway
+    writer.log_command("SET", "b", "2")
+    assert writer.flush_buffer() is None
+    time.sleep(0.06)
+    assert writer.flush_buffer() == 2
+    assert writer.delayed_fsync == 1
+
+    release.set()
+    writer.close()
+    assert writer.synced_batch == 2
+
+def test_failed_write_is_not_acknowledged(tmp_path, monkeypatch):
+    from redis_server.persistence import aof
+    failing = threading.Event()
+    failing.set()
+
+    def datasync(fd):
+        if failing.is_set():
+            raise OSError(28, "No space left on device")
+    monkeypatch.setattr(aof, "_datasync", datasync)
+    monkeypatch.setattr(aof, "WRITE_RETRY_INTERVAL", 0.01)
+
+    writer = AOFWriter(str(tmp_path / "appendonly.aof"), "always")
+    writer.open()
+    writer.log_command("SET", "a", "1")
+    batch = writer.flush_buffer()
+    while writer.last_write_error is None:
+        time.sleep(0.01)
+    assert writer.written_batch < batch and writer.unwritten_batch() == batch
+    assert os.path.getsize(writer.incr_filename) == 0  # the failed write was cut back
+
+    failing.clear()
+    while writer.written_batch < batch:
+        time.sleep(0.01)
+    assert writer.last_write_error is None
+    writer.close()
+    with open(writer.incr_filename, "rb") as f:
+        assert [command for command, _, _ in parse_commands(f.read())] == ["SET"]
+
+def test_segment_that_cant_be_opened_holds_writes_back(tmp_path, monkeypatch):
+    from redis_server.persistence import aof
+    monkeypatch.setattr(aof, "WRITE_RETRY_INTERVAL", 0.01)
+    writer = AOFWriter(str(tmp_path / "appendonly.aof"), "always")
+    writer.open()
+    old_segment = writer.incr_filename
+    new_segment = str(tmp_path / "missing" / "appendonly.aof.2.incr.aof")
+    writer._queue.put((aof._SWITCH_FILE, new_segment))
+    writer.log_command("SET", "a", "1")
+    batch = writer.flush_buffer()
+    while writer.last_write_error is None:
+        time.sleep(0.01)
+    assert writer.unwritten_batch() == batch and writer._thread.is_alive()
+    assert os.path.getsize(old_segment) == 0  # never written to the segment being left
+
+    os.mkdir(tmp_path / "missing")
+    while writer.written_batch < batch:
+        time.sleep(0.01)
+    assert writer.last_write_error is None
+    writer.close()
+    with open(new_segment, "rb") as f:
+        assert [command for command, _, _ in parse_commands(f.read())] == ["SET"]
+
+@pytest.mark.parametrize("use_rdb_preamble", [True, False])
+def test_rewrite_starts_new_base_and_segment(tmp_path, use_rdb_preamble):
+    from redis_server.command_handler import CommandHandler
+    filename = str(tmp_path / "appendonly.aof")
+    with open(filename, "wb") as f:  # single-file AOF from before multi-part
+        f.write(encode_command("SET", "old", "1"))
+    store = DataStore()
+    store.set("old", "1")
+    store.get_or_create_list("list").extend(str(i) for i in range(100))
+    store.get_or_create_hash("hash").update({"a": "1", "b": "2"})
+    store.get_or_create_set("set").add("x")
+    store.get_or_create_hyperloglog("hll").add("a", "b", "c")
+    store.set("bits", bytearray(b"\xff\x00"), time.time() + 100)
+
+    writer = AOFWriter(filename, "everysec", use_rdb_preamble=use_rdb_preamble)
+    writer.open()
+    assert not os.path.exists(filename)
+    assert [f.name for f in writer.manifest.files()] == ["appendonly.aof", "appendonly.aof.1.incr.aof"]
+    assert writer.start_rewrite(store, str(tmp_path / "temp.base"))
+    assert not writer.start_rewrite(store, str(tmp_path / "temp.base"))
+
+    # Changed while the rewrite runs: the snapshot keeps the old contents
+    # and the new segment gets the commands
+    store.get_or_create_list("list").append("late")
+    writer.log_command("RPUSH", "list", "late")
+    store.delete("set")
+    writer.log_command("DEL", "set")
+
+    writer._rewrite_job.wait()
+    assert writer.finish_rewrite() is True
+    writer.close()
+    assert store._snapshot is None
+
+    base = "appendonly.aof.2.base." + ("rdb" if use_rdb_preamble else "aof")
+    assert [f.name for f in writer.manifest.files()] == [base, "appendonly.aof.2.incr.aof"]
+    assert sorted(os.listdir(writer.manifest.dirname)) == sorted([base, "appendonly.aof.2.incr.aof", "appendonly.aof.manifest"])
+    with open(writer.incr_filename, "rb") as f:
+        assert [(command, args) for command, args, _ in parse_commands(f.read())] == [
+            ("RPUSH", ["list", "late"]), ("DEL", ["set"])]
+    if not use_rdb_preamble:
+        with open(writer.manifest.path(writer.manifest.base), "rb") as f:
+            names = [command for command, _, _ in parse_commands(f.read())]
+        assert names.count("RPUSH") == 2  # 64 + 36 items
+        assert "RESTORE" in names and "PEXPIREAT" in names
+
+    restored = DataStore()
+    assert RecoveryManager(filename, str(tmp_path / "dump.rdb")).recover_data(restored, CommandHandler(restored))
+    assert list(restored.get("list")) == [str(i) for i in range(100)] + ["late"]
+    assert restored.get("hash") == {"a": "1", "b": "2"}
+    assert restored.get("set") is None
+    assert restored.get("bits") == bytearray(b"\xff\x00") and restored.ttl("bits") > 0
+    assert restored.get("hll").count() == 3
+
+def test_loader_replays_every_command_type(tmp_path):
+    from redis_server.command_handler import CommandHandler
+    from redis_server.persistence import AOFLoader
+    filename = str(tmp_path / "appendonly.aof")
+    with open(filename, "wb") as f:
+        f.write(b"1700000000 SET legacy old-format\n")
+        f.write(encode_command("SET", "multi", "line\r\nvalue"))
+        f.write(encode_command("SET", "accent", "café"))
+        f.write(encode_command("RPUSH", "list", *[str(i) for i in range(50)]))
+        f.write(encode_command("LPUSH", "list", "first"))
+        f.write(encode_command("HSET", "hash", "a", "1", "b", "2"))
+        f.write(encode_command("SADD", "set", "x", "y"))
+        f.write(encode_command("SET", "ttl", "v", "EX", "100"))
+        f.write(encode_command("XADD", "stream", "1-1", "field", "value"))
+        f.write(encode_command("HSET", "list", "wrong", "type"))
+        f.write(encode_command("SET", "torn", "value")[:-4])
+
+    store = DataStore()
+    # A tiny block size makes records straddle block boundaries
+    loader = AOFLoader(store, CommandHandler(store), block_size=64)
+    assert loader.load(filename) == 10
+    assert loader.errors == 1
+    assert loader.bytes_loaded < loader.bytes_total
+    assert store.get("legacy") == "old-format"
+    assert store.get("multi") == "line\r\nvalue"
+    assert store.get("accent") == "café"
+    assert list(store.get("list")) == ["first"] + [str(i) for i in range(50)]
+    assert store.get("hash") == {"a": "1", "b": "2"}
+    assert store.get("set") == {"x", "y"}
+    assert store.get("ttl") == "v" and store.ttl("ttl") > 0
+    assert store.get_type("stream") == "stream"
+    assert store.get("torn") is None
+
+def test_expiry_is_logged_as_absolute_deadline(tmp_path):
+    from redis_server.command_handler import CommandHandler
+    from redis_server.persistence import AOFLoader
+
+    class Recorder:
+        loading = False
+
+        def __init__(self):
+            self.logged = []
+
+        def log_write_command(self, command, *args):
+            self.logged.append((command, *args))
+
+        def write_error(self):
+            return None
+
+    store, recorder = DataStore(), Recorder()
+    handler = CommandHandler(store, recorder)
+    now = time.time()
+    handler.execute("SET", "a", "1", "EX", "100")
+    handler.execute("SET", "b", "2")
+    handler.execute("EXPIRE", "b", "50")
+    handler.execute("EXPIRE", "missing", "50")
+    handler.execute("SET", "gone", "3", "PXAT", str(int(now * 1000) - 1))
+    assert [entry[:2] for entry in recorder.logged] == [("SET", "a"), ("SET", "b"), ("PEXPIREAT", "b"), ("DEL", "gone")]
+    assert recorder.logged[0][3] == "PXAT" and abs(int(recorder.logged[0][4]) / 1000 - (now + 100)) < 1
+    assert abs(int(recorder.logged[2][2]) / 1000 - (now + 50)) < 1
+    assert store.get("gone") is None
+
+    # Replayed later, deadlines stay where they were and passed ones drop the key
+    filename = str(tmp_path / "appendonly.aof")
+    with open(filename, "wb") as f:
+        for command, *args in recorder.logged:
+            f.write(encode_command(command, *args))
+        f.write(encode_command("SET", "stale", "x", "PXAT", int(now * 1000) - 5000))
+        f.write(encode_command("RPUSH", "old", "x"))
+        f.write(encode_command("PEXPIREAT", "old", int(now * 1000) - 5000))
+    restored = DataStore()
+    AOFLoader(restored, CommandHandler(restored)).load(filename)
+    assert 99 <= restored.ttl("a") <= 100 and 49 <= restored.ttl("b") <= 50
+    assert sorted(restored.keys()) == ["a", "b"]
+
+def test_every_write_command_survives_a_restart(tmp_path):
+    from redis_server.command_handler import CommandHandler
+    from redis_server.persistence import PersistenceConfig, PersistenceManager
+    config = {"rdb_enabled": False, "data_dir": str(tmp_path), "temp_dir": str(tmp_path / "temp")}
+    manager = PersistenceManager(PersistenceConfig(config))
+    manager.start()
+    handler = CommandHandler(DataStore(), manager)
+    handler.execute("HMSET", "h", "a", "1", "b", "2")
+    handler.execute("RPUSH", "l", "old", "x")
+    handler.execute("LSET", "l", "0", "new")
+    handler.execute("SADD", "s1", "a", "b")
+    handler.execute("SADD", "s2", "b", "c")
+    handler.execute("SINTERSTORE", "s3", "s1", "s2")
+    manager.flush_aof()
+    manager.stop()
+
+    store = DataStore()
+    assert PersistenceManager(PersistenceConfig(config)).recover_data(store, CommandHandler(store))
+    assert store.get("h") == {"a": "1", "b": "2"}
+    assert list(store.get("l")) == ["new", "x"]
+    assert store.get("s3") == {"b"}
+
+def test_rewrite_keeps_search_index_definitions(tmp_path):
+    from redis_server.command_handler import CommandHandler
+    from redis_server.persistence import PersistenceConfig, PersistenceManager
+    config = {"rdb_enabled": False, "data_dir": str(tmp_path), "temp_dir": str(tmp_path / "temp")}
+    manager = PersistenceManager(PersistenceConfig(config))
+    manager.start()
+    store = DataStore()
+    handler = CommandHandler(store, manager)
+    handler.execute("FT.CREATE", "idx", "ON", "HASH", "PREFIX", "1", "doc:",
+                    "SCHEMA", "title", "TEXT", "tags", "TAG", "SEPARATOR", ";", "year", "NUMERIC", "SORTABLE")
+    handler.execute("HSET", "doc:1", "title", "hello world", "tags", "a;b", "year", "2020")
+    assert manager.rewrite_aof_background(store)
+    manager.aof_writer._rewrite_job.wait()
+    manager.periodic_tasks(store)
+    assert not manager.aof_rewrite_in_progress()
+    manager.stop()
+
+    restored = DataStore()
+    handler = CommandHandler(restored)
+    assert PersistenceManager(PersistenceConfig(config)).recover_data(restored, handler)
+    assert handler.execute("FT._LIST") == b"*1\r\n$3\r\nidx\r\n"
+    assert handler.execute("FT.SEARCH", "idx", "@tags:{b}", "NOCONTENT") == b"*2\r\n:1\r\n$5\r\ndoc:1\r\n"
+    assert handler.execute("FT.SEARCH", "idx", "@year:[2020 2020]", "NOCONTENT") == b"*2\r\n:1\r\n$5\r\ndoc:1\r\n"
+
+def test_info_reports_the_multipart_aof_files(tmp_path):
+    from redis_server.command_handler import CommandHandler
+    from redis_server.persistence import PersistenceConfig, PersistenceManager
+    config = {"rdb_enabled": False, "data_dir": str(tmp_path), "temp_dir": str(tmp_path / "temp")}
+    manager = PersistenceManager(PersistenceConfig(config))
+    manager.start()
+    store = DataStore()
+    handler = CommandHandler(store, manager)
+    handler.execute("SET", "a", "1")
+    directory = os.path.join(str(tmp_path), "appendonlydir")
+    info = handler.execute("INFO", "persistence").decode()
+    assert f"aof_manifest:{os.path.join(directory, 'appendonly.aof.manifest')}\r\n" in info
+    assert f"aof_incr_filename:{os.path.join(directory, 'appendonly.aof.1.incr.aof')}\r\n" in info
+
+    assert manager.rewrite_aof_background(store)
+    manager.aof_writer._rewrite_job.wait()
+    manager.periodic_tasks(store)
+    info = handler.execute("INFO", "persistence").decode()
+    assert f"aof_incr_filename:{os.path.join(directory, 'appendonly.aof.2.incr.aof')}\r\n" in info
+    manager.stop()
@@ -0,0 +1,24 @@
+from conftest import send_command
+
+def test_setbit_getbit_bitcount():
+    send_command("DEL test:bitmap\r\n")
+
+    resp = send_command("SETBIT test:bitmap 7 1\r\n")
+    assert ":0" in resp
+    send_command("SETBIT test:bitmap 100 1\r\n")
+
+    assert ":1" in send_command("GETBIT test:bitmap 7\r\n")
+    assert ":0" in send_command("GETBIT test:bitmap 8\r\n")
+    assert ":2" in send_command("BITCOUNT test:bitmap\r\n")
+    assert ":100" in send_command("BITPOS test:bitmap 1 1\r\n")
+
+def test_bitop_and_bitfield():
+    send_command("SET test:bitop:a foobar\r\n")
+    send_command("SET test:bitop:b abcdef\r\n")
+
+    assert ":6" in send_command("BITOP AND test:bitop:dest test:bitop:a test:bitop:b\r\n")
+    assert "$6\r\n`bc`ab\r\n" in send_command("GET test:bitop:dest\r\n")
+
+    send_command("DEL test:bitfield\r\n")
+    resp = send_command("BITFIELD test:bitfield SET u8 #0 255 INCRBY u8 #0 10\r\n")
+    assert resp == "*2\r\n:0\r\n:9\r\n"
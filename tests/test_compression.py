@@ -0,0 +1,69 @@
+import json
+import time
+from redis_server.command_handler import CommandHandler
+from redis_server.compression import CompressedString, StringCompressor
+from redis_server.persistence import RDBHandler, RecoveryManager
+from redis_server.storage import DataStore
+
+DOCUMENT = json.dumps([{"id": i, "name": f"user {i}", "tags": ["a", "b"]} for i in range(500)])
+
+def test_large_strings_are_kept_compressed():
+    store = DataStore(StringCompressor(threshold=1024, cache_bytes=len(DOCUMENT)))
+    store.set("doc", DOCUMENT)
+    store.set("small", "x" * 100)
+    store.set("ttl", DOCUMENT.replace("user", "name"), time.time() + 100)
+    assert isinstance(store._data["doc"][0], CompressedString)
+    assert store._data["small"][0] == "x" * 100
+    assert store.get_type("doc") == "string" and store.ttl("ttl") > 0
+    assert store.get_memory_usage() < len(DOCUMENT)
+
+    stats = store.get_compression_stats()
+    assert stats["compressed_values"] == 2 and stats["compression_ratio"] > 5
+    assert stats["raw_bytes"] == 2 * len(DOCUMENT)
+
+    # The cache holds one document: reading the other evicts it
+    assert store.get("doc") == DOCUMENT and store.get("doc") == DOCUMENT
+    assert store.get("ttl") == DOCUMENT.replace("user", "name")
+    assert store.get("doc") == DOCUMENT
+    stats = store.get_compression_stats()
+    assert (stats["cache_hits"], stats["cache_misses"]) == (1, 3)
+    assert stats["cache_bytes"] == len(DOCUMENT)
+
+    assert store.get_string_bytes("doc") == DOCUMENT.encode()
+    store.set("doc", "short")
+    store.delete("ttl")
+    assert store.get("doc") == "short"
+    assert store.get_compression_stats()["compressed_values"] == 0
+    assert store.get_compression_stats()["cache_bytes"] == 0
+
+def test_compressed_strings_are_saved_without_recompressing(tmp_path):
+    filename = str(tmp_path / "dump.rdb")
+    store = DataStore()
+    store.set("doc", DOCUMENT, time.time() + 100)
+    assert RDBHandler(filename).create_snapshot(store)
+
+    restored = DataStore(StringCompressor(threshold=0))
+    assert RecoveryManager(str(tmp_path / "appendonly.aof"), filename).recover_data(restored)
+    assert restored._data["doc"][0].data == store._data["doc"][0].data
+    assert restored.get("doc") == DOCUMENT and restored.ttl("doc") > 0
+    assert restored.get_compression_stats()["compressed_values"] == 1
+
+def test_object_encoding_and_config():
+    store = DataStore()
+    handler = CommandHandler(store)
+    handler.execute("SET", "doc", DOCUMENT)
+    handler.execute("SET", "number", "12345")
+    handler.execute("SET", "word", "hello")
+    handler.execute("RPUSH", "list", "a")
+    assert handler.execute("OBJECT", "ENCODING", "doc") == b"$10\r\ncompressed\r\n"
+    assert handler.execute("OBJECT", "ENCODING", "number") == b"$3\r\nint\r\n"
+    assert handler.execute("OBJECT", "ENCODING", "word") == b"$6\r\nembstr\r\n"
+    assert handler.execute("OBJECT", "ENCODING", "list") == b"$9\r\nquicklist\r\n"
+    assert handler.execute("OBJECT", "ENCODING", "missing") == b"$-1\r\n"
+    assert b"compressed_strings:1" in handler.execute("INFO")
+
+    assert handler.execute("CONFIG", "SET", "string_compression_threshold", "0") == b"+OK\r\n"
+    assert handler.execute("CONFIG", "SET", "string_compression_level", "10").startswith(b"-")
+    handler.execute("SET", "doc", DOCUMENT)
+    assert handler.execute("OBJECT", "ENCODING", "doc") == b"$3\r\nraw\r\n"
+    assert handler.execute("CONFIG", "GET", "string_compression_threshold").endswith(b"\r\n0\r\n")
@@ -0,0 +1,117 @@
+from conftest import rdb_only_handler, send_command
+from redis_server.command_handler import CommandHandler
+from redis_server.storage import DataStore
+
+def test_bloom_filter():
+    send_command("DEL test:bloom\r\n")
+
+    assert "+OK" in send_command("BF.RESERVE test:bloom 0.001 1000\r\n")
+    assert ":1" in send_command("BF.ADD test:bloom alice\r\n")
+    assert ":0" in send_command("BF.ADD test:bloom alice\r\n")
+    assert send_command("BF.MEXISTS test:bloom alice bob\r\n") == "*2\r\n:1\r\n:0\r\n"
+
+def test_cuckoo_filter_delete():
+    send_command("DEL test:cuckoo\r\n")
+
+    assert ":1" in send_command("CF.ADD test:cuckoo alice\r\n")
+    assert ":1" in send_command("CF.EXISTS test:cuckoo alice\r\n")
+    assert ":1" in send_command("CF.DEL test:cuckoo alice\r\n")
+    assert ":0" in send_command("CF.EXISTS test:cuckoo alice\r\n")
+
+def test_cuckoo_expansion_out_of_range_is_refused():
+    send_command("DEL test:cuckoo:expansion\r\n")
+
+    for expansion in ("-1", "65536"):
+        assert send_command(f"CF.RESERVE test:cuckoo:expansion 1000 EXPANSION {expansion}\r\n") == (
+            "-ERR Expansion must be between 0 and 65535\r\n"
+        )
+    assert send_command("EXISTS test:cuckoo:expansion\r\n") == ":0\r\n"
+    assert "+OK" in send_command("CF.RESERVE test:cuckoo:expansion 1000 EXPANSION 65535\r\n")
+    assert send_command("SAVE\r\n") == "+OK\r\n"
+
+def test_bloom_filter_errors():
+    send_command("DEL test:bloom:errors test:bloom:missing\r\n")
+
+    assert send_command("BF.RESERVE test:bloom:errors x 1000\r\n") == "-ERR bad error rate or capacity\r\n"
+    assert send_command("BF.RESERVE test:bloom:errors 0.01 0\r\n") == "-ERR (capacity should be larger than 0)\r\n"
+    assert send_command("BF.RESERVE test:bloom:errors 1.5 1000\r\n") == "-ERR (0 < error rate range < 1)\r\n"
+    assert send_command("BF.RESERVE test:bloom:errors 0.01 1000 EXPANSION 0\r\n") == (
+        "-ERR expansion should be greater or equal to 1\r\n"
+    )
+    assert send_command("BF.RESERVE test:bloom:errors 0.01 1000 BOGUS\r\n") == "-ERR syntax error\r\n"
+    assert send_command("BF.RESERVE test:bloom:errors 0.01 1000\r\n") == "+OK\r\n"
+    assert send_command("BF.RESERVE test:bloom:errors 0.01 1000\r\n") == "-ERR item exists\r\n"
+    assert send_command("BF.INFO test:bloom:missing\r\n") == "-ERR not found\r\n"
+
+def test_non_scaling_bloom_filter_fills_up():
+    handler = CommandHandler(DataStore())
+    handler.execute("BF.RESERVE", "bf", "0.01", "10", "NONSCALING")
+    handler.execute("BF.MADD", "bf", *(f"item:{i}" for i in range(10)))
+
+    assert handler.execute("BF.ADD", "bf", "one:more") == b"-ERR non scaling filter is full\r\n"
+    assert b"-ERR non scaling filter is full\r\n" in handler.execute("BF.MADD", "bf", "two:more")
+
+def test_scaling_bloom_filter_adds_layers():
+    handler = CommandHandler(DataStore())
+    handler.execute("BF.RESERVE", "bf", "0.01", "10", "EXPANSION", "2")
+    handler.execute("BF.MADD", "bf", *(f"item:{i}" for i in range(100)))
+
+    assert b"Number of filters\r\n:4\r\n" in handler.execute("BF.INFO", "bf")
+    assert handler.execute("BF.MEXISTS", "bf", "item:0", "item:99") == b"*2\r\n:1\r\n:1\r\n"
+
+def test_cuckoo_filter_errors():
+    send_command("DEL test:cuckoo:errors test:cuckoo:missing\r\n")
+
+    assert send_command("CF.RESERVE test:cuckoo:errors x\r\n") == "-ERR Bad capacity\r\n"
+    assert send_command("CF.RESERVE test:cuckoo:errors 0\r\n") == "-ERR Capacity must be a positive integer\r\n"
+    assert send_command("CF.RESERVE test:cuckoo:errors 1000 BUCKETSIZE 256\r\n") == (
+        "-ERR Bucket size must be between 1 and 255\r\n"
+    )
+    assert send_command("CF.RESERVE test:cuckoo:errors 1000 MAXITERATIONS 0\r\n") == (
+        "-ERR Max iterations must be between 1 and 65535\r\n"
+    )
+    assert send_command("CF.RESERVE test:cuckoo:errors 1000 BOGUS\r\n") == "-ERR syntax error\r\n"
+    assert send_command("CF.DEL test:cuckoo:missing a\r\n") == "-ERR Not found\r\n"
+    assert send_command("CF.INFO test:cuckoo:missing\r\n") == "-ERR not found\r\n"
+
+def test_cuckoo_filter_counts_duplicates():
+    send_command("DEL test:cuckoo:dups\r\n")
+
+    assert send_command("CF.ADDNX test:cuckoo:dups a\r\n") == ":1\r\n"
+    assert send_command("CF.ADDNX test:cuckoo:dups a\r\n") == ":0\r\n"
+    send_command("CF.ADD test:cuckoo:dups a\r\n")
+    assert send_command("CF.COUNT test:cuckoo:dups a\r\n") == ":2\r\n"
+    assert send_command("CF.DEL test:cuckoo:dups b\r\n") == ":0\r\n"
+
+def test_cuckoo_filter_full_or_expanding():
+    handler = CommandHandler(DataStore())
+    handler.execute("CF.RESERVE", "full", "4", "BUCKETSIZE", "1", "EXPANSION", "0")
+    replies = [handler.execute("CF.ADD", "full", f"item:{i}") for i in range(20)]
+    assert b"-ERR Filter is full\r\n" in replies
+
+    handler.execute("CF.RESERVE", "grows", "4", "BUCKETSIZE", "1", "EXPANSION", "2")
+    for i in range(20):
+        assert handler.execute("CF.ADD", "grows", f"item:{i}") == b":1\r\n"
+    info = handler.execute("CF.INFO", "grows")
+    assert b"Number of filters\r\n:1\r\n" not in info and b"Number of items inserted\r\n:20\r\n" in info
+    assert all(handler.execute("CF.EXISTS", "grows", f"item:{i}") == b":1\r\n" for i in range(20))
+
+def test_filters_survive_save_and_restart(tmp_path):
+    handler = rdb_only_handler(tmp_path)
+    handler.execute("BF.RESERVE", "bf", "0.01", "10", "EXPANSION", "2")
+    handler.execute("BF.MADD", "bf", *(f"item:{i}" for i in range(100)))
+    handler.execute("CF.RESERVE", "cf", "4", "BUCKETSIZE", "1", "EXPANSION", "2")
+    for i in range(20):
+        handler.execute("CF.ADD", "cf", f"item:{i}")
+    handler.execute("CF.DEL", "cf", "item:0")
+    infos = [handler.execute(info, key) for info, key in (("BF.INFO", "bf"), ("CF.INFO", "cf"))]
+    assert handler.execute("SAVE") == b"+OK\r\n"
+
+    restored = rdb_only_handler(tmp_path)
+    assert [restored.execute(info, key) for info, key in (("BF.INFO", "bf"), ("CF.INFO", "cf"))] == infos
+    assert restored.execute("BF.EXISTS", "bf", "item:99") == b":1\r\n"
+    assert restored.execute("CF.EXISTS", "cf", "item:0") == b":0\r\n"
+    assert restored.execute("CF.EXISTS", "cf", "item:19") == b":1\r\n"
+    # Still scales: a restored filter keeps its expansion
+    restored.execute("BF.MADD", "bf", *(f"more:{i}" for i in range(200)))
+    assert b"Number of filters\r\n:5\r\n" in restored.execute("BF.INFO", "bf")
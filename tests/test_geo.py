@@ -0,0 +1,29 @@
+from conftest import send_command
+
+def test_geoadd_and_lookup():
+    send_command("DEL test:geo\r\n")
+
+    assert send_command("GEOADD test:geo 13.361389 38.115556 Palermo 15.087269 37.502669 Catania\r\n") == ":2\r\n"
+    assert send_command("GEOADD test:geo NX 0 0 Palermo\r\n") == ":0\r\n"
+    assert send_command("ZSCORE test:geo Palermo\r\n") == "$16\r\n3479099956230698\r\n"
+    assert send_command("GEODIST test:geo Palermo Catania km\r\n") == "$8\r\n166.2742\r\n"
+    assert send_command("GEOHASH test:geo Palermo missing\r\n") == "*2\r\n$11\r\nsqc8b49rny0\r\n$-1\r\n"
+    assert send_command("GEOPOS test:geo missing\r\n") == "*1\r\n*-1\r\n"
+    assert "invalid longitude,latitude pair" in send_command("GEOADD test:geo 10 89 pole\r\n")
+    assert send_command("TYPE test:geo\r\n") == "+zset\r\n"
+
+def test_geosearch():
+    send_command("DEL test:geo\r\n")
+    send_command("GEOADD test:geo 13.361389 38.115556 Palermo 15.087269 37.502669 Catania "
+                 "12.758489 38.788135 edge1 17.241510 38.788135 edge2\r\n")
+
+    assert send_command("GEOSEARCH test:geo FROMLONLAT 15 37 BYRADIUS 200 km ASC\r\n") == (
+        "*2\r\n$7\r\nCatania\r\n$7\r\nPalermo\r\n"
+    )
+    assert send_command("GEOSEARCH test:geo FROMMEMBER Palermo BYRADIUS 100 km WITHDIST ASC\r\n") == (
+        "*2\r\n*2\r\n$7\r\nPalermo\r\n$6\r\n0.0000\r\n*2\r\n$5\r\nedge1\r\n$7\r\n91.4007\r\n"
+    )
+    assert send_command("GEOSEARCH test:geo FROMLONLAT 15 37 BYBOX 400 400 km COUNT 1\r\n") == "*1\r\n$7\r\nCatania\r\n"
+    assert send_command("GEOSEARCH test:geo FROMLONLAT 15 37 BYRADIUS 1 km\r\n") == "*0\r\n"
+    assert send_command("ZREM test:geo Catania\r\n") == ":1\r\n"
+    assert send_command("ZCARD test:geo\r\n") == ":3\r\n"
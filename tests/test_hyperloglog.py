@@ -0,0 +1,68 @@
+from conftest import rdb_only_handler, send_command
+
+def test_pfadd_pfcount_pfmerge():
+    send_command("DEL test:hll:a test:hll:b test:hll:merged\r\n")
+
+    assert ":1" in send_command("PFADD test:hll:a a b c d e f g\r\n")
+    assert ":0" in send_command("PFADD test:hll:a a b\r\n")
+    assert ":7" in send_command("PFCOUNT test:hll:a\r\n")
+
+    send_command("PFADD test:hll:b e f g h i\r\n")
+    assert ":9" in send_command("PFCOUNT test:hll:a test:hll:b\r\n")
+
+    assert "+OK" in send_command("PFMERGE test:hll:merged test:hll:a test:hll:b\r\n")
+    assert ":9" in send_command("PFCOUNT test:hll:merged\r\n")
+    assert "+hyperloglog" in send_command("TYPE test:hll:merged\r\n")
+
+def test_pfadd_errors():
+    send_command("DEL test:hll:str\r\n")
+    send_command("SET test:hll:str x\r\n")
+
+    assert send_command("PFADD\r\n") == "-ERR wrong number of arguments for 'pfadd' command\r\n"
+    assert send_command("PFADD test:hll:str a\r\n") == (
+        "-ERR WRONGTYPE Operation against a key holding the wrong kind of value\r\n"
+    )
+    assert "WRONGTYPE" in send_command("PFCOUNT test:hll:str\r\n")
+    assert "WRONGTYPE" in send_command("PFMERGE test:hll:str\r\n")
+
+def test_pfadd_without_elements_creates_an_empty_hll():
+    send_command("DEL test:hll:empty\r\n")
+
+    assert send_command("PFCOUNT test:hll:empty\r\n") == ":0\r\n"
+    assert send_command("PFADD test:hll:empty\r\n") == ":1\r\n"
+    assert send_command("PFCOUNT test:hll:empty\r\n") == ":0\r\n"
+    assert send_command("TYPE test:hll:empty\r\n") == "+hyperloglog\r\n"
+
+def test_pfmerge_with_missing_sources():
+    send_command("DEL test:hll:dest test:hll:missing\r\n")
+
+    assert send_command("PFMERGE test:hll:dest test:hll:missing\r\n") == "+OK\r\n"
+    assert send_command("TYPE test:hll:dest\r\n") == "+hyperloglog\r\n"
+    assert send_command("PFCOUNT test:hll:dest\r\n") == ":0\r\n"
+
+def test_pfmerge_sparse_into_dense():
+    from redis_server.command_handler import CommandHandler
+    from redis_server.storage import DataStore
+    handler = CommandHandler(DataStore())
+    handler.execute("PFADD", "dense", *(f"item:{i}" for i in range(5000)))
+    handler.execute("PFADD", "sparse", "a", "b", "c")
+    dense_count = handler.execute("PFCOUNT", "dense")
+
+    assert handler.execute("PFMERGE", "sparse", "dense") == b"+OK\r\n"
+    assert handler.execute("PFCOUNT", "sparse") == handler.execute("PFCOUNT", "dense", "sparse")
+    # Merging a key into itself changes nothing
+    assert handler.execute("PFMERGE", "dense", "dense") == b"+OK\r\n"
+    assert handler.execute("PFCOUNT", "dense") == dense_count
+
+def test_hll_survives_save_and_restart(tmp_path):
+    handler = rdb_only_handler(tmp_path)
+    handler.execute("PFADD", "sparse", "a", "b", "c")
+    handler.execute("PFADD", "dense", *(f"item:{i}" for i in range(5000)))
+    counts = [handler.execute("PFCOUNT", key) for key in ("sparse", "dense")]
+    assert handler.execute("SAVE") == b"+OK\r\n"
+
+    restored = rdb_only_handler(tmp_path)
+    assert [restored.execute("PFCOUNT", key) for key in ("sparse", "dense")] == counts
+    assert restored.execute("TYPE", "dense") == b"+hyperloglog\r\n"
+    assert restored.execute("PFADD", "sparse", "a") == b":0\r\n"
+    assert restored.execute("PFADD", "sparse", "d") == b":1\r\n"
@@ -0,0 +1,41 @@
+from conftest import send_command
+
+def test_json_set_and_get():
+    send_command("DEL test:json\r\n")
+
+    assert send_command('JSON.SET test:json $ {"name": "ada", "tags": ["a"], "stats": {"visits": 1}}\r\n') == "+OK\r\n"
+    assert send_command("JSON.GET test:json .name\r\n") == '$5\r\n"ada"\r\n'
+    assert send_command("JSON.GET test:json $..visits\r\n") == "$3\r\n[1]\r\n"
+    assert send_command('JSON.SET test:json $.stats.likes 3\r\n') == "+OK\r\n"
+    assert send_command('JSON.SET test:json $.name "bob" NX\r\n') == "$-1\r\n"
+    assert send_command('JSON.SET test:json $.missing.deep 1\r\n') == "$-1\r\n"
+    assert send_command("JSON.GET test:json $.stats\r\n") == '$24\r\n[{"visits":1,"likes":3}]\r\n'
+    assert send_command("JSON.TYPE test:json .tags\r\n") == "+array\r\n"
+    assert send_command("TYPE test:json\r\n") == "+json\r\n"
+
+def test_json_partial_updates():
+    send_command("DEL test:json\r\n")
+    send_command('JSON.SET test:json . {"a": {"n": 1}, "b": {"n": 2.5}, "list": [1, 2]}\r\n')
+
+    assert send_command("JSON.NUMINCRBY test:json $..n 2\r\n") == "$7\r\n[3,4.5]\r\n"
+    assert send_command("JSON.NUMINCRBY test:json .a.n 1\r\n") == "$1\r\n4\r\n"
+    assert send_command('JSON.ARRAPPEND test:json .list 3 "x"\r\n') == ":4\r\n"
+    assert send_command("JSON.ARRLEN test:json $.list\r\n") == "*1\r\n:4\r\n"
+    assert send_command("JSON.OBJLEN test:json $\r\n") == "*1\r\n:3\r\n"
+    assert send_command("JSON.DEL test:json $.list[-1]\r\n") == ":1\r\n"
+    assert send_command("JSON.GET test:json .list\r\n") == "$7\r\n[1,2,3]\r\n"
+    assert send_command("JSON.DEL test:json $..n\r\n") == ":2\r\n"
+    assert send_command("JSON.GET test:json $.a\r\n") == "$4\r\n[{}]\r\n"
+    assert send_command("JSON.DEL test:json\r\n") == ":1\r\n"
+    assert send_command("EXISTS test:json\r\n") == ":0\r\n"
+
+def test_json_errors():
+    send_command("DEL test:json test:str\r\n")
+    send_command("SET test:str hello\r\n")
+
+    assert "WRONGTYPE" in send_command("JSON.GET test:str\r\n")
+    assert "root" in send_command("JSON.SET test:json $.a 1\r\n")
+    assert send_command("JSON.SET test:json $ {bad\r\n").startswith("-ERR")
+    send_command('JSON.SET test:json $ {"a": "text"}\r\n')
+    assert send_command("JSON.NUMINCRBY test:json $.a 1\r\n") == "$6\r\n[null]\r\n"
+    assert "does not exist" in send_command("JSON.GET test:json .nope\r\n")
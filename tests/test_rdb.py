@@ -0,0 +1,360 @@
+import os
+import time
+import pytest
+from redis_server.persistence import RDBHandler, RecoveryManager
+from redis_server.persistence import rdb
+from redis_server.storage import DataStore
+from redis_server.datatypes import JSONDocument, SortedSet
+
+def fill_store():
+    store = DataStore()
+    store.set("string", "héllo\r\nworld")
+    store.set("ttl", "v", time.time() + 100)
+    store.set("expired", "v", time.time() - 1)
+    store.get_or_create_list("list").extend(str(i) for i in range(1000))
+    store.get_or_create_hash("hash").update({"a": "1", "é": "x" * 300})
+    store.get_or_create_set("set").update({"x", "y"})
+    store.set("bits", bytearray(b"\xff\x00\x80"))
+    store.get_or_create_hyperloglog("hll").add("a", "b", "c")
+    store.get_or_create_bloom("bloom")
+    store.get_or_create_stream("stream").append((1, 1), ["field", "value"])
+    sorted_set = SortedSet()
+    sorted_set.add("member", 1.5)
+    store.set("zset", sorted_set)
+    store.set("json", JSONDocument('{"a": [1, 2]}'))
+    return store
+
+@pytest.mark.parametrize("compression", [True, False])
+@pytest.mark.parametrize("workers", [1, 2])
+def test_snapshot_round_trip(tmp_path, compression, workers, monkeypatch):
+    # Tiny chunks give most keys a chunk of their own
+    monkeypatch.setattr(rdb, "CHUNK_SIZE", 128)
+    filename = str(tmp_path / "dump.rdb")
+    store = fill_store()
+    assert RDBHandler(filename, compression).create_snapshot(store)
+    with open(filename, "rb") as f:
+        assert f.read(9) == b"REDIS0003"
+        assert len(rdb.read_index(f, os.path.getsize(filename))[1]) >= 5
+
+    restored = DataStore()
+    recovery = RecoveryManager(str(tmp_path / "appendonly.aof"), filename, rdb_load_workers=workers)
+    assert recovery.recover_data(restored)
+    assert recovery.rdb_loader.keys_loaded == 11 and recovery.rdb_loader.progress() == 1.0
+    assert sorted(restored.keys()) == ["bits", "bloom", "hash", "hll", "json", "list", "set", "stream",
+                                       "string", "ttl", "zset"]
+    assert restored.get("expired") is None
+    for key in ("string", "list", "hash", "set", "bits"):
+        assert restored.get(key) == store.get(key)
+    assert restored.ttl("ttl") > 0 and restored.ttl("string") == -1
+    assert restored.get("hll").count() == 3
+    for key in ("bloom", "stream", "zset", "json"):
+        assert restored.get(key).to_bytes() == store.get(key).to_bytes()
+
+def test_corrupted_snapshot_is_rejected(tmp_path):
+    filename = str(tmp_path / "dump.rdb")
+    assert RDBHandler(filename).create_snapshot(fill_store())
+    with open(filename, "r+b") as f:
+        f.seek(os.path.getsize(filename) // 2)
+        byte = f.read(1)
+        f.seek(-1, os.SEEK_CUR)
+        f.write(bytes([byte[0] ^ 0xFF]))
+
+    restored = DataStore()
+    assert not RecoveryManager(str(tmp_path / "appendonly.aof"), filename).recover_data(restored)
+    assert restored.keys() == []
+
+def test_version_0002_file_still_loads(tmp_path):
+    import zlib
+    body = zlib.compress(bytes([rdb.OPCODE_EXPIRETIME_MS]) + rdb._EXPIRY.pack(int(time.time() * 1000) + 100000)
+                         + bytes([rdb.TYPE_STRING]) + b"\x01a\x011" + bytes([rdb.OPCODE_EOF]))
+    data = b"REDIS0002" + bytes([rdb.FLAG_COMPRESSED | rdb.FLAG_CHECKSUM]) + body
+    filename = str(tmp_path / "dump.rdb")
+    with open(filename, "wb") as f:
+        f.write(data + rdb._CHECKSUM.pack(zlib.crc32(data)))
+
+    [(key, value, expiry_time)] = RDBHandler(filename).iter_snapshot()
+    assert (key, value) == ("a", "1") and expiry_time > time.time()
+
+def test_version_0001_file_is_only_converted_offline(tmp_path):
+    import gzip
+    import hashlib
+    import pickle
+    from redis_server import tools
+    from redis_server.persistence.rdb import LegacyRDBError
+    state = {'keys': {'a': {'value': '1', 'type': 'string', 'ttl': None, 'expiry_time': None}},
+             'metadata': {'created_time': time.time(), 'key_count': 1}}
+    body = gzip.compress(pickle.dumps(state))
+    filename = str(tmp_path / "dump.rdb")
+    with open(filename, "wb") as f:
+        f.write(b"REDIS0001" + hashlib.md5(body).digest() + body)
+
+    # Never unpickled unless asked to
+    with pytest.raises(LegacyRDBError):
+        list(RDBHandler(filename).iter_snapshot())
+    assert tools.main(["convert", filename, str(tmp_path / "new.rdb")]) == 1
+    assert tools.main(["convert", filename, str(tmp_path / "new.rdb"), "--allow-pickle"]) == 0
+    assert list(RDBHandler(str(tmp_path / "new.rdb")).iter_snapshot()) == [("a", "1", None)]
+
+    # On startup the server leaves it alone, moved out of the way of the next save
+    store = DataStore()
+    assert not RecoveryManager(str(tmp_path / "appendonly.aof"), filename).recover_data(store)
+    assert store.keys() == [] and not os.path.exists(filename)
+    assert list(RDBHandler(filename + ".0001", allow_pickle=True).iter_snapshot()) == [("a", "1", None)]
+
+@pytest.mark.parametrize("fork", [True, False])
+def test_background_save_writes_store_as_it_was(tmp_path, monkeypatch, fork):
+    from collections import deque
+    from redis_server.persistence import child
+    monkeypatch.setattr(child, "FORK_SUPPORTED", fork)
+    store = DataStore()
+    store.set("a", "1")
+    store.get_or_create_list("list").append("x")
+    handler = RDBHandler(str(tmp_path / "dump.rdb"))
+    assert handler.create_background_snapshot(store)
+    assert not handler.create_background_snapshot(store)
+
+    # Changes after the start don't reach the file
+    store.set("a", "2")
+    store.get_or_create_list("list").append("y")
+    store.set("late", "1")
+
+    handler.bgsave_job.wait()
+    assert handler.poll_background_save() is True
+    assert handler.last_bgsave_status == "ok" and not handler.bgsave_in_progress()
+    assert sorted(handler.iter_snapshot()) == [("a", "1", None), ("list", deque(["x"]), None)]
+    assert store._snapshot is None
+
+def test_failed_background_save_is_reported(tmp_path):
+    store = DataStore()
+    store.set("bad", object())
+    handler = RDBHandler(str(tmp_path / "dump.rdb"))
+    assert handler.create_background_snapshot(store)
+    job = handler.bgsave_job
+    job.wait()
+    assert handler.poll_background_save() is False
+    assert handler.last_bgsave_status == "err"
+    assert "Can't save a value of type object" in job.message
+    assert os.listdir(tmp_path) == []
+
+def test_clients_get_loading_error_until_dataset_is_loaded(tmp_path, monkeypatch):
+    from redis_server.command_handler import CommandHandler
+    from redis_server.persistence import PersistenceConfig, PersistenceManager
+    monkeypatch.setattr(rdb, "CHUNK_SIZE", 128)
+    store = fill_store()
+    assert RDBHandler(str(tmp_path / "dump.rdb")).create_snapshot(store)
+
+    manager = PersistenceManager(PersistenceConfig({"aof_enabled": False, "data_dir": str(tmp_path),
+                                                    "temp_dir": str(tmp_path / "temp"), "rdb_load_workers": 1}))
+    restored = DataStore()
+    handler = CommandHandler(restored, manager)
+    manager.start_loading(restored, handler)
+    assert manager.load_step(budget=0) is None
+    assert handler.execute("GET", "string") == b"-LOADING Redis is loading the dataset in memory\r\n"
+    assert handler.execute("PING") == b"+PONG\r\n"
+    info = handler.execute("INFO", "persistence")
+    assert b"loading:1" in info and b"loading_loaded_perc:" in info
+    assert 0 < manager.recovery_manager.loading_loaded_bytes < manager.recovery_manager.loading_total_bytes
+
+    while (result := manager.load_step(budget=0)) is None:
+        pass
+    assert result is True and not manager.loading
+    assert handler.execute("LLEN", "list") == b":1000\r\n"
+    assert restored.get("string") == store.get("string") and len(restored.keys()) == 11
+    assert b"loading:0" in handler.execute("INFO", "persistence")
+
+def test_mapped_snapshot_is_served_in_place(tmp_path):
+    from redis_server.command_handler import CommandHandler
+    from redis_server.persistence import MappedKeyspace, MappedRDBHandler
+    filename = str(tmp_path / "dump.rdb")
+    store = fill_store()
+    handler = MappedRDBHandler(filename)
+    assert handler.create_snapshot(store)
+
+    restored = DataStore()
+    assert RecoveryManager(str(tmp_path / "appendonly.aof"), filename).recover_data(restored)
+    assert isinstance(restored._data, MappedKeyspace) and not restored._data.overlay
+    assert sorted(restored.keys()) == sorted(key for key in store.keys())
+    loaded = DataStore()
+    for key, value, expiry_time in store.entries():
+        if key != "expired":
+            loaded.set(key, value, expiry_time)
+    assert restored.get_memory_usage() == loaded.get_memory_usage()
+    assert restored.get_type_stats() == loaded.get_type_stats()
+    for key in ("string", "list", "hash", "set", "bits"):
+        assert restored.get(key) == store.get(key)
+    assert restored.get_type("zset") == "zset" and restored.ttl("ttl") > 0
+    assert restored.get("missing") is None
+
+    # Changes go to the overlay and tombstones; the file is left as it was
+    handler_commands = CommandHandler(restored)
+    handler_commands.execute("RPUSH", "list", "late")
+    handler_commands.execute("SET", "string", "new")
+    handler_commands.execute("DEL", "set", "hash")
+    handler_commands.execute("SET", "added", "1")
+    assert restored.get("list")[-1] == "late" and restored.get("string") == "new"
+    assert restored.get("set") is None and len(restored.keys()) == 10
+    info = handler_commands.execute("INFO", "memory")
+    # Besides the keys written, the list and bitmap read above were copied into the overlay when handed out
+    assert b"mapped_keys:6" in info and b"overlay_keys:4" in info and b"tombstones:2" in info
+    assert restored._data.snapshot.lookup("set") is not None
+
+    # Saving writes the store as it is now, and the new file maps the same way
+    assert handler.create_snapshot(restored)
+    again = DataStore()
+    assert RecoveryManager(str(tmp_path / "appendonly.aof"), filename).recover_data(again)
+    assert sorted(again.keys()) == sorted(restored.keys())
+    assert list(again.get("list"))[-1] == "late" and again.get("added") == "1"
+    assert list(handler.iter_snapshot())[0][0] in restored.keys()
+
+    again.flush()
+    assert again.get_mapped_stats() is None and again.keys() == []
+
+@pytest.mark.parametrize("fork", [True, False])
+def test_incremental_snapshots_chain_deltas_to_base(tmp_path, monkeypatch, fork):
+    from redis_server.persistence import DeltaChain, child
+    monkeypatch.setattr(child, "FORK_SUPPORTED", fork)
+    filename = str(tmp_path / "dump.rdb")
+    store = fill_store()
+    handler = RDBHandler(filename, chain=DeltaChain(filename, max_deltas=2))
+
+    def save():
+        assert handler.create_background_snapshot(store, incremental=True)
+        handler.bgsave_job.wait()
+        assert handler.poll_background_save() is True
+        return handler.last_save_type, handler.last_save_keys
+
+    def restore():
+        restored = DataStore()
+        assert RecoveryManager(str(tmp_path / "appendonly.aof"), filename).recover_data(restored)
+        assert sorted(restored.keys()) == sorted(store.keys())
+        for key in ("string", "set", "hash", "new"):
+            assert restored.get(key) == store.get(key)
+        return restored
+
+    # Nothing is known about the store before its first save
+    assert save() == ("full", 11)
+    store.set("string", "changed")
+    store.delete("hash")
+    store.get_or_create_set("set").add("late")
+    store.set("new", "1")
+    assert save() == ("delta", 4)
+    assert os.path.getsize(filename + ".delta.1") < os.path.getsize(filename) / 10
+    store.set("ttl", "v", time.time() - 1)
+    store.delete("new")
+    assert save() == ("delta", 2)
+    assert restore().get("ttl") is None
+    assert handler.chain.deltas == [filename + ".delta.1", filename + ".delta.2"]
+
+    # A full chain is consolidated into a new base, and the old deltas go
+    with open(filename + ".delta.1", "rb") as f:
+        stale = f.read()
+    store.set("string", "again")
+    assert save() == ("full", 9)
+    assert sorted(os.listdir(tmp_path)) == ["dump.rdb"]
+    restore()
+
+    # A delta of an older base is removed, never applied
+    with open(filename + ".delta.1", "wb") as f:
+        f.write(stale)
+    assert DeltaChain(filename).deltas == [] and sorted(os.listdir(tmp_path)) == ["dump.rdb"]
+
+def test_reads_leave_the_next_delta_empty():
+    from redis_server.command_handler import CommandHandler
+    store = DataStore()
+    handler = CommandHandler(store)
+    for i in range(1000):
+        handler.execute("HSET", f"user:{i}", "name", f"n{i}")
+    handler.execute("RPUSH", "list", "a", "b")
+    assert store.take_dirty_keys() is None  # the full save that starts the tracking
+
+    for i in range(1000):
+        assert handler.execute("HGET", f"user:{i}", "name") == f"${len(f'n{i}')}\r\nn{i}\r\n".encode()
+    handler.execute("LRANGE", "list", "0", "-1")
+    handler.execute("HGETALL", "user:1")
+    assert store.take_dirty_keys() == set()
+
+    handler.execute("HSET", "user:7", "name", "changed")
+    assert store.take_dirty_keys() == {"user:7"}
+
+def test_mapped_snapshot_is_only_decoded_for_indexes_and_writes(tmp_path):
+    from redis_server.command_handler import CommandHandler
+    from redis_server.persistence import MappedRDBHandler
+    from redis_server.search.index import IndexManager, SchemaField
+    filename = str(tmp_path / "dump.rdb")
+    store = DataStore()
+    for i in range(50):
+        store.get_or_create_hash(f"doc:{i}").update({"color": "red"})
+        store.get_or_create_hash(f"other:{i}").update({"color": "blue"})
+    assert MappedRDBHandler(filename).create_snapshot(store)
+
+    restored = DataStore()
+    indexes = IndexManager(restored)
+    indexes.create("docs", ["doc:"], [SchemaField("color", "TAG")])
+    assert RecoveryManager(str(tmp_path / "appendonly.aof"), filename).recover_data(restored)
+    assert indexes.indexes["docs"].tag_match("color", ["red"]) == {f"doc:{i}" for i in range(50)}
+    assert restored.get_mapped_stats()["overlay_keys"] == 0
+
+    # Reads are served from the file; only a write copies a value into the overlay
+    handler = CommandHandler(restored)
+    assert handler.execute("HGET", "doc:1", "color") == b"$3\r\nred\r\n"
+    handler.execute("HGETALL", "other:1")
+    assert restored.get_mapped_stats()["overlay_keys"] == 0
+    handler.execute("HSET", "other:1", "color", "green")
+    assert restored.get_mapped_stats()["overlay_keys"] == 1
+    assert handler.execute("HGET", "other:1", "color") == b"$5\r\ngreen\r\n"
+
+def test_auto_saves_write_deltas_without_aof(tmp_path):
+    from redis_server.command_handler import CommandHandler
+    from redis_server.persistence import PersistenceConfig, PersistenceManager
+    config = {"aof_enabled": False, "rdb_incremental": True, "rdb_save_conditions": [(0, 1)],
+              "data_dir": str(tmp_path), "temp_dir": str(tmp_path / "temp")}
+    manager = PersistenceManager(PersistenceConfig(config))
+    manager.start()
+    store = DataStore()
+    handler = CommandHandler(store, manager)
+
+    def auto_save():
+        manager.periodic_tasks(store)
+        manager.rdb_handler.bgsave_job.wait()
+        manager.periodic_tasks(store)
+        assert not manager.rdb_bgsave_in_progress() and manager.changes_since_save == 0
+        return manager.rdb_handler.last_save_type
+
+    handler.execute("SET", "a", "1")
+    handler.execute("RPUSH", "l", "x")
+    assert auto_save() == "full"
+    handler.execute("SET", "b", "2")
+    handler.execute("RPUSH", "l", "y")
+    handler.execute("DEL", "a")
+    assert auto_save() == "delta"
+    assert os.path.exists(str(tmp_path / "dump.rdb.delta.1"))
+    manager.stop()
+
+    restored = DataStore()
+    assert PersistenceManager(PersistenceConfig(config)).recover_data(restored, CommandHandler(restored))
+    assert sorted(restored.keys()) == ["b", "l"]
+    assert list(restored.get("l")) == ["x", "y"] and restored.get("b") == "2"
+
+@pytest.mark.parametrize("rdb_format", ["chunked", "mapped"])
+def test_search_indexes_survive_an_rdb_only_restart(tmp_path, rdb_format):
+    from redis_server.command_handler import CommandHandler
+    from redis_server.persistence import PersistenceConfig, PersistenceManager
+    config = {"aof_enabled": False, "rdb_format": rdb_format, "data_dir": str(tmp_path),
+              "temp_dir": str(tmp_path / "temp")}
+    manager = PersistenceManager(PersistenceConfig(config))
+    store = DataStore()
+    handler = CommandHandler(store, manager)
+    handler.execute("FT.CREATE", "idx", "ON", "HASH", "PREFIX", "1", "doc:",
+                    "SCHEMA", "title", "TEXT", "tags", "TAG", "SEPARATOR", ";", "year", "NUMERIC", "SORTABLE")
+    handler.execute("HSET", "doc:1", "title", "hello world", "tags", "a;b", "year", "2020")
+    handler.execute("HSET", "other:1", "title", "hello")
+    assert handler.execute("SAVE") == b"+OK\r\n"
+
+    restored = DataStore()
+    handler = CommandHandler(restored)
+    assert PersistenceManager(PersistenceConfig(config)).recover_data(restored, handler)
+    assert handler.execute("FT._LIST") == b"*1\r\n$3\r\nidx\r\n"
+    assert handler.execute("FT.SEARCH", "idx", "@tags:{b}", "NOCONTENT") == b"*2\r\n:1\r\n$5\r\ndoc:1\r\n"
+    assert handler.execute("FT.SEARCH", "idx", "hello", "NOCONTENT") == b"*2\r\n:1\r\n$5\r\ndoc:1\r\n"
+    if rdb_format == "mapped":
+        assert restored.get_mapped_stats()["overlay_keys"] == 0
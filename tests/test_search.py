@@ -0,0 +1,24 @@
+from conftest import send_command
+
+def test_ft_search_ranges_tags_and_sort():
+    send_command("DEL test:item:1 test:item:2 test:item:3\r\n")
+    send_command("FT.DROPINDEX test:items\r\n")
+
+    assert "+OK" in send_command("FT.CREATE test:items PREFIX 1 test:item: SCHEMA price NUMERIC SORTABLE color TAG\r\n")
+    send_command("HSET test:item:1 price 10 color red\r\n")
+    send_command("HSET test:item:2 price 25 color blue\r\n")
+    send_command("HSET test:item:3 price 40 color red\r\n")
+
+    assert send_command("FT.SEARCH test:items @color:{red} @price:[(10 +inf] NOCONTENT\r\n") == (
+        "*2\r\n:1\r\n$11\r\ntest:item:3\r\n"
+    )
+    assert send_command("FT.SEARCH test:items * SORTBY price DESC LIMIT 0 2 NOCONTENT\r\n") == (
+        "*3\r\n:3\r\n$11\r\ntest:item:3\r\n$11\r\ntest:item:2\r\n"
+    )
+
+    # The index follows HSET and DEL
+    send_command("HSET test:item:2 color red\r\n")
+    send_command("DEL test:item:3\r\n")
+    assert send_command("FT.SEARCH test:items @color:{red} SORTBY price NOCONTENT\r\n") == (
+        "*3\r\n:2\r\n$11\r\ntest:item:1\r\n$11\r\ntest:item:2\r\n"
+    )
@@ -0,0 +1,111 @@
+from conftest import rdb_only_handler, send_command
+
+def test_count_min_sketch():
+    send_command("DEL test:cms\r\n")
+
+    assert "+OK" in send_command("CMS.INITBYDIM test:cms 2000 5\r\n")
+    assert send_command("CMS.INCRBY test:cms apple 5 pear 3\r\n") == "*2\r\n:5\r\n:3\r\n"
+    assert send_command("CMS.QUERY test:cms apple plum\r\n") == "*2\r\n:5\r\n:0\r\n"
+
+def test_topk_list():
+    send_command("DEL test:topk\r\n")
+
+    assert "+OK" in send_command("TOPK.RESERVE test:topk 2\r\n")
+    send_command("TOPK.INCRBY test:topk hot 10 warm 5 cold 1\r\n")
+    assert send_command("TOPK.LIST test:topk\r\n") == "*2\r\n$3\r\nhot\r\n$4\r\nwarm\r\n"
+
+def test_cms_merge_refuses_negative_weights():
+    send_command("DEL test:cms:a test:cms:b test:cms:dest\r\n")
+    send_command("CMS.INITBYDIM test:cms:a 100 4\r\n")
+    send_command("CMS.INITBYDIM test:cms:b 100 4\r\n")
+    send_command("CMS.INITBYDIM test:cms:dest 100 4\r\n")
+    send_command("CMS.INCRBY test:cms:a x 5\r\n")
+    send_command("CMS.INCRBY test:cms:b x 2\r\n")
+
+    assert send_command("CMS.MERGE test:cms:dest 2 test:cms:a test:cms:b WEIGHTS 1 -1\r\n") == (
+        "-ERR CMS: invalid weight value\r\n"
+    )
+    assert "+OK" in send_command("CMS.MERGE test:cms:dest 2 test:cms:a test:cms:b WEIGHTS 2 3\r\n")
+    assert send_command("CMS.QUERY test:cms:dest x\r\n") == "*1\r\n:16\r\n"
+    # A total past the u64 the snapshot holds is capped, so saving still works
+    send_command(f"CMS.INCRBY test:cms:a y {2 ** 70}\r\n")
+    assert send_command("SAVE\r\n") == "+OK\r\n"
+
+def test_count_min_sketch_errors():
+    send_command("DEL test:cms:errors test:cms:missing\r\n")
+
+    assert send_command("CMS.INITBYDIM test:cms:errors x 5\r\n") == "-ERR CMS: invalid width/depth\r\n"
+    assert send_command("CMS.INITBYDIM test:cms:errors 0 5\r\n") == "-ERR CMS: width and depth must be positive\r\n"
+    assert send_command("CMS.INITBYPROB test:cms:errors 0.01 2\r\n") == (
+        "-ERR CMS: error and probability must be between 0 and 1\r\n"
+    )
+    assert "+OK" in send_command("CMS.INITBYDIM test:cms:errors 100 4\r\n")
+    assert send_command("CMS.INITBYDIM test:cms:errors 100 4\r\n") == "-ERR CMS: key already exists\r\n"
+    assert send_command("CMS.INCRBY test:cms:errors a x\r\n") == "-ERR CMS: Cannot parse number\r\n"
+    assert send_command("CMS.INCRBY test:cms:errors a -1\r\n") == "-ERR CMS: Cannot parse number\r\n"
+    assert send_command("CMS.INCRBY test:cms:missing a 1\r\n") == "-ERR CMS: key does not exist\r\n"
+    assert send_command("CMS.QUERY test:cms:missing a\r\n") == "-ERR CMS: key does not exist\r\n"
+
+def test_cms_merge_errors():
+    send_command("DEL test:cms:wide test:cms:narrow test:cms:missing\r\n")
+    send_command("CMS.INITBYDIM test:cms:wide 100 4\r\n")
+    send_command("CMS.INITBYDIM test:cms:narrow 50 4\r\n")
+
+    assert send_command("CMS.MERGE test:cms:wide 1 test:cms:narrow\r\n") == "-ERR CMS: width/depth is not equal\r\n"
+    assert send_command("CMS.MERGE test:cms:wide 2 test:cms:narrow\r\n") == "-ERR CMS: invalid numkeys\r\n"
+    assert send_command("CMS.MERGE test:cms:wide 0 test:cms:narrow\r\n") == "-ERR CMS: invalid numkeys\r\n"
+    assert send_command("CMS.MERGE test:cms:wide 1 test:cms:missing\r\n") == "-ERR CMS: key does not exist\r\n"
+    # The destination must exist too
+    assert send_command("CMS.MERGE test:cms:missing 1 test:cms:wide\r\n") == "-ERR CMS: key does not exist\r\n"
+    assert send_command("CMS.MERGE test:cms:wide 1 test:cms:wide WEIGHTS\r\n") == "-ERR syntax error\r\n"
+
+def test_cms_merge_into_a_source_applies_weights():
+    send_command("DEL test:cms:self\r\n")
+    send_command("CMS.INITBYDIM test:cms:self 100 4\r\n")
+    send_command("CMS.INCRBY test:cms:self a 3\r\n")
+
+    assert "+OK" in send_command("CMS.MERGE test:cms:self 1 test:cms:self WEIGHTS 2\r\n")
+    assert send_command("CMS.QUERY test:cms:self a\r\n") == "*1\r\n:6\r\n"
+    assert "+OK" in send_command("CMS.MERGE test:cms:self 1 test:cms:self WEIGHTS 0\r\n")
+    assert send_command("CMS.QUERY test:cms:self a\r\n") == "*1\r\n:0\r\n"
+
+def test_topk_errors():
+    send_command("DEL test:topk:errors test:topk:missing\r\n")
+
+    assert send_command("TOPK.RESERVE test:topk:errors 0\r\n") == "-ERR TopK: k, width and depth must be positive\r\n"
+    assert send_command("TOPK.RESERVE test:topk:errors 2 8 7 1.5\r\n") == "-ERR TopK: decay must be between 0 and 1\r\n"
+    assert "+OK" in send_command("TOPK.RESERVE test:topk:errors 2\r\n")
+    assert send_command("TOPK.RESERVE test:topk:errors 2\r\n") == "-ERR TopK: key already exists\r\n"
+    assert send_command("TOPK.INCRBY test:topk:errors a x\r\n") == "-ERR TopK: Cannot parse increment\r\n"
+    for increment in ("0", "100001"):
+        assert send_command(f"TOPK.INCRBY test:topk:errors a {increment}\r\n") == (
+            "-ERR TopK: increment must be an integer between 1 and 100000\r\n"
+        )
+    assert send_command("TOPK.ADD test:topk:missing a\r\n") == "-ERR TopK: key does not exist\r\n"
+    assert send_command("TOPK.LIST test:topk:errors BOGUS\r\n") == "-ERR syntax error\r\n"
+
+def test_topk_reports_expelled_items():
+    send_command("DEL test:topk:expel\r\n")
+    send_command("TOPK.RESERVE test:topk:expel 2\r\n")
+
+    assert send_command("TOPK.ADD test:topk:expel a b c\r\n") == "*3\r\n$-1\r\n$-1\r\n$-1\r\n"
+    assert send_command("TOPK.INCRBY test:topk:expel c 10\r\n") == "*1\r\n$1\r\na\r\n"
+    assert send_command("TOPK.QUERY test:topk:expel c zzz\r\n") == "*2\r\n:1\r\n:0\r\n"
+    assert send_command("TOPK.LIST test:topk:expel WITHCOUNT\r\n") == "*4\r\n$1\r\nc\r\n:11\r\n$1\r\nb\r\n:1\r\n"
+
+def test_sketches_survive_save_and_restart(tmp_path):
+    handler = rdb_only_handler(tmp_path)
+    handler.execute("CMS.INITBYDIM", "cms", "2000", "5")
+    handler.execute("CMS.INCRBY", "cms", "apple", "5", "pear", "3")
+    handler.execute("TOPK.RESERVE", "topk", "2")
+    handler.execute("TOPK.INCRBY", "topk", "hot", "10", "warm", "5", "cold", "1")
+    assert handler.execute("SAVE") == b"+OK\r\n"
+
+    restored = rdb_only_handler(tmp_path)
+    assert restored.execute("CMS.QUERY", "cms", "apple", "pear", "plum") == b"*3\r\n:5\r\n:3\r\n:0\r\n"
+    assert restored.execute("CMS.INFO", "cms") == handler.execute("CMS.INFO", "cms")
+    assert restored.execute("TOPK.LIST", "topk", "WITHCOUNT") == handler.execute("TOPK.LIST", "topk", "WITHCOUNT")
+    assert restored.execute("TOPK.INFO", "topk") == handler.execute("TOPK.INFO", "topk")
+    # The heap keeps working from where it was saved
+    restored.execute("TOPK.INCRBY", "topk", "cold", "20")
+    assert restored.execute("TOPK.LIST", "topk") == b"*2\r\n$4\r\ncold\r\n$3\r\nhot\r\n"
@@ -0,0 +1,35 @@
+from conftest import send_command, redis_client
+
+def test_xadd_and_xrange():
+    send_command("DEL test:stream\r\n")
+
+    assert send_command("XADD test:stream 1-1 name alice\r\n") == "$3\r\n1-1\r\n"
+    assert send_command("XADD test:stream 1-* name bob\r\n") == "$3\r\n1-2\r\n"
+    assert "equal or smaller" in send_command("XADD test:stream 1-1 name carol\r\n")
+    assert send_command("XLEN test:stream\r\n") == ":2\r\n"
+    assert send_command("XRANGE test:stream (1-1 + COUNT 5\r\n") == (
+        "*1\r\n*2\r\n$3\r\n1-2\r\n*2\r\n$4\r\nname\r\n$3\r\nbob\r\n"
+    )
+
+def test_consumer_group_pending_and_ack():
+    send_command("DEL test:jobs\r\n")
+
+    assert "+OK" in send_command("XGROUP CREATE test:jobs workers $ MKSTREAM\r\n")
+    send_command("XADD test:jobs 5-0 task build\r\n")
+    reply = send_command("XREADGROUP GROUP workers w1 COUNT 10 STREAMS test:jobs >\r\n")
+    assert "5-0" in reply and "build" in reply
+    assert send_command("XPENDING test:jobs workers\r\n").startswith("*4\r\n:1\r\n")
+    assert send_command("XACK test:jobs workers 5-0\r\n") == ":1\r\n"
+    assert send_command("XPENDING test:jobs workers\r\n").startswith("*4\r\n:0\r\n")
+
+def test_xread_block_is_served_by_xadd():
+    send_command("DEL test:feed\r\n")
+    send_command("XADD test:feed 1-0 seed 1\r\n")
+
+    reader = redis_client()
+    reader.settimeout(2)
+    reader.sendall(b"XREAD BLOCK 2000 STREAMS test:feed $\r\n")
+    send_command("XADD test:feed 2-0 fresh 1\r\n")
+    reply = reader.recv(4096).decode()
+    reader.close()
+    assert "2-0" in reply and "fresh" in reply and "seed" not in reply
@@ -0,0 +1,119 @@
+import os
+from redis_server.command_handler import CommandHandler
+from redis_server.persistence import RDBHandler, RecoveryManager
+from redis_server.storage import DataStore
+from redis_server.tiering import SpilledValue, ValueTier
+
+VALUE = "v" * 1000
+
+def fill(store, count=50):
+    store.get_or_create_list("list").extend(VALUE for _ in range(5))
+    for i in range(count):
+        store.set(f"key:{i}", f"{i}:{VALUE}")
+
+def test_cold_values_are_spilled_and_hot_ones_promoted(tmp_path):
+    store = DataStore(tier=ValueTier(str(tmp_path / "valuelog"), max_memory=20000, promote_hits=2))
+    fill(store)
+    store.get("key:49")  # hot: must stay in memory
+    assert store.spill_cold_values() > 0
+    assert store.get_memory_usage() <= 20000
+    assert isinstance(store._data["key:0"][0], SpilledValue)
+    assert not isinstance(store._data["key:49"][0], SpilledValue)
+    assert isinstance(store._data["list"][0], SpilledValue)
+
+    # Served from disk once, then promoted; a value fetched to be changed is promoted at once
+    assert store.get("key:0") == f"0:{VALUE}"
+    assert isinstance(store._data["key:0"][0], SpilledValue)
+    assert store.get("key:0") == f"0:{VALUE}"
+    assert not isinstance(store._data["key:0"][0], SpilledValue)
+    store.get_or_create_list("list").append("x")
+    assert len(store.get("list")) == 6
+    assert store.get_type("key:1") == "string" and store.get_encoding("key:1") == "spilled"
+
+    stats = store.get_tiering_stats()
+    assert stats["fetches"] == 1 and stats["promotions"] == 2
+    assert stats["spilled_values"] == stats["spills"] - 2
+    assert stats["disk_live_bytes"] > 0 and stats["segments"] == 1
+
+    store.delete("key:1")
+    store.set("key:2", "small")
+    assert store.get_tiering_stats()["spilled_values"] == stats["spilled_values"] - 2
+    store.flush()
+    assert store.get_tiering_stats()["spilled_values"] == 0
+    assert os.listdir(tmp_path / "valuelog") == []
+
+def test_compaction_moves_live_values_out_of_emptied_segments(tmp_path):
+    store = DataStore(tier=ValueTier(str(tmp_path / "valuelog"), max_memory=1, promote_hits=1, segment_bytes=8000))
+    fill(store, 40)
+    store.spill_cold_values()
+    assert store.get_tiering_stats()["segments"] > 2
+    for i in range(0, 40, 4):
+        store.delete(f"key:{i + 1}", f"key:{i + 2}", f"key:{i + 3}")
+
+    store.spill_cold_values()  # starts a compaction
+    store.tier._compaction[0].join()
+    store.spill_cold_values()  # adopts its result
+    stats = store.get_tiering_stats()
+    assert stats["compactions"] == 1 and stats["disk_bytes"] < 40 * 1000
+    for i in range(0, 40, 4):
+        assert store.get(f"key:{i}") == f"{i}:{VALUE}"
+    assert store.get("key:1") is None
+
+def test_emptied_segments_are_removed_without_a_copy(tmp_path):
+    store = DataStore(tier=ValueTier(str(tmp_path / "valuelog"), max_memory=1, promote_hits=1, segment_bytes=8000))
+    fill(store, 40)
+    store.spill_cold_values()
+    assert store.get_tiering_stats()["segments"] > 2
+    store.delete("list", *(f"key:{i}" for i in range(40)))
+
+    store.spill_cold_values()
+    # Nothing was live in them: no copy, no new segment, only the active one is left
+    assert store.tier._compaction is None
+    stats = store.get_tiering_stats()
+    assert stats["segments"] == 1 and stats["disk_live_bytes"] == 0
+    assert len(os.listdir(tmp_path / "valuelog")) == 1
+
+def test_spilled_values_are_saved_and_reported(tmp_path):
+    store = DataStore(tier=ValueTier(str(tmp_path / "valuelog"), max_memory=1))
+    fill(store)
+    store.spill_cold_values()
+    filename = str(tmp_path / "dump.rdb")
+    assert RDBHandler(filename).create_snapshot(store)
+    restored = DataStore()
+    assert RecoveryManager(str(tmp_path / "appendonly.aof"), filename).recover_data(restored)
+    assert restored.get("key:7") == f"7:{VALUE}" and list(restored.get("list")) == [VALUE] * 5
+
+    handler = CommandHandler(store)
+    assert handler.execute("CONFIG", "SET", "tiering_promote_hits", "0").startswith(b"-")
+    assert handler.execute("CONFIG", "SET", "tiering_max_memory", "0") == b"+OK\r\n"
+    info = handler.execute("INFO", "memory")
+    assert b"tiered_spilled_values:51" in info and b"tiered_spills_per_sec:" in info
+
+def test_values_grown_in_place_count_towards_the_limit(tmp_path):
+    store = DataStore(tier=ValueTier(str(tmp_path / "valuelog"), max_memory=200_000))
+    handler = CommandHandler(store)
+    item = "x" * 200
+    for i in range(50):
+        for _ in range(10):
+            handler.execute("RPUSH", f"list:{i}", *[item] * 10)
+        handler.execute("HSET", f"hash:{i}", *[part for n in range(20) for part in (f"f{n}", item)])
+        handler.execute("SADD", f"set:{i}", *[f"{n}{item}" for n in range(20)])
+    expected = sum(store._calculate_memory_usage(key, value) for key, value, _ in store.entries())
+    assert store.get_memory_usage() == expected > 1_000_000
+
+    assert store.spill_cold_values(limit=1000) > 0
+    assert store.get_memory_usage() <= 200_000
+    assert isinstance(store._data["list:0"][0], SpilledValue)
+
+def test_dropped_values_take_back_what_was_counted(tmp_path):
+    store = DataStore()
+    handler = CommandHandler(store)
+    handler.execute("RPUSH", "list", "a")
+    handler.execute("SET", "string", "v")
+    before = store.get_memory_usage()
+    handler.execute("RPUSH", "list", *["x" * 1000] * 50)
+    handler.execute("SADD", "set", *[str(n) for n in range(100)])
+    handler.execute("DEL", "list", "set")
+    assert store.get_memory_usage() == before - store._calculate_memory_usage("list", ["a"])
+    handler.execute("DEL", "string")
+    assert store.get_memory_usage() == 0
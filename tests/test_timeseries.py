@@ -0,0 +1,19 @@
+from conftest import send_command
+
+def test_ts_range_aggregation():
+    send_command("DEL test:ts\r\n")
+
+    assert "+OK" in send_command("TS.CREATE test:ts LABELS sensor temp\r\n")
+    send_command("TS.MADD test:ts 1000 1 test:ts 1500 3 test:ts 2000 10\r\n")
+    assert send_command("TS.RANGE test:ts - + AGGREGATION avg 1000\r\n") == (
+        "*2\r\n*2\r\n:1000\r\n$1\r\n2\r\n*2\r\n:2000\r\n$2\r\n10\r\n"
+    )
+    assert send_command("TS.GET test:ts\r\n") == "*2\r\n:2000\r\n$2\r\n10\r\n"
+
+def test_ts_duplicate_policy():
+    send_command("DEL test:ts:dup\r\n")
+
+    assert send_command("TS.ADD test:ts:dup 1000 5\r\n") == ":1000\r\n"
+    assert "BLOCK" in send_command("TS.ADD test:ts:dup 1000 6\r\n")
+    assert send_command("TS.ADD test:ts:dup 1000 6 ON_DUPLICATE SUM\r\n") == ":1000\r\n"
+    assert send_command("TS.RANGE test:ts:dup 1000 1000\r\n") == "*1\r\n*2\r\n:1000\r\n$2\r\n11\r\n"
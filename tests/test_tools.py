@@ -0,0 +1,80 @@
+import os
+import time
+from collections import deque
+from redis_server import tools
+from redis_server.persistence import MappedRDBHandler, RDBHandler, RecoveryManager
+from redis_server.persistence.aof import encode_command
+from redis_server.storage import DataStore
+
+def fill(store):
+    for i in range(200):
+        store.set(f"user:{i}", "x" * i)
+    store.get_or_create_list("queue:jobs").extend(str(i) for i in range(500))
+    store.get_or_create_hash("plain").update({"a": "1"})
+    store.set("session:1", "v", time.time() + 100)
+    return store
+
+def test_torn_aof_tail_is_found_and_cut(tmp_path, capsys):
+    aof = tmp_path / "appendonly.aof"
+    aof.write_bytes(encode_command("SET", "a", "1") + encode_command("RPUSH", "l", "x", "y")
+                    + b"*3\r\n$3\r\nSET\r\n$1\r\nb\r\n$5\r\nab")
+    assert tools.main(["check", str(aof)]) == 1
+    assert "2 commands, then truncated bulk string" in capsys.readouterr().out
+
+    assert tools.main(["repair", str(aof), "--dry-run"]) == 0
+    assert os.path.getsize(aof) > tools.scan_aof(str(aof))[1]
+    assert tools.main(["repair", str(aof)]) == 0
+    assert tools.scan_aof(str(aof)) == (2, os.path.getsize(aof), None)
+    assert tools.main(["check", str(aof)]) == 0
+
+def test_datasets_convert_between_formats(tmp_path):
+    store = fill(DataStore())
+    rdb = str(tmp_path / "dump.rdb")
+    assert RDBHandler(rdb).create_snapshot(store)
+    assert tools.main(["convert", rdb, str(tmp_path / "out.aof")]) == 0
+    assert tools.main(["convert", str(tmp_path / "out.aof"), str(tmp_path / "mapped.rdb"), "--format", "mapped",
+                       "--max-memory", "4096"]) == 0
+    assert tools.main(["check", rdb, str(tmp_path / "out.aof"), str(tmp_path / "mapped.rdb")]) == 0
+
+    entries = {key: (value, expiry_time) for key, value, expiry_time in
+               MappedRDBHandler(str(tmp_path / "mapped.rdb")).iter_snapshot()}
+    assert sorted(entries) == sorted(store.keys())
+    assert entries["queue:jobs"][0] == deque(str(i) for i in range(500))
+    assert entries["user:150"][0] == "x" * 150 and entries["session:1"][1] > time.time()
+    assert sorted(os.listdir(tmp_path)) == ["dump.rdb", "mapped.rdb", "out.aof"]
+
+    # A flipped byte fails the chunk checksum
+    with open(rdb, "r+b") as f:
+        f.seek(20)
+        byte = f.read(1)
+        f.seek(20)
+        f.write(bytes([byte[0] ^ 0xFF]))
+    ok, report = tools.check_file(rdb)
+    assert not ok and "checksum" in report
+
+def test_snapshot_analysis(tmp_path):
+    rdb = str(tmp_path / "dump.rdb")
+    assert RDBHandler(rdb).create_snapshot(fill(DataStore()))
+    analysis = tools.analyze(rdb, top=2)
+    assert analysis.keys == 203 and analysis.volatile == 1
+    assert analysis.types["string"][0] == 201 and analysis.types["list"][0] == 1
+    assert [key for _, key, _ in analysis.largest()] == ["queue:jobs", "user:199"]
+    assert analysis.prefixes["user"][0] == 200 and analysis.prefixes[tools.NO_PREFIX][0] == 1
+    assert sum(memory for _, memory in analysis.types.values()) == analysis.memory
+
+def test_convert_keeps_search_index_definitions(tmp_path):
+    from redis_server.command_handler import CommandHandler
+    store = DataStore()
+    handler = CommandHandler(store)
+    handler.execute("FT.CREATE", "idx", "PREFIX", "1", "doc:", "SCHEMA", "color", "TAG")
+    handler.execute("HSET", "doc:1", "color", "red")
+    rdb = str(tmp_path / "dump.rdb")
+    assert RDBHandler(rdb).create_snapshot(store)
+
+    for source, target, target_format in [(rdb, "out.aof", "aof"), ("out.aof", "mapped.rdb", "mapped"),
+                                          ("mapped.rdb", "again.rdb", "rdb")]:
+        assert tools.main(["convert", str(tmp_path / source), str(tmp_path / target), "--format", target_format]) == 0
+    restored = DataStore()
+    handler = CommandHandler(restored)
+    assert RecoveryManager(str(tmp_path / "none.aof"), str(tmp_path / "again.rdb")).recover_data(restored, handler)
+    assert handler.execute("FT.SEARCH", "idx", "@color:{red}", "NOCONTENT") == b"*2\r\n:1\r\n$5\r\ndoc:1\r\n"
@@ -0,0 +1,35 @@
+import random
+from conftest import send_command
+from redis_server.datatypes.vectorset import VectorSet
+
+def test_vadd_and_vsim():
+    send_command("DEL test:vec\r\n")
+
+    assert send_command("VADD test:vec VALUES 3 1 0 0 east\r\n") == ":1\r\n"
+    assert send_command("VADD test:vec VALUES 3 0 1 0 north\r\n") == ":1\r\n"
+    assert send_command("VADD test:vec VALUES 3 0.9 0.1 0 east-ish\r\n") == ":1\r\n"
+    assert send_command("VCARD test:vec\r\n") == ":3\r\n"
+    assert send_command("VSIM test:vec VALUES 3 1 0 0 COUNT 2\r\n") == (
+        "*2\r\n$4\r\neast\r\n$8\r\neast-ish\r\n"
+    )
+    assert "dimension mismatch" in send_command("VADD test:vec VALUES 2 1 0 west\r\n")
+    assert send_command("VREM test:vec east\r\n") == ":1\r\n"
+    assert send_command("VSIM test:vec ELE east-ish COUNT 1\r\n") == "*1\r\n$8\r\neast-ish\r\n"
+
+def test_hnsw_survives_add_remove_churn():
+    vector_set = VectorSet(8, hnsw_threshold=0, m=4, ef_construction=20)
+    rng = random.Random(1)
+    names = [f"e{i}" for i in range(300)]
+    for _ in range(2000):
+        name = rng.choice(names)
+        if name in vector_set.rows and rng.random() < 0.5:
+            assert vector_set.remove(name)
+        else:
+            vector_set.add(name, [rng.random() for _ in range(8)])
+        assert len(vector_set.rows) == len(vector_set.elements) == len(vector_set.links)
+    assert len(vector_set.vectors) == 8 * len(vector_set)
+    assert all(vector_set.elements[row] == name for name, row in vector_set.rows.items())
+    element = vector_set.elements[0]
+    assert vector_set.search_element(element, count=1)[0][0] == element
+    restored = VectorSet.from_bytes(vector_set.to_bytes())
+    assert restored.search_element(element, count=1)[0][0] == element